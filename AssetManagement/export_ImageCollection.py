@@ -28,6 +28,19 @@ except ImportError:
 import ee
 import geemap
 
+# %%
+# Imports the export scheduler of this repository when the notebook runs from a clone of it. Elsewhere, e.g., on
+# Colab, the tasks are started from a few threads instead.
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.pardir, 'Template'))
+try:
+    from export_scheduler import ExportScheduler
+except ImportError:
+    ExportScheduler = None
+
 # %%
 """
 ## Create an interactive map 
@@ -55,11 +68,8 @@ polys = ee.Geometry.Polygon(
           [-99.21443939208984, 46.772037733479884],
           [-99.30267333984375, 46.77321343419932]]])
 
-# create a FeatureCollection based on the roi and center the map
+# create a FeatureCollection based on the roi
 centroid = polys.centroid()
-lng, lat = centroid.getInfo()['coordinates']
-print("lng = {}, lat = {}".format(lng, lat))
-Map.setCenter(lng, lat, 12)
 fc = ee.FeatureCollection(polys)
 
 # filter the ImageCollection using the roi
@@ -67,8 +77,14 @@ naip = collection.filterBounds(polys)
 naip_2015 = naip.filterDate('2015-01-01', '2015-12-31')
 mosaic = naip_2015.mosaic()
 
+# fetch the centroid and the names of all images in one request, instead of one getInfo() call per image
+(lng, lat), names = ee.List([centroid.coordinates(),
+                             naip_2015.limit(100).aggregate_array('system:index')]).getInfo()
+print("lng = {}, lat = {}".format(lng, lat))
+Map.setCenter(lng, lat, 12)
+
 # print out the number of images in the ImageCollection
-count = naip_2015.size().getInfo()
+count = len(names)
 print("Count: ", count)
 
 # add the ImageCollection and the roi to the map
@@ -80,12 +96,30 @@ Map.addLayer(fc)
 downConfig = {'scale': 30, "maxPixels": 1.0E13, 'driveFolder': 'image'}  # scale means resolution.
 img_lst = naip_2015.toList(100)
 
-for i in range(0, count):
+
+def make_task(i):
     image = ee.Image(img_lst.get(i))
-    name = image.get('system:index').getInfo()
-    # print(name)
-    task = ee.batch.Export.image(image, name, downConfig)
+    return ee.batch.Export.image(image, names[i], downConfig)
+
+
+def start_export(i):
+    task = make_task(i)
     task.start()
+    return task
+
+
+if ExportScheduler is not None:
+    # start the tasks with at most 10 of them queued or running at a time, retrying the starts that fail.
+    with ExportScheduler(max_in_flight=10) as scheduler:
+        for i in range(count):
+            scheduler.submit(lambda i=i: make_task(i), names[i])
+        scheduler.wait(until='started')
+
+    for result in scheduler.results():
+        print(result['description'], result['state'], result['error'] or '')
+else:
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        tasks = list(executor.map(start_export, range(count)))
 
 
 
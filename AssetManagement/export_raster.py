@@ -28,6 +28,19 @@ except ImportError:
 import ee
 import geemap
 
+# %%
+# Imports the export scheduler of this repository when the notebook runs from a clone of it. Elsewhere, e.g., on
+# Colab, the tasks are started from a few threads instead.
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.pardir, 'Template'))
+try:
+    from export_scheduler import ExportScheduler
+except ImportError:
+    ExportScheduler = None
+
 # %%
 """
 ## Create an interactive map 
@@ -54,15 +67,17 @@ polys = ee.Geometry.Polygon(
           [-99.30267333984375, 46.77321343419932]]])
 
 centroid = polys.centroid()
-lng, lat = centroid.getInfo()['coordinates']
-print("lng = {}, lat = {}".format(lng, lat))
-
-lng_lat = ee.Geometry.Point(lng, lat)
 naip = collection.filterBounds(polys)
 naip_2015 = naip.filterDate('2015-01-01', '2015-12-31')
 ppr = naip_2015.mosaic()
 
-count = naip_2015.size().getInfo()
+# Fetch the centroid and the names of all images in one request, instead of one getInfo() call per image.
+(lng, lat), names = ee.List([centroid.coordinates(),
+                             naip_2015.limit(100).aggregate_array('system:index')]).getInfo()
+print("lng = {}, lat = {}".format(lng, lat))
+lng_lat = ee.Geometry.Point(lng, lat)
+
+count = len(names)
 print("Count: ", count)
 
 # print(naip_2015.size().getInfo())
@@ -74,12 +89,30 @@ print("Count: ", count)
 downConfig = {'scale': 30, "maxPixels": 1.0E13, 'driveFolder': 'image'}  # scale means resolution.
 img_lst = naip_2015.toList(100)
 
-for i in range(0, count):
+
+def make_task(i):
     image = ee.Image(img_lst.get(i))
-    name = image.get('system:index').getInfo()
-    # print(name)
-    task = ee.batch.Export.image(image, name, downConfig)
+    return ee.batch.Export.image(image, names[i], downConfig)
+
+
+def start_export(i):
+    task = make_task(i)
     task.start()
+    return task
+
+
+if ExportScheduler is not None:
+    # Start the tasks with at most 10 of them queued or running at a time, retrying the starts that fail.
+    with ExportScheduler(max_in_flight=10) as scheduler:
+        for i in range(count):
+            scheduler.submit(lambda i=i: make_task(i), names[i])
+        scheduler.wait(until='started')
+
+    for result in scheduler.results():
+        print(result['description'], result['state'], result['error'] or '')
+else:
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        tasks = list(executor.map(start_export, range(count)))
 
 
 
@@ -105,15 +105,23 @@ image = dem.clip(roi)
 Map.centerObject(image, 9)
 Map.addLayer(image, vis_params, 'DEM')
 
-scale = image.projection().nominalScale()
-print("Resolution: ", scale.getInfo())
+resolution = image.projection().nominalScale()
 
 scale = 30
 
-print("Minimum value: ", minValue(image, scale).get('elevation').getInfo())
-print("Maximum value: ", maxValue(image, scale).get('elevation').getInfo())
-print("Average value: ", meanValue(image, scale).get('elevation').getInfo())
-print("Standard deviation: ", stdValue(image, scale).get('elevation').getInfo())
+# Compute all statistics in one request instead of one getInfo() call each.
+stats = ee.List([
+    resolution,
+    minValue(image, scale).get('elevation'),
+    maxValue(image, scale).get('elevation'),
+    meanValue(image, scale).get('elevation'),
+    stdValue(image, scale).get('elevation'),
+]).getInfo()
+print("Resolution: ", stats[0])
+print("Minimum value: ", stats[1])
+print("Maximum value: ", stats[2])
+print("Average value: ", stats[3])
+print("Standard deviation: ", stats[4])
 
 
 # %%
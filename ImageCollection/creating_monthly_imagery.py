@@ -53,16 +53,13 @@ Date_window = ee.Number(30)
 
 # Create list of dates for time series
 n_months = Date_End.difference(Date_Start, 'month').round()
-print("Number of months:", n_months.getInfo())
-dates = ee.List.sequence(0, n_months, 1)
-print(dates.getInfo())
+month_offsets = ee.List.sequence(0, n_months, 1)
 
 def make_datelist(n):
     return Date_Start.advance(n, 'month')
 
 
-dates = dates.map(make_datelist)
-print(dates.getInfo())
+dates = month_offsets.map(make_datelist)
 
 
 def fnc(d1):
@@ -83,9 +80,16 @@ def fnc(d1):
 
 
 list_of_images = dates.map(fnc)
-print('list_of_images', list_of_images.getInfo())
 mt = ee.ImageCollection(list_of_images)
-print(mt.getInfo())
+
+# Fetch all results in one request instead of one getInfo() call each.
+n_months_info, month_offsets_info, dates_info, list_of_images_info, mt_info = ee.List(
+    [n_months, month_offsets, dates, list_of_images, mt]).getInfo()
+print("Number of months:", n_months_info)
+print(month_offsets_info)
+print(dates_info)
+print('list_of_images', list_of_images_info)
+print(mt_info)
 # Map.addLayer(mt, {}, 'mt')
 
 
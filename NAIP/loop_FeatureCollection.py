@@ -28,6 +28,19 @@ except ImportError:
 import ee
 import geemap
 
+# %%
+# Imports the export scheduler of this repository when the notebook runs from a clone of it. Elsewhere, e.g., on
+# Colab, the tasks are started from a few threads instead.
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.pardir, 'Template'))
+try:
+    from export_scheduler import ExportScheduler
+except ImportError:
+    ExportScheduler = None
+
 # %%
 """
 ## Create an interactive map 
@@ -57,11 +70,10 @@ fromFT = ee.FeatureCollection('ft:1CLldB-ULPyULBT2mxoRNv7enckVF0gCQoD2oH7XP')
 # print(count)
 polys = fromFT.geometry()
 centroid = polys.centroid()
-lng, lat = centroid.getInfo()['coordinates']
+# Fetch the centroid and the ids and names of all watersheds in one request.
+id_names = fromFT.reduceColumns(ee.Reducer.toList(2), ['system:index', 'name']).get('list')
+(lng, lat), values = ee.List([centroid.coordinates(), id_names]).getInfo()
 # print("lng = {}, lat = {}".format(lng, lat))
-
-
-values = fromFT.reduceColumns(ee.Reducer.toList(2), ['system:index', 'name']).getInfo()['list']
 # print(values)
 Map.setCenter(lng, lat, 10)
 
@@ -90,25 +102,42 @@ def rasterToVector(img, fc):
 
 
 def exportToDrive(vec, filename):
+    """Get the task exporting the vectors to Google Drive, which is started by the export scheduler."""
     taskParams = {
         'driveFolder': 'image',
         'fileFormat': 'KML'
     }
-    task = ee.batch.Export.table(vec, filename, taskParams)
-    task.start()
+    return ee.batch.Export.table(vec, filename, taskParams)
 
 
-vis = {'bands': ['N', 'R', 'G']}
-for (id, name) in values:
-    watershed = fromFT.filter(ee.Filter.eq('system:index', str(id)))
-    filename = "Y" + str(year) + "_" + str(id) + "_" + str(name).replace(" ", "_")
-    print(filename)
+def ndwiExport(id, filename):
+    watershed = fromFT.filter(ee.Filter.eq('system:index', str(id))).geometry()
     image = subsetNAIP(collection, startTime, endTime, watershed)
     ndwi = calNDWI(image)
     vector = rasterToVector(ndwi, watershed)
-    exportToDrive(vector, filename)
-    # Map.addLayer(image, vis)
     # Map.addLayer(vector)
+    return exportToDrive(vector, filename)
+
+
+def startExport(id, filename):
+    task = ndwiExport(id, filename)
+    task.start()
+    return task
+
+
+vis = {'bands': ['N', 'R', 'G']}
+filenames = ["Y" + str(year) + "_" + str(id) + "_" + str(name).replace(" ", "_") for (id, name) in values]
+ids = [id for (id, name) in values]
+if ExportScheduler is not None:
+    # Export every watershed, with at most 10 tasks queued or running at a time.
+    with ExportScheduler(max_in_flight=10) as scheduler:
+        for id, filename in zip(ids, filenames):
+            print(filename)
+            scheduler.submit(lambda id=id, filename=filename: ndwiExport(id, filename), filename)
+        scheduler.wait(until='started')
+else:
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        tasks = list(executor.map(startExport, ids, filenames))
 
 
 
@@ -69,21 +69,25 @@ naip_2015 = naip.filterDate('2010-01-01', '2015-12-31')
 
 image = ee.Image('USDA/NAIP/DOQQ/m_4609915_sw_14_1_20100629')
 bandNames = image.bandNames()
-print('Band names: ', bandNames.getInfo())
 
 b_nir = image.select('N')
 
 proj = b_nir.projection()
-print('Projection: ', proj.getInfo())
 
 props = b_nir.propertyNames()
-print(props.getInfo())
 
 img_date = ee.Date(image.get('system:time_start'))
-print('Timestamp: ', img_date.getInfo())
 
 id = image.get('system:index')
-print(id.getInfo())
+
+# Fetch all metadata in one request instead of one getInfo() call each.
+band_names_info, proj_info, props_info, img_date_info, id_info = ee.List(
+    [bandNames, proj, props, img_date, id]).getInfo()
+print('Band names: ', band_names_info)
+print('Projection: ', proj_info)
+print(props_info)
+print('Timestamp: ', img_date_info)
+print(id_info)
 
 # print(image.getInfo())
 
@@ -93,14 +97,16 @@ vis = {'bands': ['N', 'R', 'G']}
 
 
 size = naip_2015.toList(100).length()
-print("Number of images: ", size.getInfo())
 
 count = naip_2015.size()
-print("Count: ", count.getInfo())
 
 dates = ee.List(naip_2015.get('date_range'))
 date_range = ee.DateRange(dates.get(0),dates.get(1))
-print("Date range: ", date_range.getInfo())
+
+size_info, count_info, date_range_info = ee.List([size, count, date_range]).getInfo()
+print("Number of images: ", size_info)
+print("Count: ", count_info)
+print("Date range: ", date_range_info)
 
 
 # %%
@@ -28,6 +28,19 @@ except ImportError:
 import ee
 import geemap
 
+# %%
+# Imports the export scheduler of this repository when the notebook runs from a clone of it. Elsewhere, e.g., on
+# Colab, the tasks are started from a few threads instead.
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.pardir, 'Template'))
+try:
+    from export_scheduler import ExportScheduler
+except ImportError:
+    ExportScheduler = None
+
 # %%
 """
 ## Create an interactive map 
@@ -66,12 +79,22 @@ def rasterToVector(img, fc):
     return vec
 
 def exportToDrive(vec, filename):
+    """Get the task exporting the vectors to Google Drive, which is started by the export scheduler."""
     taskParams = {
         'driveFolder': 'image',
         'fileFormat': 'KML'
     }
-    task = ee.batch.Export.table(vec, filename, taskParams)
-    task.start()
+    return ee.batch.Export.table(vec, filename, taskParams)
+
+def ndwiExport(year, id, filename):
+    watershed = fromFT.filter(ee.Filter.eq('system:index', str(id))).geometry()
+    startTime = ee.Date(str(year) + '-01-01')
+    endTime = ee.Date(str(year) + '-12-31')
+    image = subsetNAIP(collection, startTime, endTime, watershed)
+    ndwi = calNDWI(image, threshold)
+    vector = rasterToVector(ndwi, watershed)
+    # Map.addLayer(vector)
+    return exportToDrive(vector, filename)
 
 
 years = [2014]
@@ -84,31 +107,34 @@ fromFT = ee.FeatureCollection('ft:1CLldB-ULPyULBT2mxoRNv7enckVF0gCQoD2oH7XP')
 # print(count)
 polys = fromFT.geometry()
 centroid = polys.centroid()
-lng, lat = centroid.getInfo()['coordinates']
+# Fetch the centroid and the ids and names of all watersheds in one request.
+id_names = fromFT.reduceColumns(ee.Reducer.toList(2), ['system:index', 'name']).get('list')
+(lng, lat), values = ee.List([centroid.coordinates(), id_names]).getInfo()
 # print("lng = {}, lat = {}".format(lng, lat))
-values = fromFT.reduceColumns(ee.Reducer.toList(2), ['system:index', 'name']).getInfo()['list']
 # print(values)
 # Map.setCenter(lng, lat, 10)
 vis = {'bands': ['N', 'R', 'G']}
 
-for year in years:
-    # year = 2015
 
-    startTime = ee.Date(str(year) + '-01-01')
-    endTime = ee.Date(str(year) + '-12-31')
-    # year = startTime.get('year').getInfo()
-    # print(year)
-
-    for (id, name) in values:
-        watershed = fromFT.filter(ee.Filter.eq('system:index', str(id)))
-        filename = "Y" + str(year) + "_" + str(id) + "_" + str(name).replace(" ", "_")
-        print(filename)
-        image = subsetNAIP(collection, startTime, endTime, watershed)
-        ndwi = calNDWI(image, threshold)
-        vector = rasterToVector(ndwi, watershed)
-        exportToDrive(vector, filename)
-        # Map.addLayer(image, vis)
-        # Map.addLayer(vector)
+def startExport(year, id, filename):
+    task = ndwiExport(year, id, filename)
+    task.start()
+    return task
+
+
+units = [(year, id, "Y" + str(year) + "_" + str(id) + "_" + str(name).replace(" ", "_"))
+         for year in years for (id, name) in values]
+if ExportScheduler is not None:
+    # Export every (year, watershed) unit, with at most 10 tasks queued or running at a time.
+    # Template/naip_ndwi_pipeline.py runs the same exports from the command line, and resumes an interrupted run.
+    with ExportScheduler(max_in_flight=10) as scheduler:
+        for (year, id, filename) in units:
+            print(filename)
+            scheduler.submit(lambda year=year, id=id, filename=filename: ndwiExport(year, id, filename), filename)
+        scheduler.wait(until='started')
+else:
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        tasks = list(executor.map(lambda unit: startExport(*unit), units))
 
 
 # for i in range(2, 2 + count):
@@ -0,0 +1,239 @@
+''' Benchmark the Earth Engine JavaScript to Python conversion.
+
+To benchmark the bundled JavaScripts and a synthetic corpus of 10,000 files: python benchmark_conversion.py
+To change the size of the synthetic corpus: python benchmark_conversion.py --synthetic 1000
+The line-based and the syntax tree frontends of the converter are both benchmarked, reported in milliseconds per KB.
+The Python to notebook step (py_to_ipynb_dir) is benchmarked too, and compared with the ipynb-py-convert command line
+tool it used to launch once per script, if that tool is installed.
+
+'''
+
+# License: MIT
+
+import os
+import io
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+from convert_js_to_python import js_to_python, py_to_ipynb_dir, remove_qgis_import, template_header, template_footer
+from js_parser import parse
+from js_codegen import PythonGenerator
+
+
+def get_js_files(in_dir):
+    """Get all Earth Engine JavaScripts in a folder recursively.
+
+    Args:
+        in_dir (str): The input folder containing Earth Engine JavaScripts.
+
+    Returns:
+        list: Sorted list of JavaScript file paths.
+    """
+    return sorted(str(file) for file in Path(in_dir).rglob('*.js'))
+
+
+def make_synthetic_corpus(js_files, out_dir, count=10000):
+    """Create a synthetic corpus of Earth Engine JavaScripts by cycling through the given scripts.
+
+    Args:
+        js_files (list): List of JavaScript file paths used as the source of the corpus.
+        out_dir (str): The output folder of the synthetic corpus.
+        count (int, optional): Number of files in the corpus. Defaults to 10000.
+
+    Returns:
+        list: List of the generated JavaScript file paths.
+    """
+    sources = []
+    for js_file in js_files:
+        with open(js_file) as f:
+            sources.append(f.read())
+
+    out_files = []
+    for index in range(count):
+        sub_dir = os.path.join(out_dir, 'dir_{:03d}'.format(index // 100))
+        if not os.path.exists(sub_dir):
+            os.makedirs(sub_dir)
+        out_file = os.path.join(sub_dir, 'script_{:05d}.js'.format(index))
+        with open(out_file, 'w') as f:
+            f.write('// Synthetic script {}\n'.format(index))
+            f.write(sources[index % len(sources)])
+        out_files.append(out_file)
+
+    return out_files
+
+
+def benchmark_js_to_python(js_files, out_dir, use_qgis=True, frontend='lines'):
+    """Convert the given JavaScripts to Python scripts and measure the throughput.
+
+    Args:
+        js_files (list): List of JavaScript file paths.
+        out_dir (str): The output folder of the Python scripts.
+        use_qgis (bool, optional): Whether to add "from ee_plugin import Map \n" to the output script. Defaults to True.
+        frontend (str, optional): The converter frontend, 'lines' or 'ast'. Defaults to 'lines'.
+
+    Returns:
+        dict: The number of files, the input size in KB, the elapsed seconds, files per second, KB per second and
+            milliseconds per KB.
+    """
+    size = sum(os.path.getsize(js_file) for js_file in js_files) / 1024.0
+
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index, js_file in enumerate(js_files):
+            out_file = os.path.join(out_dir, '{:05d}.py'.format(index))
+            js_to_python(js_file, out_file, use_qgis, frontend=frontend)
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        'files': len(js_files),
+        'size_kb': size,
+        'seconds': elapsed,
+        'files_per_second': len(js_files) / elapsed if elapsed else 0.0,
+        'kb_per_second': size / elapsed if elapsed else 0.0,
+        'ms_per_kb': elapsed * 1000 / size if size else 0.0,
+    }
+
+
+def benchmark_ast_stages(js_files, repeat=5):
+    """Measure the parse and the code generation stages of the syntax tree frontend in memory.
+
+    Args:
+        js_files (list): List of JavaScript file paths.
+        repeat (int, optional): Number of times each stage is repeated; the fastest run is kept. Defaults to 5.
+
+    Returns:
+        dict: The input size in KB and the milliseconds per KB spent parsing and generating Python code.
+    """
+    sources = []
+    for js_file in js_files:
+        with open(js_file) as f:
+            sources.append(f.read())
+    size = sum(len(source.encode('utf-8')) for source in sources) / 1024.0
+
+    parse_times = []
+    emit_times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        programs = [parse(source) for source in sources]
+        parse_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        for source, program in zip(sources, programs):
+            PythonGenerator(source, program['comments']).generate(program)
+        emit_times.append(time.perf_counter() - start_time)
+
+    return {
+        'size_kb': size,
+        'parse_ms_per_kb': min(parse_times) * 1000 / size if size else 0.0,
+        'emit_ms_per_kb': min(emit_times) * 1000 / size if size else 0.0,
+    }
+
+
+def ipynb_py_convert_dir(in_dir, template_file):
+    """Convert Python scripts to notebooks the way py_to_ipynb_dir() used to, launching ipynb-py-convert per script.
+
+    Args:
+        in_dir (str): Input folder containing Earth Engine Python scripts.
+        template_file (str): Input Jupyter notebook template.
+    """
+    header = template_header(template_file)
+    footer = template_footer(template_file)
+    for file in list(Path(in_dir).rglob('*.py')):
+        in_file = str(file)
+        out_py_file = in_file.replace('.py', '_nb.py')
+        content = remove_qgis_import(in_file) or []
+        with open(out_py_file, 'w') as f:
+            f.writelines(header + content + footer)
+        subprocess.run(['ipynb-py-convert', out_py_file, in_file.replace('.py', '.ipynb')], check=True)
+        os.remove(out_py_file)
+
+
+def benchmark_py_to_ipynb(py_files, template_file, out_dir, use_subprocess=False):
+    """Convert the given Python scripts to Jupyter notebooks with py_to_ipynb_dir() and measure the throughput.
+
+    Args:
+        py_files (list): List of Python script file paths. They are copied to out_dir first.
+        template_file (str): Input Jupyter notebook template.
+        out_dir (str): The output folder of the notebooks.
+        use_subprocess (bool, optional): Whether to launch ipynb-py-convert per script instead, for comparison.
+            Defaults to False.
+
+    Returns:
+        dict: The number of files, the input size in KB, the elapsed seconds, files per second, KB per second and
+            milliseconds per KB.
+    """
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    for index, py_file in enumerate(py_files):
+        shutil.copyfile(py_file, os.path.join(out_dir, '{:05d}.py'.format(index)))
+    size = sum(os.path.getsize(py_file) for py_file in py_files) / 1024.0
+
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if use_subprocess:
+            ipynb_py_convert_dir(out_dir, template_file)
+        else:
+            py_to_ipynb_dir(out_dir, template_file)
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        'files': len(py_files),
+        'size_kb': size,
+        'seconds': elapsed,
+        'files_per_second': len(py_files) / elapsed if elapsed else 0.0,
+        'kb_per_second': size / elapsed if elapsed else 0.0,
+        'ms_per_kb': elapsed * 1000 / size if size else 0.0,
+    }
+
+
+def print_result(name, result):
+    """Print a benchmark result.
+
+    Args:
+        name (str): Name of the benchmark.
+        result (dict): The benchmark result.
+    """
+    print('{}: {} files, {:.1f} KB in {:.3f} s ({:.1f} files/s, {:.1f} KB/s, {:.3f} ms/KB)'.format(
+        name, result['files'], result['size_kb'], result['seconds'],
+        result['files_per_second'], result['kb_per_second'], result['ms_per_kb']))
+
+
+if __name__ == '__main__':
+
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description='Benchmark the Earth Engine JavaScript to Python conversion.')
+    parser.add_argument('--input', type=str, default=root_dir,
+                        help="Folder containing the Earth Engine JavaScripts to benchmark")
+    parser.add_argument('--synthetic', type=int, default=10000,
+                        help="Number of files in the synthetic corpus")
+    args = parser.parse_args()
+
+    js_files = get_js_files(args.input)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        out_dir = os.path.join(work_dir, 'bundled')
+        print_result('Bundled JavaScripts', benchmark_js_to_python(js_files, out_dir))
+        print_result('Bundled JavaScripts (ast)', benchmark_js_to_python(js_files, out_dir, frontend='ast'))
+        stages = benchmark_ast_stages(js_files)
+        print('Syntax tree frontend: parse {:.3f} ms/KB, emit {:.3f} ms/KB'.format(
+            stages['parse_ms_per_kb'], stages['emit_ms_per_kb']))
+
+        template_file = os.path.join(root_dir, 'Template', 'template.py')
+        py_files = sorted(str(file) for file in Path(out_dir).glob('*.py'))
+        nb_dir = os.path.join(work_dir, 'notebooks')
+        print_result('Notebooks', benchmark_py_to_ipynb(py_files, template_file, nb_dir))
+        if shutil.which('ipynb-py-convert') is not None:
+            nb_dir = os.path.join(work_dir, 'notebooks_subprocess')
+            print_result('Notebooks (ipynb-py-convert)',
+                         benchmark_py_to_ipynb(py_files, template_file, nb_dir, use_subprocess=True))
+
+        corpus_dir = os.path.join(work_dir, 'corpus')
+        corpus_files = make_synthetic_corpus(js_files, corpus_dir, args.synthetic)
+        out_dir = os.path.join(work_dir, 'synthetic')
+        print_result('Synthetic corpus', benchmark_js_to_python(corpus_files, out_dir))
+        print_result('Synthetic corpus (ast)', benchmark_js_to_python(corpus_files, out_dir, frontend='ast'))
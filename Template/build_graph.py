@@ -0,0 +1,299 @@
+''' Rebuild the artifacts of the JavaScript examples that are out of date: .js → _qgis.py → .py → .ipynb
+
+To rebuild what changed in the default example folders: build()
+From the command line: python build_graph.py --workers 4
+To list the stale artifacts without rebuilding them: python build_graph.py --dry-run
+To execute the rebuilt notebooks too: python build_graph.py --execute
+
+Each example is a chain of rules: the JavaScript is converted to a QGIS script (Buffer.js → Buffer_qgis.py), which
+is spliced into the notebook template (Buffer_qgis.py + template.py → Buffer.py), which is written as a notebook
+(Buffer.py → Buffer.ipynb). A target is rebuilt when the hash of its sources or of its converter changed since it was
+built, or when it is missing. Targets that were never built by this script are rebuilt when a source is newer, like
+make. The rules of each step run in parallel, and a rebuilt target that comes out unchanged does not make the next
+step stale. The build state is kept in .build_graph_state.json in the repo root.
+
+'''
+
+# License: MIT
+
+import io
+import os
+import json
+import hashlib
+import argparse
+import contextlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from conversion_cache import ConversionCache
+from convert_js_to_python import js_to_python, remove_qgis_import, converter_version
+from notebook_template import load_template, TEMPLATE_USERNAME, TEMPLATE_REPO
+from notebook_writer import py_file_to_notebook
+from notebook_executor import execute_notebooks
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FILE = os.path.join(ROOT_DIR, 'Template', 'template.py')
+EXAMPLE_DIRS = ['JavaScripts', 'JavaScripts fdeature img collection', 'javascript2']
+BUILD_STATE_FILE = os.path.join(ROOT_DIR, '.build_graph_state.json')
+
+# The steps of the chain, in build order.
+STEPS = ('qgis', 'script', 'notebook')
+BUILD_STATE_VERSION = '1'
+
+
+class Rule(object):
+    """A build rule: the target file and the source files it is made from.
+
+    Args:
+        step (str): One of STEPS.
+        target (str): File path of the target.
+        sources (list): File paths of the sources.
+        options (dict, optional): The JSON serializable options of the step. Defaults to None.
+    """
+
+    def __init__(self, step, target, sources, options=None):
+        self.step = step
+        self.target = target
+        self.sources = sources
+        self.options = options or {}
+
+
+class BuildState(ConversionCache):
+    """The hashes the targets were built from, see ConversionCache. Entries are keyed by target."""
+
+    def make_key(self, in_file, options=None):
+        """Compute the key of a rule.
+
+        Args:
+            in_file (list): File paths of the sources of the rule.
+            options (dict, optional): The options of the rule, including its step and the step version.
+                Defaults to None.
+
+        Returns:
+            str: The hexadecimal SHA-256 digest of the version, the options and the content of the sources.
+        """
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+        for source in in_file:
+            with open(source, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        return digest.hexdigest()
+
+
+def step_version(step):
+    """Get the version of the code that builds the targets of a step.
+
+    Args:
+        step (str): One of STEPS.
+
+    Returns:
+        str: The version, which changes when the converter changes.
+    """
+    if step == 'qgis':
+        return converter_version()
+    digest = hashlib.sha256()
+    module_file = 'notebook_template.py' if step == 'script' else 'notebook_writer.py'
+    with open(os.path.join(ROOT_DIR, 'Template', module_file), 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def find_rules(example_dirs=None, template_file=TEMPLATE_FILE, github_username=TEMPLATE_USERNAME,
+               github_repo=TEMPLATE_REPO, root_dir=ROOT_DIR):
+    """Find the build rules of the examples in the given folders.
+
+    An example is a JavaScript or a QGIS script without a JavaScript. The .py and .ipynb targets are built for both.
+
+    Args:
+        example_dirs (list, optional): Folders searched recursively. Defaults to None, which uses EXAMPLE_DIRS.
+        template_file (str, optional): File path of the notebook template. Defaults to TEMPLATE_FILE.
+        github_username (str, optional): GitHub username of the notebook links. Defaults to TEMPLATE_USERNAME.
+        github_repo (str, optional): GitHub repo name of the notebook links. Defaults to TEMPLATE_REPO.
+        root_dir (str, optional): The repo folder the notebook links are relative to. Defaults to ROOT_DIR.
+
+    Returns:
+        dict: Mapping of each step to its list of rules.
+    """
+    if example_dirs is None:
+        example_dirs = [os.path.join(root_dir, example_dir) for example_dir in EXAMPLE_DIRS]
+
+    stems = set()
+    for example_dir in example_dirs:
+        for file in Path(example_dir).rglob('*.js'):
+            stems.add(str(file)[:-len('.js')])
+        for file in Path(example_dir).rglob('*_qgis.py'):
+            stems.add(str(file)[:-len('_qgis.py')])
+
+    rules = {step: [] for step in STEPS}
+    for stem in sorted(stems):
+        if os.path.isfile(stem + '.js'):
+            rules['qgis'].append(Rule('qgis', stem + '_qgis.py', [stem + '.js']))
+        notebook_path = Path(os.path.relpath(stem, root_dir)).as_posix()
+        rules['script'].append(Rule('script', stem + '.py', [stem + '_qgis.py', template_file],
+                                    {'github_username': github_username, 'github_repo': github_repo,
+                                     'notebook_path': notebook_path}))
+        rules['notebook'].append(Rule('notebook', stem + '.ipynb', [stem + '.py']))
+    return rules
+
+
+def is_stale(rule, state, key):
+    """Check if the target of a rule needs to be rebuilt.
+
+    Args:
+        rule (Rule): The rule.
+        state (BuildState): The build state, or None to compare the modification times only.
+        key (str): The key of the rule, see BuildState.make_key().
+
+    Returns:
+        bool: Returns True if the target is missing, if it was built from other sources, or if it was never built
+            by this script and a source is newer.
+    """
+    if not os.path.isfile(rule.target):
+        return True
+    if state is not None and rule.target in state.entries:
+        return not state.is_fresh(rule.target, key, rule.target)
+    target_mtime = os.path.getmtime(rule.target)
+    return any(os.path.getmtime(source) > target_mtime for source in rule.sources)
+
+
+def _build_rule(task):
+    """Build the target of a rule in a worker process and report the result instead of raising.
+
+    Args:
+        task (tuple): The (step, target, sources, options) of the rule.
+
+    Returns:
+        dict: The build result, with the keys target, success and error.
+    """
+    step, target, sources, options = task
+    result = {'target': target, 'success': True, 'error': None}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if step == 'qgis':
+                js_to_python(sources[0], target, use_qgis=True)
+            elif step == 'script':
+                template = load_template(sources[1])
+                out_text = template.splice(remove_qgis_import(sources[0]), options['github_username'],
+                                           options['github_repo'], options['notebook_path'])
+                with open(target, 'w') as f:
+                    f.writelines(out_text)
+            else:
+                py_file_to_notebook(sources[0], target)
+    except Exception as e:
+        result['success'] = False
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    return result
+
+
+def build(example_dirs=None, workers=None, dry_run=False, use_state=True, state_file=BUILD_STATE_FILE,
+          template_file=TEMPLATE_FILE, execute=False):
+    """Rebuild the stale artifacts of the examples, one step after the other and the rules of a step in parallel.
+
+    Args:
+        example_dirs (list, optional): Folders of the examples. Defaults to None, which uses EXAMPLE_DIRS.
+        workers (int, optional): Number of worker processes. Defaults to None, which uses all CPU cores.
+        dry_run (bool, optional): Whether to only print the targets that would be rebuilt. Every target downstream of
+            a stale target is listed, as it cannot be known in advance if the rebuilt target changes. Defaults to
+            False.
+        use_state (bool, optional): Whether to use the hashes of the build state. Defaults to True. If False, the
+            targets are compared with their sources by modification time only.
+        state_file (str, optional): File path of the build state. Defaults to BUILD_STATE_FILE.
+        template_file (str, optional): File path of the notebook template. Defaults to TEMPLATE_FILE.
+        execute (bool, optional): Whether to execute the rebuilt notebooks. Defaults to False.
+
+    Returns:
+        list: File paths of the rebuilt (or, with dry_run, stale) targets, in build order.
+    """
+    rules = find_rules(example_dirs, template_file)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    state = BuildState(state_file, BUILD_STATE_VERSION) if use_state else None
+    versions = {step: step_version(step) for step in STEPS}
+
+    rebuilt = []
+    failed = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and not dry_run else None
+    try:
+        for step in STEPS:
+            tasks = []
+            keys = {}
+            for rule in rules[step]:
+                if dry_run and any(source in rebuilt for source in rule.sources):
+                    tasks.append((rule.step, rule.target, rule.sources, rule.options))
+                    continue
+                if any(not os.path.isfile(source) for source in rule.sources):
+                    continue
+                keys[rule.target] = None
+                if state is not None:
+                    keys[rule.target] = state.make_key(rule.sources, dict(rule.options, step=step,
+                                                                          version=versions[step]))
+                if is_stale(rule, state, keys[rule.target]):
+                    tasks.append((rule.step, rule.target, rule.sources, rule.options))
+                elif state is not None and rule.target not in state.entries:
+                    # Up to date by modification time: record its hashes so that the next runs compare contents.
+                    state.store(rule.target, keys[rule.target], rule.target)
+
+            if dry_run:
+                rebuilt.extend(task[1] for task in tasks)
+                continue
+
+            before = {task[1]: _file_hash(task[1]) for task in tasks}
+            results = executor.map(_build_rule, tasks) if executor is not None and len(tasks) > 1 else \
+                map(_build_rule, tasks)
+            for result in results:
+                target = result['target']
+                if not result['success']:
+                    print('Failed {}: {}'.format(target, result['error']))
+                    failed.append(target)
+                    if state is not None:
+                        state.discard(target)
+                    continue
+                if state is not None:
+                    state.store(target, keys[target], target)
+                if _file_hash(target) != before[target]:
+                    rebuilt.append(target)
+                    print('Rebuilt {}'.format(target))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if state is not None and not dry_run:
+            state.save()
+
+    print('{} {} targets{}'.format('Would rebuild' if dry_run else 'Rebuilt', len(rebuilt),
+                                   ', {} failed'.format(len(failed)) if failed else ''))
+    for target in rebuilt:
+        print('  ' + os.path.relpath(target, ROOT_DIR))
+
+    if execute and not dry_run:
+        execute_notebooks([target for target in rebuilt if target.endswith('.ipynb')], workers)
+
+    return rebuilt
+
+
+def _file_hash(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Rebuild the stale .js → _qgis.py → .py → .ipynb artifacts.')
+    parser.add_argument('--input', type=str, action='append',
+                        help="Folder of examples (can be given several times; default: {})".format(
+                            ', '.join(EXAMPLE_DIRS)))
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Number of worker processes (0 for all CPU cores)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print the stale targets without rebuilding them")
+    parser.add_argument('--mtime', action='store_true',
+                        help="Compare modification times only, ignoring the hashes of the build state")
+    parser.add_argument('--execute', action='store_true',
+                        help="Execute the rebuilt notebooks")
+    args = parser.parse_args()
+
+    build(args.input, args.workers or None, args.dry_run, use_state=not args.mtime, execute=args.execute)
@@ -0,0 +1,120 @@
+''' A persistent, content-hash based cache of converted files.
+
+To skip the files whose source and conversion options have not changed since the last run:
+
+    cache = ConversionCache(cache_file, version)
+    key = cache.make_key(in_file, options)
+    if not cache.is_fresh(in_file, key, out_file):
+        convert(in_file, out_file)
+        cache.store(in_file, key, out_file)
+    cache.save()
+
+'''
+
+# License: MIT
+
+import os
+import json
+import hashlib
+
+
+class ConversionCache(object):
+    """A manifest of converted files, keyed by the hash of the source, the converter version and the options.
+
+    An entry is fresh when its key is unchanged and the output file still has the size and modification time it
+    had when it was written, so that deleted or manually edited outputs are converted again.
+
+    Args:
+        cache_file (str): File path of the JSON manifest. It is created on save() if it does not exist.
+        version (str): The converter version. All entries are stale when it changes.
+    """
+
+    def __init__(self, cache_file, version):
+        self.cache_file = cache_file
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file) as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == version:
+                    self.entries = manifest.get('entries', {})
+            except (ValueError, OSError):
+                print('Ignoring the corrupted cache manifest {}'.format(cache_file))
+
+    def make_key(self, in_file, options=None):
+        """Compute the cache key of a source file.
+
+        Args:
+            in_file (str): File path of the source file.
+            options (dict, optional): The conversion options, which must be JSON serializable. Defaults to None.
+
+        Returns:
+            str: The hexadecimal SHA-256 digest of the converter version, the options and the file content.
+        """
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+        with open(in_file, 'rb') as f:
+            digest.update(f.read())
+        return digest.hexdigest()
+
+    def is_fresh(self, in_file, key, out_file):
+        """Check if the output of a source file is up to date, and count the hit or miss.
+
+        Args:
+            in_file (str): File path of the source file.
+            key (str): The cache key returned by make_key().
+            out_file (str): File path of the output file.
+
+        Returns:
+            bool: Returns True if the output file does not need to be regenerated.
+        """
+        entry = self.entries.get(str(in_file))
+        fresh = entry is not None and entry['key'] == key and entry['out_file'] == str(out_file) and \
+            entry['out_stat'] == _stat(out_file)
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def store(self, in_file, key, out_file):
+        """Record the output of a source file.
+
+        Args:
+            in_file (str): File path of the source file.
+            key (str): The cache key returned by make_key().
+            out_file (str): File path of the output file, which must exist.
+        """
+        self.entries[str(in_file)] = {'key': key, 'out_file': str(out_file), 'out_stat': _stat(out_file)}
+
+    def discard(self, in_file):
+        """Remove the entry of a source file, e.g., after its conversion failed.
+
+        Args:
+            in_file (str): File path of the source file.
+        """
+        self.entries.pop(str(in_file), None)
+
+    def save(self):
+        """Write the manifest to the cache file."""
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_file))
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'version': self.version, 'entries': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.cache_file)
+
+
+def _stat(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
@@ -2,20 +2,41 @@
 
 To convert one Earth Engine JavaScript to Python script: js_to_python(in_file_path, out_file_path)
 To convert all Earth Engine JavaScripts in a folder recursively: js_to_python_dir(in_dir, out_dir)
+To convert them with a pool of worker processes: js_to_python_dir(in_dir, out_dir, workers=4)
+To convert through the syntax tree rather than line by line: js_to_python(in_file_path, out_file_path, frontend='ast')
+To stream the converted script to an open file or pipe: write_js_to_python(in_file_path, stream)
+Unchanged JavaScripts are skipped using the cache manifest .js_to_python_cache.json in out_dir.
+From the command line: python convert_js_to_python.py --input in_dir --output out_dir --workers 4
+To print one converted script to the standard output: python convert_js_to_python.py --input in_file --output -
 
 '''
 
 # Authors: Dr. Qiusheng Wu (https://wetlands.io)
 # License: MIT
 
+import io
 import os
+import re
+import sys
 import glob
+import time
+import hashlib
 import random
 import string
 import argparse
+import contextlib
 import subprocess
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from collections import deque
+from js_tokenizer import tokenize, tokens_to_lines, rewrite_tokens, uses_math
+from conversion_cache import ConversionCache
+from js_parser import parse, JSSyntaxError
+from js_codegen import PythonGenerator
+from notebook_writer import write_notebook
+from notebook_template import load_template
+from notebook_executor import execute_notebooks, get_notebooks
+from execution_cache import ExecutionCache, kernel_fingerprint
 
 
 def random_string(string_length=3):
@@ -89,6 +110,149 @@ def find_matching_bracket(lines, start_line_index, start_char_index, matching_ch
     return matching_line_index, matching_char_index
 
 
+# Strings and comments are matched first, so that the brackets inside them are skipped.
+_BRACKET_PATTERN = re.compile(r"""'(?:[^'\\\n]|\\.)*'?|"(?:[^"\\\n]|\\.)*"?|`(?:[^`\\\n]|\\.)*`?|#.*|//.*|/\*.*?(?:\*/|$)|[{}()\[\]]""")
+
+_CLOSING_BRACKETS = {
+    '}': '{',
+    ')': '(',
+    ']': '['
+}
+_OPENING_BRACKETS = frozenset('{([')
+_BRACKETS = frozenset('{}()[]')
+
+
+def scan_brackets(line):
+    """Find the brackets in a line, skipping the brackets inside strings and comments.
+
+    Args:
+        line (str): The input line.
+
+    Returns:
+        list: List of (char_index, bracket) tuples.
+    """
+    return [(m.start(), m.group()) for m in _BRACKET_PATTERN.finditer(line) if m.group() in _BRACKETS]
+
+
+class _Bracket(object):
+    __slots__ = ('line_index', 'char_index', 'char', 'partner')
+
+    def __init__(self, line_index, char_index, char):
+        self.line_index = line_index
+        self.char_index = char_index
+        self.char = char
+        self.partner = None
+
+
+class BracketIndex(object):
+    """An index of the matching brackets ({}, (), []) in a list of lines, built in one pass.
+
+    Looking up the matching bracket takes O(1) time, instead of walking forward over the rest of the file
+    as find_matching_bracket() does. The index is kept up to date with delete_char() and update_line()
+    when the lines are rewritten. Brackets inside strings and comments are ignored.
+
+    Args:
+        lines (list): The input list of lines.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.rebuild()
+
+    def rebuild(self):
+        """Rebuild the index from scratch."""
+        self._rows = rows = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        for line_index, line in enumerate(self.lines):
+            row = {}
+            rows.append(row)
+            for m in _BRACKET_PATTERN.finditer(line):
+                char = m.group()
+                if char not in _BRACKETS:
+                    continue
+                bracket = _Bracket(line_index, m.start(), char)
+                row[bracket.char_index] = bracket
+                if char in _OPENING_BRACKETS:
+                    push(bracket)
+                elif stack and stack[-1].char == _CLOSING_BRACKETS[char]:
+                    opening = pop()
+                    opening.partner = bracket
+                    bracket.partner = opening
+
+    def find(self, line_index, char_index):
+        """Find the position of the bracket matching the bracket at the given position.
+
+        Args:
+            line_index (int): The line index where the bracket is located.
+            char_index (int): The position index of the bracket.
+
+        Returns:
+            matching_line_index (int): The line index where the matching bracket is located, or -1 if not found.
+            matching_char_index (int): The position index of the matching bracket, or -1 if not found.
+        """
+        bracket = self._rows[line_index].get(char_index)
+        if bracket is None or bracket.partner is None:
+            return -1, -1
+        return bracket.partner.line_index, bracket.partner.char_index
+
+    def delete_char(self, line_index, char_index):
+        """Delete a character from a line and update the index.
+
+        Args:
+            line_index (int): The line index of the character. Nothing is deleted if it is -1.
+            char_index (int): The position index of the character.
+        """
+        if line_index < 0:
+            return
+        line = self.lines[line_index]
+        self.lines[line_index] = line[:char_index] + line[char_index+1:]
+
+        row = self._rows[line_index]
+        bracket = row.pop(char_index, None)
+        if bracket is not None and bracket.partner is not None:
+            bracket.partner.partner = None
+        self._shift(line_index, char_index, -1)
+
+    def update_line(self, line_index, line):
+        """Replace a line and update the index.
+
+        The index is updated in place if the brackets of the new line are the same as (or a suffix of) the brackets
+        of the old line, which covers moving, stripping and blanking out lines. Otherwise it is rebuilt.
+
+        Args:
+            line_index (int): The line index.
+            line (str): The new line.
+        """
+        self.lines[line_index] = line
+        old_brackets = sorted(self._rows[line_index].values(), key=lambda bracket: bracket.char_index)
+        new_brackets = scan_brackets(line)
+        dropped = len(old_brackets) - len(new_brackets)
+
+        if dropped < 0 or [char for _, char in new_brackets] != [bracket.char for bracket in old_brackets[dropped:]]:
+            self.rebuild()
+            return
+
+        for bracket in old_brackets[:dropped]:
+            if bracket.partner is not None:
+                bracket.partner.partner = None
+        row = {}
+        for bracket, (char_index, _) in zip(old_brackets[dropped:], new_brackets):
+            bracket.char_index = char_index
+            row[char_index] = bracket
+        self._rows[line_index] = row
+
+    def _shift(self, line_index, char_index, offset):
+        row = self._rows[line_index]
+        moved = [bracket for index, bracket in row.items() if index > char_index]
+        for bracket in moved:
+            del row[bracket.char_index]
+        for bracket in moved:
+            bracket.char_index += offset
+            row[bracket.char_index] = bracket
+
+
 # extract parameters and wrap them with single/double quotes if needed.
 def format_params(line, sep=':'):
     """Format keys in a dictionary and adds quotes to the keys. 
@@ -227,32 +391,62 @@ def convert_for_loop(line):
     return new_line
 
 
-def check_map_functions(input_lines):
+def callback_name(file_name, content, used_names):
+    """Generate a deterministic name for a hoisted map callback.
+
+    The name is derived from the file name and the source code of the callback, so converting the same script twice
+    gives the same output. A counter is mixed into the hash until the name does not clash with used_names.
+
+    Args:
+        file_name (str): Name of the JavaScript file.
+        content (str): Source code of the callback.
+        used_names (set): The identifiers already used in the file. The new name is added to it.
+
+    Returns:
+        str: A name such as 'func_abc'.
+    """
+    letters = string.ascii_lowercase
+    salt = 0
+    while True:
+        digest = hashlib.sha1('{}\n{}\n{}'.format(file_name, salt, content).encode('utf-8')).digest()
+        name = 'func_' + ''.join(letters[byte % len(letters)] for byte in digest[:3])
+        if name not in used_names:
+            used_names.add(name)
+            return name
+        salt += 1
+
+
+def check_map_functions(input_lines, file_name=''):
     """Extract Earth Engine map function
     
     Args:
         input_lines (list): List of Earth Engine JavaScrips
+        file_name (str, optional): Name of the JavaScript file, used to name the hoisted functions. Defaults to ''.
     
     Returns:
         list: Output JavaScript with map function
     """    
     output_lines = []
+    brackets = None
     for index, line in enumerate(input_lines):
 
         if ('.map(function' in line) or ('.map (function') in line:
 
+            if brackets is None:  # most scripts have no map function, so build the index only when needed
+                brackets = BracketIndex(input_lines)
+                used_names = set(re.findall(r'[A-Za-z_$][\w$]*', ''.join(input_lines)))
             bracket_index = line.index("{")
-            matching_line_index, matching_char_index = find_matching_bracket(input_lines, index, bracket_index)
+            matching_line_index, matching_char_index = brackets.find(index, bracket_index)
 
             func_start_index = line.index('function')
-            func_name = 'func_' + random_string()
+            func_name = callback_name(file_name, ''.join(input_lines[index:matching_line_index+1]), used_names)
             func_header = line[func_start_index:].replace('function', 'function ' + func_name)
             output_lines.append('\n')
             output_lines.append(func_header)
 
             for sub_index, tmp_line in enumerate(input_lines[index+1: matching_line_index]):
                 output_lines.append(tmp_line)
-                input_lines[index+1+sub_index] = ''                
+                brackets.update_line(index+1+sub_index, '')
 
             header_line = line[:func_start_index] + func_name 
             header_line = header_line.rstrip()
@@ -265,7 +459,7 @@ def check_map_functions(input_lines):
                 header_line = header_line + footer_line
                 footer_line = ''
 
-            input_lines[matching_line_index] = footer_line
+            brackets.update_line(matching_line_index, footer_line)
 
             output_lines.append(header_line)
             output_lines.append(footer_line)
@@ -275,8 +469,172 @@ def check_map_functions(input_lines):
     return output_lines
 
 
+def ast_to_python(source, file_name=''):
+    """Convert the source code of an Earth Engine JavaScript to Python through its abstract syntax tree.
+
+    Args:
+        source (str): The JavaScript source code.
+        file_name (str, optional): Name of the JavaScript file, used to name the hoisted functions. Defaults to ''.
+
+    Raises:
+        JSSyntaxError: If the script cannot be parsed, or uses a construct that has no Python equivalent.
+
+    Returns:
+        tuple: The Python code (without the import header) and the set of modules it uses, e.g., {'math'}.
+    """
+    program = parse(source)
+    used_names = set(re.findall(r'[A-Za-z_$][\w$]*', source))
+    generator = PythonGenerator(source, program['comments'],
+                                name_callback=lambda content: callback_name(file_name, content, used_names))
+    lines = generator.generate(program)
+    return '\n'.join(lines) + '\n', generator.imports
+
+
+def iter_js_to_python(in_file, use_qgis=True, github_repo=None, frontend='lines'):
+    """Convert an Earth Engine JavaScript to Python script, yielding the output as it is produced.
+
+    The output is never accumulated into a single string, so it can be written straight to a file or a pipe.
+
+    Args:
+        in_file (str): File path of the input JavaScript.
+        use_qgis (bool, optional): Whether to add "from ee_plugin import Map \n" to the output script. Defaults to True.
+        github_repo (str, optional): GitHub repo url. Defaults to None.
+        frontend (str, optional): 'lines' or 'ast', see js_to_python(). Defaults to 'lines'.
+
+    Yields:
+        str: Chunks of the Python script, each ending with a newline character.
+    """
+    is_python = False
+    qgis_import_str = ''
+    if use_qgis:
+        qgis_import_str = "from ee_plugin import Map \n"
+
+    github_url = ""
+    if github_repo is not None:
+        github_url = "# GitHub URL: " + github_repo + in_file + "\n\n"
+
+    math_import_str = ""
+
+    with open(in_file) as f:
+        source = f.read()
+
+    lines = source.splitlines(True)
+    for line in lines:
+        if line.strip() == 'import ee':
+            is_python = True
+
+    if is_python:   # only update the GitHub URL if it is already a GEE Python script
+        yield github_url + source
+        return
+
+    if frontend == 'ast':
+        try:
+            code, imports = ast_to_python(source, os.path.basename(in_file))
+        except JSSyntaxError as e:
+            print('Falling back to the line-based conversion of {}: {}'.format(in_file, e), file=sys.stderr)
+        else:
+            yield github_url + "import ee \n" + qgis_import_str + ''.join(
+                'import {}\n'.format(module) for module in sorted(imports)) + "\n"
+            yield code
+            return
+
+    # Tokenize the script once and apply the rewrite rules (var, true/false/null, .or/.and/.not, Math., comments)
+    # to the token stream, so that strings and comments are never rewritten by mistake.
+    tokens = tokenize(source)
+    if uses_math(tokens):
+        math_import_str = "import math\n"
+
+    header = github_url + "import ee \n" + qgis_import_str + math_import_str 
+
+    lines = tokens_to_lines(rewrite_tokens(tokens))
+
+    lines = check_map_functions(lines, os.path.basename(in_file))
+    brackets = BracketIndex(lines)
+
+    # A line starting with '.' continues the last non-blank line, so that line and the blank lines after it are held
+    # back until the next non-blank line shows whether they are joined.
+    pending = [header + "\n"]
+
+    for index, line in enumerate(lines):
+
+        if ("= function" in line) or ("=function" in line) or line.strip().startswith("function"):
+            bracket_index = line.index("{")
+            matching_line_index, matching_char_index = brackets.find(index, bracket_index)
+
+            line = line[:bracket_index] + line[bracket_index+1:]
+            if matching_line_index == index:
+                line = line[:matching_char_index-1] + \
+                    line[matching_char_index:]
+            else:
+                brackets.delete_char(matching_line_index, matching_char_index)
+
+            line = line.replace(" = function", "").replace(
+                "=function", '').replace("function ", '')
+            line = " " * (len(line) - len(line.lstrip())) + "def " + line.strip() + ":"
+        elif "{" in line:
+            bracket_index = line.index("{")
+            matching_line_index, matching_char_index = brackets.find(index, bracket_index)
+            if (matching_line_index == index) and (':' in line):
+                pass
+            elif ('for (' in line) or ('for(' in line):
+                line = convert_for_loop(line)
+                brackets.update_line(index, line)
+                bracket_index = line.index("{")
+                matching_line_index, matching_char_index = brackets.find(index, bracket_index)
+                brackets.delete_char(matching_line_index, matching_char_index)
+                line = lines[index].replace('{', '')
+
+        if line is None:
+            line = ''
+
+        line = line.rstrip()
+
+        if line.endswith("+"):
+            line = line + " \\"
+
+        if (":" in line) and (not line.strip().startswith("#")) and (not line.strip().startswith('def')) and (not line.strip().startswith(".")):
+            line = format_params(line)
+
+        if index < (len(lines) - 1) and line.lstrip().startswith("#") and lines[index+1].lstrip().startswith("."):
+            line = ''               
+
+        if line.lstrip().startswith("."):
+            if "#" in line:
+                line = line[:line.index("#")]
+            pending = [pending[0].rstrip() + " " + "\\" + "\n" + line + "\n"]
+        elif line:
+            yield ''.join(pending)
+            pending = [line + "\n"]
+        else:
+            pending.append("\n")
+
+    yield ''.join(pending)
+
+
+def write_js_to_python(in_file, stream=None, use_qgis=True, github_repo=None, frontend='lines'):
+    """Convert an Earth Engine JavaScript to Python script and write it to an open file or pipe as it is produced.
+
+    Args:
+        in_file (str): File path of the input JavaScript.
+        stream (file, optional): A writable text stream. Defaults to None, which writes to the standard output.
+        use_qgis (bool, optional): Whether to add "from ee_plugin import Map \n" to the output script. Defaults to True.
+        github_repo (str, optional): GitHub repo url. Defaults to None.
+        frontend (str, optional): 'lines' or 'ast', see js_to_python(). Defaults to 'lines'.
+
+    Returns:
+        int: Number of characters written.
+    """
+    if stream is None:
+        stream = sys.stdout
+    count = 0
+    for chunk in iter_js_to_python(in_file, use_qgis, github_repo, frontend):
+        stream.write(chunk)
+        count += len(chunk)
+    return count
+
+
 # Convert GEE JavaScripts to Python
-def js_to_python(in_file, out_file=None, use_qgis=True, github_repo=None):
+def js_to_python(in_file, out_file=None, use_qgis=True, github_repo=None, frontend='lines'):
     """Convert an Earth Engine JavaScript to Python script.
 
     Args:
@@ -284,6 +642,9 @@ def js_to_python(in_file, out_file=None, use_qgis=True, github_repo=None):
         out_file (str, optional): File path of the output Python script. Defaults to None.
         use_qgis (bool, optional): Whether to add "from ee_plugin import Map \n" to the output script. Defaults to True.
         github_repo (str, optional): GitHub repo url. Defaults to None.
+        frontend (str, optional): 'lines' to rewrite the script line by line, or 'ast' to parse it into a syntax tree
+            and generate the Python code from the tree. Scripts the 'ast' frontend cannot handle fall back to 'lines'.
+            Defaults to 'lines'.
 
     Returns:
         list : Python script
@@ -298,136 +659,65 @@ def js_to_python(in_file, out_file=None, use_qgis=True, github_repo=None):
     if not os.path.isfile(out_file):
         out_file = os.path.join(root_dir, out_file)
 
-    is_python = False
-    add_github_url = False
-    qgis_import_str = ''
-    if use_qgis:
-        qgis_import_str = "from ee_plugin import Map \n"
-
-    github_url = ""
-    if github_repo is not None:
-        github_url = "# GitHub URL: " + github_repo + in_file + "\n\n"
-
-    math_import = False
-    math_import_str = ""
-
-    lines = []
-    with open(in_file) as f:
-        lines = f.readlines()
+    # The workers of js_to_python_dir() may create the same folder at the same time.
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
 
-        math_import = use_math(lines)
+    print('Processing {}'.format(in_file))
+    chunks = []
+    with open(out_file, 'w') as f:
+        for chunk in iter_js_to_python(in_file, use_qgis, github_repo, frontend):
+            f.write(chunk)
+            chunks.append(chunk)
 
-        for line in lines:
-            line = line.strip()
-            if line == 'import ee':
-                is_python = True
-            
-    if math_import:
-        math_import_str = "import math\n"
+    return ''.join(chunks)
 
-    output = ""
 
-    if is_python:   # only update the GitHub URL if it is already a GEE Python script
-        output = github_url + ''.join(map(str, lines))
-    else:             # deal with JavaScript
+def _convert_js_file(task):
+    """Convert one JavaScript in a worker process and report the result instead of raising.
 
-        header = github_url + "import ee \n" + qgis_import_str + math_import_str 
-        function_defs = []
-        output = header + "\n"
+    Args:
+        task (tuple): The (in_file, out_file, use_qgis, github_repo, frontend) arguments of js_to_python().
 
-        with open(in_file) as f:
-            lines = f.readlines()
+    Returns:
+        dict: The conversion result, with the keys in_file, out_file, success, duration and error.
+    """
+    in_file, out_file, use_qgis, github_repo, frontend = task
+    result = {'in_file': in_file, 'out_file': out_file, 'success': True, 'duration': 0.0, 'error': None}
 
-            print('Processing {}'.format(in_file))
-            lines = check_map_functions(lines)
+    start_time = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            js_to_python(in_file, out_file, use_qgis, github_repo, frontend)
+    except Exception as e:
+        result['success'] = False
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['duration'] = time.perf_counter() - start_time
 
-            for index, line in enumerate(lines):
+    return result
 
-                if ('/* color' in line) and ('*/' in line):
-                    line = line[:line.index('/*')].lstrip() + line[(line.index('*/')+2):]
-                
-                if ("= function" in line) or ("=function" in line) or line.strip().startswith("function"):
-                    bracket_index = line.index("{")
-                    matching_line_index, matching_char_index = find_matching_bracket(
-                        lines, index, bracket_index)
 
-                    line = line[:bracket_index] + line[bracket_index+1:]
-                    if matching_line_index == index:
-                        line = line[:matching_char_index] + \
-                            line[matching_char_index+1:]
-                    else:
-                        tmp_line = lines[matching_line_index]
-                        lines[matching_line_index] = tmp_line[:matching_char_index] + \
-                            tmp_line[matching_char_index+1:]
-
-                    line = line.replace(" = function", "").replace(
-                        "=function", '').replace("function ", '')
-                    line = " " * (len(line) - len(line.lstrip())) + "def " + line.strip() + ":"
-                elif "{" in line:
-                    bracket_index = line.index("{")
-                    matching_line_index, matching_char_index = find_matching_bracket(
-                        lines, index, bracket_index)
-                    if (matching_line_index == index) and (':' in line):
-                        pass
-                    elif ('for (' in line) or ('for(' in line):
-                        line = convert_for_loop(line)
-                        lines[index] = line
-                        bracket_index = line.index("{")
-                        matching_line_index, matching_char_index = find_matching_bracket(lines, index, bracket_index)
-                        tmp_line = lines[matching_line_index]
-                        lines[matching_line_index] = tmp_line[:matching_char_index] + tmp_line[matching_char_index+1:]
-                        line = line.replace('{', '')
-
-                if line is None:
-                    line = ''
-
-                line = line.replace("//", "#")
-                line = line.replace("var ", "", 1)
-                line = line.replace("/*", '#')
-                line = line.replace("*/", '#')
-                line = line.replace("true", "True").replace("false", "False")
-                line = line.replace("null", "{}")
-                line = line.replace(".or", ".Or")
-                line = line.replace(".and", '.And')
-                line = line.replace(".not", '.Not')
-                line = line.replace('visualize({', 'visualize(**{')
-                line = line.replace('Math.PI', 'math.pi')
-                line = line.replace('Math.', 'math.')
-                line = line.replace('= new', '=')
-                line = line.rstrip()
-
-                if line.endswith("+"):
-                    line = line + " \\"
-                elif line.endswith(";"):
-                    line = line[:-1]             
-                
-                if line.lstrip().startswith('*'):
-                    line = line.replace('*', '#')
-
-                if (":" in line) and (not line.strip().startswith("#")) and (not line.strip().startswith('def')) and (not line.strip().startswith(".")):
-                    line = format_params(line)
-
-                if index < (len(lines) - 1) and line.lstrip().startswith("#") and lines[index+1].lstrip().startswith("."):
-                    line = ''               
-
-                if line.lstrip().startswith("."):
-                    if "#" in line:
-                        line = line[:line.index("#")]
-                    output = output.rstrip() + " " + "\\" + "\n" + line + "\n"
-                else:
-                    output += line + "\n"
+def converter_version():
+    """Get the version of the converter, i.e., the hash of its source code.
 
-    out_dir = os.path.dirname(out_file)
-    if not os.path.exists(out_dir):
-        os.makedirs(out_dir)
+    Returns:
+        str: The hexadecimal SHA-256 digest of convert_js_to_python.py and the modules it uses.
+    """
+    global _converter_version
+    if _converter_version is None:
+        digest = hashlib.sha256()
+        root_dir = os.path.dirname(os.path.abspath(__file__))
+        for module_file in ('convert_js_to_python.py', 'js_tokenizer.py', 'js_parser.py', 'js_codegen.py'):
+            with open(os.path.join(root_dir, module_file), 'rb') as f:
+                digest.update(f.read())
+        _converter_version = digest.hexdigest()
+    return _converter_version
 
-    with open(out_file, 'w') as f:
-        f.write(output)
 
-    return output
+_converter_version = None
 
 
-def js_to_python_dir(in_dir, out_dir=None, use_qgis=True, github_repo=None):
+def js_to_python_dir(in_dir, out_dir=None, use_qgis=True, github_repo=None, workers=1, use_cache=True, cache_file=None,
+                     frontend='lines'):
     """Convert all Earth Engine JavaScripts in a folder recursively to Python scripts
 
     Args:
@@ -435,16 +725,78 @@ def js_to_python_dir(in_dir, out_dir=None, use_qgis=True, github_repo=None):
         out_dir (str, optional): The output folder containing Earth Engine Python scripts. Defaults to None.
         use_qgis (bool, optional): Whether to add "from ee_plugin import Map \n" to the output script. Defaults to True.
         github_repo (str, optional): GitHub repo url. Defaults to None.
+        workers (int, optional): Number of worker processes. Defaults to 1, which converts the files serially.
+            Set it to None to use all CPU cores.
+        use_cache (bool, optional): Whether to skip the JavaScripts whose content, conversion options and converter
+            version have not changed since the last run. Defaults to True.
+        cache_file (str, optional): File path of the cache manifest. Defaults to None, which uses
+            .js_to_python_cache.json in the output folder.
+        frontend (str, optional): 'lines' or 'ast', see js_to_python(). Defaults to 'lines'.
 
+    Returns:
+        list: The conversion result of each file, in the order the files are processed. Each result is a dict with
+            the keys in_file, out_file, success, duration (in seconds), error and cached.
     """
+    in_dir = str(in_dir)
     if out_dir is None:
         out_dir = in_dir
-
-    for in_file in Path(in_dir).rglob('*.js'):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    cache = None
+    if use_cache:
+        if cache_file is None:
+            cache_file = os.path.join(out_dir, '.js_to_python_cache.json')
+        cache = ConversionCache(cache_file, converter_version())
+    options = {'use_qgis': use_qgis, 'github_repo': github_repo, 'frontend': frontend}
+
+    manifest = []
+    tasks = []
+    keys = {}
+    for in_file in sorted(Path(in_dir).rglob('*.js')):
+        in_file = str(in_file)
         out_file = os.path.splitext(in_file)[0] + ".py"
         out_file = out_file.replace(in_dir, out_dir)
-        js_to_python(in_file, out_file, use_qgis, github_repo)
-    # print("Ouput Python script folder: {}".format(out_dir))
+        if cache is not None:
+            keys[in_file] = cache.make_key(in_file, options)
+            if cache.is_fresh(in_file, keys[in_file], out_file):
+                manifest.append({'in_file': in_file, 'out_file': out_file, 'success': True, 'duration': 0.0,
+                                 'error': None, 'cached': True})
+                continue
+        manifest.append(None)
+        tasks.append((in_file, out_file, use_qgis, github_repo, frontend))
+
+    if workers > 1 and len(tasks) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(tasks)))
+        results = executor.map(_convert_js_file, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+    else:
+        executor = None
+        results = map(_convert_js_file, tasks)
+
+    pending = (index for index, result in enumerate(manifest) if result is None)
+    try:
+        # Both map() calls yield the results in input order, so the progress is reported in order too.
+        for index, result in enumerate(results):
+            result['cached'] = False
+            manifest[next(pending)] = result
+            status = 'Processing' if result['success'] else 'Failed'
+            print('{} {}/{}: {}'.format(status, index + 1, len(tasks), result['in_file']))
+            if not result['success']:
+                print(result['error'])
+
+            if cache is not None:
+                if result['success']:
+                    cache.store(result['in_file'], keys[result['in_file']], result['out_file'])
+                else:
+                    cache.discard(result['in_file'])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            cache.save()
+            print('Cache: {} hits, {} misses'.format(cache.hits, cache.misses))
+
+    return manifest
 
 
 # def dict_key_str(line):
@@ -494,19 +846,7 @@ def template_header(in_template):
     Returns:
         list: List of lines.
     """    
-    header = []
-    template_lines = []
-    header_end_index = 0
-
-    with open(in_template) as f:
-        template_lines = f.readlines()
-        for index, line in enumerate(template_lines):
-           if '## Add Earth Engine Python script' in line:
-                header_end_index = index + 5
-
-    header = template_lines[:header_end_index]
-
-    return header
+    return list(load_template(in_template).header)
 
 
 def template_footer(in_template):
@@ -518,19 +858,7 @@ def template_footer(in_template):
     Returns:
         list: List of lines.
     """    
-    footer = []
-    template_lines = []
-    footer_start_index = 0
-
-    with open(in_template) as f:
-        template_lines = f.readlines()
-        for index, line in enumerate(template_lines):
-            if '## Display Earth Engine data layers' in line:
-                footer_start_index = index - 3
-
-    footer = ['\n'] + template_lines[footer_start_index:]
-
-    return footer
+    return list(load_template(in_template).footer)
 
 
 def py_to_ipynb(in_file, template_file, out_file=None, github_username=None, github_repo=None):
@@ -545,47 +873,21 @@ def py_to_ipynb(in_file, template_file, out_file=None, github_username=None, git
     """    
     if out_file is None:
         out_file = in_file.replace('.py', '.ipynb')
-    out_py_file = in_file.replace(".py", "_nb.py")
 
     content = remove_qgis_import(in_file)
-    header = template_header(template_file)
-    footer = template_footer(template_file)
+    template = load_template(template_file)
 
     if (github_username is not None) and (github_repo is not None):
 
         out_py_path = str(in_file).split('/')
         index = out_py_path.index(github_repo)
         out_py_relative_path = '/'.join(out_py_path[index+1:])
-        out_ipynb_relative_path = out_py_relative_path.replace('.py', '.ipynb')
-
-        new_header = []
-        for line in header:
-            line = line.replace('giswqs', github_username)
-            line = line.replace('earthengine-py-notebooks', github_repo)
-            line = line.replace('Template/template.ipynb', out_ipynb_relative_path)
-
-            new_header.append(line)
-        header = new_header
-
-    if content != None:
-        out_text = header + content + footer 
+        out_text = template.splice(content, github_username, github_repo, os.path.splitext(out_py_relative_path)[0])
     else:
-        out_text = header + footer
-
-    if not os.path.exists(os.path.dirname(out_py_file)):
-        os.makedirs(os.path.dirname(out_py_file))
-
-    with open(out_py_file, 'w') as f:
-        f.writelines(out_text)    
-
-    try:
-        command = 'ipynb-py-convert ' + out_py_file + ' ' + out_file
-        print(os.popen(command).read().rstrip())
-    except:
-        print('Please install ipynb-py-convert using the following command:\n')
-        print('pip install ipynb-py-convert')
+        out_text = template.splice(content)
 
-    os.remove(out_py_file)
+    # Build the notebook cells in process rather than writing a temporary script for ipynb-py-convert.
+    write_notebook(out_text, out_file)
 
 
 def py_to_ipynb_dir(in_dir, template_file, out_dir=None, github_username=None, github_repo=None):
@@ -608,34 +910,81 @@ def py_to_ipynb_dir(in_dir, template_file, out_dir=None, github_username=None, g
         py_to_ipynb(in_file, template_file, out_file, github_username, github_repo)
 
 
-def execute_notebook(in_file):
+def execute_notebook(in_file, timeout=600):
     """Execute a Jupyter notebook and save output cells 
     
     Args:
         in_file (str): Input Jupyter notebook.
+        timeout (float, optional): Seconds allowed for the notebook. Defaults to 600.
+
+    Returns:
+        dict: The execution result, see notebook_executor.execute_notebooks().
     """    
-    command = 'jupyter nbconvert --to notebook --execute ' + in_file + ' --inplace'
-    print(os.popen(command).read().rstrip())
+    return execute_notebooks([in_file], workers=1, timeout=timeout)['notebooks'][0]
 
 
-def execute_notebook_dir(in_dir):
+def execute_notebook_dir(in_dir, workers=4, timeout=600, report_file=None, use_cache=True, cache_file=None,
+                         profile_file=None):
     """Execute all Jupyter notebooks in the given directory recursively and save output cells.
     
     Args:
         in_dir (str): Input folder containing notebooks.
+        workers (int, optional): Number of notebooks executed concurrently. Defaults to 4.
+        timeout (float, optional): Seconds allowed per notebook. Defaults to 600.
+        report_file (str, optional): File path of the JSON report of the results. Defaults to None.
+        use_cache (bool, optional): Whether to skip the notebooks whose code cells and kernel environment have not
+            changed since their last successful execution. Defaults to True.
+        cache_file (str, optional): File path of the cache manifest. Defaults to None, which uses
+            .notebook_execution_cache.json in in_dir.
+        profile_file (str, optional): File path of the per-cell profile (.csv or .json). Defaults to None.
+
+    Returns:
+        dict: The report, see notebook_executor.execute_notebooks().
     """
-    files = list(Path(in_dir).rglob('*.ipynb'))
-    count = len(files)
-    if files is not None:
-        for index, file in enumerate(files):
-            in_file = str(file)
-            print('Processing {}/{} ...'.format(index+1, count))
-            execute_notebook(in_file)
+    cache = None
+    if use_cache:
+        if cache_file is None:
+            cache_file = os.path.join(in_dir, '.notebook_execution_cache.json')
+        cache = ExecutionCache(cache_file, kernel_fingerprint())
+    report = execute_notebooks(get_notebooks(in_dir), workers, timeout, report_file=report_file, cache=cache,
+                               profile_file=profile_file)
+    if cache is not None:
+        print('Cache: {} hits, {} misses'.format(cache.hits, cache.misses))
+    return report
 
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Convert Earth Engine JavaScripts to Python scripts.')
+    parser.add_argument('--input', type=str,
+                        help="Path to the input JavaScript file or folder")
+    parser.add_argument('--output', type=str,
+                        help="Path to the output Python file or folder, or '-' to write a converted file to stdout")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes used to convert a folder (0 for all CPU cores)")
+    parser.add_argument('--no-qgis', action='store_true',
+                        help="Do not add 'from ee_plugin import Map' to the output scripts")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Convert all JavaScripts, including the ones that have not changed since the last run")
+    parser.add_argument('--frontend', choices=['lines', 'ast'], default='lines',
+                        help="Convert line by line, or through the JavaScript syntax tree")
+    args = parser.parse_args()
+
+    if args.input is not None:
+        if os.path.isdir(args.input):
+            manifest = js_to_python_dir(args.input, args.output, use_qgis=not args.no_qgis, workers=args.workers or None,
+                                        use_cache=not args.no_cache, frontend=args.frontend)
+            failed = [result for result in manifest if not result['success']]
+            print("Converted {} of {} JavaScripts.".format(len(manifest) - len(failed), len(manifest)))
+            sys.exit(1 if failed else 0)
+        elif args.output == '-':
+            write_js_to_python(args.input, sys.stdout, use_qgis=not args.no_qgis, frontend=args.frontend)
+            sys.exit(0)
+        else:
+            js_to_python(args.input, args.output, use_qgis=not args.no_qgis, frontend=args.frontend)
+            sys.exit(0)
+
     ## Convert an Earth Engine JavaScript to Python script.
     root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     in_file_path = os.path.join(root_dir, "JavaScripts/Image/NormalizedDifference.js")  # change this path to your JavaScript file
@@ -661,13 +1010,3 @@ if __name__ == '__main__':
 
     # Execute all Jupyter notebooks in a folder recursively and save the output cells.
     execute_notebook_dir(in_dir)
-
-
-    # parser = argparse.ArgumentParser()
-    # parser.add_argument('--input', type=str,
-    #                     help="Path to the input JavaScript file")
-    # parser.add_argument('--output', type=str,
-    #                     help="Path to the output Python file")
-    # args = parser.parse_args()
-    # js_to_python(args.input, args.output)
-
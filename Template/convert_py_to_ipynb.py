@@ -1,7 +1,32 @@
+''' Convert the QGIS Earth Engine examples to notebooks: extract → splice → write notebook → execute.
+
+To convert and execute all examples: convert_py_to_ipynb_dir(in_dir, out_dir)
+From the command line: python convert_py_to_ipynb.py --input ../../qgis-earthengine-examples --output ..
+To only rewrite the notebooks from the existing Python scripts: --skip-extract --skip-execute
+
+The extract stage takes the Earth Engine code after 'from ee_plugin import Map' from each script of in_dir, and the
+splice stage puts it into the notebook template. The resulting Python script and notebook are written to the same
+relative path in out_dir. Each notebook is executed as soon as it is written, while the next scripts are converted.
+Notebooks whose code cells have not changed keep their outputs and are neither rewritten nor executed.
+
+'''
+
+# Authors: Dr. Qiusheng Wu (https://wetlands.io)
+# License: MIT
+
 import os
-import glob
-import datetime
+import argparse
 from pathlib import Path
+from notebook_template import load_template
+from notebook_writer import make_notebook, percent_to_cells, write_notebook
+from notebook_executor import execute_notebooks
+from execution_cache import ExecutionCache, code_cells_key, kernel_fingerprint
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FILE = os.path.join(ROOT_DIR, 'Template', 'template.py')
+# The QGIS examples repo is expected next to this repo.
+EXAMPLES_DIR = os.path.join(os.path.dirname(ROOT_DIR), 'qgis-earthengine-examples')
 
 
 def extract_py_script(in_file):
@@ -21,122 +46,177 @@ def extract_py_script(in_file):
                         i = i + 1
 
 
-def extract_template(in_file, template_file):
-    out_py_path = str(in_file).split('/')
-    index = out_py_path.index('qgis-earthengine-examples')
-    # print(out_py_path)
-    # print(index)
-    out_py_script_path = '/'.join(out_py_path[index+1:])
-
-    header = []
-    footer = []
-
-    template_lines = []
-    header_end_index = 0
-    footer_start_index = 0
-
-    with open(template_file) as f:
-        template_lines = f.readlines()
-        for index, line in enumerate(template_lines):
-            # line = line.replace('Template/template', out_py_script_path[:-3])
-            # header.append(line)
-            if '## Add Earth Engine Python script' in line:
-                header_end_index = index + 5
-            if '## Display Earth Engine data layers' in line:
-                footer_start_index = index - 3
-
-    header = template_lines[:header_end_index]
-    footer = ['\n'] + template_lines[footer_start_index:]
-
-    header_tmp = []
-    for line in header:
-        line = line.replace('Template/template', out_py_script_path[:-3])
-        header_tmp.append(line)
-    header = header_tmp
-
-    # print("header end index: {}".format(header_end_index))
-    # print(template_lines[:header_end_index])
-    # print(template_lines[footer_start_index:])
-
-    # out_py_script_path = os.path.join(root_dir, out_py_script_path)
-    line = 'https://github.com/giswqs/earthengine-py-notebooks/tree/master/Template/template.ipynb'
-    line = line.replace('Template/template', out_py_script_path[:-3])
-    # print(line)
-    return header, footer
-
-
-
-root_dir = os.path.dirname(os.path.dirname(__file__))
-template_path = os.path.join(root_dir, 'Template/template.py')
-# print(template_path)
-
-template_lines = []
-with open(template_path) as f:
-    template_lines = f.readlines()
-# print(len(template_lines))
-
-py_script_dir = os.path.join(root_dir, 'Python')
-py_script_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'qgis-earthengine-examples')
-print(py_script_dir)
-
-files = list(Path(py_script_dir).rglob('*.py'))[1:]
-# print(files)
-
-changed_files = []
-changed_files.append('extract_image_by_polygon.py')
-changed_files.append('filtering_feature_collection.py')
-changed_files.append('filter_range_contains.py')
-
-# loop through dem files to create contours
-i = 1
-for index, filename in enumerate(files):
-    
-    # print(filename)
-    out_py_path = str(filename).split('/')
-    index = out_py_path.index('qgis-earthengine-examples')
-    # print(out_py_path)
-    # print(index)
-    out_py_script_path = '/'.join(out_py_path[index+1:])
-    out_py_script_path = os.path.join(root_dir, out_py_script_path)
-    # print(out_py_script_path)
-
-    out_dir = os.path.dirname(out_py_script_path)
-    if not os.path.exists(out_dir):
-        os.makedirs(out_dir)
-
-    header, footer = extract_template(filename, template_path)
-    content = extract_py_script(filename)
-
-    if content != None:
-        out_text = header + content + footer 
+def extract_template(in_file, template_file, in_dir=None):
+    if in_dir is not None:
+        out_py_script_path = Path(os.path.relpath(in_file, in_dir)).as_posix()
     else:
-        out_text = header + footer
-
-    with open(out_py_script_path, 'w') as f:
-        f.writelines(out_text)
-
-    # basename = os.path.basename(out_py_script_path)
-    # if basename in changed_files:
-    #     print(basename)
-    #     out_nb_path = out_py_script_path.replace('.py', '.ipynb')
-    #     cmd = 'ipynb-py-convert ' + out_py_script_path + ' ' + out_nb_path
-    #     print(os.popen(cmd).read().rstrip())
-    #     cmd2 = 'jupyter nbconvert --to notebook --execute ' + out_nb_path + ' --inplace'
-    #     print(os.popen(cmd2).read().rstrip())
-
-    # modTimesinceEpoc = os.path.getmtime(out_py_script_path)
-    # modificationTime = datetime.datetime.utcfromtimestamp(modTimesinceEpoc).strftime('%Y-%m-%d %H:%M:%S')
-    # print("Last Modified Time : ", modificationTime , ' UTC')    
-    
-    out_nb_path = out_py_script_path.replace('.py', '.ipynb')
-    print('{}/{}: {}'.format(i, len(files), out_nb_path))
-    i = i + 1
-    
-    cmd = 'ipynb-py-convert ' + out_py_script_path + ' ' + out_nb_path
-    # print(cmd)
-    print(os.popen(cmd).read().rstrip())
-
-    cmd2 = 'jupyter nbconvert --to notebook --execute ' + out_nb_path + ' --inplace'
-    print(os.popen(cmd2).read().rstrip())
+        out_py_path = str(in_file).split('/')
+        index = out_py_path.index('qgis-earthengine-examples')
+        out_py_script_path = '/'.join(out_py_path[index+1:])
+
+    # The template is parsed once and reused for every script.
+    template = load_template(template_file)
+    header = template.render_header(notebook_path=out_py_script_path[:-3])
+    footer = list(template.footer)
+    return header, footer
 
 
+def get_py_scripts(in_dir):
+    """Get all Python scripts in a folder recursively.
+
+    Args:
+        in_dir (str): The input folder.
+
+    Returns:
+        list: Sorted list of file paths.
+    """
+    return sorted(str(file) for file in Path(in_dir).rglob('*.py'))
+
+
+def splice_py_script(in_file, in_dir, template_file=TEMPLATE_FILE):
+    """Extract the Earth Engine code of a QGIS example and splice it into the notebook template.
+
+    Args:
+        in_file (str): File path of the QGIS example.
+        in_dir (str): The folder of the QGIS examples, which in_file is relative to.
+        template_file (str, optional): File path of the notebook template. Defaults to TEMPLATE_FILE.
+
+    Returns:
+        list: List of lines of the percent-format notebook script.
+    """
+    header, footer = extract_template(in_file, template_file, in_dir)
+    content = extract_py_script(in_file)
+    if content is not None:
+        return header + content + footer
+    return header + footer
+
+
+def iter_notebooks(in_dir, out_dir=None, template_file=TEMPLATE_FILE, extract=True, notebook=True, cache=None):
+    """Convert the QGIS examples one by one, yielding the notebooks.
+
+    Args:
+        in_dir (str): The folder of the QGIS examples.
+        out_dir (str, optional): The output folder. Defaults to None, which uses the root of this repo.
+        template_file (str, optional): File path of the notebook template. Defaults to TEMPLATE_FILE.
+        extract (bool, optional): Whether to run the extract and splice stages and write the Python scripts.
+            Defaults to True. If False, the existing Python scripts in out_dir are used.
+        notebook (bool, optional): Whether to write the notebooks. Defaults to True. If False, the existing
+            notebooks in out_dir are yielded.
+        cache (ExecutionCache, optional): The execution cache. The notebooks whose code cells have not changed are
+            not rewritten, so that they keep their outputs; execute_notebooks() checks the cache for whether the
+            outputs are current, so that each notebook is checked once. Defaults to None.
+
+    Yields:
+        str: File path of a notebook.
+    """
+    if out_dir is None:
+        out_dir = ROOT_DIR
+    files = get_py_scripts(in_dir)
+
+    for i, in_file in enumerate(files):
+        out_py_file = os.path.join(out_dir, os.path.relpath(in_file, in_dir))
+        out_nb_file = os.path.splitext(out_py_file)[0] + '.ipynb'
+        print('{}/{}: {}'.format(i + 1, len(files), out_nb_file))
+
+        if extract:
+            out_text = splice_py_script(in_file, in_dir, template_file)
+            if not os.path.exists(os.path.dirname(out_py_file)):
+                os.makedirs(os.path.dirname(out_py_file))
+            with open(out_py_file, 'w') as f:
+                f.writelines(out_text)
+        elif notebook:
+            if not os.path.isfile(out_py_file):
+                print('Skipping, {} does not exist'.format(out_py_file))
+                continue
+            with open(out_py_file) as f:
+                out_text = f.readlines()
+
+        if notebook:
+            try:
+                old_key = cache.make_key(out_nb_file) if cache is not None else None
+            except (OSError, ValueError):
+                old_key = None
+            if old_key is None or old_key != code_cells_key(make_notebook(percent_to_cells(''.join(out_text)))):
+                write_notebook(out_text, out_nb_file)
+
+        if os.path.isfile(out_nb_file):
+            yield out_nb_file
+
+
+def convert_py_to_ipynb_dir(in_dir, out_dir=None, template_file=TEMPLATE_FILE, extract=True, notebook=True,
+                            execute=True, workers=4, timeout=600, use_cache=True, python_path=None, warm=False,
+                            report_file=None):
+    """Convert the QGIS examples to notebooks and execute them. The stages can be skipped individually.
+
+    Args:
+        in_dir (str): The folder of the QGIS examples.
+        out_dir (str, optional): The output folder. Defaults to None, which uses the root of this repo.
+        template_file (str, optional): File path of the notebook template. Defaults to TEMPLATE_FILE.
+        extract (bool, optional): Whether to extract and splice the scripts, see iter_notebooks(). Defaults to True.
+        notebook (bool, optional): Whether to write the notebooks, see iter_notebooks(). Defaults to True.
+        execute (bool, optional): Whether to execute the notebooks. Defaults to True.
+        workers (int, optional): Number of notebooks executed concurrently. Defaults to 4.
+        timeout (float, optional): Seconds allowed per notebook. Defaults to 600.
+        use_cache (bool, optional): Whether to skip the notebooks whose code cells and kernel environment have not
+            changed since their last successful execution. Defaults to True.
+        python_path (list, optional): Folders prepended to sys.path of the kernels. Defaults to None.
+        warm (bool, optional): Whether to execute the notebooks in a pool of warm kernels. Defaults to False.
+        report_file (str, optional): File path of the JSON report of the execution. Defaults to None.
+
+    Returns:
+        dict: The execution report (see notebook_executor.execute_notebooks()), or None if execute is False.
+    """
+    if out_dir is None:
+        out_dir = ROOT_DIR
+    cache = None
+    if use_cache and execute:
+        cache_file = os.path.join(out_dir, '.notebook_execution_cache.json')
+        cache = ExecutionCache(cache_file, kernel_fingerprint(python_path))
+
+    notebooks = iter_notebooks(in_dir, out_dir, template_file, extract, notebook, cache)
+    if not execute:
+        for _ in notebooks:
+            pass
+        return None
+    return execute_notebooks(notebooks, workers, timeout, python_path=python_path, report_file=report_file,
+                             warm=warm, cache=cache)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Convert the QGIS Earth Engine examples to Jupyter notebooks.')
+    parser.add_argument('--input', type=str, default=EXAMPLES_DIR,
+                        help="Path to the folder of the QGIS examples")
+    parser.add_argument('--output', type=str, default=ROOT_DIR,
+                        help="Path to the output folder")
+    parser.add_argument('--template', type=str, default=TEMPLATE_FILE,
+                        help="Path to the notebook template")
+    parser.add_argument('--skip-extract', action='store_true',
+                        help="Use the existing Python scripts in the output folder")
+    parser.add_argument('--skip-notebook', action='store_true',
+                        help="Use the existing notebooks in the output folder")
+    parser.add_argument('--skip-execute', action='store_true',
+                        help="Do not execute the notebooks")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Number of notebooks executed concurrently")
+    parser.add_argument('--timeout', type=float, default=600,
+                        help="Seconds allowed per notebook (0 for no limit)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Execute all notebooks, including the ones whose code has not changed since the last run")
+    parser.add_argument('--python-path', action='append', default=[],
+                        help="Folder prepended to sys.path of the kernels")
+    parser.add_argument('--warm', action='store_true',
+                        help="Execute the notebooks in a pool of warm kernels")
+    parser.add_argument('--report', type=str,
+                        help="Path to the JSON report of the execution")
+    args = parser.parse_args()
+
+    report = convert_py_to_ipynb_dir(args.input, args.output, args.template, extract=not args.skip_extract,
+                            notebook=not args.skip_notebook, execute=not args.skip_execute, workers=args.workers,
+                            timeout=args.timeout or None, use_cache=not args.no_cache,
+                            python_path=[os.path.abspath(path) for path in args.python_path], warm=args.warm,
+                            report_file=args.report)
+    if report is not None:
+        print('Executed {} notebooks in {:.1f} s: {}'.format(
+            len(report['notebooks']), report['duration'], ', '.join(
+                '{} {}'.format(count, status) for status, count in sorted(report['summary'].items()))))
@@ -0,0 +1,118 @@
+''' Fetch the values of several Earth Engine objects with a single getInfo() request.
+
+To fetch several objects at once: count, dates = batch_get_info(collection.size(), dates)
+To fetch named objects at once: info = batch_get_info_dict({'count': collection.size(), 'dates': dates})
+To collect the objects first and fetch them when the block ends:
+
+    with GetInfoBatch() as batch:
+        count = batch.add(collection.size())
+        dates = batch.add(dates)
+    print(count.value, dates.value)
+
+Each getInfo() call is a blocking round-trip to the Earth Engine servers. The objects are packed into one ee.List
+(or ee.Dictionary), which the server computes in one request, and the results are unpacked on the client.
+The example notebooks inline the same pattern, e.g., n, dates = ee.List([n, dates]).getInfo(), so that they do not
+depend on this module.
+
+'''
+
+# License: MIT
+
+import ee
+
+
+def batch_get_info(*objs):
+    """Fetch the values of several Earth Engine objects in one request.
+
+    Args:
+        *objs: The objects, e.g., ee.Number, ee.List, ee.Image or ee.ImageCollection. Plain Python values are
+            returned as they are.
+
+    Returns:
+        list: The values, in the order of objs.
+    """
+    values = list(objs)
+    indices = [index for index, obj in enumerate(objs) if isinstance(obj, ee.ComputedObject)]
+    if indices:
+        results = ee.List([objs[index] for index in indices]).getInfo()
+        for index, result in zip(indices, results):
+            values[index] = result
+    return values
+
+
+def batch_get_info_dict(objs):
+    """Fetch the values of named Earth Engine objects in one request.
+
+    Args:
+        objs (dict): Mapping of names (str) to the objects. Plain Python values are returned as they are.
+
+    Returns:
+        dict: Mapping of the names to the values.
+    """
+    values = dict(objs)
+    computed = {name: obj for name, obj in objs.items() if isinstance(obj, ee.ComputedObject)}
+    if computed:
+        values.update(ee.Dictionary(computed).getInfo())
+    return values
+
+
+class DeferredInfo(object):
+    """The value of an object added to a GetInfoBatch, available once the batch has been fetched."""
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.resolved = False
+        self._value = None
+
+    @property
+    def value(self):
+        """The value of the object.
+
+        Raises:
+            RuntimeError: If the batch has not been fetched yet.
+        """
+        if not self.resolved:
+            raise RuntimeError('The value is not available until the batch has been fetched.')
+        return self._value
+
+
+class GetInfoBatch(object):
+    """Collect Earth Engine objects and fetch their values in one request, see batch_get_info().
+
+    The batch is fetched when the with block ends without an error, or when fetch() is called. Objects added after
+    a fetch are fetched by the next one.
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def add(self, obj):
+        """Add an object to the batch.
+
+        Args:
+            obj (object): The Earth Engine object.
+
+        Returns:
+            DeferredInfo: The handle of the value.
+        """
+        deferred = DeferredInfo(obj)
+        self.pending.append(deferred)
+        return deferred
+
+    def fetch(self):
+        """Fetch the values of the objects added since the last fetch."""
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        values = batch_get_info(*[deferred.obj for deferred in pending])
+        for deferred, value in zip(pending, values):
+            deferred._value = value
+            deferred.resolved = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.fetch()
+        return False
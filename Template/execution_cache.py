@@ -0,0 +1,120 @@
+''' A persistent cache of executed notebooks, keyed by the hash of their code cells and the kernel environment.
+
+To skip the notebooks whose code has not changed since they were last executed successfully:
+
+    cache = ExecutionCache(cache_file, kernel_fingerprint())
+    key = cache.make_key(in_file)
+    if not cache.is_fresh(in_file, key):
+        execute(in_file)
+        cache.store(in_file, key)
+    cache.save()
+
+'''
+
+# License: MIT
+
+import os
+import sys
+import json
+import hashlib
+from importlib import metadata
+from conversion_cache import ConversionCache
+
+
+# The packages whose versions change what the notebooks output.
+KERNEL_PACKAGES = ('earthengine-api', 'geemap', 'ipyleaflet', 'folium', 'ipykernel', 'nbclient')
+
+
+def code_cells_key(notebook):
+    """Compute the hash of the code cells of a notebook. Markdown cells, outputs and metadata are ignored.
+
+    Args:
+        notebook (dict): The nbformat 4 notebook.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the sources of the code cells.
+    """
+    sources = [''.join(cell.get('source', [])) for cell in notebook.get('cells', []) if cell.get('cell_type') == 'code']
+    return hashlib.sha256(json.dumps(sources).encode('utf-8')).hexdigest()
+
+
+def kernel_fingerprint(python_path=None, packages=KERNEL_PACKAGES):
+    """Compute the fingerprint of the environment the notebooks are executed in.
+
+    It covers the Python version, the versions of the given packages, the notebook kernel itself, and the Python
+    modules in the python_path folders (e.g., a stand-in ee module), so that upgrading any of them executes all
+    notebooks again.
+
+    Args:
+        python_path (list, optional): Folders prepended to sys.path of the kernels. Defaults to None.
+        packages (tuple, optional): Names of the installed distributions to include. Defaults to KERNEL_PACKAGES.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the environment.
+    """
+    digest = hashlib.sha256()
+    digest.update(sys.version.encode('utf-8'))
+    for package in packages:
+        try:
+            version = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            version = None
+        digest.update(json.dumps([package, version]).encode('utf-8'))
+
+    module_files = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'notebook_kernel.py')]
+    for path in python_path or []:
+        if os.path.isdir(path):
+            module_files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.py'))
+    for module_file in module_files:
+        digest.update(os.path.basename(module_file).encode('utf-8'))
+        with open(module_file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ExecutionCache(ConversionCache):
+    """A manifest of executed notebooks, keyed by the hash of their code cells and the kernel fingerprint.
+
+    An entry is fresh when the code cells of the notebook and the kernel fingerprint are unchanged, and the notebook
+    still has the size and modification time it had after its execution, i.e., it still holds the stored outputs.
+
+    Args:
+        cache_file (str): File path of the JSON manifest. It is created on save() if it does not exist.
+        fingerprint (str): The kernel fingerprint, see kernel_fingerprint(). All entries are stale when it changes.
+    """
+
+    def make_key(self, in_file, options=None):
+        """Compute the cache key of a notebook.
+
+        Args:
+            in_file (str): File path of the notebook.
+            options (dict, optional): Not used. Defaults to None.
+
+        Returns:
+            str: The hash of the code cells of the notebook, see code_cells_key().
+        """
+        with open(in_file, encoding='utf-8') as f:
+            return code_cells_key(json.load(f))
+
+    def is_fresh(self, in_file, key, out_file=None):
+        """Check if a notebook holds the outputs of its current code, and count the hit or miss.
+
+        Args:
+            in_file (str): File path of the notebook.
+            key (str): The cache key returned by make_key() or code_cells_key().
+            out_file (str, optional): Defaults to None, which means the notebook is executed in place.
+
+        Returns:
+            bool: Returns True if the notebook does not need to be executed.
+        """
+        return super().is_fresh(in_file, key, out_file or in_file)
+
+    def store(self, in_file, key, out_file=None):
+        """Record a notebook that has been executed successfully.
+
+        Args:
+            in_file (str): File path of the notebook.
+            key (str): The cache key returned by make_key() or code_cells_key().
+            out_file (str, optional): Defaults to None, which means the notebook is executed in place.
+        """
+        super().store(in_file, key, out_file or in_file)
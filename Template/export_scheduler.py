@@ -0,0 +1,272 @@
+''' Submit Earth Engine export tasks concurrently, with a limit on the tasks in flight, retries and bulk polling.
+
+To export all images of a collection to Google Drive:
+
+    results = export_collection_images(collection, {'scale': 30, 'driveFolder': 'image'}, max_in_flight=10)
+
+To schedule any export tasks:
+
+    with ExportScheduler(max_in_flight=10, workers=4) as scheduler:
+        for name, image in images:
+            scheduler.submit(lambda name=name, image=image: ee.batch.Export.image(image, name, config), name)
+        scheduler.wait(until='finished')
+    print(scheduler.results())
+
+A task is in flight from the moment it is started until the Earth Engine task list reports it as completed, failed or
+cancelled. The task list of all tasks is fetched with one request per poll, rather than one request per task. A task
+that is missing from the task list for missing_timeout seconds is marked as failed, so that it frees its slot.
+
+'''
+
+# License: MIT
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+
+
+FINAL_STATES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+
+def image_names(collection, limit=None, name_property='system:index'):
+    """Get the names of the images of a collection in one request.
+
+    Args:
+        collection (ee.ImageCollection): The collection.
+        limit (int, optional): Maximum number of images. Defaults to None.
+        name_property (str, optional): The image property holding the name. Defaults to 'system:index'.
+
+    Returns:
+        list: The names, in the order of the collection.
+    """
+    if limit is not None:
+        collection = collection.limit(limit)
+    return collection.aggregate_array(name_property).getInfo()
+
+
+class ExportScheduler(object):
+    """Start export tasks from a thread pool, keeping at most max_in_flight of them queued or running.
+
+    Args:
+        max_in_flight (int, optional): Maximum number of started tasks that have not finished yet. Defaults to 10.
+            None means no limit.
+        workers (int, optional): Number of threads starting tasks. Defaults to 4.
+        retries (int, optional): Number of times a failed start is retried. Defaults to 5.
+        backoff (float, optional): Seconds to wait before the first retry, doubled for each next one, with jitter.
+            Defaults to 1.
+        max_backoff (float, optional): Maximum seconds to wait before a retry. Defaults to 60.
+        poll_interval (float, optional): Seconds between two polls of the task list. Defaults to 10.
+        missing_timeout (float, optional): Seconds after which a task in flight that is not in the task list is
+            marked as failed. Defaults to 300.
+    """
+
+    def __init__(self, max_in_flight=10, workers=4, retries=5, backoff=1.0, max_backoff=60.0, poll_interval=10.0,
+                 missing_timeout=300.0):
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.missing_timeout = missing_timeout
+        self.polls = 0
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._results = []
+        self._in_flight = {}
+        self._missing = {}
+        self._poller = None
+        self._closed = False
+
+    def submit(self, make_task, description=None):
+        """Start an export task as soon as a thread and an in-flight slot are free.
+
+        Args:
+            make_task (function): Returns the ee.batch.Task to start. It is called in the thread starting the task,
+                so that building the task does not block the caller either.
+            description (str, optional): Name of the task in the results. Defaults to None.
+
+        Returns:
+            dict: The result of the task, which is updated as the task progresses: description, id, state, attempts
+                and error.
+        """
+        result = {'description': description, 'id': None, 'state': 'PENDING', 'attempts': 0, 'error': None}
+        with self._lock:
+            self._results.append(result)
+        self._executor.submit(self._start, make_task, result)
+        return result
+
+    def _start(self, make_task, result):
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            task = make_task()
+            while True:
+                result['attempts'] += 1
+                try:
+                    task.start()
+                    break
+                except Exception:
+                    if result['attempts'] > self.retries:
+                        raise
+                    delay = min(self.max_backoff, self.backoff * 2 ** (result['attempts'] - 1))
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+        except Exception as e:
+            with self._changed:
+                result['state'] = 'FAILED'
+                result['error'] = '{}: {}'.format(type(e).__name__, e)
+                self._changed.notify_all()
+            if self._slots is not None:
+                self._slots.release()
+            return
+
+        self._started(task.id, result)
+
+    def track(self, task_id, description=None):
+        """Track a task that was started earlier, e.g., by a previous run, until it finishes.
+
+        The task takes an in-flight slot like the submitted ones, so that resumed runs stay within max_in_flight.
+
+        Args:
+            task_id (str): The id of the task.
+            description (str, optional): Name of the task in the results. Defaults to None.
+
+        Returns:
+            dict: The result of the task, see submit().
+        """
+        result = {'description': description, 'id': None, 'state': 'PENDING', 'attempts': 0, 'error': None}
+        with self._lock:
+            self._results.append(result)
+        self._executor.submit(self._track, task_id, result)
+        return result
+
+    def _track(self, task_id, result):
+        if self._slots is not None:
+            self._slots.acquire()
+        self._started(task_id, result)
+
+    def _started(self, task_id, result):
+        with self._changed:
+            result['id'] = task_id
+            result['state'] = 'READY'
+            self._in_flight[task_id] = result
+            self._changed.notify_all()
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+                self._poller.start()
+
+    def poll(self):
+        """Update the states of the tasks in flight from the task list, with one request.
+
+        Returns:
+            int: Number of tasks still in flight.
+        """
+        tasks = ee.data.getTaskList()
+        self.polls += 1
+        now = time.monotonic()
+        states = {task.get('id'): task for task in tasks}
+        with self._changed:
+            for task_id, result in list(self._in_flight.items()):
+                status = states.get(task_id)
+                if status is None:
+                    # A task that has just been started may not be listed yet, and the list only has recent tasks.
+                    missing_since = self._missing.setdefault(task_id, now)
+                    if now - missing_since < self.missing_timeout:
+                        continue
+                    status = {'state': 'FAILED', 'error_message': 'The task is missing from the task list.'}
+                self._missing.pop(task_id, None)
+                result['state'] = status.get('state', result['state'])
+                if result['state'] in FINAL_STATES:
+                    result['error'] = status.get('error_message')
+                    del self._in_flight[task_id]
+                    if self._slots is not None:
+                        self._slots.release()
+            self._changed.notify_all()
+            return len(self._in_flight)
+
+    def _poll_loop(self):
+        while not self._closed:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                print('Polling the task list failed: {}: {}'.format(type(e).__name__, e))
+
+    def wait(self, timeout=None, until='started'):
+        """Wait until all tasks have been started, or until they have all finished.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults to None.
+            until (str, optional): 'started' to wait for all tasks to be started (or to fail to start), or
+                'finished' to wait for all of them to complete, fail or be cancelled. Defaults to 'started'.
+
+        Returns:
+            bool: Returns True if all tasks reached the state waited for.
+        """
+        waiting = ('PENDING',) if until == 'started' else ('PENDING', 'READY', 'RUNNING', 'CANCEL_REQUESTED')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while any(result['state'] in waiting for result in self._results):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def results(self):
+        """Get the results of the submitted tasks.
+
+        Returns:
+            list: Copies of the results, in submission order.
+        """
+        with self._lock:
+            return [dict(result) for result in self._results]
+
+    def close(self):
+        """Stop polling. Tasks that have been started keep running on the Earth Engine servers."""
+        self._closed = True
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(wait=True)
+        self.close()
+        return False
+
+
+def export_collection_images(collection, config, limit=None, max_in_flight=10, workers=4, wait_until='started',
+                             **kwargs):
+    """Export every image of a collection with its system:index as name, using an ExportScheduler.
+
+    Args:
+        collection (ee.ImageCollection): The collection.
+        config (dict): The export configuration of ee.batch.Export.image(), e.g., {'scale': 30, 'driveFolder': 'image'}.
+        limit (int, optional): Maximum number of images. Defaults to None.
+        max_in_flight (int, optional): See ExportScheduler. Defaults to 10.
+        workers (int, optional): See ExportScheduler. Defaults to 4.
+        wait_until (str, optional): See ExportScheduler.wait(). Defaults to 'started'.
+        **kwargs: Other arguments of ExportScheduler.
+
+    Returns:
+        list: The results of the tasks, see ExportScheduler.submit().
+    """
+    names = image_names(collection, limit)
+    images = collection.toList(len(names))
+
+    def make_task(index, name):
+        return ee.batch.Export.image(ee.Image(images.get(index)), name, config)
+
+    scheduler = ExportScheduler(max_in_flight, workers, **kwargs)
+    try:
+        for index, name in enumerate(names):
+            scheduler.submit(lambda index=index, name=name: make_task(index, name), name)
+        scheduler.wait(until=wait_until)
+    finally:
+        scheduler.close()
+    return scheduler.results()
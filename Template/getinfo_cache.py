@@ -0,0 +1,238 @@
+''' An opt-in cache of getInfo() results, keyed by the serialized Earth Engine expression.
+
+To cache the getInfo() calls of this process in memory and in a SQLite file: install(GetInfoCache('getinfo.sqlite'))
+To stop caching: uninstall()
+To cache the getInfo() calls of executed notebooks: python notebook_executor.py --input in_dir --getinfo-cache getinfo.sqlite
+
+getInfo() sends the expression graph of an object to the Earth Engine servers and waits for the result. The same
+graph gives the same result as long as the data behind it does not change, so repeated runs of the same notebooks can
+reuse the results. Entries expire after ttl seconds to pick up new data, and the results of expressions that depend
+on the current time (e.g., ee.Date(Date.now())) are cached for that long as well, so keep the TTL short for them.
+
+'''
+
+# License: MIT
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+
+
+class GetInfoCache(object):
+    """A two-tier cache of getInfo() results: an LRU dict in memory in front of an optional SQLite file.
+
+    Args:
+        cache_file (str, optional): File path of the SQLite database, which is shared by all processes using it.
+            Defaults to None, which keeps the results in memory only.
+        max_entries (int, optional): Number of results kept in memory. Defaults to 1024.
+        max_disk_entries (int, optional): Number of results kept in the SQLite file. Defaults to 100000.
+        ttl (float, optional): Seconds a result stays valid. Defaults to 86400 (one day). None means forever.
+        namespace (str, optional): A string added to the keys, e.g., the Earth Engine project, so that the results
+            seen by different accounts are kept apart. Defaults to ''.
+    """
+
+    def __init__(self, cache_file=None, max_entries=1024, max_disk_entries=100000, ttl=86400, namespace=''):
+        self.cache_file = cache_file
+        self.max_entries = max(1, max_entries)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.ttl = ttl
+        self.namespace = namespace
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if cache_file is not None:
+            cache_dir = os.path.dirname(os.path.abspath(cache_file))
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            self._db = sqlite3.connect(cache_file, timeout=30, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS results '
+                             '(key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)')
+            self._db.commit()
+
+    def make_key(self, serialized):
+        """Compute the cache key of an expression.
+
+        Args:
+            serialized (str): The serialized expression graph, see ee.ComputedObject.serialize().
+
+        Returns:
+            str: The hexadecimal SHA-256 digest of the namespace and the expression.
+        """
+        return hashlib.sha256((self.namespace + '\n' + serialized).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Look a result up, first in memory and then on disk, and count the hit or miss.
+
+        Args:
+            key (str): The cache key returned by make_key().
+
+        Returns:
+            tuple: (True, result) if the result is cached, (False, None) otherwise.
+        """
+        now = time.time()
+        expired = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] is None or entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return True, json.loads(entry[0])
+                del self._entries[key]
+                expired = True
+
+            if self._db is not None:
+                row = self._db.execute('SELECT value, expires FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    if row[1] is None or row[1] > now:
+                        self._db.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, key))
+                        self._db.commit()
+                        self._remember(key, row[0], row[1])
+                        self.disk_hits += 1
+                        return True, json.loads(row[0])
+                    self._db.execute('DELETE FROM results WHERE key = ?', (key,))
+                    self._db.commit()
+                    expired = True
+
+            if expired:
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result):
+        """Store a result in memory and on disk.
+
+        Args:
+            key (str): The cache key returned by make_key().
+            result (object): The JSON serializable result of getInfo().
+        """
+        value = json.dumps(result)
+        now = time.time()
+        expires = None if self.ttl is None else now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            if self._db is not None:
+                self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, value, expires, now))
+                count = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+                if count > self.max_disk_entries:
+                    # Drop the least recently used results, and the expired ones with them.
+                    removed = self._db.execute(
+                        'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)',
+                        (count - self.max_disk_entries,)).rowcount
+                    self.evictions += removed
+                self._db.commit()
+
+    def _remember(self, key, value, expires):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_info(self, obj, get_info):
+        """Get the result of an object from the cache, or from get_info(obj) on a miss.
+
+        Args:
+            obj (ee.ComputedObject): The object.
+            get_info (function): The uncached getInfo() function.
+
+        Returns:
+            object: The result.
+        """
+        try:
+            key = self.make_key(obj.serialize())
+        except Exception:
+            return get_info(obj)
+        found, result = self.get(key)
+        if not found:
+            result = get_info(obj)
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        """Get the counters of the cache.
+
+        Returns:
+            dict: The memory_hits, disk_hits, misses, evictions (from memory or disk) and expirations, and the
+                hit_rate.
+        """
+        hits = self.memory_hits + self.disk_hits
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': hits / (hits + self.misses) if hits + self.misses else 0.0,
+        }
+
+    def clear(self):
+        """Remove all results, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM results')
+                self._db.commit()
+
+    def close(self):
+        """Close the SQLite file."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_installed = None
+
+
+def install(cache=None):
+    """Route the getInfo() calls of all Earth Engine objects through a cache.
+
+    Args:
+        cache (GetInfoCache, optional): The cache. Defaults to None, which creates an in-memory cache.
+
+    Returns:
+        GetInfoCache: The installed cache.
+    """
+    global _installed
+    import ee
+
+    uninstall()
+    if cache is None:
+        cache = GetInfoCache()
+    get_info = ee.ComputedObject.getInfo
+
+    @functools.wraps(get_info)
+    def cached_get_info(self):
+        return cache.get_info(self, get_info)
+
+    ee.ComputedObject.getInfo = cached_get_info
+    _installed = (cache, get_info)
+    return cache
+
+
+def uninstall():
+    """Restore the uncached getInfo() installed by install(), if any.
+
+    Returns:
+        GetInfoCache: The cache that was installed, or None.
+    """
+    global _installed
+    if _installed is None:
+        return None
+    import ee
+
+    cache, get_info = _installed
+    ee.ComputedObject.getInfo = get_info
+    _installed = None
+    return cache
@@ -0,0 +1,571 @@
+''' Generate Python code from the abstract syntax tree of an Earth Engine JavaScript.
+
+To convert an Earth Engine JavaScript to Python code:
+
+    program = parse(source)
+    generator = PythonGenerator(source, program['comments'])
+    lines = generator.generate(program)
+
+'''
+
+# License: MIT
+
+import keyword
+from collections import deque, namedtuple
+from js_parser import JSSyntaxError
+
+
+INDENT = '    '
+
+# Python operators and precedence levels of the JavaScript binary operators.
+BINARY_OPERATORS = {
+    '||': ('or', 2),
+    '&&': ('and', 3),
+    '==': ('==', 5), '===': ('==', 5), '!=': ('!=', 5), '!==': ('!=', 5),
+    '<': ('<', 5), '>': ('>', 5), '<=': ('<=', 5), '>=': ('>=', 5), 'in': ('in', 5),
+    '|': ('|', 6),
+    '^': ('^', 7),
+    '&': ('&', 8),
+    '<<': ('<<', 9), '>>': ('>>', 9), '>>>': ('>>', 9),
+    '+': ('+', 10), '-': ('-', 10),
+    '*': ('*', 11), '/': ('/', 11), '%': ('%', 11),
+    '**': ('**', 13),
+}
+
+_CONDITIONAL = 1
+_NOT = 4
+_COMPARISON = 5
+_UNARY = 12
+_PRIMARY = 15
+
+# Methods whose names are Python keywords.
+KEYWORD_METHODS = {'or': 'Or', 'and': 'And', 'not': 'Not'}
+
+# Members of the JavaScript Math object that are Python built-ins or differ from the math module.
+MATH_MEMBERS = {'PI': 'math.pi', 'E': 'math.e', 'abs': 'abs', 'min': 'min', 'max': 'max', 'round': 'round',
+                'random': 'random.random'}
+
+GLOBAL_FUNCTIONS = {'parseInt': 'int', 'parseFloat': 'float', 'String': 'str', 'Number': 'float',
+                    'Boolean': 'bool', 'isNaN': 'math.isnan'}
+
+GLOBAL_VALUES = {'undefined': 'None', 'NaN': "float('nan')", 'Infinity': "float('inf')"}
+
+# The indentation of a statement, the continuation level of the expression being generated inside it, and whether
+# the expression is enclosed in brackets (where line breaks need no backslash).
+_Context = namedtuple('_Context', ['indent', 'depth', 'bracketed'])
+
+
+class PythonGenerator(object):
+    """Generate Python code from the Program node returned by js_parser.parse().
+
+    Function expressions (e.g., the callbacks passed to map()) are hoisted into named functions defined just before
+    the statement using them. Comments and blank lines are kept, and the line breaks of multi-line object literals,
+    arrays, argument lists and method chains are preserved.
+
+    Args:
+        source (str): The JavaScript source code.
+        comments (list, optional): The comments returned by js_parser.parse(). Defaults to ().
+        name_callback (function, optional): A function taking the source code of a function expression and returning
+            the name of its hoisted function. Defaults to None, which numbers the functions func_1, func_2, ...
+    """
+
+    def __init__(self, source, comments=(), name_callback=None):
+        self.source = source
+        # The inline '/* color: #ff0000 */' comments inserted by the Code Editor geometry imports are dropped.
+        comments = [comment for comment in comments
+                    if not (comment['type'] == 'Block' and comment['value'].startswith(' color') and
+                            '\n' not in comment['value'])]
+        self.comments = deque(sorted(comments, key=lambda comment: comment['range'][0]))
+        self.name_callback = name_callback or self._default_name
+        self.imports = set()
+        self.lines = []
+        self.last_line = 0
+        self._function_count = 0
+        self._function_indent = None
+
+    def generate(self, program):
+        """Generate the Python code of a program.
+
+        Args:
+            program (dict): The Program node.
+
+        Returns:
+            list: List of Python lines, without newline characters. The modules used by the generated code
+                (e.g., math) are in the imports attribute.
+        """
+        for statement in program['body']:
+            self.emit_statement(statement, '')
+        self.flush_comments(float('inf'), '')
+        return self.lines
+
+    # Output helpers
+
+    def _default_name(self, content):
+        self._function_count += 1
+        return 'func_{}'.format(self._function_count)
+
+    def emit(self, line):
+        # Separate a function from the code following it.
+        if self._function_indent is not None and line.strip():
+            if len(line) - len(line.lstrip()) <= len(self._function_indent) and self.lines[-1].strip():
+                self.lines.append('')
+            self._function_indent = None
+        self.lines.append(line)
+
+    def blank_line_before(self, line_number):
+        if self.lines and self.lines[-1].strip() and line_number > self.last_line + 1:
+            self.emit('')
+
+    def take_comments(self, before_line):
+        """Pop the comments that start before the given line and return them as Python comment lines."""
+        lines = []
+        while self.comments and self.comments[0]['line'] < before_line:
+            comment = self.comments.popleft()
+            lines.extend(format_comment(comment))
+            self.last_line = max(self.last_line, comment['end_line'])
+        return lines
+
+    def flush_comments(self, before_line, indent):
+        while self.comments and self.comments[0]['line'] < before_line:
+            self.blank_line_before(self.comments[0]['line'])
+            for line in self.take_comments(self.comments[0]['line'] + 1):
+                self.emit(indent + line)
+
+    def trailing_comment(self, node):
+        """Append the line comment following a statement on its last line, if any."""
+        if self.comments and self.comments[0]['line'] == node['end_line'] and self.comments[0]['type'] == 'Line' \
+                and self.comments[0]['range'][0] >= node['range'][1] and self.lines:
+            comment = self.comments.popleft()
+            self.lines[-1] += '  ' + format_comment(comment)[0]
+
+    # Statements
+
+    def emit_statement(self, node, indent):
+        self.flush_comments(node['line'], indent)
+        self.blank_line_before(node['line'])
+        node_type = node['type']
+
+        if node_type == 'EmptyStatement':
+            return
+        elif node_type == 'BlockStatement':
+            for statement in node['body']:
+                self.emit_statement(statement, indent)
+            self.flush_comments(node['end_line'], indent)
+        elif node_type == 'FunctionDeclaration':
+            self.emit_function(self.identifier(node['id']['name']), node, indent)
+        elif node_type == 'VariableDeclaration':
+            for declarator in node['declarations']:
+                name = self.identifier(declarator['id']['name'])
+                init = declarator['init']
+                if init is not None and init['type'] in ('FunctionExpression', 'ArrowFunctionExpression'):
+                    self.emit_function(name, init, indent)
+                else:
+                    value = 'None' if init is None else self.expression(init, _Context(indent, 0, False))
+                    self.emit_simple(declarator, indent, '{} = {}'.format(name, value))
+        elif node_type == 'ExpressionStatement':
+            self.emit_expression_statement(node['expression'], indent)
+        elif node_type == 'ReturnStatement':
+            if node['argument'] is None:
+                self.emit_simple(node, indent, 'return')
+            else:
+                self.emit_simple(node, indent, 'return ' + self.expression(node['argument'], _Context(indent, 0, False)))
+        elif node_type == 'IfStatement':
+            self.emit_if(node, indent, 'if')
+        elif node_type == 'ForStatement':
+            self.emit_for(node, indent)
+        elif node_type in ('ForInStatement', 'ForOfStatement'):
+            left = node['left']
+            target = left['declarations'][0]['id'] if left['type'] == 'VariableDeclaration' else left
+            header = 'for {} in {}:'.format(self.expression(target, _Context(indent, 0, False)),
+                                            self.expression(node['right'], _Context(indent, 0, False)))
+            self.emit_compound(node, indent, header, node['body'])
+        elif node_type == 'WhileStatement':
+            header = 'while {}:'.format(self.expression(node['test'], _Context(indent, 0, False)))
+            self.emit_compound(node, indent, header, node['body'])
+        elif node_type == 'DoWhileStatement':
+            test = self.expression(node['test'], _Context(indent + INDENT, 0, False), _NOT)
+            self.emit_compound(node, indent, 'while True:', node['body'])
+            self.emit(indent + INDENT + 'if not {}:'.format(test))
+            self.emit(indent + INDENT * 2 + 'break')
+        elif node_type == 'BreakStatement':
+            self.emit_simple(node, indent, 'break')
+        elif node_type == 'ContinueStatement':
+            self.emit_simple(node, indent, 'continue')
+        elif node_type == 'ThrowStatement':
+            argument = self.expression(node['argument'], _Context(indent, 1, True))
+            self.emit_simple(node, indent, 'raise Exception({})'.format(argument))
+        else:
+            raise JSSyntaxError("Unsupported statement '{}' at line {}".format(node_type, node['line']))
+
+        self.last_line = max(self.last_line, node['end_line'])
+
+    def emit_simple(self, node, indent, code):
+        # Comments inside a multi-line statement that could not be placed in brackets go before it.
+        for line in self.take_comments(node['end_line']):
+            self.emit(indent + line)
+        self.emit(indent + code)
+        self.last_line = max(self.last_line, node['end_line'])
+        self.trailing_comment(node)
+
+    def emit_compound(self, node, indent, header, body):
+        self.emit(indent + header)
+        self.trailing_comment_on_line(node['line'])
+        self.last_line = max(self.last_line, body['line'])
+        self.emit_body(body, indent + INDENT)
+
+    def trailing_comment_on_line(self, line_number):
+        if self.comments and self.comments[0]['line'] == line_number and self.comments[0]['type'] == 'Line':
+            self.lines[-1] += '  ' + format_comment(self.comments.popleft())[0]
+
+    def emit_body(self, body, indent):
+        count = len(self.lines)
+        if body['type'] == 'BlockStatement':
+            for statement in body['body']:
+                self.emit_statement(statement, indent)
+            self.flush_comments(body['end_line'], indent)
+        else:
+            self.emit_statement(body, indent)
+        if not any(line.strip() and not line.strip().startswith('#') for line in self.lines[count:]):
+            self.emit(indent + 'pass')
+
+    def emit_if(self, node, indent, keyword_name):
+        test = self.expression(node['test'], _Context(indent, 0, False))
+        self.emit_compound(node, indent, '{} {}:'.format(keyword_name, test), node['consequent'])
+        alternate = node['alternate']
+        if alternate is None:
+            return
+        if alternate['type'] == 'IfStatement':
+            self.emit_if(alternate, indent, 'elif')
+        else:
+            self.emit(indent + 'else:')
+            self.last_line = max(self.last_line, alternate['line'])
+            self.emit_body(alternate, indent + INDENT)
+
+    def emit_for(self, node, indent):
+        header = self.range_loop(node, _Context(indent, 0, False))
+        if header is not None:
+            self.emit_compound(node, indent, header, node['body'])
+            return
+
+        # Any other for loop becomes a while loop.
+        init = node['init']
+        if init is not None:
+            if init['type'] == 'VariableDeclaration':
+                self.emit_statement(init, indent)
+            else:
+                self.emit_expression_statement(init, indent)
+        test = 'True' if node['test'] is None else self.expression(node['test'], _Context(indent, 0, False))
+        self.emit_compound(node, indent, 'while {}:'.format(test), node['body'])
+        if node['update'] is not None:
+            self.emit_expression_statement(node['update'], indent + INDENT)
+
+    def range_loop(self, node, context):
+        """Convert a counting loop such as for (var i = 0; i < n; i++) to a for loop over range(), if possible."""
+        init, test, update = node['init'], node['test'], node['update']
+        if init is None or test is None or update is None:
+            return None
+
+        if init['type'] == 'VariableDeclaration' and len(init['declarations']) == 1:
+            name, start = init['declarations'][0]['id']['name'], init['declarations'][0]['init']
+        elif init['type'] == 'AssignmentExpression' and init['operator'] == '=' and init['left']['type'] == 'Identifier':
+            name, start = init['left']['name'], init['right']
+        else:
+            return None
+        if start is None or test['type'] != 'BinaryExpression' or test['left'].get('name') != name or \
+                test['operator'] not in ('<', '<=', '>', '>='):
+            return None
+
+        if update['type'] == 'UpdateExpression' and update['argument'].get('name') == name:
+            step = '1' if update['operator'] == '++' else '-1'
+        elif update['type'] == 'AssignmentExpression' and update['left'].get('name') == name and \
+                update['operator'] in ('+=', '-=') and update['right']['type'] == 'Literal':
+            step = update['right']['raw'] if update['operator'] == '+=' else '-' + update['right']['raw']
+        else:
+            return None
+        if (test['operator'] in ('<', '<=')) == step.startswith('-'):
+            return None
+
+        # range() excludes its end, so inclusive comparisons move the end by one.
+        if test['operator'] in ('<=', '>='):
+            end = self.expression(test['right'], context, BINARY_OPERATORS['+'][1])
+            end += ' + 1' if test['operator'] == '<=' else ' - 1'
+        else:
+            end = self.expression(test['right'], context)
+        args = [self.expression(start, context), end]
+        if step != '1':
+            args.append(step)
+        return 'for {} in range({}):'.format(self.identifier(name), ', '.join(args))
+
+    def emit_expression_statement(self, expression, indent):
+        context = _Context(indent, 0, False)
+        expression_type = expression['type']
+
+        if expression_type == 'SequenceExpression':
+            for item in expression['expressions']:
+                self.emit_expression_statement(item, indent)
+            return
+
+        if expression_type == 'AssignmentExpression':
+            right = expression['right']
+            if right['type'] in ('FunctionExpression', 'ArrowFunctionExpression') and expression['operator'] == '=':
+                if expression['left']['type'] == 'Identifier':
+                    self.emit_function(self.identifier(expression['left']['name']), right, indent)
+                    return
+            targets = []
+            while expression['type'] == 'AssignmentExpression' and expression['operator'] == '=' and \
+                    expression['right']['type'] == 'AssignmentExpression':
+                targets.append(self.expression(expression['left'], context))
+                expression = expression['right']
+            operator = '>>=' if expression['operator'] == '>>>=' else expression['operator']
+            code = '{} {} {}'.format(self.expression(expression['left'], context), operator,
+                                     self.expression(expression['right'], context))
+            if targets:
+                code = ' = '.join(targets) + ' = ' + code
+            self.emit_simple(expression, indent, code)
+        elif expression_type == 'UpdateExpression':
+            operator = '+=' if expression['operator'] == '++' else '-='
+            self.emit_simple(expression, indent, '{} {} 1'.format(self.expression(expression['argument'], context),
+                                                                  operator))
+        elif expression_type == 'UnaryExpression' and expression['operator'] == 'delete':
+            self.emit_simple(expression, indent, 'del ' + self.expression(expression['argument'], context))
+        else:
+            self.emit_simple(expression, indent, self.expression(expression, context))
+
+    def emit_function(self, name, node, indent):
+        previous = self.lines[-1].strip() if self.lines else ''
+        if previous and not previous.endswith(':') and not previous.startswith('#'):
+            self.emit('')
+        params = ', '.join(self.identifier(param['name']) for param in node['params'])
+        self.emit('{}def {}({}):'.format(indent, name, params))
+        self.trailing_comment_on_line(node['line'])
+        body = node['body']
+        if node['type'] == 'ArrowFunctionExpression' and node['expression']:
+            self.emit(indent + INDENT + 'return ' + self.expression(body, _Context(indent + INDENT, 0, False)))
+        else:
+            self.last_line = max(self.last_line, body['line'])
+            self.emit_body(body, indent + INDENT)
+        self.last_line = max(self.last_line, node['end_line'])
+        self._function_indent = indent
+
+    # Expressions
+
+    def identifier(self, name):
+        name = name.replace('$', '_')
+        if keyword.iskeyword(name):
+            name += '_'
+        return name
+
+    def expression(self, node, context, precedence=0):
+        """Generate the code of an expression, adding parentheses if it binds less tightly than precedence."""
+        code, node_precedence = self._expression(node, context)
+        if node_precedence < precedence:
+            code = '(' + code + ')'
+        return code
+
+    def _expression(self, node, context):
+        node_type = node['type']
+        method = getattr(self, 'expression_' + node_type, None)
+        if method is None:
+            raise JSSyntaxError("Unsupported expression '{}' at line {}".format(node_type, node['line']))
+        return method(node, context)
+
+    def expression_Identifier(self, node, context):
+        name = node['name']
+        if name in GLOBAL_VALUES:
+            return GLOBAL_VALUES[name], _PRIMARY
+        return self.identifier(name), _PRIMARY
+
+    def expression_ThisExpression(self, node, context):
+        return 'self', _PRIMARY
+
+    def expression_Literal(self, node, context):
+        if 'regex' in node:
+            return repr(node['regex']['pattern']), _PRIMARY
+        if node['raw'] in ('true', 'false', 'null'):
+            return {'true': 'True', 'false': 'False', 'null': 'None'}[node['raw']], _PRIMARY
+        return node['raw'], _PRIMARY
+
+    def expression_TemplateLiteral(self, node, context):
+        text = ''.join(quasi.replace('{', '{{').replace('}', '}}') + ('{}' if index < len(node['expressions']) else '')
+                       for index, quasi in enumerate(node['quasis']))
+        text = "'" + text.replace("'", "\\'").replace('\n', '\\n') + "'"
+        if not node['expressions']:
+            return text, _PRIMARY
+        inner = _Context(context.indent, context.depth + 1, True)
+        args = ', '.join(self.expression(expression, inner) for expression in node['expressions'])
+        return '{}.format({})'.format(text, args), _PRIMARY
+
+    def expression_ArrayExpression(self, node, context):
+        return self.bracketed('[', node['elements'], ']', node, context), _PRIMARY
+
+    def expression_ObjectExpression(self, node, context):
+        return self.bracketed('{', node['properties'], '}', node, context, self.property_code), _PRIMARY
+
+    def property_code(self, prop, context):
+        key = prop['key']
+        key_code = "'{}'".format(key['name']) if key['type'] == 'Identifier' else key['raw']
+        return '{}: {}'.format(key_code, self.expression(prop['value'], context))
+
+    def bracketed(self, opening, items, closing, node, context, item_code=None, prefix='', start_line=None):
+        """Generate a bracketed, comma separated list, keeping the line breaks of the source."""
+        item_code = item_code or (lambda item, item_context: self.expression(item, item_context))
+        start_line = node['line'] if start_line is None else start_line
+        multiline = any(item['line'] > previous for item, previous in
+                        zip(items, [start_line] + [item['end_line'] for item in items]))
+        depth = context.depth + 1 if multiline else context.depth
+        pad = context.indent + INDENT * depth
+        item_context = _Context(context.indent, depth, True)
+
+        code = opening
+        previous_line = start_line
+        for index, item in enumerate(items):
+            if index > 0:
+                code += ','
+            if item['line'] > previous_line:
+                for comment in self.take_comments(item['line']):
+                    code += '\n' + pad + comment
+                code += '\n' + pad
+            elif index > 0:
+                code += ' '
+            code += (prefix if index == 0 else '') + item_code(item, item_context)
+            previous_line = item['end_line']
+        if multiline and node['end_line'] > previous_line:
+            for comment in self.take_comments(node['end_line']):
+                code += '\n' + pad + comment
+            code += '\n' + context.indent + INDENT * context.depth
+        return code + closing
+
+    def expression_FunctionExpression(self, node, context):
+        name = self.name_callback(self.source[node['range'][0]:node['range'][1]])
+        self.emit_function(name, node, context.indent)
+        return name, _PRIMARY
+
+    def expression_ArrowFunctionExpression(self, node, context):
+        if node['expression'] and node['body']['type'] not in ('FunctionExpression', 'ArrowFunctionExpression'):
+            params = ', '.join(self.identifier(param['name']) for param in node['params'])
+            body = self.expression(node['body'], context)
+            return 'lambda {}: {}'.format(params, body) if params else 'lambda: ' + body, 0
+        return self.expression_FunctionExpression(node, context)
+
+    def expression_MemberExpression(self, node, context, callee=False):
+        obj = node['object']
+        if node['computed']:
+            prop = self.expression(node['property'], _Context(context.indent, context.depth + 1, True))
+            return '{}[{}]'.format(self.expression(obj, context, _PRIMARY), prop), _PRIMARY
+
+        name = node['property']['name']
+        if obj['type'] == 'Identifier' and obj['name'] == 'Math':
+            code = MATH_MEMBERS.get(name, 'math.' + name)
+            if '.' in code:
+                self.imports.add(code.split('.')[0])
+            return code, _PRIMARY
+        if obj['type'] == 'Identifier' and obj['name'] == 'Export':
+            return 'ee.batch.Export.' + name, _PRIMARY
+        # The length property of arrays and strings, not the length() method of ee.List and ee.String.
+        if name == 'length' and not callee:
+            return 'len({})'.format(self.expression(obj, _Context(context.indent, context.depth, True))), _PRIMARY
+
+        code = self.expression(obj, context, _PRIMARY)
+        if node.get('dot_line', 0) > obj['end_line']:
+            continuation = '\n' if context.bracketed else ' \\\n'
+            code += continuation + context.indent + INDENT * (context.depth + 1)
+        return code + '.' + KEYWORD_METHODS.get(name, name), _PRIMARY
+
+    def expression_CallExpression(self, node, context):
+        callee = node['callee']
+        arguments = node['arguments']
+        if callee['type'] == 'Identifier' and callee['name'] in GLOBAL_FUNCTIONS:
+            callee_code = GLOBAL_FUNCTIONS[callee['name']]
+            if callee_code.startswith('math.'):
+                self.imports.add('math')
+        elif callee['type'] == 'MemberExpression' and not callee['computed'] and callee['property']['name'] == 'push':
+            callee_code = self.expression(callee['object'], context, _PRIMARY) + '.append'
+        elif callee['type'] == 'MemberExpression':
+            callee_code = self.expression_MemberExpression(callee, context, callee=True)[0]
+        else:
+            callee_code = self.expression(callee, context, _PRIMARY)
+
+        # Earth Engine functions taking a dictionary of named arguments need it unpacked as keyword arguments.
+        prefix = ''
+        if len(arguments) == 1 and arguments[0]['type'] == 'ObjectExpression' and \
+                (callee_code.endswith('.visualize') or callee_code.startswith('ee.batch.Export.')):
+            prefix = '**'
+        arguments_code = self.bracketed('(', arguments, ')', node, context, prefix=prefix, start_line=callee['end_line'])
+        return callee_code + arguments_code, _PRIMARY
+
+    def expression_NewExpression(self, node, context):
+        return self.expression_CallExpression(node, context)
+
+    def expression_UnaryExpression(self, node, context):
+        operator = node['operator']
+        if operator == '!':
+            return 'not ' + self.expression(node['argument'], context, _NOT), _NOT
+        if operator == 'typeof':
+            return 'type({}).__name__'.format(self.expression(node['argument'], context)), _PRIMARY
+        if operator == 'void':
+            return 'None', _PRIMARY
+        if operator == 'delete':
+            raise JSSyntaxError("Unsupported 'delete' expression at line {}".format(node['line']))
+        return operator + self.expression(node['argument'], context, _UNARY), _UNARY
+
+    def expression_BinaryExpression(self, node, context):
+        operator = node['operator']
+        if operator == 'instanceof':
+            return 'isinstance({}, {})'.format(self.expression(node['left'], context),
+                                               self.expression(node['right'], context)), _PRIMARY
+        if operator == '??':
+            left = self.expression(node['left'], context, _CONDITIONAL + 1)
+            right = self.expression(node['right'], context, _CONDITIONAL)
+            return '{0} if {0} is not None else {1}'.format(left, right), _CONDITIONAL
+
+        python_operator, precedence = BINARY_OPERATORS[operator]
+        if precedence == _COMPARISON:
+            left_precedence = right_precedence = precedence + 1  # Python would chain the comparisons
+        elif operator == '**':
+            left_precedence, right_precedence = precedence + 1, precedence
+        else:
+            left_precedence, right_precedence = precedence, precedence + 1
+        left = self.expression(node['left'], context, left_precedence)
+        right = self.expression(node['right'], context, right_precedence)
+        return '{} {} {}'.format(left, python_operator, right), precedence
+
+    expression_LogicalExpression = expression_BinaryExpression
+
+    def expression_ConditionalExpression(self, node, context):
+        test = self.expression(node['test'], context, _CONDITIONAL + 1)
+        consequent = self.expression(node['consequent'], context, _CONDITIONAL + 1)
+        alternate = self.expression(node['alternate'], context, _CONDITIONAL)
+        return '{} if {} else {}'.format(consequent, test, alternate), _CONDITIONAL
+
+    def expression_AssignmentExpression(self, node, context):
+        if node['operator'] != '=' or node['left']['type'] != 'Identifier':
+            raise JSSyntaxError("Unsupported assignment inside an expression at line {}".format(node['line']))
+        return '{} := {}'.format(self.identifier(node['left']['name']),
+                                 self.expression(node['right'], context, _CONDITIONAL)), 0
+
+
+def format_comment(comment):
+    """Convert a JavaScript comment to Python comment lines.
+
+    Args:
+        comment (dict): A comment returned by js_parser.parse().
+
+    Returns:
+        list: List of Python comment lines.
+    """
+    if comment['type'] == 'Line':
+        return ['#' + comment['value']]
+
+    lines = comment['value'].split('\n')
+    output = ['#' + lines[0].rstrip()] if lines[0].strip() not in ('', '*') else []
+    for line in lines[1:]:
+        stripped = line.strip()
+        if stripped.startswith('*'):
+            stripped = stripped[1:].rstrip()
+            if stripped or output:
+                output.append('#' + stripped)
+        elif stripped:
+            output.append('# ' + stripped)
+    while output and output[-1] == '#':
+        output.pop()
+    return output or ['#']
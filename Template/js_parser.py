@@ -0,0 +1,590 @@
+''' Parse Google Earth Engine JavaScript into an ESTree (esprima-style) abstract syntax tree.
+
+To parse an Earth Engine JavaScript: program = parse(source)
+
+Nodes are dicts with a 'type' key and the ESTree fields of that type (e.g., 'callee' and 'arguments' for a
+CallExpression), plus 'range' (start and end character offsets), 'line' and 'end_line' (1-based). The comments are
+returned separately in program['comments'], so that the code generator can put them back in place.
+
+The parser covers the ES5 subset used by Earth Engine scripts, plus let/const and arrow functions. Anything else
+raises JSSyntaxError.
+
+'''
+
+# License: MIT
+
+from collections import namedtuple
+from js_tokenizer import tokenize, NEWLINE, WHITESPACE, COMMENT, BLOCK_COMMENT, NAME, PUNCT, STRING, NUMBER, \
+    REGEX, TEMPLATE
+
+
+class JSSyntaxError(Exception):
+    """Raised when a JavaScript cannot be parsed."""
+
+
+LexToken = namedtuple('LexToken', ['type', 'value', 'line', 'end_line', 'start', 'end', 'newline_before'])
+
+_EOF = 'eof'
+
+# Binding powers of the binary operators, from the lowest to the highest precedence.
+BINARY_PRECEDENCE = {
+    '??': 4, '||': 4,
+    '&&': 5,
+    '|': 6,
+    '^': 7,
+    '&': 8,
+    '==': 9, '!=': 9, '===': 9, '!==': 9,
+    '<': 10, '>': 10, '<=': 10, '>=': 10, 'instanceof': 10, 'in': 10,
+    '<<': 11, '>>': 11, '>>>': 11,
+    '+': 12, '-': 12,
+    '*': 13, '/': 13, '%': 13,
+    '**': 14,
+}
+
+ASSIGNMENT_OPERATORS = {'=', '+=', '-=', '*=', '/=', '%=', '**=', '<<=', '>>=', '>>>=', '&=', '|=', '^='}
+
+UNARY_OPERATORS = {'!', '-', '+', '~', 'typeof', 'void', 'delete'}
+
+
+def lex(source):
+    """Split a JavaScript into significant tokens with their positions, and comments.
+
+    Args:
+        source (str): The JavaScript source code.
+
+    Returns:
+        tuple: The list of LexToken (ending with an 'eof' token) and the list of comments. Each comment is a dict with
+            the keys 'type' ('Line' or 'Block'), 'value', 'line', 'end_line' and 'range'.
+    """
+    tokens = []
+    comments = []
+    line = 1
+    pos = 0
+    newline_before = False
+
+    for token_type, value in tokenize(source):
+        end = pos + len(value)
+        if token_type == NEWLINE:
+            line += 1
+            newline_before = True
+        elif token_type == WHITESPACE:
+            pass
+        else:
+            end_line = line + value.count('\n')
+            if token_type in (COMMENT, BLOCK_COMMENT):
+                comments.append({
+                    'type': 'Line' if token_type == COMMENT else 'Block',
+                    'value': value[2:] if token_type == COMMENT else value[2:-2],
+                    'line': line,
+                    'end_line': end_line,
+                    'range': [pos, end],
+                })
+                if end_line > line:
+                    newline_before = True
+            else:
+                tokens.append(LexToken(token_type, value, line, end_line, pos, end, newline_before))
+                newline_before = False
+            line = end_line
+        pos = end
+
+    tokens.append(LexToken(_EOF, '', line, line, pos, pos, True))
+    return tokens, comments
+
+
+def parse(source):
+    """Parse an Earth Engine JavaScript.
+
+    Args:
+        source (str): The JavaScript source code.
+
+    Returns:
+        dict: The Program node, with the list of comments in program['comments'].
+    """
+    tokens, comments = lex(source)
+    program = Parser(tokens, source).parse_program()
+    program['comments'] = comments
+    return program
+
+
+class Parser(object):
+    """A recursive descent parser for the JavaScript subset used by Earth Engine scripts.
+
+    Args:
+        tokens (list): List of LexToken returned by lex().
+        source (str): The JavaScript source code.
+    """
+
+    def __init__(self, tokens, source):
+        self.tokens = tokens
+        self.source = source
+        self.index = 0
+
+    # Token helpers
+
+    @property
+    def token(self):
+        return self.tokens[self.index]
+
+    def peek(self, offset=1):
+        return self.tokens[min(self.index + offset, len(self.tokens) - 1)]
+
+    def at(self, value, token_type=None):
+        token = self.token
+        return token.value == value and token.type in ((token_type,) if token_type else (PUNCT, NAME))
+
+    def advance(self):
+        token = self.token
+        if token.type != _EOF:
+            self.index += 1
+        return token
+
+    def accept(self, value):
+        if self.at(value):
+            return self.advance()
+        return None
+
+    def expect(self, value):
+        if not self.at(value):
+            self.error("Expected '{}'".format(value))
+        return self.advance()
+
+    def error(self, message, token=None):
+        token = token or self.token
+        found = token.value if token.type != _EOF else 'end of input'
+        raise JSSyntaxError("{} but found '{}' at line {}".format(message, found, token.line))
+
+    def node(self, node_type, start, **fields):
+        """Create a node spanning from the start token to the last consumed token."""
+        last = self.tokens[self.index - 1] if self.index > 0 else start
+        fields.update({
+            'type': node_type,
+            'range': [start.start, max(last.end, start.end)],
+            'line': start.line,
+            'end_line': max(last.end_line, start.end_line),
+        })
+        return fields
+
+    def consume_semicolon(self):
+        """Consume a semicolon, or insert one automatically before a newline, a closing brace or the end of input."""
+        if self.accept(';'):
+            return
+        if self.at('}') or self.token.type == _EOF or self.token.newline_before:
+            return
+        self.error("Expected ';'")
+
+    # Statements
+
+    def parse_program(self):
+        start = self.token
+        body = []
+        while self.token.type != _EOF:
+            body.append(self.parse_statement())
+        return self.node('Program', start, body=body)
+
+    def parse_statement(self):
+        token = self.token
+        if token.type == PUNCT:
+            if token.value == '{':
+                return self.parse_block()
+            if token.value == ';':
+                self.advance()
+                return self.node('EmptyStatement', token)
+        elif token.type == NAME:
+            keyword = token.value
+            if keyword in ('var', 'let', 'const'):
+                declaration = self.parse_variable_declaration()
+                self.consume_semicolon()
+                declaration = self.node('VariableDeclaration', token, kind=declaration['kind'],
+                                        declarations=declaration['declarations'])
+                return declaration
+            if keyword == 'function':
+                return self.parse_function(token, 'FunctionDeclaration')
+            if keyword == 'if':
+                return self.parse_if()
+            if keyword == 'for':
+                return self.parse_for()
+            if keyword == 'while':
+                self.advance()
+                self.expect('(')
+                test = self.parse_expression()
+                self.expect(')')
+                body = self.parse_statement()
+                return self.node('WhileStatement', token, test=test, body=body)
+            if keyword == 'do':
+                self.advance()
+                body = self.parse_statement()
+                self.expect('while')
+                self.expect('(')
+                test = self.parse_expression()
+                self.expect(')')
+                self.accept(';')
+                return self.node('DoWhileStatement', token, body=body, test=test)
+            if keyword == 'return':
+                self.advance()
+                argument = None
+                if not (self.at(';') or self.at('}') or self.token.type == _EOF or self.token.newline_before):
+                    argument = self.parse_expression()
+                self.consume_semicolon()
+                return self.node('ReturnStatement', token, argument=argument)
+            if keyword in ('break', 'continue'):
+                self.advance()
+                self.consume_semicolon()
+                return self.node('BreakStatement' if keyword == 'break' else 'ContinueStatement', token)
+            if keyword == 'throw':
+                self.advance()
+                argument = self.parse_expression()
+                self.consume_semicolon()
+                return self.node('ThrowStatement', token, argument=argument)
+            if keyword in ('switch', 'try', 'class', 'with', 'import', 'export', 'yield', 'async'):
+                self.error("Unsupported statement '{}'".format(keyword))
+
+        expression = self.parse_expression()
+        self.consume_semicolon()
+        return self.node('ExpressionStatement', token, expression=expression)
+
+    def parse_block(self):
+        start = self.expect('{')
+        body = []
+        while not self.at('}'):
+            if self.token.type == _EOF:
+                self.error("Expected '}'")
+            body.append(self.parse_statement())
+        self.advance()
+        return self.node('BlockStatement', start, body=body)
+
+    def parse_variable_declaration(self, allow_in=True):
+        start = self.advance()
+        declarations = []
+        while True:
+            id_token = self.token
+            if id_token.type != NAME:
+                self.error('Expected a variable name')
+            self.advance()
+            identifier = self.node('Identifier', id_token, name=id_token.value)
+            init = None
+            if self.accept('='):
+                init = self.parse_assignment(allow_in)
+            declarations.append(self.node('VariableDeclarator', id_token, id=identifier, init=init))
+            if not self.accept(','):
+                break
+        return self.node('VariableDeclaration', start, kind=start.value, declarations=declarations)
+
+    def parse_function(self, start, node_type):
+        self.expect('function')
+        identifier = None
+        if self.token.type == NAME:
+            id_token = self.advance()
+            identifier = self.node('Identifier', id_token, name=id_token.value)
+        elif node_type == 'FunctionDeclaration':
+            self.error('Expected a function name')
+        params = self.parse_params()
+        body = self.parse_block()
+        return self.node(node_type, start, id=identifier, params=params, body=body)
+
+    def parse_params(self):
+        self.expect('(')
+        params = []
+        while not self.at(')'):
+            token = self.token
+            if token.type != NAME:
+                self.error('Expected a parameter name')
+            self.advance()
+            params.append(self.node('Identifier', token, name=token.value))
+            if not self.accept(','):
+                break
+        self.expect(')')
+        return params
+
+    def parse_if(self):
+        start = self.advance()
+        self.expect('(')
+        test = self.parse_expression()
+        self.expect(')')
+        consequent = self.parse_statement()
+        alternate = None
+        if self.accept('else'):
+            alternate = self.parse_statement()
+        return self.node('IfStatement', start, test=test, consequent=consequent, alternate=alternate)
+
+    def parse_for(self):
+        start = self.advance()
+        self.expect('(')
+
+        init = None
+        if self.at('var') or self.at('let') or self.at('const'):
+            init = self.parse_variable_declaration(allow_in=False)
+        elif not self.at(';'):
+            init = self.parse_expression(allow_in=False)
+
+        if self.accept('in') or self.accept('of'):
+            node_type = 'ForInStatement' if self.tokens[self.index - 1].value == 'in' else 'ForOfStatement'
+            right = self.parse_expression()
+            self.expect(')')
+            body = self.parse_statement()
+            return self.node(node_type, start, left=init, right=right, body=body)
+
+        self.expect(';')
+        test = None if self.at(';') else self.parse_expression()
+        self.expect(';')
+        update = None if self.at(')') else self.parse_expression()
+        self.expect(')')
+        body = self.parse_statement()
+        return self.node('ForStatement', start, init=init, test=test, update=update, body=body)
+
+    # Expressions
+
+    def parse_expression(self, allow_in=True):
+        start = self.token
+        expression = self.parse_assignment(allow_in)
+        if not self.at(','):
+            return expression
+        expressions = [expression]
+        while self.accept(','):
+            expressions.append(self.parse_assignment(allow_in))
+        return self.node('SequenceExpression', start, expressions=expressions)
+
+    def parse_assignment(self, allow_in=True):
+        start = self.token
+        if self.is_arrow_function():
+            return self.parse_arrow_function()
+
+        left = self.parse_conditional(allow_in)
+        if self.token.type == PUNCT and self.token.value in ASSIGNMENT_OPERATORS:
+            if left['type'] not in ('Identifier', 'MemberExpression'):
+                self.error('Invalid assignment target')
+            operator = self.advance().value
+            right = self.parse_assignment(allow_in)
+            return self.node('AssignmentExpression', start, operator=operator, left=left, right=right)
+        return left
+
+    def is_arrow_function(self):
+        token = self.token
+        if token.type == NAME and self.peek().value == '=>':
+            return True
+        if not self.at('(', PUNCT):
+            return False
+        depth = 0
+        for offset in range(len(self.tokens) - self.index):
+            value = self.peek(offset).value
+            if self.peek(offset).type == PUNCT:
+                if value in ('(', '[', '{'):
+                    depth += 1
+                elif value in (')', ']', '}'):
+                    depth -= 1
+                    if depth == 0:
+                        return self.peek(offset + 1).value == '=>'
+            if self.peek(offset).type == _EOF:
+                return False
+        return False
+
+    def parse_arrow_function(self):
+        start = self.token
+        if start.type == NAME:
+            self.advance()
+            params = [self.node('Identifier', start, name=start.value)]
+        else:
+            params = self.parse_params()
+        self.expect('=>')
+        if self.at('{'):
+            body = self.parse_block()
+            expression = False
+        else:
+            body = self.parse_assignment()
+            expression = True
+        return self.node('ArrowFunctionExpression', start, id=None, params=params, body=body, expression=expression)
+
+    def parse_conditional(self, allow_in=True):
+        start = self.token
+        test = self.parse_binary(0, allow_in)
+        if not self.accept('?'):
+            return test
+        consequent = self.parse_assignment()
+        self.expect(':')
+        alternate = self.parse_assignment(allow_in)
+        return self.node('ConditionalExpression', start, test=test, consequent=consequent, alternate=alternate)
+
+    def parse_binary(self, min_precedence, allow_in=True):
+        start = self.token
+        left = self.parse_unary()
+        while True:
+            token = self.token
+            if token.type not in (PUNCT, NAME) or token.value not in BINARY_PRECEDENCE:
+                return left
+            if token.type == NAME and token.value not in ('instanceof', 'in'):
+                return left
+            if token.value == 'in' and not allow_in:
+                return left
+            precedence = BINARY_PRECEDENCE[token.value]
+            if precedence < min_precedence:
+                return left
+            self.advance()
+            right = self.parse_binary(precedence if token.value == '**' else precedence + 1, allow_in)
+            node_type = 'LogicalExpression' if token.value in ('||', '&&', '??') else 'BinaryExpression'
+            left = self.node(node_type, start, operator=token.value, left=left, right=right)
+
+    def parse_unary(self):
+        start = self.token
+        if start.value in UNARY_OPERATORS and start.type in (PUNCT, NAME):
+            self.advance()
+            argument = self.parse_unary()
+            return self.node('UnaryExpression', start, operator=start.value, prefix=True, argument=argument)
+        if start.type == PUNCT and start.value in ('++', '--'):
+            self.advance()
+            argument = self.parse_unary()
+            return self.node('UpdateExpression', start, operator=start.value, prefix=True, argument=argument)
+
+        expression = self.parse_postfix()
+        token = self.token
+        if token.type == PUNCT and token.value in ('++', '--') and not token.newline_before:
+            self.advance()
+            return self.node('UpdateExpression', start, operator=token.value, prefix=False, argument=expression)
+        return expression
+
+    def parse_postfix(self):
+        start = self.token
+        if self.at('new', NAME):
+            self.advance()
+            callee = self.parse_member(self.parse_primary(), start, allow_call=False)
+            arguments = self.parse_arguments() if self.at('(') else []
+            expression = self.node('NewExpression', start, callee=callee, arguments=arguments)
+        else:
+            expression = self.parse_primary()
+        return self.parse_member(expression, start, allow_call=True)
+
+    def parse_member(self, expression, start, allow_call):
+        while True:
+            if self.at('.'):
+                dot = self.advance()
+                token = self.token
+                if token.type != NAME:
+                    self.error('Expected a property name')
+                self.advance()
+                prop = self.node('Identifier', token, name=token.value)
+                expression = self.node('MemberExpression', start, object=expression, property=prop, computed=False,
+                                       dot_line=dot.line)
+            elif self.at('['):
+                self.advance()
+                prop = self.parse_expression()
+                self.expect(']')
+                expression = self.node('MemberExpression', start, object=expression, property=prop, computed=True)
+            elif allow_call and self.at('('):
+                arguments = self.parse_arguments()
+                expression = self.node('CallExpression', start, callee=expression, arguments=arguments)
+            else:
+                return expression
+
+    def parse_arguments(self):
+        self.expect('(')
+        arguments = []
+        while not self.at(')'):
+            arguments.append(self.parse_assignment())
+            if not self.accept(','):
+                break
+        self.expect(')')
+        return arguments
+
+    def parse_primary(self):
+        token = self.token
+        if token.type == NAME:
+            if token.value == 'function':
+                return self.parse_function(token, 'FunctionExpression')
+            if token.value in ('true', 'false', 'null'):
+                self.advance()
+                value = {'true': True, 'false': False, 'null': None}[token.value]
+                return self.node('Literal', token, value=value, raw=token.value)
+            if token.value == 'this':
+                self.advance()
+                return self.node('ThisExpression', token)
+            self.advance()
+            return self.node('Identifier', token, name=token.value)
+        if token.type in (STRING, NUMBER):
+            self.advance()
+            return self.node('Literal', token, value=None, raw=token.value)
+        if token.type == REGEX:
+            self.advance()
+            pattern, _, flags = token.value[1:].rpartition('/')
+            return self.node('Literal', token, value=None, raw=token.value, regex={'pattern': pattern, 'flags': flags})
+        if token.type == TEMPLATE:
+            self.advance()
+            return self.parse_template(token)
+        if token.type == PUNCT:
+            if token.value == '(':
+                self.advance()
+                expression = self.parse_expression()
+                self.expect(')')
+                expression['parenthesized'] = True
+                return expression
+            if token.value == '[':
+                return self.parse_array()
+            if token.value == '{':
+                return self.parse_object()
+        self.error('Unexpected token')
+
+    def parse_array(self):
+        start = self.expect('[')
+        elements = []
+        while not self.at(']'):
+            if self.at(','):
+                self.error('Array holes are not supported')
+            elements.append(self.parse_assignment())
+            if not self.accept(','):
+                break
+        self.expect(']')
+        return self.node('ArrayExpression', start, elements=elements)
+
+    def parse_object(self):
+        start = self.expect('{')
+        properties = []
+        while not self.at('}'):
+            key_token = self.token
+            if key_token.type in (NAME, STRING, NUMBER):
+                self.advance()
+                if key_token.type == NAME:
+                    key = self.node('Identifier', key_token, name=key_token.value)
+                else:
+                    key = self.node('Literal', key_token, value=None, raw=key_token.value)
+            else:
+                self.error('Expected a property name')
+
+            if self.accept(':'):
+                value = self.parse_assignment()
+                shorthand = False
+            elif key_token.type == NAME and (self.at(',') or self.at('}')):
+                value = key
+                shorthand = True
+            else:
+                self.error("Expected ':'")
+            properties.append(self.node('Property', key_token, key=key, value=value, kind='init',
+                                        shorthand=shorthand, computed=False))
+            if not self.accept(','):
+                break
+        self.expect('}')
+        return self.node('ObjectExpression', start, properties=properties)
+
+    def parse_template(self, token):
+        """Parse a template literal into its string parts (quasis) and the expressions in between."""
+        text = token.value[1:-1] if token.value.endswith('`') and len(token.value) > 1 else token.value[1:]
+        quasis = []
+        expressions = []
+        current = ''
+        index = 0
+        while index < len(text):
+            if text[index] == '\\':
+                current += text[index:index + 2]
+                index += 2
+            elif text.startswith('${', index):
+                depth = 0
+                end = index + 2
+                while end < len(text) and not (text[end] == '}' and depth == 0):
+                    depth += {'{': 1, '}': -1}.get(text[end], 0)
+                    end += 1
+                quasis.append(current)
+                current = ''
+                inner_tokens, _ = lex(text[index + 2:end])
+                expressions.append(Parser(inner_tokens, text[index + 2:end]).parse_expression())
+                index = end + 1
+            else:
+                current += text[index]
+                index += 1
+        quasis.append(current)
+        return self.node('TemplateLiteral', token, quasis=quasis, expressions=expressions)
@@ -0,0 +1,290 @@
+''' Tokenize Google Earth Engine JavaScript and rewrite it at the token level.
+
+To tokenize an Earth Engine JavaScript: tokenize(source)
+To apply the JavaScript to Python rewrite rules to a token stream: rewrite_tokens(tokens)
+
+'''
+
+# License: MIT
+
+import re
+from collections import namedtuple
+
+
+Token = namedtuple('Token', ['type', 'value'])
+
+NEWLINE = 'newline'
+WHITESPACE = 'whitespace'
+COMMENT = 'comment'
+BLOCK_COMMENT = 'block_comment'
+STRING = 'string'
+TEMPLATE = 'template'
+REGEX = 'regex'
+NUMBER = 'number'
+NAME = 'name'
+PUNCT = 'punct'
+
+_TOKEN_PATTERN = re.compile(r'''
+    (?P<newline>\r\n|\n|\r)
+  | (?P<whitespace>[ \t\f\v\u00a0\ufeff]+)
+  | (?P<comment>//[^\r\n]*)
+  | (?P<block_comment>/\*[\s\S]*?(?:\*/|\Z))
+  | (?P<string>"(?:[^"\\\r\n]|\\[\s\S])*"?|'(?:[^'\\\r\n]|\\[\s\S])*'?)
+  | (?P<template>`(?:[^`\\]|\\[\s\S])*`?)
+  | (?P<number>0[xXoObB][0-9a-fA-F_]+|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*)
+  | (?P<punct>>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|=>|==|!=|<=|>=|&&|\|\||\?\?|\+\+|--|[-+*/%&|^]=|<<|>>|\*\*|[\s\S])
+''', re.VERBOSE)
+
+_REGEX_PATTERN = re.compile(r'/(?:[^/\\\r\n\[]|\\.|\[(?:[^\]\\\r\n]|\\.)*\])+/[A-Za-z]*')
+
+# A slash after any of these tokens starts a regular expression literal rather than a division.
+_REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else'}
+
+_SKIP = (WHITESPACE, NEWLINE, COMMENT, BLOCK_COMMENT)
+
+
+def tokenize(source):
+    """Split an Earth Engine JavaScript into a list of tokens in a single pass.
+
+    Whitespace, newlines and comments are kept as tokens so that joining the values of all tokens
+    reproduces the source exactly.
+
+    Args:
+        source (str): The JavaScript source code.
+
+    Returns:
+        list: List of Token(type, value) tuples.
+    """
+    tokens = []
+    make_token = tuple.__new__
+    finditer = _TOKEN_PATTERN.finditer
+    pos = 0
+
+    while True:
+        chunk = [make_token(Token, (m.lastgroup, m.group())) for m in finditer(source, pos)]
+
+        # A slash is tokenized as a division by default. Regular expression literals are rare in Earth Engine
+        # scripts, so only the slashes are revisited here, and the scan restarts after a regex literal.
+        regex = None
+        for index in [i for i, token in enumerate(chunk) if token[1] == '/']:
+            if _regex_allowed(_previous_significant(tokens, chunk, index)):
+                start = pos + sum(len(token[1]) for token in chunk[:index])
+                regex = _REGEX_PATTERN.match(source, start)
+                if regex is not None:
+                    break
+
+        if regex is None:
+            tokens.extend(chunk)
+            return tokens
+
+        tokens.extend(chunk[:index])
+        tokens.append(Token(REGEX, regex.group()))
+        pos = regex.end()
+
+
+def _previous_significant(tokens, chunk, index):
+    """Return the last token before chunk[index] that is not whitespace, a newline or a comment, or None."""
+    for token in reversed(chunk[:index]):
+        if token.type not in _SKIP:
+            return token
+    for token in reversed(tokens):
+        if token.type not in _SKIP:
+            return token
+    return None
+
+
+def _regex_allowed(prev):
+    if prev is None:
+        return True
+    if prev.type == PUNCT:
+        return prev.value not in (')', ']', '}')
+    if prev.type == NAME:
+        return prev.value in _REGEX_KEYWORDS
+    return False
+
+
+def tokens_to_lines(tokens):
+    """Join a token stream back into a list of lines, each ending with a newline character.
+
+    Args:
+        tokens (list): List of tokens.
+
+    Returns:
+        list: List of lines.
+    """
+    return ''.join([token[1] for token in tokens]).splitlines(True)
+
+
+# The token values and types the rewrite passes act on.
+_KEYWORDS = {'var', 'new', 'true', 'false', 'null', 'or', 'and', 'not', 'Math', 'visualize', ';'}
+_COMMENTS = (COMMENT, BLOCK_COMMENT)
+
+
+def index_tokens(tokens):
+    """Index the positions of the tokens that the rewrite passes act on.
+
+    Args:
+        tokens (list): List of tokens.
+
+    Returns:
+        dict: Mapping of a token value (or the comment token types) to the list of its positions.
+    """
+    index = {}
+    for position in [i for i, token in enumerate(tokens) if token[1] in _KEYWORDS or token[0] in _COMMENTS]:
+        token_type, value = tokens[position]
+        key = token_type if token_type in _COMMENTS else value
+        index.setdefault(key, []).append(position)
+    return index
+
+
+def _remove(tokens, position):
+    """Blank out a token in place, so that the positions of the other tokens do not change."""
+    tokens[position] = Token(WHITESPACE, '')
+
+
+def _next_significant(tokens, position):
+    """Return the position of the first token after position that is not whitespace, or -1."""
+    for i in range(position + 1, len(tokens)):
+        if tokens[i].type != WHITESPACE:
+            return i
+    return -1
+
+
+def strip_color_comments(tokens, index):
+    """Remove the inline '/* color: #ff0000 */' comments inserted by the Code Editor geometry imports.
+
+    The imports are declared at the top level, so the indentation of the line holding the comment is removed as well.
+    """
+    for position in index.get(BLOCK_COMMENT, []):
+        value = tokens[position].value
+        if value.startswith('/* color') and '\n' not in value:
+            _remove(tokens, position)
+            line_start = position
+            while line_start > 0 and tokens[line_start - 1].type != NEWLINE:
+                line_start -= 1
+            if tokens[line_start].type == WHITESPACE:
+                _remove(tokens, line_start)
+
+
+def remove_keywords(tokens, index):
+    """Remove the 'var' declarations and the 'new' operator, which have no Python equivalent."""
+    for position in index.get('var', []) + index.get('new', []):
+        if tokens[position].type == NAME:
+            _remove(tokens, position)
+            if position + 1 < len(tokens) and tokens[position + 1].type == WHITESPACE:
+                _remove(tokens, position + 1)
+
+
+def convert_literals(tokens, index):
+    """Convert the JavaScript true/false/null literals to True/False/{}."""
+    literals = {'true': 'True', 'false': 'False', 'null': '{}'}
+    for literal, value in literals.items():
+        for position in index.get(literal, []):
+            if tokens[position].type == NAME:
+                tokens[position] = Token(NAME, value)
+
+
+def convert_logical_methods(tokens, index):
+    """Convert the .or()/.and()/.not() methods to .Or()/.And()/.Not(), since or/and/not are Python keywords."""
+    methods = {'or': 'Or', 'and': 'And', 'not': 'Not'}
+    for method, value in methods.items():
+        for position in index.get(method, []):
+            if position > 0 and tokens[position].type == NAME and tokens[position - 1] == (PUNCT, '.'):
+                tokens[position] = Token(NAME, value)
+
+
+def convert_math(tokens, index):
+    """Convert the JavaScript Math library (e.g., Math.PI, Math.pow) to the Python math module."""
+    for position in index.get('Math', []):
+        if tokens[position].type == NAME and tokens[position + 1:position + 2] == [(PUNCT, '.')]:
+            tokens[position] = Token(NAME, 'math')
+            if tokens[position + 2:position + 3] == [(NAME, 'PI')]:
+                tokens[position + 2] = Token(NAME, 'pi')
+
+
+def convert_visualize_params(tokens, index):
+    """Unpack the dictionary passed to image.visualize({...}) as keyword arguments."""
+    for position in index.get('visualize', []):
+        if tokens[position + 1:position + 3] == [(PUNCT, '('), (PUNCT, '{')]:
+            tokens[position + 2] = Token(PUNCT, '**{')
+
+
+def remove_semicolons(tokens, index):
+    """Remove the semicolons ending a statement, i.e., followed only by whitespace or a comment on the same line."""
+    for position in index.get(';', []):
+        if tokens[position].type == PUNCT:
+            next_position = _next_significant(tokens, position)
+            if next_position == -1 or tokens[next_position].type in (NEWLINE, COMMENT, BLOCK_COMMENT):
+                _remove(tokens, position)
+
+
+def convert_comments(tokens, index):
+    """Convert JavaScript line and block comments to Python comments."""
+    for position in index.get(COMMENT, []):
+        tokens[position] = Token(COMMENT, '#' + tokens[position].value[2:])
+
+    for position in index.get(BLOCK_COMMENT, []):
+        token = tokens[position]
+        if token.type != BLOCK_COMMENT:  # already removed by strip_color_comments
+            continue
+        text = token.value[2:]
+        if text.endswith('*/'):
+            text = text[:-2]
+        lines = text.split('\n')
+        for line_index in range(1, len(lines)):
+            line = lines[line_index]
+            stripped = line.lstrip()
+            padding = line[:len(line) - len(stripped)]
+            if stripped.startswith('*'):
+                lines[line_index] = padding + '#' + stripped[1:]
+            elif stripped:
+                lines[line_index] = padding + '# ' + stripped
+        tokens[position] = Token(BLOCK_COMMENT, '#' + '\n'.join(lines))
+
+
+REWRITE_PASSES = (
+    strip_color_comments,
+    remove_keywords,
+    convert_literals,
+    convert_logical_methods,
+    convert_math,
+    convert_visualize_params,
+    remove_semicolons,
+    convert_comments,
+)
+
+
+def rewrite_tokens(tokens, passes=REWRITE_PASSES):
+    """Apply the JavaScript to Python rewrite rules to a token stream.
+
+    The positions of the tokens the rules act on are indexed once, and each pass only visits those positions.
+    Removed tokens are blanked out rather than deleted, so the index stays valid across passes.
+
+    Args:
+        tokens (list): List of tokens returned by tokenize().
+        passes (tuple, optional): The token-level passes to apply in order. Defaults to REWRITE_PASSES.
+
+    Returns:
+        list: List of rewritten tokens.
+    """
+    tokens = list(tokens)
+    index = index_tokens(tokens)
+    for rewrite_pass in passes:
+        rewrite_pass(tokens, index)
+    return tokens
+
+
+def uses_math(tokens):
+    """Check if a token stream uses the JavaScript Math library.
+
+    Args:
+        tokens (list): List of tokens.
+
+    Returns:
+        bool: Returns True if the tokens contain 'Math.'. For example 'Math.PI', 'Math.pow'
+    """
+    for index in [i for i, token in enumerate(tokens) if token[1] == 'Math']:
+        if tokens[index].type == NAME and tokens[index + 1:index + 2] == [(PUNCT, '.')]:
+            return True
+    return False
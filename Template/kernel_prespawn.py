@@ -0,0 +1,540 @@
+''' Pre-spawn kernels for the most visited notebooks, within a memory budget, and cull the ones no longer needed.
+
+To count the visits of the live notebooks: stats = RequestStats('.voila_request_stats.json'); stats.record(path)
+To get the Voila options that keep kernels ready for the most visited notebooks:
+    voila_prespawn_args(PrespawnPolicy(stats, memory_budget=2048 * MB).pool_sizes())
+To replay visits against local kernels with a stand-in ee module, and print the hit rate and spawn latency:
+    python kernel_prespawn.py --input .. --python-path stub_dir --visits 200 --memory-budget 1024
+
+Visits are counted per notebook with an exponential decay, so that the ranking follows what is popular now.
+PrespawnPolicy splits the kernels that fit in the memory budget between the most visited notebooks, in proportion to
+their visits, and falls back to DEFAULT_NOTEBOOKS when there are no visits yet. Voila pre-heats that many kernels per
+notebook (--preheat_kernel, Voila 0.3 or later); snapshot_server.py records the visits and passes the options on.
+PrespawnPool applies the same policy to local kernels (see notebook_executor.KernelProcess): each kernel imports the
+modules of its notebook before the visit, a visit served by a waiting kernel is a hit, and the spare kernels of the
+least visited notebooks are shut down first when the kernels use more memory than the budget.
+
+'''
+
+# License: MIT
+
+import os
+import ast
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from notebook_executor import KernelProcess, get_notebooks
+
+
+MB = 1024 * 1024
+# The examples visited the most, which get kernels before any visit has been counted.
+DEFAULT_NOTEBOOKS = ('GetStarted/01_hello_world.ipynb', 'GetStarted/02_adding_data.ipynb',
+                     'GetStarted/03_finding_images.ipynb', 'Visualization/image_rgb_composite.ipynb',
+                     'Visualization/ndvi_symbology.ipynb', 'Visualization/landsat_symbology.ipynb')
+
+
+class RequestStats(object):
+    """Visit counts per notebook, decayed exponentially with time.
+
+    Args:
+        stats_file (str, optional): File path of the JSON file the counts are kept in. Defaults to None, which keeps
+            them in memory only.
+        half_life (float, optional): Seconds after which a visit counts half. Defaults to 86400 (one day).
+    """
+
+    def __init__(self, stats_file=None, half_life=86400):
+        self.stats_file = stats_file
+        self.half_life = half_life
+        self.scores = {}
+        self._lock = threading.Lock()
+
+        if stats_file is not None and os.path.isfile(stats_file):
+            try:
+                with open(stats_file) as f:
+                    self.scores = {path: tuple(score) for path, score in json.load(f).items()}
+            except (ValueError, OSError, TypeError):
+                print('Ignoring the corrupted request stats {}'.format(stats_file))
+
+    def _decayed(self, score, updated, now):
+        return score * math.exp(-math.log(2) * max(0.0, now - updated) / self.half_life)
+
+    def record(self, path, now=None):
+        """Count a visit of a notebook.
+
+        Args:
+            path (str): The notebook path, relative to the folder served by Voila.
+            now (float, optional): The time of the visit (time.time()). Defaults to None, which uses the current time.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            score, updated = self.scores.get(path, (0.0, now))
+            self.scores[path] = (self._decayed(score, updated, now) + 1.0, now)
+
+    def ranking(self, now=None):
+        """Get the notebooks by decreasing number of recent visits.
+
+        Args:
+            now (float, optional): The current time. Defaults to None.
+
+        Returns:
+            list: The (path, score) pairs.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            scores = [(path, self._decayed(score, updated, now)) for path, (score, updated) in self.scores.items()]
+        return sorted(scores, key=lambda item: (-item[1], item[0]))
+
+    def save(self):
+        """Write the counts to the stats file."""
+        if self.stats_file is None:
+            return
+        with self._lock:
+            scores = dict(self.scores)
+        tmp_file = self.stats_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(scores, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.stats_file)
+
+
+class PrespawnPolicy(object):
+    """Decide how many kernels to keep ready for each notebook.
+
+    Args:
+        stats (RequestStats): The visit counts.
+        memory_budget (int, optional): Bytes of memory all pre-spawned kernels may use. Defaults to 1 GiB.
+        kernel_memory (int, optional): Bytes of memory of a kernel with the notebook modules imported. Defaults to
+            250 MiB.
+        max_per_notebook (int, optional): Maximum number of kernels ready for one notebook. Defaults to 2.
+        min_share (float, optional): Minimum share of the recent visits a notebook needs to get a kernel, once
+            visits have been counted. Defaults to 0.02.
+        default_notebooks (tuple, optional): Notebooks ranked after the visited ones. Defaults to DEFAULT_NOTEBOOKS.
+    """
+
+    def __init__(self, stats, memory_budget=1024 * MB, kernel_memory=250 * MB, max_per_notebook=2, min_share=0.02,
+                 default_notebooks=DEFAULT_NOTEBOOKS):
+        self.stats = stats
+        self.memory_budget = memory_budget
+        self.kernel_memory = kernel_memory
+        self.max_per_notebook = max_per_notebook
+        self.min_share = min_share
+        self.default_notebooks = default_notebooks
+
+    def slots(self):
+        """Get the number of kernels that fit in the memory budget."""
+        return int(self.memory_budget // max(1, self.kernel_memory))
+
+    def pool_sizes(self, now=None):
+        """Split the kernels that fit in the memory budget between the most visited notebooks.
+
+        Each notebook gets kernels in proportion to its share of the recent visits, at least one and at most
+        max_per_notebook, in the order of the ranking until the budget is used. The default notebooks get one kernel
+        each from the remaining budget.
+
+        Args:
+            now (float, optional): The current time. Defaults to None.
+
+        Returns:
+            dict: Mapping of the notebook paths to their number of kernels.
+        """
+        slots = self.slots()
+        ranking = self.stats.ranking(now)
+        total = sum(score for _, score in ranking)
+        sizes = {}
+        for path, score in ranking:
+            if slots <= 0 or score / total < self.min_share:
+                break
+            size = min(self.max_per_notebook, slots, max(1, int(round(score / total * self.slots()))))
+            sizes[path] = size
+            slots -= size
+        for path in self.default_notebooks:
+            if slots <= 0:
+                break
+            if path not in sizes:
+                sizes[path] = 1
+                slots -= 1
+        return sizes
+
+    def rank(self, path, now=None):
+        """Get the position of a notebook in the ranking, for eviction: the higher, the sooner it is evicted.
+
+        Args:
+            path (str): The notebook path.
+            now (float, optional): The current time. Defaults to None.
+
+        Returns:
+            int: The position.
+        """
+        order = [item[0] for item in self.stats.ranking(now)]
+        order += [item for item in self.default_notebooks if item not in order]
+        return order.index(path) if path in order else len(order)
+
+
+def voila_prespawn_args(pool_sizes, fill_delay=1):
+    """Get the Voila options that keep kernels ready for notebooks.
+
+    Args:
+        pool_sizes (dict): Mapping of the notebook paths, relative to the folder served by Voila, to their number of
+            kernels, see PrespawnPolicy.pool_sizes().
+        fill_delay (float, optional): Seconds Voila waits before starting a kernel to replace a used one.
+            Defaults to 1.
+
+    Returns:
+        list: The command line options.
+    """
+    config = {path: {'pool_size': size} for path, size in pool_sizes.items()}
+    config['default'] = {'pool_size': 0}
+    return ['--preheat_kernel=True', '--VoilaKernelManager.kernel_pools_config={}'.format(json.dumps(config)),
+            '--VoilaKernelManager.fill_delay={}'.format(fill_delay)]
+
+
+def notebook_imports(in_file):
+    """Get the top-level modules imported by the code cells of a notebook.
+
+    Args:
+        in_file (str): File path of the notebook.
+
+    Returns:
+        tuple: The module names, in the order they are imported.
+    """
+    with open(in_file, encoding='utf-8') as f:
+        notebook = json.load(f)
+    modules = []
+    for cell in notebook['cells']:
+        if cell['cell_type'] != 'code':
+            continue
+        source = ''.join(cell['source'])
+        lines = [line for line in source.splitlines() if not line.lstrip().startswith(('%', '!'))]
+        try:
+            tree = ast.parse('\n'.join(lines))
+        except SyntaxError:
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = name.split('.')[0]
+                if module not in modules:
+                    modules.append(module)
+    return tuple(modules)
+
+
+def process_rss(pid):
+    """Get the resident memory of a process in bytes, or 0 if it is unknown.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        int: The resident memory.
+    """
+    try:
+        with open('/proc/{}/statm'.format(pid)) as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class PrespawnPool(object):
+    """Local kernels kept ready for the notebooks chosen by a PrespawnPolicy.
+
+    Args:
+        policy (PrespawnPolicy): The policy.
+        in_dir (str): The folder of the notebooks, which the notebook paths are relative to.
+        python_path (list, optional): Folders prepended to sys.path of the kernels. Defaults to None.
+        getinfo_cache (str, optional): File path of the SQLite getInfo() cache of the kernels. Defaults to None.
+    """
+
+    def __init__(self, policy, in_dir, python_path=None, getinfo_cache=None):
+        self.policy = policy
+        self.in_dir = in_dir
+        self.python_path = python_path
+        self.getinfo_cache = getinfo_cache
+        self.standby = {}
+        self.active = set()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.culled = 0
+        self.spawn_latencies = []
+        self.wait_times = []
+        self.peak_memory = 0
+        self._imports = {}
+        self._lock = threading.Lock()
+
+    def _spawn(self, path):
+        if path not in self._imports:
+            self._imports[path] = notebook_imports(os.path.join(self.in_dir, path))
+        kernel = KernelProcess(self.python_path, self._imports[path], self.getinfo_cache)
+        kernel.path = path
+        return kernel
+
+    def _record_ready(self, kernel, timeout=60):
+        # Only this thread reads the ready message of the kernel; acquire() waits for the event.
+        if kernel.wait_ready(timeout):
+            with self._lock:
+                self.spawn_latencies.append(kernel.startup_time)
+        kernel.ready.set()
+
+    def kernels(self):
+        """Get all kernels, the ones waiting for a visit and the ones in use."""
+        with self._lock:
+            return [kernel for kernels in self.standby.values() for kernel in kernels] + list(self.active)
+
+    def memory(self):
+        """Get the resident memory of all kernels in bytes, estimated with policy.kernel_memory when unknown."""
+        memory = sum(process_rss(kernel.pid) or self.policy.kernel_memory for kernel in self.kernels())
+        self.peak_memory = max(self.peak_memory, memory)
+        return memory
+
+    def fill(self):
+        """Start the kernels the policy asks for, and shut the ones it no longer asks for down.
+
+        The kernels start in the background, and their spawn latency is recorded once they are ready. The memory of
+        the ready kernels updates policy.kernel_memory, so that the policy asks for as many kernels as fit.
+        """
+        measured = [process_rss(kernel.pid) for kernel in self.kernels() if kernel.startup_time is not None]
+        measured = [rss for rss in measured if rss]
+        if measured:
+            self.policy.kernel_memory = sum(measured) / len(measured)
+        sizes = self.policy.pool_sizes()
+        spawned = []
+        culled = []
+        with self._lock:
+            for path in list(self.standby):
+                extra = len(self.standby[path]) - sizes.get(path, 0)
+                for _ in range(max(0, extra)):
+                    culled.append(self.standby[path].pop())
+                if not self.standby[path]:
+                    del self.standby[path]
+            self.culled += len(culled)
+            for path, size in sizes.items():
+                if not os.path.isfile(os.path.join(self.in_dir, path)):
+                    continue
+                kernels = self.standby.setdefault(path, [])
+                while len(kernels) < size:
+                    kernel = self._spawn(path)
+                    kernel.ready = threading.Event()
+                    kernels.append(kernel)
+                    spawned.append(kernel)
+        for kernel in culled:
+            threading.Thread(target=kernel.close, daemon=True).start()
+        for kernel in spawned:
+            threading.Thread(target=self._record_ready, args=(kernel,), daemon=True).start()
+        self.enforce_memory()
+
+    def enforce_memory(self):
+        """Shut the waiting kernels of the least visited notebooks down while the kernels use more than the budget.
+
+        The kernels are larger than policy.kernel_memory when that happens, so it is raised to their mean memory, and
+        the next fill() does not start the kernels again.
+
+        Returns:
+            int: Number of kernels shut down.
+        """
+        evicted = 0
+        memory = self.memory()
+        kernels = self.kernels()
+        if memory > self.policy.memory_budget and kernels:
+            self.policy.kernel_memory = max(self.policy.kernel_memory, memory / len(kernels))
+        while memory > self.policy.memory_budget:
+            with self._lock:
+                if not self.standby:
+                    break
+                path = max(self.standby, key=self.policy.rank)
+                kernel = self.standby[path].pop()
+                if not self.standby[path]:
+                    del self.standby[path]
+                self.evicted += 1
+            if kernel.startup_time is None:
+                kernel.kill()
+            else:
+                threading.Thread(target=kernel.close, daemon=True).start()
+            evicted += 1
+            memory = self.memory()
+        return evicted
+
+    def acquire(self, path, timeout=60):
+        """Take a kernel for a visit of a notebook, a waiting one if there is one, or a new one.
+
+        Args:
+            path (str): The notebook path.
+            timeout (float, optional): Seconds to wait for the kernel to be ready. Defaults to 60.
+
+        Returns:
+            tuple: The KernelProcess (None if it failed to start) and whether a waiting kernel was used.
+        """
+        start_time = time.perf_counter()
+        with self._lock:
+            kernels = self.standby.get(path)
+            kernel = kernels.pop(0) if kernels else None
+            if kernels is not None and not kernels:
+                del self.standby[path]
+            hit = kernel is not None
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if kernel is None:
+            kernel = self._spawn(path)
+            ready = kernel.wait_ready(timeout)
+            if ready:
+                with self._lock:
+                    self.spawn_latencies.append(kernel.startup_time)
+        else:
+            ready = kernel.ready.wait(timeout) and kernel.startup_time is not None
+        with self._lock:
+            self.wait_times.append(time.perf_counter() - start_time)
+        if not ready:
+            kernel.kill()
+            return None, hit
+        with self._lock:
+            self.active.add(kernel)
+        self.enforce_memory()
+        return kernel, hit
+
+    def release(self, kernel):
+        """Shut the kernel of a finished visit down, like Voila does when the page is closed."""
+        if kernel is None:
+            return
+        with self._lock:
+            self.active.discard(kernel)
+        threading.Thread(target=kernel.close, daemon=True).start()
+
+    def close(self):
+        """Shut all kernels down."""
+        for kernel in self.kernels():
+            kernel.close()
+        with self._lock:
+            self.standby.clear()
+            self.active.clear()
+
+    def stats(self):
+        """Get the counters of the pool.
+
+        Returns:
+            dict: The hits, misses and hit_rate of the visits, the spawn latency and the time visitors waited for a
+                kernel (mean and 95th percentile, in seconds), the kernels evicted for memory and culled by the
+                policy, and the peak memory of the kernels in bytes.
+        """
+        with self._lock:
+            visits = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / visits if visits else 0.0,
+                'spawn_latency_mean': sum(self.spawn_latencies) / len(self.spawn_latencies)
+                if self.spawn_latencies else 0.0,
+                'spawn_latency_p95': _percentile(self.spawn_latencies, 0.95),
+                'wait_mean': sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0.0,
+                'wait_p95': _percentile(self.wait_times, 0.95),
+                'evicted': self.evicted,
+                'culled': self.culled,
+                'peak_memory': self.peak_memory,
+            }
+
+
+def synthetic_visits(notebooks, count, favorites=DEFAULT_NOTEBOOKS, skew=1.2, seed=0):
+    """Draw notebook visits from a Zipf-like distribution, the favorites being the most visited.
+
+    Args:
+        notebooks (list): The notebook paths.
+        count (int): Number of visits.
+        favorites (tuple, optional): The most visited notebooks. Defaults to DEFAULT_NOTEBOOKS.
+        skew (float, optional): The exponent of the distribution. Defaults to 1.2.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        list: The notebook paths of the visits.
+    """
+    rng = random.Random(seed)
+    others = [path for path in notebooks if path not in favorites]
+    rng.shuffle(others)
+    order = [path for path in favorites if path in notebooks] + others
+    weights = [1.0 / (rank + 1) ** skew for rank in range(len(order))]
+    return rng.choices(order, weights, k=count)
+
+
+def replay(pool, visits, interval=0.5, execute=False, timeout=600):
+    """Replay notebook visits against a pool, refilling it after each visit.
+
+    Args:
+        pool (PrespawnPool): The pool.
+        visits (list): The notebook paths of the visits.
+        interval (float, optional): Seconds between two visits. Defaults to 0.5.
+        execute (bool, optional): Whether to execute the notebook of each visit in its kernel. Defaults to False.
+        timeout (float, optional): Seconds allowed per notebook. Defaults to 600.
+
+    Returns:
+        dict: The counters of the pool, see PrespawnPool.stats().
+    """
+    pool.fill()
+    for i, path in enumerate(visits):
+        time.sleep(interval)
+        pool.policy.stats.record(path)
+        kernel, hit = pool.acquire(path)
+        if execute and kernel is not None:
+            kernel.execute(os.path.join(pool.in_dir, path), allow_errors=True, timeout=timeout)
+        pool.release(kernel)
+        pool.fill()
+    return pool.stats()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Replay notebook visits against pre-spawned local kernels.')
+    parser.add_argument('--input', type=str, required=True,
+                        help="Path to the folder of the notebooks")
+    parser.add_argument('--visits', type=int, default=100,
+                        help="Number of visits, drawn from a Zipf-like distribution unless --trace is given")
+    parser.add_argument('--trace', type=str,
+                        help="Path to a text file with the notebook path of one visit per line")
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help="Seconds between two visits")
+    parser.add_argument('--memory-budget', type=int, default=1024,
+                        help="Megabytes of memory the kernels may use (0 to pre-spawn nothing)")
+    parser.add_argument('--kernel-memory', type=int, default=250,
+                        help="Estimated megabytes of memory of a kernel")
+    parser.add_argument('--stats', type=str,
+                        help="Path to the JSON visit counts, which are read and updated")
+    parser.add_argument('--python-path', action='append', default=[],
+                        help="Folder prepended to sys.path of the kernels, e.g., holding a stand-in ee module")
+    parser.add_argument('--execute', action='store_true',
+                        help="Execute the notebook of each visit")
+    args = parser.parse_args()
+
+    in_dir = os.path.abspath(args.input)
+    if args.trace:
+        with open(args.trace) as f:
+            visits = [line.strip() for line in f if line.strip()]
+    else:
+        notebooks = [Path(os.path.relpath(file, in_dir)).as_posix() for file in get_notebooks(in_dir)]
+        visits = synthetic_visits(notebooks, args.visits)
+
+    stats = RequestStats(args.stats)
+    policy = PrespawnPolicy(stats, args.memory_budget * MB, args.kernel_memory * MB)
+    pool = PrespawnPool(policy, in_dir, [os.path.abspath(path) for path in args.python_path])
+    try:
+        result = replay(pool, visits, args.interval, args.execute)
+    finally:
+        pool.close()
+        stats.save()
+    print('{} visits: {hits} hits, {misses} misses, hit rate {hit_rate:.0%}'.format(len(visits), **result))
+    print('Spawn latency: {spawn_latency_mean:.2f} s mean, {spawn_latency_p95:.2f} s p95'.format(**result))
+    print('Wait for a kernel: {wait_mean:.2f} s mean, {wait_p95:.2f} s p95'.format(**result))
+    print('Peak kernel memory: {:.0f} MB, {} kernels evicted for memory, {} culled'.format(
+        result['peak_memory'] / MB, result['evicted'], result['culled']))
@@ -0,0 +1,32 @@
+''' A stand-in ee module that computes images locally with local_image, to run the band math examples offline.
+
+To execute the examples with it: python notebook_executor.py --input ../GetStarted --python-path local_ee
+
+ee.Image('LANDSAT/...') reads the local copy of the asset from local_image.DATA_DIR (see local_image.py). The
+functions that the local backend does not have (e.g., ee.ImageCollection or ee.Reducer) raise an AttributeError that
+names them, so the examples that need Earth Engine fail on their first unsupported call.
+
+'''
+
+# License: MIT
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_image import Image, Geometry, Kernel, Terrain, Algorithms  # noqa: E402,F401
+
+
+def Initialize(*args, **kwargs):
+    """Do nothing: the local backend needs no Earth Engine session."""
+
+
+def Authenticate(*args, **kwargs):
+    """Do nothing: the local backend needs no Earth Engine session."""
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    raise AttributeError('ee.{} is not supported by the local backend, this example needs Earth Engine'.format(name))
@@ -0,0 +1,74 @@
+''' A stand-in geemap module whose Map computes the layers added to it with the local backend of the ee stand-in.
+
+To execute the examples with it: python notebook_executor.py --input ../GetStarted --python-path local_ee
+
+Map.addLayer() computes the bands of the layer that the visualization parameters show, so that the errors of the
+band math surface in the cell that adds the layer, and the Map displays a table of the layers, with the number of
+unmasked pixels and the range of every band, in place of the interactive map.
+
+'''
+
+# License: MIT
+
+import ee
+
+
+def ee_initialize(*args, **kwargs):
+    """Do nothing: the local backend needs no Earth Engine session."""
+
+
+class Map(object):
+    """A map that computes its layers locally and lists them.
+
+    Args:
+        **kwargs: The arguments of geemap.Map, which are ignored.
+    """
+
+    def __init__(self, **kwargs):
+        self.layers = []
+
+    def addLayer(self, ee_object, vis_params=None, name=None, shown=True, opacity=1.0):
+        """Compute a layer and add it to the list of layers.
+
+        Args:
+            ee_object (ee.Image): The image.
+            vis_params (dict, optional): The visualization parameters; only the bands are used. Defaults to None.
+            name (str, optional): The layer name. Defaults to None, which names it Layer N.
+            shown (bool, optional): Ignored. Defaults to True.
+            opacity (float, optional): Ignored. Defaults to 1.0.
+        """
+        if not isinstance(ee_object, ee.Image):
+            raise TypeError('The local backend can only add images to the map, not {}'.format(type(ee_object)))
+        bands = (vis_params or {}).get('bands')
+        image = ee_object.select(bands if isinstance(bands, list) else bands.split(',')) if bands else ee_object
+        stats = []
+        for band, array in image.compute().items():
+            count = int(array.count())
+            stats.append((band, count, float(array.min()) if count else float('nan'),
+                          float(array.max()) if count else float('nan')))
+        self.layers.append((name or 'Layer ' + str(len(self.layers) + 1), stats))
+
+    add_ee_layer = addLayer
+
+    def setCenter(self, lon, lat, zoom=None):
+        pass
+
+    def centerObject(self, ee_object, zoom=None):
+        pass
+
+    def addLayerControl(self):
+        pass
+
+    def add_basemap(self, basemap='HYBRID'):
+        pass
+
+    def _repr_html_(self):
+        rows = ''.join('<tr><td>{}</td><td>{}</td><td>{}</td><td>{:.4g}</td><td>{:.4g}</td></tr>'.format(name, *band)
+                       for name, stats in self.layers for band in stats)
+        return ('<table><tr><th>Layer</th><th>Band</th><th>Pixels</th><th>Min</th><th>Max</th></tr>{}</table>'
+                .format(rows))
+
+    def __repr__(self):
+        return '\n'.join('{}: {}'.format(name, ', '.join('{} ({} pixels, {:.4g} to {:.4g})'.format(*band)
+                                                         for band in stats))
+                         for name, stats in self.layers) or 'Map()'
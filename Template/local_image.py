@@ -0,0 +1,1873 @@
+''' A local NumPy backend for the ee.Image band math used by the examples, to run them offline.
+
+To compute NDVI from a local copy of a Landsat scene:
+
+    image = Image('LANDSAT/LC08/C01/T1_TOA/LC08_044034_20140318')
+    ndvi = image.normalizedDifference(['B5', 'B4'])
+    arrays = ndvi.compute()    # {'nd': numpy masked array}
+
+To run the examples that only use band math without an Earth Engine session, with the stand-in ee and geemap modules
+of the local_ee folder: python notebook_executor.py --input ../GetStarted --python-path local_ee
+
+To save a local copy of an asset (this needs the real ee package and an Earth Engine session):
+    python local_image_io.py --download LANDSAT/LC08/C01/T1_TOA/LC08_044034_20140318 --region -122.3 37.6 -122.1 37.8
+To compare the fused evaluation with plain NumPy: python local_image_benchmark.py --benchmark --size 4096
+
+To compute the hillshade of a DEM larger than the memory, tile by tile in 4 threads within 512 MB, into .npy files:
+    Terrain.hillshade(Image('dem_dir')).save('hillshade_dir', workers=4, memory_limit=512 * MB, timings=timings)
+    timing_report(timings)
+To time the terrain products of a synthetic DEM:
+    python local_image_benchmark.py --tile-benchmark --size 8192 --memory-limit 256
+
+The Image class has the same methods as ee.Image for normalizedDifference, add/subtract/multiply/divide, the
+comparisons, updateMask, clip, select, rename, addBands, expression and a few more. Like ee.Image, the methods only
+record an expression graph: the graph of every band is built from nodes that are shared between identical
+subexpressions, and nothing is read or computed until compute() is called. compute() then reads the source bands
+and evaluates all elementwise operations of all bands in one pass over blocks of BLOCK_SIZE pixels, so that the
+intermediate arrays fit in the CPU cache instead of being allocated for the whole image at every step.
+
+The neighborhood operations (focal_min, focal_max, focal_mean, convolve and the ee.Terrain algorithms) cut the graph:
+compute() and save() can evaluate the graph tile by tile, computing the inputs of every neighborhood operation over
+the tile expanded by the radii of the neighborhood operations downstream (the halo), so that the tiles join without
+seams. The tiles are computed in a thread pool (NumPy releases the GIL), their size is chosen to keep the estimated
+memory of the tiles in progress under a limit, and the time every tile spends reading, in neighborhood operations,
+in fused passes and writing is recorded. focal_min and focal_max reduce the rows of the array over the rows of the
+kernel (then over a sliding window of rows for square kernels) instead of over every pixel of the kernel.
+connectedPixelCount is a neighborhood operation of radius maxSize - 1, computed by local_vectors.py, and
+reduceToVectors traces the polygons of the patches of the whole computed image, so the water polygons of
+naip_ndwi_pipeline.py can be extracted offline:
+    water = large_patches.focal_min(1).focal_max(1)
+    features = water.reduceToVectors(eightConnected=True, maxPixels=1e9).getInfo()['features']
+
+Assets are read from DATA_DIR (the LOCAL_EE_DATA environment variable, ~/.local_ee by default), where the asset
+LANDSAT/LC08/C01/T1_TOA/LC08_044034_20140318 is the file LANDSAT/LC08/C01/T1_TOA/LC08_044034_20140318.npz (one array
+per band, read into memory, see save_npz() in local_image_io.py), a .tif file (read window by window with rasterio,
+which is optional) or a folder saved by Image.save() (memory-mapped .npy files). All the bands of a computation must
+share the same grid: the backend does not reproject or resample, and geometries are taken in the CRS of the images.
+
+'''
+
+# License: MIT
+
+import os
+import re
+import json
+import math
+import time
+import itertools
+import threading
+import collections
+import concurrent.futures
+import weakref
+
+import numpy as np
+
+import local_vectors
+
+
+DATA_DIR = os.environ.get('LOCAL_EE_DATA', os.path.join(os.path.expanduser('~'), '.local_ee'))
+BLOCK_SIZE = 16384
+MIN_TILE_SIZE = 64
+MB = 1024 * 1024
+DATASET_EXTENSIONS = ('.npz', '.tif', '.tiff')
+GEOGRAPHIC_CRS = ('EPSG:4326', 'EPSG:4269', 'EPSG:4258')
+METERS_PER_DEGREE = 111320.0
+
+Grid = collections.namedtuple('Grid', ['shape', 'crs_transform', 'crs'])
+Band = collections.namedtuple('Band', ['name', 'value', 'mask'])
+
+
+# The elementwise operations, as NumPy code of one block. {0}, {1}... are the inputs and {p} the parameter of the
+# node. The values are computed in the floating point type of the computation and the masks are booleans.
+ELEMENTWISE = {
+    'add': '{0} + {1}',
+    'subtract': '{0} - {1}',
+    'multiply': '{0} * {1}',
+    'divide': '{0} / {1}',
+    'pow': '{0} ** {1}',
+    'mod': 'np.fmod({0}, {1})',
+    'max': 'np.maximum({0}, {1})',
+    'min': 'np.minimum({0}, {1})',
+    'gt': '({0} > {1}).astype(dtype)',
+    'gte': '({0} >= {1}).astype(dtype)',
+    'lt': '({0} < {1}).astype(dtype)',
+    'lte': '({0} <= {1}).astype(dtype)',
+    'eq': '({0} == {1}).astype(dtype)',
+    'neq': '({0} != {1}).astype(dtype)',
+    'and': '(({0} != 0) & ({1} != 0)).astype(dtype)',
+    'or': '(({0} != 0) | ({1} != 0)).astype(dtype)',
+    'not': '({0} == 0).astype(dtype)',
+    'neg': '-{0}',
+    'abs': 'np.abs({0})',
+    'sqrt': 'np.sqrt({0})',
+    'exp': 'np.exp({0})',
+    'log': 'np.log({0})',
+    'log10': 'np.log10({0})',
+    'sin': 'np.sin({0})',
+    'cos': 'np.cos({0})',
+    'tan': 'np.tan({0})',
+    'asin': 'np.arcsin({0})',
+    'acos': 'np.arccos({0})',
+    'atan': 'np.arctan({0})',
+    'atan2': 'np.arctan2({0}, {1})',
+    'floor': 'np.floor({0})',
+    'ceil': 'np.ceil({0})',
+    'round': 'np.round({0})',
+    'clamp': 'np.clip({0}, {1}, {2})',
+    'cast': 'np.clip(np.trunc({0}), {p[0]}, {p[1]})',
+    'normalized_difference': 'np.where({1} == 0, 0.0, {0} / {1})',
+    'where': 'np.where({0}, {1}, {2})',
+    'x': '_transform[0] * (_col + 0.5) + _transform[1] * (_row + 0.5) + _transform[2]',
+    'y': '_transform[3] * (_col + 0.5) + _transform[4] * (_row + 0.5) + _transform[5]',
+    'inside': '{p}.contains({0}, {1})',
+    # Masks
+    'mask_and': '{0} & {1}',
+    'mask_or': '{0} | {1}',
+    'nonzero': '{0} != 0',
+}
+
+# The integer types of the cast methods, with their range.
+CAST_RANGES = {
+    'byte': (0, 255), 'uint8': (0, 255), 'int8': (-128, 127), 'uint16': (0, 65535), 'int16': (-32768, 32767),
+    'uint32': (0, 4294967295), 'int32': (-2147483648, 2147483647), 'int': (-2147483648, 2147483647),
+    'int64': (-2 ** 63, 2 ** 63 - 1), 'long': (-2 ** 63, 2 ** 63 - 1),
+}
+
+
+class Node(object):
+    """A node of the expression graph of a band: an operation, its input nodes and a hashable parameter.
+
+    Nodes are interned, so that the same operation on the same inputs gives the same node, and a subexpression used
+    by several bands (e.g., the NDVI of a mask and of a value) is computed once.
+    """
+
+    __slots__ = ('uid', 'op', 'args', 'param', '__weakref__')
+    _interned = weakref.WeakValueDictionary()
+    _uids = itertools.count()
+
+    def __new__(cls, op, args=(), param=None):
+        key = (op, tuple(arg.uid for arg in args), param)
+        node = cls._interned.get(key)
+        if node is None:
+            node = object.__new__(cls)
+            node.uid = next(cls._uids)
+            node.op = op
+            node.args = tuple(args)
+            node.param = param
+            cls._interned[key] = node
+        return node
+
+    def __repr__(self):
+        return 'Node({}, {})'.format(self.op, self.param if self.op == 'const' else len(self.args))
+
+
+TRUE = Node('const', param=True)
+
+
+def const(value):
+    """Get the node of a constant value.
+
+    Args:
+        value (float|bool): The value.
+
+    Returns:
+        Node: The constant node.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return TRUE if value else Node('const', param=False)
+    return Node('const', param=float(value))
+
+
+def mask_and(*masks):
+    """Get the node of the intersection of masks, leaving out the masks that are all True.
+
+    Args:
+        *masks (Node): The masks.
+
+    Returns:
+        Node: The mask node.
+    """
+    result = TRUE
+    for mask in masks:
+        if mask is TRUE or mask is result:
+            continue
+        result = mask if result is TRUE else Node('mask_and', (result, mask))
+    return result
+
+
+class Dataset(object):
+    """The bands of a local raster file, which are read when they are first needed.
+
+    Args:
+        path (str): File path of a .npz file, with one 2D array per band, of a GeoTIFF file, which needs rasterio, or
+            of a folder saved by Image.save(). A .npz file can hold the mask of a band in the <band>.mask array (True
+            where valid), the crs_transform and crs of its grid in the __crs_transform__ and __crs__ arrays, and the
+            image properties as JSON in __properties__. The .npz files are read into memory, while the .npy files of
+            a folder are memory-mapped and the GeoTIFF files are read window by window, so that images larger than
+            the memory can be computed tile by tile.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.arrays = {}
+        self.masked_bands = []
+        if os.path.isdir(path):
+            with open(os.path.join(path, 'metadata.json')) as f:
+                metadata = json.load(f)
+            self.band_names = metadata['bands']
+            self.masked_bands = metadata.get('masked_bands', [])
+            shape = metadata['shape']
+            crs_transform = tuple(metadata['crs_transform'])
+            crs = metadata.get('crs')
+            self.properties = metadata.get('properties', {})
+        elif path.lower().endswith('.npz'):
+            with np.load(path) as npz:
+                self.band_names = [name for name in npz.files
+                                   if not name.startswith('__') and not name.endswith('.mask')]
+                self.masked_bands = [name for name in self.band_names if name + '.mask' in npz.files]
+                if self.band_names:
+                    self.arrays[self.band_names[0]] = npz[self.band_names[0]]
+                shape = self.arrays[self.band_names[0]].shape if self.band_names else (0, 0)
+                crs_transform = tuple(npz['__crs_transform__'].tolist()) if '__crs_transform__' in npz.files \
+                    else (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+                crs = str(npz['__crs__']) if '__crs__' in npz.files else None
+                self.properties = json.loads(str(npz['__properties__'])) if '__properties__' in npz.files else {}
+        else:
+            try:
+                import rasterio
+            except ImportError:
+                raise ImportError('Reading {} needs rasterio: pip install rasterio'.format(path))
+            with rasterio.open(path) as src:
+                self.band_names = [description or 'B' + str(index + 1)
+                                   for index, description in enumerate(src.descriptions)]
+                shape = (src.height, src.width)
+                crs_transform = tuple(src.transform)[:6]
+                crs = src.crs.to_string() if src.crs else None
+                self.properties = src.tags()
+        self.grid = Grid(tuple(shape), crs_transform, crs)
+
+    def read(self, band_name):
+        """Read a band.
+
+        Args:
+            band_name (str): The band name.
+
+        Returns:
+            numpy.ndarray: The 2D array of the band.
+        """
+        if band_name not in self.arrays:
+            if os.path.isdir(self.path):
+                self.arrays[band_name] = np.load(os.path.join(self.path, band_name + '.npy'), mmap_mode='r')
+            elif self.path.lower().endswith('.npz'):
+                with np.load(self.path) as npz:
+                    self.arrays[band_name] = npz[band_name]
+            else:
+                import rasterio
+                with rasterio.open(self.path) as src:
+                    self.arrays[band_name] = src.read(self.band_names.index(band_name) + 1)
+        return self.arrays[band_name]
+
+    def read_window(self, band_name, window):
+        """Read a window of a band.
+
+        Args:
+            band_name (str): The band name.
+            window (tuple): The (first row, last row + 1, first column, last column + 1) of the window.
+
+        Returns:
+            numpy.ndarray: The 2D array of the window.
+        """
+        if band_name in self.arrays or not self.path.lower().endswith(('.tif', '.tiff')):
+            return self.read(band_name)[window[0]:window[1], window[2]:window[3]]
+        import rasterio
+        from rasterio.windows import Window
+        with rasterio.open(self.path) as src:
+            return src.read(self.band_names.index(band_name) + 1,
+                            window=Window(window[2], window[0], window[3] - window[2], window[1] - window[0]))
+
+
+_datasets = {}
+
+
+def asset_path(asset_id, data_dir=None):
+    """Find the local file of an asset.
+
+    Args:
+        asset_id (str): The asset id, e.g., LANDSAT/LC08/C01/T1_TOA/LC08_044034_20140318, or a file or folder path.
+        data_dir (str, optional): The folder of the local assets. Defaults to None, which uses DATA_DIR.
+
+    Returns:
+        str: The file path.
+    """
+    if os.path.isfile(asset_id) or os.path.isfile(os.path.join(asset_id, 'metadata.json')):
+        return asset_id
+    for extension in DATASET_EXTENSIONS + ('',):
+        path = os.path.join(data_dir or DATA_DIR, *asset_id.split('/')) + extension
+        if os.path.isfile(path) or os.path.isfile(os.path.join(path, 'metadata.json')):
+            return path
+    raise IOError('No local copy of {} in {}, save one with: python local_image_io.py --download {}'.format(
+        asset_id, data_dir or DATA_DIR, asset_id))
+
+
+def open_dataset(path):
+    """Open a local raster file, once per process.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        Dataset: The dataset.
+    """
+    path = os.path.abspath(path)
+    if path not in _datasets:
+        _datasets[path] = Dataset(path)
+    return _datasets[path]
+
+
+class Geometry(object):
+    """A polygon or rectangle, in the CRS of the images it is used with.
+
+    Args:
+        coords (list): The rings of the polygon, each a list of [x, y] points; the first ring is the exterior.
+    """
+
+    def __init__(self, coords):
+        self.rings = [[(float(x), float(y)) for x, y in ring] for ring in coords]
+        self.type = 'Polygon'
+
+    @staticmethod
+    def Rectangle(coords, proj=None, geodesic=None):
+        """Create a rectangle from [xMin, yMin, xMax, yMax] or [[xMin, yMin], [xMax, yMax]]."""
+        coords = list(np.ravel(coords))
+        x0, y0, x1, y1 = coords
+        return Geometry([[[x0, y0], [x1, y0], [x1, y1], [x0, y1]]])
+
+    @staticmethod
+    def Polygon(coords, proj=None, geodesic=None):
+        """Create a polygon from a list of rings, or from the points of its exterior ring."""
+        if coords and not isinstance(coords[0][0], (list, tuple)):
+            coords = [coords]
+        return Geometry(coords)
+
+    def bounds(self):
+        """Get the bounding rectangle."""
+        xs = [x for ring in self.rings for x, y in ring]
+        ys = [y for ring in self.rings for x, y in ring]
+        return Geometry.Rectangle([min(xs), min(ys), max(xs), max(ys)])
+
+    def coordinates(self):
+        return [[list(point) for point in ring] for ring in self.rings]
+
+    def getInfo(self):
+        return {'type': self.type, 'coordinates': self.coordinates()}
+
+    def key(self):
+        return tuple(tuple(ring) for ring in self.rings)
+
+    def contains(self, x, y):
+        """Test which points are inside the polygon, with the even-odd rule.
+
+        Args:
+            x (numpy.ndarray): The x coordinates.
+            y (numpy.ndarray): The y coordinates.
+
+        Returns:
+            numpy.ndarray: True for the points inside.
+        """
+        inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+        for ring in self.rings:
+            for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+                if y0 == y1:
+                    continue
+                crosses = (y0 > y) != (y1 > y)
+                inside ^= crosses & (x < x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+        return inside
+
+    def __eq__(self, other):
+        return isinstance(other, Geometry) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+class Kernel(object):
+    """The weights of a neighborhood, like ee.Kernel, in pixels.
+
+    Args:
+        weights (list): The rows of weights; the pixels with a weight of 0 are not in the neighborhood.
+        x (int, optional): The column of the focus pixel. Defaults to -1, which is the center column.
+        y (int, optional): The row of the focus pixel. Defaults to -1, which is the center row.
+    """
+
+    def __init__(self, weights, x=-1, y=-1):
+        self.weights = np.array(weights, dtype=np.float64, ndmin=2)
+        height, width = self.weights.shape
+        self.x = width // 2 if x < 0 else x
+        self.y = height // 2 if y < 0 else y
+        self.radius = max(self.x, self.y, width - 1 - self.x, height - 1 - self.y)
+
+    @staticmethod
+    def _shape(shape, radius, units, normalize, magnitude):
+        if units != 'pixels':
+            raise NotImplementedError('The local backend only has kernels in pixels, not in {}'.format(units))
+        extent = int(math.ceil(radius))
+        rows, cols = np.mgrid[-extent:extent + 1, -extent:extent + 1]
+        weights = shape(rows, cols).astype(np.float64)
+        if normalize:
+            weights /= weights.sum()
+        return Kernel(weights * magnitude)
+
+    @staticmethod
+    def square(radius, units='pixels', normalize=True, magnitude=1):
+        return Kernel._shape(lambda rows, cols: np.ones(rows.shape), radius, units, normalize, magnitude)
+
+    @staticmethod
+    def circle(radius, units='pixels', normalize=True, magnitude=1):
+        return Kernel._shape(lambda rows, cols: np.hypot(rows, cols) <= radius, radius, units, normalize, magnitude)
+
+    @staticmethod
+    def plus(radius, units='pixels', normalize=True, magnitude=1):
+        return Kernel._shape(lambda rows, cols: (rows == 0) | (cols == 0), radius, units, normalize, magnitude)
+
+    cross = plus
+
+    @staticmethod
+    def diamond(radius, units='pixels', normalize=True, magnitude=1):
+        return Kernel._shape(lambda rows, cols: np.abs(rows) + np.abs(cols) <= radius, radius, units, normalize,
+                             magnitude)
+
+    @staticmethod
+    def gaussian(radius, sigma=1, units='pixels', normalize=True, magnitude=1):
+        return Kernel._shape(lambda rows, cols: np.exp(-(rows ** 2 + cols ** 2) / (2.0 * sigma ** 2)), radius, units,
+                             normalize, magnitude)
+
+    @staticmethod
+    def fixed(width=-1, height=-1, weights=None, x=-1, y=-1, normalize=False):
+        weights = np.array(weights, dtype=np.float64)
+        if normalize:
+            weights /= weights.sum()
+        return Kernel(weights, x, y)
+
+    def key(self):
+        return self.weights.shape, self.weights.tobytes(), self.x, self.y
+
+    def __eq__(self, other):
+        return isinstance(other, Kernel) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+class Terrain(object):
+    """The terrain algorithms of ee.Terrain, computed from the elevation of the 4-connected neighbors of each pixel.
+
+    The elevation is in meters, and the pixel size in meters is computed from the latitude on geographic grids.
+    """
+
+    @staticmethod
+    def slope(input):
+        """Compute the slope in degrees of the first band."""
+        return _to_image(input).select(0)._neighborhood('slope', ()).rename('slope')
+
+    @staticmethod
+    def aspect(input):
+        """Compute the aspect in degrees clockwise from the north of the first band."""
+        return _to_image(input).select(0)._neighborhood('aspect', ()).rename('aspect')
+
+    @staticmethod
+    def hillshade(input, azimuth=270, elevation=45):
+        """Compute a hillshade from 0 to 255 of the first band, lit from azimuth at elevation degrees."""
+        slope = Terrain.slope(input).multiply(math.pi / 180)
+        aspect = Terrain.aspect(input).multiply(math.pi / 180)
+        zenith = math.radians(90 - elevation)
+        lit = slope.sin().multiply(math.sin(zenith)).multiply(aspect.multiply(-1).add(math.radians(azimuth)).cos())
+        return slope.cos().multiply(math.cos(zenith)).add(lit).max(0).multiply(255).rename('hillshade')
+
+    @staticmethod
+    def products(input):
+        """Add the slope, aspect and hillshade bands to an elevation image."""
+        input = _to_image(input)
+        return input.addBands([Terrain.slope(input), Terrain.aspect(input), Terrain.hillshade(input)])
+
+
+class Algorithms(object):
+    """The ee.Algorithms of the local backend."""
+
+    Terrain = staticmethod(Terrain.products)
+
+
+def _merge_grids(*grids):
+    grids = [grid for grid in grids if grid is not None]
+    for grid in grids[1:]:
+        if grid != grids[0]:
+            raise ValueError('The images are on different grids ({} and {}): the local backend does not resample, '
+                             'save the inputs on one grid'.format(grids[0], grid))
+    return grids[0] if grids else None
+
+
+class Image(object):
+    """A lazily computed image, with the methods of ee.Image for band math.
+
+    Args:
+        args (str|float|list|dict|Image, optional): An asset id or file path, a constant, a list of constants (one
+            band each), a dict of 2D arrays keyed by band name, or an image. Defaults to None, which is the constant 0.
+    """
+
+    def __init__(self, args=None):
+        self.grid = None
+        self.properties = {}
+        if args is None:
+            args = 0
+        if isinstance(args, Image):
+            bands, self.grid, self.properties = args.bands, args.grid, dict(args.properties)
+        elif isinstance(args, str):
+            dataset = open_dataset(asset_path(args))
+            bands = [Band(name, Node('source', param=(dataset, name)),
+                          Node('source', param=(dataset, name + '.mask')) if name in dataset.masked_bands else TRUE)
+                     for name in dataset.band_names]
+            self.grid, self.properties = dataset.grid, dict(dataset.properties)
+            self.properties.setdefault('system:id', args)
+        elif isinstance(args, dict):
+            bands = []
+            for name, array in args.items():
+                dataset = _ArrayDataset(array)
+                mask = Node('source', param=(dataset, 'mask')) if dataset.masked else TRUE
+                bands.append(Band(name, Node('source', param=(dataset, 'array')), mask))
+                self.grid = _merge_grids(self.grid, dataset.grid)
+        elif isinstance(args, (list, tuple)):
+            bands = [Band('constant' if index == 0 else 'constant_' + str(index), const(value), TRUE)
+                     for index, value in enumerate(args)]
+        else:
+            bands = [Band('constant', const(args), TRUE)]
+        self.bands = tuple(bands)
+
+    @classmethod
+    def _with_bands(cls, bands, grid, properties=None):
+        image = cls.__new__(cls)
+        image.bands = tuple(bands)
+        image.grid = grid
+        image.properties = dict(properties or {})
+        return image
+
+    def _new(self, bands, grid=None):
+        return Image._with_bands(bands, grid if grid is not None else self.grid, self.properties)
+
+    @staticmethod
+    def constant(value):
+        """Create a constant image."""
+        return Image(value)
+
+    @staticmethod
+    def pixelLonLat():
+        """Get the coordinates of the pixel centers in the CRS of the grid, as the longitude and latitude bands."""
+        return Image._with_bands([Band('longitude', Node('x'), TRUE), Band('latitude', Node('y'), TRUE)], None)
+
+    @staticmethod
+    def cat(*images):
+        """Combine the bands of images into one image."""
+        images = [_to_image(image) for image in images]
+        return images[0].addBands(images[1:]) if len(images) > 1 else images[0]
+
+    # Band bookkeeping
+
+    def bandNames(self):
+        """Get the band names."""
+        return _List(band.name for band in self.bands)
+
+    def _band_indices(self, selectors):
+        indices = []
+        for selector in selectors:
+            if isinstance(selector, int):
+                indices.append(selector)
+                continue
+            matches = [index for index, band in enumerate(self.bands) if re.fullmatch(selector, band.name)]
+            if not matches:
+                raise KeyError('Band {} not found in {}'.format(selector, list(self.bandNames())))
+            indices.extend(matches)
+        return indices
+
+    def select(self, *args):
+        """Select bands by name, regular expression or index, and optionally rename them.
+
+        Args:
+            *args: Band selectors, or a list of selectors and an optional list of new names.
+
+        Returns:
+            Image: The selected bands.
+        """
+        names = None
+        if args and isinstance(args[0], (list, tuple)):
+            selectors = list(args[0])
+            if len(args) > 1:
+                names = list(args[1])
+        else:
+            selectors = list(args)
+        bands = [self.bands[index] for index in self._band_indices(selectors)]
+        image = self._new(bands)
+        return image.rename(names) if names is not None else image
+
+    def rename(self, *names):
+        """Rename the bands."""
+        if names and isinstance(names[0], (list, tuple)):
+            names = names[0]
+        if len(names) != len(self.bands):
+            raise ValueError('Got {} names for {} bands'.format(len(names), len(self.bands)))
+        return self._new([band._replace(name=name) for band, name in zip(self.bands, names)])
+
+    def addBands(self, srcImg, names=None, overwrite=False):
+        """Add the bands of another image (or a list of images).
+
+        Args:
+            srcImg (Image|list): The image(s) whose bands are added.
+            names (list, optional): The names of the bands to add. Defaults to None, which adds all bands.
+            overwrite (bool, optional): Whether bands with the same name replace the existing ones, instead of raising
+                an error. Defaults to False.
+
+        Returns:
+            Image: The image with the added bands.
+        """
+        images = srcImg if isinstance(srcImg, (list, tuple)) else [srcImg]
+        bands = list(self.bands)
+        grid = self.grid
+        for image in images:
+            image = _to_image(image)
+            grid = _merge_grids(grid, image.grid)
+            added = image.bands if names is None else image.select(list(names)).bands
+            for band in added:
+                existing = [index for index, old in enumerate(bands) if old.name == band.name]
+                if existing and not overwrite:
+                    raise ValueError('Band {} already exists, use overwrite=True'.format(band.name))
+                if existing:
+                    bands[existing[0]] = band
+                else:
+                    bands.append(band)
+        return self._new(bands, grid)
+
+    # Elementwise operations
+
+    def _map_bands(self, op, param=None):
+        return self._new([band._replace(value=Node(op, (band.value,), param)) for band in self.bands])
+
+    def _binary(self, op, other, mask=None):
+        other = _to_image(other)
+        if len(self.bands) == 1 or len(other.bands) == 1 or len(self.bands) == len(other.bands):
+            count = max(len(self.bands), len(other.bands))
+        else:
+            raise ValueError('Cannot combine {} bands with {} bands'.format(len(self.bands), len(other.bands)))
+        # Like ee.Image: the band names are the ones of the longer input, or of the first one.
+        named = other if len(other.bands) > len(self.bands) else self
+        bands = []
+        for index in range(count):
+            left = self.bands[index if len(self.bands) > 1 else 0]
+            right = other.bands[index if len(other.bands) > 1 else 0]
+            value = Node(op, (left.value, right.value))
+            masks = [left.mask, right.mask] + ([mask(left, right)] if mask is not None else [])
+            bands.append(Band(named.bands[index].name, value, mask_and(*masks)))
+        return self._new(bands, _merge_grids(self.grid, other.grid))
+
+    def add(self, image2):
+        return self._binary('add', image2)
+
+    def subtract(self, image2):
+        return self._binary('subtract', image2)
+
+    def multiply(self, image2):
+        return self._binary('multiply', image2)
+
+    def divide(self, image2):
+        """Divide by another image, masking the pixels where it is 0."""
+        return self._binary('divide', image2, lambda left, right: Node('nonzero', (right.value,)))
+
+    def pow(self, image2):
+        return self._binary('pow', image2)
+
+    def mod(self, image2):
+        return self._binary('mod', image2, lambda left, right: Node('nonzero', (right.value,)))
+
+    def max(self, image2):
+        return self._binary('max', image2)
+
+    def min(self, image2):
+        return self._binary('min', image2)
+
+    def gt(self, image2):
+        return self._binary('gt', image2)
+
+    def gte(self, image2):
+        return self._binary('gte', image2)
+
+    def lt(self, image2):
+        return self._binary('lt', image2)
+
+    def lte(self, image2):
+        return self._binary('lte', image2)
+
+    def eq(self, image2):
+        return self._binary('eq', image2)
+
+    def neq(self, image2):
+        return self._binary('neq', image2)
+
+    def And(self, image2):
+        return self._binary('and', image2)
+
+    def Or(self, image2):
+        return self._binary('or', image2)
+
+    def Not(self):
+        return self._map_bands('not')
+
+    def abs(self):
+        return self._map_bands('abs')
+
+    def sqrt(self):
+        return self._map_bands('sqrt')
+
+    def exp(self):
+        return self._map_bands('exp')
+
+    def log(self):
+        return self._map_bands('log')
+
+    def log10(self):
+        return self._map_bands('log10')
+
+    def sin(self):
+        return self._map_bands('sin')
+
+    def cos(self):
+        return self._map_bands('cos')
+
+    def tan(self):
+        return self._map_bands('tan')
+
+    def asin(self):
+        return self._map_bands('asin')
+
+    def acos(self):
+        return self._map_bands('acos')
+
+    def atan(self):
+        return self._map_bands('atan')
+
+    def atan2(self, image2):
+        return self._binary('atan2', image2)
+
+    def floor(self):
+        return self._map_bands('floor')
+
+    def ceil(self):
+        return self._map_bands('ceil')
+
+    def round(self):
+        return self._map_bands('round')
+
+    def clamp(self, low, high):
+        return self._new([band._replace(value=Node('clamp', (band.value, const(low), const(high))))
+                          for band in self.bands])
+
+    def toFloat(self):
+        return self
+
+    toDouble = float = double = toFloat
+
+    def _cast(self, pixel_type):
+        return self._map_bands('cast', CAST_RANGES[pixel_type])
+
+    def normalizedDifference(self, bandNames=None):
+        """Compute (first - second) / (first + second), which is 0 where both bands are 0.
+
+        Args:
+            bandNames (list, optional): The names of the two bands. Defaults to None, which uses the first two bands.
+
+        Returns:
+            Image: The nd band.
+        """
+        first, second = self.select(list(bandNames)).bands if bandNames else self.bands[:2]
+        value = Node('normalized_difference', (Node('subtract', (first.value, second.value)),
+                                               Node('add', (first.value, second.value))))
+        return self._new([Band('nd', value, mask_and(first.mask, second.mask))])
+
+    # Neighborhood operations
+
+    def _neighborhood(self, kind, args):
+        bands = []
+        for band in self.bands:
+            inputs = (band.value, band.mask)
+            bands.append(Band(band.name, Node('neighborhood', inputs, (kind, args, 0)),
+                              Node('neighborhood', inputs, (kind, args, 1))))
+        return self._new(bands)
+
+    def _focal(self, reducer, radius, kernelType, units, iterations, kernel):
+        if kernel is None:
+            kernel = getattr(Kernel, kernelType)(radius, units, normalize=False)
+        image = self
+        for _ in range(iterations):
+            image = image._neighborhood('focal', (reducer, kernel))
+        return image
+
+    def focal_min(self, radius=1, kernelType='circle', units='pixels', iterations=1, kernel=None):
+        """Compute the minimum of the unmasked pixels of the neighborhood of each pixel.
+
+        Args:
+            radius (float, optional): The radius of the kernel. Defaults to 1.
+            kernelType (str, optional): The shape of the kernel: circle, square, plus, cross or diamond. Defaults to
+                'circle'.
+            units (str, optional): The units of the radius; only 'pixels' is supported. Defaults to 'pixels'.
+            iterations (int, optional): Number of times the operation is applied. Defaults to 1.
+            kernel (Kernel, optional): A kernel to use in place of radius and kernelType. Defaults to None.
+
+        Returns:
+            Image: The filtered image, masked where the whole neighborhood is masked.
+        """
+        return self._focal('min', radius, kernelType, units, iterations, kernel)
+
+    def focal_max(self, radius=1, kernelType='circle', units='pixels', iterations=1, kernel=None):
+        """Compute the maximum of the unmasked pixels of the neighborhood of each pixel, see focal_min()."""
+        return self._focal('max', radius, kernelType, units, iterations, kernel)
+
+    def focal_mean(self, radius=1, kernelType='circle', units='pixels', iterations=1, kernel=None):
+        """Compute the weighted mean of the unmasked pixels of the neighborhood of each pixel, see focal_min()."""
+        return self._focal('mean', radius, kernelType, units, iterations, kernel)
+
+    def connectedPixelCount(self, maxSize=100, eightConnected=True):
+        """Count the pixels of the patch of connected pixels of equal values that each pixel is in.
+
+        Args:
+            maxSize (int, optional): The largest count: the pixels of larger patches get maxSize. Defaults to 100.
+            eightConnected (bool, optional): Whether pixels touching by a corner are connected. Defaults to True.
+
+        Returns:
+            Image: The counts, masked where the image is masked.
+        """
+        return self._neighborhood('connected', (int(maxSize), bool(eightConnected)))
+
+    def convolve(self, kernel):
+        """Compute the sum of the pixels of the neighborhood of each pixel, multiplied by the kernel weights.
+
+        Args:
+            kernel (Kernel): The kernel.
+
+        Returns:
+            Image: The convolved image, masked where a pixel of the neighborhood is masked or outside the grid.
+        """
+        return self._neighborhood('convolve', (kernel,))
+
+    # Masks
+
+    def updateMask(self, mask):
+        """Mask the pixels where mask is 0 or masked.
+
+        Args:
+            mask (Image): A one band mask, or one band per band of this image.
+
+        Returns:
+            Image: The masked image.
+        """
+        mask = _to_image(mask)
+        if len(mask.bands) not in (1, len(self.bands)):
+            raise ValueError('Cannot mask {} bands with {} bands'.format(len(self.bands), len(mask.bands)))
+        bands = []
+        for index, band in enumerate(self.bands):
+            mask_band = mask.bands[index if len(mask.bands) > 1 else 0]
+            bands.append(band._replace(mask=mask_and(band.mask, mask_band.mask,
+                                                     Node('nonzero', (mask_band.value,)))))
+        return self._new(bands, _merge_grids(self.grid, mask.grid))
+
+    def mask(self, mask=None):
+        """Get the mask of the bands, as 0 and 1 values, or mask the image like updateMask()."""
+        if mask is not None:
+            return self.updateMask(mask)
+        return self._new([Band(band.name, Node('where', (band.mask, const(1), const(0))), TRUE)
+                          for band in self.bands])
+
+    def selfMask(self):
+        """Mask the pixels whose value is 0."""
+        return self.updateMask(self)
+
+    def unmask(self, value=0):
+        """Replace the masked pixels by value."""
+        value = _to_image(value)
+        return self._new([Band(band.name, Node('where', (band.mask, band.value, value.bands[0].value)),
+                               value.bands[0].mask) for band in self.bands])
+
+    def where(self, test, value):
+        """Replace the pixels where test is not 0 by value.
+
+        Args:
+            test (Image): The test, one band or one band per band of this image.
+            value (Image|float): The replacement values.
+
+        Returns:
+            Image: The image with the replaced pixels.
+        """
+        test, value = _to_image(test), _to_image(value)
+        bands = []
+        for index, band in enumerate(self.bands):
+            test_band = test.bands[index if len(test.bands) > 1 else 0]
+            value_band = value.bands[index if len(value.bands) > 1 else 0]
+            condition = mask_and(test_band.mask, Node('nonzero', (test_band.value,)))
+            bands.append(Band(band.name, Node('where', (condition, value_band.value, band.value)),
+                              Node('where', (condition, value_band.mask, band.mask))))
+        return self._new(bands, _merge_grids(self.grid, test.grid, value.grid))
+
+    def clip(self, geometry):
+        """Mask the pixels whose center is outside a geometry.
+
+        Args:
+            geometry (Geometry): The geometry, in the CRS of the image.
+
+        Returns:
+            Image: The clipped image.
+        """
+        if hasattr(geometry, 'geometry'):
+            geometry = geometry.geometry()
+        inside = Node('inside', (Node('x'), Node('y')), geometry)
+        return self._new([band._replace(mask=mask_and(band.mask, inside)) for band in self.bands])
+
+    def expression(self, expression, map_=None, **kwargs):
+        """Compute an Earth Engine expression, e.g., '2.5 * (NIR - RED) / (NIR + 6 * RED + 1)'.
+
+        Args:
+            expression (str): The expression, with the arithmetic, comparison and logical operators, the ?: operator,
+                b('name') or b(index) for the bands of this image and math functions like sqrt() or abs().
+            map_ (dict, optional): The images or numbers of the variables of the expression. Defaults to None.
+
+        Returns:
+            Image: The result.
+        """
+        variables = dict(map_ or kwargs.get('map') or {})
+        return _ExpressionParser(expression, self, variables).parse()
+
+    # Metadata and results
+
+    # Vectors
+
+    def projection(self):
+        """Get the projection of the first band, like ee.Image.projection()."""
+        if self.grid is None:
+            raise ValueError('A constant image has no projection')
+        return Projection(self.grid.crs, self.grid.crs_transform)
+
+    def reduceToVectors(self, reducer=None, geometry=None, scale=None, geometryType='polygon', eightConnected=True,
+                        labelProperty='label', crs=None, crsTransform=None, bestEffort=False, maxPixels=1e7,
+                        tileScale=1, geometryInNativeProjection=False):
+        """Convert the patches of connected pixels of equal values of the first band to polygons.
+
+        The polygons are traced on the grid of the image: scale, crs and crsTransform are only checked against it.
+
+        Args:
+            reducer (object, optional): Only None is supported, which counts the pixels of every patch like
+                ee.Reducer.countEvery(). Defaults to None.
+            geometry (Geometry, optional): The region to convert. Defaults to None, which is the whole grid.
+            scale (float, optional): The pixel size, which must be the one of the image. Defaults to None.
+            geometryType (str, optional): 'polygon', 'bb' (bounding box) or 'centroid'. Defaults to 'polygon'.
+            eightConnected (bool, optional): Whether pixels touching by a corner are connected. Defaults to True.
+            labelProperty (str, optional): The property holding the value of a patch. Defaults to 'label'.
+            crs (str or Projection, optional): The CRS, which must be the one of the image. Defaults to None.
+            crsTransform (list, optional): The transform, which must be the one of the image. Defaults to None.
+            bestEffort (bool, optional): Not used. Defaults to False.
+            maxPixels (float, optional): The largest number of pixels to convert. Defaults to 1e7.
+            tileScale (float, optional): Not used. Defaults to 1.
+            geometryInNativeProjection (bool, optional): Not used. Defaults to False.
+
+        Returns:
+            FeatureCollection: The polygons, computed when getInfo() is called.
+        """
+        if reducer is not None:
+            raise NotImplementedError('The local backend only counts the pixels of the vectors, use reducer=None')
+        image = self.select(0)
+        grid = image._grid(None)
+        projection = image.projection()
+        if isinstance(crs, Projection):
+            crs, crsTransform = crs.crs, crsTransform or crs.transform
+        resampled = [crs is not None and crs != grid.crs,
+                     crsTransform is not None and list(crsTransform) != list(grid.crs_transform),
+                     scale is not None and not np.isclose(scale, projection.nominalScale())]
+        if any(resampled):
+            raise NotImplementedError('The local backend does not resample, vectorize at the scale and CRS of the '
+                                      'image ({}, {})'.format(grid.crs, projection.nominalScale()))
+        if geometry is not None:
+            image = image.clip(geometry)
+        return FeatureCollection(image, geometryType, eightConnected, labelProperty, maxPixels)
+
+    def get(self, prop):
+        return self.properties.get(prop)
+
+    def set(self, *args):
+        properties = dict(args[0]) if len(args) == 1 else {args[0]: args[1]}
+        image = self._new(self.bands)
+        image.properties.update(properties)
+        return image
+
+    def getInfo(self):
+        """Get the bands and properties, like ee.Image.getInfo(), without computing anything."""
+        bands = []
+        for band in self.bands:
+            info = {'id': band.name, 'data_type': {'type': 'PixelType', 'precision': 'double'}}
+            if self.grid is not None:
+                info.update({'dimensions': [self.grid.shape[1], self.grid.shape[0]],
+                             'crs': self.grid.crs, 'crs_transform': list(self.grid.crs_transform)})
+            bands.append(info)
+        return {'type': 'Image', 'bands': bands, 'properties': dict(self.properties)}
+
+    def _grid(self, grid):
+        grid = _merge_grids(self.grid, grid)
+        if grid is None:
+            raise ValueError('A constant image has no grid, pass one with grid=')
+        return grid
+
+    def compute(self, block_size=BLOCK_SIZE, dtype=np.float64, grid=None, tile_size=None, workers=1,
+                memory_limit=None, timings=None):
+        """Compute the bands in memory.
+
+        Args:
+            block_size (int, optional): Number of pixels computed at a time. Defaults to BLOCK_SIZE. None computes
+                every operation over a whole tile at once, like plain NumPy code.
+            dtype (numpy.dtype, optional): The floating point type of the values. Defaults to numpy.float64.
+            grid (Grid, optional): The grid of constant images. Defaults to None, which uses the grid of the sources.
+            tile_size (int, optional): See evaluate(). Defaults to None.
+            workers (int, optional): Number of threads computing tiles. Defaults to 1.
+            memory_limit (float, optional): See evaluate(), in bytes. Defaults to None.
+            timings (list, optional): A list the timing dicts of the tiles are added to. Defaults to None.
+
+        Returns:
+            collections.OrderedDict: The masked arrays of the bands, keyed by band name.
+        """
+        grid = self._grid(grid)
+        outputs = [band.value for band in self.bands] + [band.mask for band in self.bands]
+        out = [np.empty(grid.shape, dtype) for _ in self.bands] + [np.empty(grid.shape, np.bool_) for _ in self.bands]
+        evaluate(outputs, out, grid, block_size, dtype, tile_size, workers, memory_limit, timings)
+        count = len(self.bands)
+        return collections.OrderedDict(
+            (band.name, np.ma.MaskedArray(value, mask=~mask))
+            for band, value, mask in zip(self.bands, out[:count], out[count:]))
+
+    def save(self, out_dir, dtype=np.float32, grid=None, block_size=BLOCK_SIZE, tile_size=None, workers=1,
+             memory_limit=None, timings=None):
+        """Compute the bands into memory-mapped .npy files, which Image(out_dir) can read.
+
+        Args:
+            out_dir (str): The output folder, with one <band>.npy file per band, a <band>.mask.npy file per masked
+                band and metadata.json.
+            dtype (numpy.dtype, optional): The floating point type of the computation and of the files. Defaults to
+                numpy.float32.
+            grid (Grid, optional): The grid of constant images. Defaults to None, which uses the grid of the sources.
+            block_size (int, optional): Number of pixels computed at a time. Defaults to BLOCK_SIZE.
+            tile_size (int, optional): See evaluate(). Defaults to None.
+            workers (int, optional): Number of threads computing tiles. Defaults to 1.
+            memory_limit (float, optional): See evaluate(), in bytes. Defaults to None.
+            timings (list, optional): A list the timing dicts of the tiles are added to. Defaults to None.
+
+        Returns:
+            str: The output folder.
+        """
+        grid = self._grid(grid)
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        masked = [band for band in self.bands if band.mask is not TRUE]
+        outputs = [band.value for band in self.bands] + [band.mask for band in masked]
+        out = [np.lib.format.open_memmap(os.path.join(out_dir, band.name + '.npy'), 'w+', dtype, grid.shape)
+               for band in self.bands]
+        out += [np.lib.format.open_memmap(os.path.join(out_dir, band.name + '.mask.npy'), 'w+', np.bool_,
+                                          grid.shape) for band in masked]
+        evaluate(outputs, out, grid, block_size, dtype, tile_size, workers, memory_limit, timings)
+        for array in out:
+            array.flush()
+
+        metadata = {'bands': [band.name for band in self.bands], 'masked_bands': [band.name for band in masked],
+                    'shape': list(grid.shape), 'crs_transform': list(grid.crs_transform), 'crs': grid.crs,
+                    'properties': self.properties}
+        with open(os.path.join(out_dir, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=1)
+        return out_dir
+
+    def __repr__(self):
+        return 'Image({})'.format(', '.join(band.name for band in self.bands))
+
+
+for _pixel_type in CAST_RANGES:
+    _cast_method = (lambda pixel_type: lambda self: self._cast(pixel_type))(_pixel_type)
+    setattr(Image, _pixel_type, _cast_method)
+    setattr(Image, 'to' + _pixel_type[0].upper() + _pixel_type[1:], _cast_method)
+
+
+class _List(list):
+    """A list that can be used like a computed ee.List."""
+
+    def getInfo(self):
+        return list(self)
+
+    def get(self, index):
+        return self[index]
+
+    def size(self):
+        return len(self)
+
+
+class Projection(object):
+    """The CRS and affine transform of a grid, like ee.Projection.
+
+    Args:
+        crs (str): The CRS.
+        transform (list): The affine transform, [scaleX, shearX, translateX, shearY, scaleY, translateY].
+    """
+
+    def __init__(self, crs, transform=(1, 0, 0, 0, 1, 0)):
+        self.crs = crs
+        self.transform = list(transform)
+
+    def nominalScale(self):
+        """Get the pixel size along x, in meters for geographic CRSs."""
+        scale = math.hypot(self.transform[0], self.transform[3])
+        return scale * METERS_PER_DEGREE if self.crs in GEOGRAPHIC_CRS else scale
+
+    def getInfo(self):
+        return {'type': 'Projection', 'crs': self.crs, 'transform': self.transform}
+
+
+class FeatureCollection(object):
+    """The polygons of the patches of an image, computed by Image.reduceToVectors().
+
+    Args:
+        image (Image): The image, whose first band is converted.
+        geometry_type (str): 'polygon', 'bb' or 'centroid'.
+        eight_connected (bool): Whether pixels touching by a corner are connected.
+        label_property (str): The property holding the value of a patch.
+        max_pixels (float): The largest number of pixels to convert.
+    """
+
+    def __init__(self, image, geometry_type, eight_connected, label_property, max_pixels):
+        self.image = image
+        self.geometry_type = geometry_type
+        self.eight_connected = eight_connected
+        self.label_property = label_property
+        self.max_pixels = max_pixels
+        self._features = None
+
+    def features(self, block_size=BLOCK_SIZE, dtype=np.float64, tile_size=None, workers=1, memory_limit=None,
+                 timings=None):
+        """Compute the image and convert it to GeoJSON features; see Image.compute() for the arguments.
+
+        Returns:
+            list: The features, with the label and count properties.
+        """
+        if self._features is None:
+            grid = self.image._grid(None)
+            if grid.shape[0] * grid.shape[1] > self.max_pixels:
+                raise ValueError('The image has {} pixels, more than maxPixels ({})'.format(
+                    grid.shape[0] * grid.shape[1], self.max_pixels))
+            band = list(self.image.compute(block_size, dtype, None, tile_size, workers, memory_limit,
+                                           timings).values())[0]
+            self._features = local_vectors.polygonize(band.data, ~np.ma.getmaskarray(band), grid.crs_transform,
+                                                      self.eight_connected, self.geometry_type, self.label_property)
+        return self._features
+
+    def getInfo(self):
+        return {'type': 'FeatureCollection', 'features': self.features()}
+
+    def size(self):
+        return _Number(len(self.features()))
+
+    def __repr__(self):
+        return 'FeatureCollection({})'.format(self.image)
+
+
+class _Number(int):
+    """An int that can be used like a computed ee.Number."""
+
+    def getInfo(self):
+        return int(self)
+
+
+class _ArrayDataset(object):
+    """A band given as an array."""
+
+    def __init__(self, array):
+        array = np.ma.asarray(array) if np.ma.isMaskedArray(array) else np.asarray(array)
+        if array.ndim != 2:
+            raise ValueError('A band must be a 2D array, got {} dimensions'.format(array.ndim))
+        self.masked = np.ma.isMaskedArray(array)
+        self.path = '<array>'
+        self.grid = Grid(array.shape, (1.0, 0.0, 0.0, 0.0, 1.0, 0.0), None)
+        self.arrays = {'array': np.ma.getdata(array), 'mask': ~np.ma.getmaskarray(array)}
+
+    def read(self, band_name):
+        return self.arrays[band_name]
+
+    def read_window(self, band_name, window):
+        return self.arrays[band_name][window[0]:window[1], window[2]:window[3]]
+
+
+def _to_image(value):
+    return value if isinstance(value, Image) else Image(value)
+
+
+def _read_source(node, window):
+    dataset, band_name = node.param
+    return dataset.read_window(band_name, window)
+
+
+# The nodes that are read rather than computed, by functions of (node, window) returning the 2D array of a window.
+SOURCES = {
+    'source': _read_source,
+}
+
+
+def _neighborhood_offsets(kernel, radius):
+    # The row and column offsets of the nonzero weights of a kernel, in an array padded by radius.
+    for (row, col), weight in np.ndenumerate(kernel.weights):
+        if weight:
+            yield row - kernel.y + radius, col - kernel.x + radius, weight
+
+
+def _kernel_rows(kernel):
+    # The row, first column and length of the nonzero weights of the rows of a kernel, or None if a row has gaps.
+    rows = []
+    for row, nonzero in enumerate(kernel.weights != 0):
+        cols = np.flatnonzero(nonzero)
+        if len(cols) and cols[-1] - cols[0] + 1 != len(cols):
+            return None
+        if len(cols):
+            rows.append((row, cols[0], len(cols)))
+    return rows
+
+
+def _sliding(values, length, ufunc):
+    # Reduce the windows of length consecutive values along the last axis, by shifts for short windows and with the
+    # prefix and suffix reductions of blocks of length values (van Herk/Gil-Werman) for long ones.
+    count = values.shape[-1] - length + 1
+    if length <= 4:
+        result = values[..., :count].copy()
+        for offset in range(1, length):
+            ufunc(result, values[..., offset:offset + count], out=result)
+        return result
+    blocks = -(-values.shape[-1] // length)
+    padding = [(0, 0)] * (values.ndim - 1) + [(0, blocks * length - values.shape[-1])]
+    padded = np.pad(values, padding, mode='edge').reshape(values.shape[:-1] + (blocks, length))
+    prefix = ufunc.accumulate(padded, axis=-1).reshape(values.shape[:-1] + (-1,))
+    suffix = ufunc.accumulate(padded[..., ::-1], axis=-1)[..., ::-1].reshape(values.shape[:-1] + (-1,))
+    return ufunc(suffix[..., :count], prefix[..., length - 1:length - 1 + count])
+
+
+def _focal_extreme(values, ufunc, kernel, rows, height, width):
+    # The minimum or maximum over a kernel whose rows have no gaps: the sliding reductions of the rows of the array
+    # over the lengths of the kernel rows, then over the kernel rows, or over a sliding window of rows when all the
+    # kernel rows are the same.
+    radius = kernel.radius
+    row_offset, col_offset = radius - kernel.y, radius - kernel.x
+    first_row, first_col, length = rows[0]
+    if all(run[1:] == (first_col, length) for run in rows) and rows[-1][0] - first_row + 1 == len(rows):
+        start = first_col + col_offset
+        across = _sliding(values, length, ufunc)[:, start:start + width]
+        start = first_row + row_offset
+        return _sliding(across.T, len(rows), ufunc).T[start:start + height]
+    across = {}
+    result = None
+    for row, col, length in rows:
+        if length not in across:
+            across[length] = _sliding(values, length, ufunc)
+        row, col = row + row_offset, col + col_offset
+        value = across[length][row:row + height, col:col + width]
+        result = value.copy() if result is None else ufunc(result, value, out=result)
+    return result
+
+
+def _focal(values, masks, args, grid, window):
+    reducer, kernel = args
+    radius = kernel.radius
+    height, width = values.shape[0] - 2 * radius, values.shape[1] - 2 * radius
+    values = np.where(masks, values, {'min': np.inf, 'max': -np.inf}.get(reducer, 0))
+    rows = _kernel_rows(kernel) if reducer != 'mean' else None
+    if rows:
+        return (_focal_extreme(values, np.minimum if reducer == 'min' else np.maximum, kernel, rows, height, width),
+                _focal_extreme(masks, np.logical_or, kernel, rows, height, width))
+    result = None
+    valid = np.zeros((height, width), dtype=np.bool_)
+    weights = np.zeros((height, width)) if reducer == 'mean' else None
+    for row, col, weight in _neighborhood_offsets(kernel, radius):
+        value = values[row:row + height, col:col + width]
+        mask = masks[row:row + height, col:col + width]
+        valid |= mask
+        if reducer == 'min':
+            result = value.copy() if result is None else np.minimum(result, value, out=result)
+        elif reducer == 'max':
+            result = value.copy() if result is None else np.maximum(result, value, out=result)
+        else:
+            result = weight * value if result is None else result + weight * value
+            weights += weight * mask
+    if reducer == 'mean':
+        result /= np.where(weights == 0, 1, weights)
+    return result, valid
+
+
+def _convolve(values, masks, args, grid, window):
+    kernel, = args
+    radius = kernel.radius
+    height, width = values.shape[0] - 2 * radius, values.shape[1] - 2 * radius
+    values = np.where(masks, values, 0)
+    result = np.zeros((height, width), dtype=values.dtype)
+    valid = np.ones((height, width), dtype=np.bool_)
+    for row, col, weight in _neighborhood_offsets(kernel, radius):
+        result += weight * values[row:row + height, col:col + width]
+        valid &= masks[row:row + height, col:col + width]
+    return result, valid
+
+
+def _cell_size(grid, window):
+    # The signed size of the pixels of the rows of a window along x and y, in meters for geographic grids.
+    scale_x, scale_y = grid.crs_transform[0], grid.crs_transform[4]
+    if grid.crs not in GEOGRAPHIC_CRS:
+        return scale_x, scale_y
+    rows = np.arange(window[0], window[1]).reshape(-1, 1) + 0.5
+    latitude = np.radians(grid.crs_transform[5] + scale_y * rows)
+    return scale_x * METERS_PER_DEGREE * np.cos(latitude), scale_y * METERS_PER_DEGREE
+
+
+def _gradient(values, masks, grid, window):
+    # The elevation change per meter to the east and to the north, from the 4-connected neighbors of each pixel.
+    size_x, size_y = _cell_size(grid, window)
+    dz_dx = (values[1:-1, 2:] - values[1:-1, :-2]) / (2 * size_x)
+    dz_dy = (values[2:, 1:-1] - values[:-2, 1:-1]) / (2 * size_y)
+    valid = masks[1:-1, 1:-1] & masks[1:-1, 2:] & masks[1:-1, :-2] & masks[2:, 1:-1] & masks[:-2, 1:-1]
+    return dz_dx, dz_dy, valid
+
+
+def _slope(values, masks, args, grid, window):
+    dz_dx, dz_dy, valid = _gradient(values, masks, grid, window)
+    return np.degrees(np.arctan(np.hypot(dz_dx, dz_dy))), valid
+
+
+def _aspect(values, masks, args, grid, window):
+    # The compass direction that the slope faces, in degrees clockwise from the north.
+    dz_dx, dz_dy, valid = _gradient(values, masks, grid, window)
+    return np.degrees(np.arctan2(-dz_dx, -dz_dy)) % 360, valid
+
+
+def _connected_pixel_count(values, masks, args, grid, window):
+    # A patch of fewer than max_size pixels fits within max_size - 1 pixels of each of its pixels, and a larger patch
+    # has at least max_size pixels there, so the radius is max_size - 1.
+    max_size, eight_connected = args
+    radius = max_size - 1
+    height, width = values.shape[0] - 2 * radius, values.shape[1] - 2 * radius
+    counts = local_vectors.connected_pixel_count(values, masks, max_size, eight_connected)
+    return (counts[radius:radius + height, radius:radius + width].astype(values.dtype),
+            masks[radius:radius + height, radius:radius + width])
+
+
+# The operations over the neighborhood of each pixel, by kind: a function of the arguments of the operation giving
+# its radius in pixels, and a function of (values, masks, args, grid, window) computing the values and masks of the
+# window from the ones of the window expanded by the radius.
+NEIGHBORHOOD = {
+    'focal': (lambda args: args[1].radius, _focal),
+    'convolve': (lambda args: args[0].radius, _convolve),
+    'slope': (lambda args: 1, _slope),
+    'aspect': (lambda args: 1, _aspect),
+    'connected': (lambda args: args[0] - 1, _connected_pixel_count),
+}
+
+
+class FusedPass(object):
+    """The elementwise operations of a set of output nodes, compiled into one Python function over a block of pixels.
+
+    The function takes the first and last pixel index of the block in a window, the (first row, first column,
+    width) of the window and the flat arrays of the leaves over the window (the nodes that are not elementwise,
+    e.g., the source bands), and returns the values of the outputs for the block.
+
+    Args:
+        outputs (list): The output nodes.
+    """
+
+    def __init__(self, outputs):
+        self.leaves = []
+        self.env = {'np': np}
+        self.lines = []
+        self.uses_coords = False
+        names = {}
+
+        for node in _topological_order(outputs, stop_at_leaves=True):
+            if node.op == 'const':
+                names[node.uid] = repr(node.param)
+            elif node.op not in ELEMENTWISE:
+                self.leaves.append(node)
+                names[node.uid] = 'x' + str(len(self.leaves))
+                self.lines.append('{0} = _cast({0}[_start:_stop])'.format(names[node.uid]))
+            else:
+                param = None
+                if node.param is not None:
+                    param = 'p' + str(node.uid)
+                    self.env[param] = node.param
+                if node.op in ('x', 'y'):
+                    self.uses_coords = True
+                names[node.uid] = 't' + str(node.uid)
+                code = ELEMENTWISE[node.op].format(*[names[arg.uid] for arg in node.args], p=param)
+                self.lines.append('{} = {}'.format(names[node.uid], code))
+
+        self.outputs = [names[node.uid] for node in outputs]
+        arguments = ', '.join(['_start', '_stop', '_window'] +
+                              ['x' + str(index + 1) for index in range(len(self.leaves))])
+        body = []
+        if self.uses_coords:
+            body = ['_i = np.arange(_start, _stop)', '_row, _col = np.divmod(_i, _window[2])',
+                    '_row += _window[0]', '_col += _window[1]']
+        body += self.lines + ['return ({},)'.format(', '.join(self.outputs))]
+        self.source = 'def kernel({}):\n    {}\n'.format(arguments, '\n    '.join(body))
+
+    def compile(self, grid, dtype):
+        """Get the function for a grid and a value type."""
+        env = dict(self.env, dtype=dtype, _transform=grid.crs_transform,
+                   _cast=lambda array: array if array.dtype == np.bool_ else array.astype(dtype, copy=False))
+        exec(compile(self.source, '<kernel>', 'exec'), env)
+        return env['kernel']
+
+    def run(self, function, leaves, window, block_size, dtype):
+        """Run the compiled function over a window, block by block.
+
+        Args:
+            function (function): The compiled function.
+            leaves (list): The flat arrays of the leaves over the window.
+            window (tuple): The (first row, last row + 1, first column, last column + 1) of the window.
+            block_size (int): Number of pixels computed at a time. None computes the whole window at once.
+            dtype (numpy.dtype): The floating point type of the values.
+
+        Returns:
+            list: The 2D arrays of the outputs over the window, of dtype for the values and bool for the masks.
+        """
+        height, width = window[1] - window[0], window[3] - window[2]
+        size = height * width
+        block_size = block_size or size
+        results = [None] * len(self.outputs)
+        with np.errstate(all='ignore'):
+            for start in range(0, size, block_size):
+                stop = min(start + block_size, size)
+                for index, value in enumerate(function(start, stop, (window[0], window[2], width), *leaves)):
+                    if results[index] is None:
+                        result_type = np.asarray(value).dtype
+                        results[index] = np.empty(size, dtype=np.bool_ if result_type == np.bool_ else dtype)
+                    results[index][start:stop] = value
+        return [result.reshape(height, width) for result in results]
+
+
+def _topological_order(outputs, stop_at_leaves=False):
+    order, seen, stack = [], set(), [(node, False) for node in reversed(outputs)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        if node.uid in seen:
+            continue
+        seen.add(node.uid)
+        stack.append((node, True))
+        if not stop_at_leaves or node.op in ELEMENTWISE:
+            stack.extend((arg, False) for arg in reversed(node.args) if arg.uid not in seen)
+    return order
+
+
+def _expand_window(window, margin):
+    return window[0] - margin, window[1] + margin, window[2] - margin, window[3] + margin
+
+
+def _clip_window(window, shape):
+    return max(window[0], 0), min(window[1], shape[0]), max(window[2], 0), min(window[3], shape[1])
+
+
+def _crop(array, array_window, window):
+    return array[window[0] - array_window[0]:window[1] - array_window[0],
+                 window[2] - array_window[2]:window[3] - array_window[2]]
+
+
+class _Neighborhood(object):
+    """A neighborhood operation of a plan, with its value and mask nodes."""
+
+    def __init__(self, inputs, kind, args):
+        self.inputs = inputs
+        self.kind = kind
+        self.args = args
+        self.radius = NEIGHBORHOOD[kind][0](args)
+        self.halo = 0
+        self.nodes = []
+        self.fused = FusedPass(list(inputs))
+
+
+class Plan(object):
+    """How to compute output nodes over a grid, tile by tile.
+
+    The graph is cut at the neighborhood operations. For each tile, the inputs of every neighborhood operation are
+    computed by a fused pass over the tile expanded by a halo: the sum of the radii of the neighborhood operations
+    between it and the outputs, plus its own radius. The pixels of the expanded tile that are outside the grid are
+    masked. The outputs are then computed by a last fused pass over the tile.
+
+    Args:
+        outputs (list): The output nodes.
+        grid (Grid): The grid.
+        block_size (int, optional): Number of pixels computed at a time by the fused passes. Defaults to BLOCK_SIZE.
+        dtype (numpy.dtype, optional): The floating point type of the values. Defaults to numpy.float64.
+    """
+
+    def __init__(self, outputs, grid, block_size=BLOCK_SIZE, dtype=np.float64):
+        self.grid = grid
+        self.block_size = block_size
+        self.dtype = dtype
+
+        order = _topological_order(outputs)
+        halos = collections.defaultdict(int)
+        for node in reversed(order):
+            radius = NEIGHBORHOOD[node.param[0]][0](node.param[1]) if node.op == 'neighborhood' else 0
+            for arg in node.args:
+                halos[arg.uid] = max(halos[arg.uid], halos[node.uid] + radius)
+
+        self.neighborhoods = collections.OrderedDict()
+        for node in order:
+            if node.op == 'neighborhood':
+                kind, args, _ = node.param
+                key = (node.args[0].uid, node.args[1].uid, kind, args)
+                if key not in self.neighborhoods:
+                    self.neighborhoods[key] = _Neighborhood(node.args, kind, args)
+                neighborhood = self.neighborhoods[key]
+                neighborhood.nodes.append(node)
+                neighborhood.halo = max(neighborhood.halo, halos[node.uid])
+        self.final = FusedPass(outputs)
+
+        self.functions = {}
+        for fused in [neighborhood.fused for neighborhood in self.neighborhoods.values()] + [self.final]:
+            self.functions[fused] = fused.compile(grid, dtype)
+
+    def tile_memory(self, height, width):
+        """Estimate the memory used to compute a tile.
+
+        Args:
+            height (int): The height of the tile.
+            width (int): The width of the tile.
+
+        Returns:
+            int: The estimated peak memory, in bytes.
+        """
+        itemsize = np.dtype(self.dtype).itemsize
+        total = 0
+        for neighborhood in self.neighborhoods.values():
+            margin = neighborhood.halo + neighborhood.radius
+            pixels = (height + 2 * margin) * (width + 2 * margin)
+            # The leaves, the value and mask with their padded copies, and the temporaries of the operation
+            total += pixels * (itemsize * (len(neighborhood.fused.leaves) + 4) + 2)
+            total += (height + 2 * neighborhood.halo) * (width + 2 * neighborhood.halo) * (itemsize + 1)
+        pixels = height * width
+        total += pixels * itemsize * (len(self.final.leaves) + len(self.final.outputs))
+        for fused in self.functions:
+            total += len(fused.lines) * min(self.block_size or pixels, pixels) * itemsize
+        return total
+
+    def compute_tile(self, window, timing):
+        """Compute the outputs over a window of the grid.
+
+        Args:
+            window (tuple): The (first row, last row + 1, first column, last column + 1) of the window.
+            timing (dict): The seconds spent reading the leaves, in the neighborhood operations and in the fused
+                passes are added to its 'read', 'neighborhood' and 'elementwise' keys.
+
+        Returns:
+            list: The 2D arrays of the outputs over the window.
+        """
+        results = {}
+        for neighborhood in self.neighborhoods.values():
+            out_window = _clip_window(_expand_window(window, neighborhood.halo), self.grid.shape)
+            in_window = _expand_window(out_window, neighborhood.radius)
+            read_window = _clip_window(in_window, self.grid.shape)
+            values, masks = self._run(neighborhood.fused, read_window, results, timing)
+            if read_window != in_window:
+                padding = ((read_window[0] - in_window[0], in_window[1] - read_window[1]),
+                           (read_window[2] - in_window[2], in_window[3] - read_window[3]))
+                values, masks = np.pad(values, padding), np.pad(masks, padding)
+
+            start = time.time()
+            with np.errstate(all='ignore'):
+                outputs = NEIGHBORHOOD[neighborhood.kind][1](values, masks, neighborhood.args, self.grid,
+                                                             out_window)
+            timing['neighborhood'] += time.time() - start
+            for node in neighborhood.nodes:
+                results[node.uid] = (outputs[node.param[2]], out_window)
+        return self._run(self.final, window, results, timing)
+
+    def _run(self, fused, window, results, timing):
+        start = time.time()
+        leaves = []
+        for node in fused.leaves:
+            if node.op == 'neighborhood':
+                array = _crop(results[node.uid][0], results[node.uid][1], window)
+            elif node.op in SOURCES:
+                array = SOURCES[node.op](node, window)
+            else:
+                _unsupported(node)
+            leaves.append(np.ascontiguousarray(array).reshape(-1))
+        timing['read'] += time.time() - start
+
+        start = time.time()
+        arrays = fused.run(self.functions[fused], leaves, window, self.block_size, self.dtype)
+        timing['elementwise'] += time.time() - start
+        return arrays
+
+
+def tiles(shape, tile_size):
+    """Split a grid into square tiles.
+
+    Args:
+        shape (tuple): The (height, width) of the grid.
+        tile_size (int): The size of the tiles. None makes one tile of the whole grid.
+
+    Returns:
+        list: The (first row, last row + 1, first column, last column + 1) of the tiles.
+    """
+    height, width = shape
+    if not tile_size:
+        return [(0, height, 0, width)]
+    return [(row, min(row + tile_size, height), col, min(col + tile_size, width))
+            for row in range(0, height, tile_size) for col in range(0, width, tile_size)]
+
+
+def choose_tile_size(plan, memory_limit, workers=1):
+    """Find the largest power of two tile size whose tiles can be computed by the workers within a memory limit.
+
+    Args:
+        plan (Plan): The plan.
+        memory_limit (int): The memory limit, in bytes.
+        workers (int, optional): Number of tiles computed at the same time. Defaults to 1.
+
+    Returns:
+        int: The tile size.
+    """
+    height, width = plan.grid.shape
+    tile_size = 1 << max(int(math.ceil(math.log2(max(height, width, 1)))), 0)
+    while tile_size > MIN_TILE_SIZE and \
+            plan.tile_memory(min(tile_size, height), min(tile_size, width)) * workers > memory_limit:
+        tile_size //= 2
+    needed = plan.tile_memory(min(tile_size, height), min(tile_size, width)) * workers
+    if needed > memory_limit:
+        raise MemoryError('Computing {} tiles of {} pixels at a time needs {:.0f} MB, over the limit of {:.0f} MB'
+                          .format(workers, tile_size, needed / MB, memory_limit / MB))
+    return tile_size
+
+
+def evaluate(outputs, out, grid, block_size=BLOCK_SIZE, dtype=np.float64, tile_size=None, workers=1,
+             memory_limit=None, timings=None):
+    """Compute output nodes over a grid, tile by tile, into arrays.
+
+    Args:
+        outputs (list): The output nodes, values and masks.
+        out (list): The 2D arrays the outputs are written to, e.g., memory-mapped .npy files, of a floating point type
+            for the values and bool for the masks.
+        grid (Grid): The grid.
+        block_size (int, optional): Number of pixels computed at a time. Defaults to BLOCK_SIZE. None computes every
+            tile at once.
+        dtype (numpy.dtype, optional): The floating point type of the computation. Defaults to numpy.float64.
+        tile_size (int, optional): The size of the square tiles. Defaults to None, which computes the whole grid as
+            one tile, or the largest tiles within memory_limit if it is set.
+        workers (int, optional): Number of threads computing tiles. Defaults to 1.
+        memory_limit (float, optional): The memory for the out arrays that are not memory-mapped and the tiles in
+            progress, in bytes. Defaults to None, which does not limit it.
+        timings (list, optional): A list the timing dicts of the tiles are added to, see timing_report(). Defaults
+            to None.
+
+    Returns:
+        list: The out arrays.
+    """
+    plan = Plan(outputs, grid, block_size, dtype)
+    if memory_limit is not None:
+        in_memory = sum(array.nbytes for array in out if not isinstance(array, np.memmap))
+        if in_memory >= memory_limit:
+            raise MemoryError('The results need {:.0f} MB, over the limit of {:.0f} MB: save them to disk instead'
+                              .format(in_memory / MB, memory_limit / MB))
+        if tile_size is None:
+            tile_size = choose_tile_size(plan, memory_limit - in_memory, workers)
+        elif plan.tile_memory(tile_size, tile_size) * workers > memory_limit - in_memory:
+            raise MemoryError('Tiles of {} pixels need more than the limit of {:.0f} MB'.format(
+                tile_size, memory_limit / MB))
+
+    def compute(window):
+        timing = {'window': window, 'read': 0.0, 'neighborhood': 0.0, 'elementwise': 0.0,
+                  'thread': threading.current_thread().name}
+        start = time.time()
+        arrays = plan.compute_tile(window, timing)
+        write_start = time.time()
+        for array, target in zip(arrays, out):
+            target[window[0]:window[1], window[2]:window[3]] = array
+        timing['write'] = time.time() - write_start
+        timing['total'] = time.time() - start
+        return timing
+
+    windows = tiles(grid.shape, tile_size)
+    if workers > 1 and len(windows) > 1:
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            tile_timings = list(executor.map(compute, windows))
+    else:
+        tile_timings = [compute(window) for window in windows]
+    if timings is not None:
+        timings.extend(tile_timings)
+    return out
+
+
+def timing_report(timings, wall_time=None):
+    """Print a summary of the timings of the tiles.
+
+    Args:
+        timings (list): The timing dicts of evaluate().
+        wall_time (float, optional): The elapsed seconds of the computation. Defaults to None.
+
+    Returns:
+        dict: The number of tiles, the mean and maximum seconds per tile and the share of every step.
+    """
+    total = sum(timing['total'] for timing in timings) or 1e-9
+    slowest = max(timings, key=lambda timing: timing['total'])
+    report = {'tiles': len(timings), 'mean': total / len(timings), 'max': slowest['total'],
+              'slowest': slowest['window']}
+    for step in ['read', 'neighborhood', 'elementwise', 'write']:
+        report[step] = sum(timing[step] for timing in timings) / total
+    print('{} tiles in {} threads: {:.3f}s per tile on average, {:.3f}s for the slowest {}'.format(
+        len(timings), len(set(timing['thread'] for timing in timings)), report['mean'], report['max'],
+        report['slowest']))
+    print('read {read:.0%}, neighborhood operations {neighborhood:.0%}, fused passes {elementwise:.0%}, '
+          'write {write:.0%}'.format(**report))
+    if wall_time:
+        print('{:.2f}s of tile time in {:.2f}s'.format(total, wall_time))
+    return report
+
+
+def _unsupported(node):
+    raise NotImplementedError('The local backend cannot compute {}'.format(node.op))
+
+
+class _ExpressionParser(object):
+    """A parser of Earth Engine expressions, which builds the result with the Image methods."""
+
+    TOKEN = re.compile(r'\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z_]\w*)|'
+                       r"('[^']*'|\"[^\"]*\")|(\*\*|==|!=|<=|>=|&&|\|\||[-+*/%<>!?:(),.]))")
+    BINARY = {'||': (1, 'Or'), '&&': (2, 'And'), '==': (3, 'eq'), '!=': (3, 'neq'), '<': (4, 'lt'), '<=': (4, 'lte'),
+              '>': (4, 'gt'), '>=': (4, 'gte'), '+': (5, 'add'), '-': (5, 'subtract'), '*': (6, 'multiply'),
+              '/': (6, 'divide'), '%': (6, 'mod'), '**': (7, 'pow')}
+    FUNCTIONS = {'abs': 'abs', 'sqrt': 'sqrt', 'exp': 'exp', 'log': 'log', 'log10': 'log10', 'floor': 'floor',
+                 'ceil': 'ceil', 'round': 'round', 'min': 'min', 'max': 'max', 'pow': 'pow', 'sin': 'sin',
+                 'cos': 'cos', 'tan': 'tan', 'asin': 'asin', 'acos': 'acos', 'atan': 'atan', 'atan2': 'atan2'}
+
+    def __init__(self, expression, image, variables):
+        self.expression = expression
+        self.image = image
+        self.variables = variables
+        self.tokens = []
+        position = 0
+        while expression[position:].strip():
+            match = self.TOKEN.match(expression, position)
+            if match is None:
+                raise SyntaxError('Unexpected {!r} in expression: {}'.format(expression[position:].strip()[:10],
+                                                                            expression))
+            number, name, string, operator = match.groups()
+            if number is not None:
+                self.tokens.append(('number', float(number)))
+            elif name is not None:
+                self.tokens.append(('name', name))
+            elif string is not None:
+                self.tokens.append(('string', string[1:-1]))
+            else:
+                self.tokens.append(('op', operator))
+            position = match.end()
+        self.position = 0
+
+    def parse(self):
+        result = self.ternary()
+        if self.position < len(self.tokens):
+            self.fail()
+        return _to_image(result)
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, operator=None):
+        token = self.peek()
+        if token[0] is None or (operator is not None and token != ('op', operator)):
+            self.fail()
+        self.position += 1
+        return token
+
+    def fail(self):
+        token = self.peek()
+        raise SyntaxError('Unexpected {} in expression: {}'.format(
+            repr(token[1]) if token[0] else 'end', self.expression))
+
+    def ternary(self):
+        condition = self.binary(1)
+        if self.peek() != ('op', '?'):
+            return condition
+        self.take('?')
+        if_true = _to_image(self.ternary())
+        self.take(':')
+        if_false = _to_image(self.ternary())
+        # The result has the bands of the two branches, like the ?: operator of ee.Image.expression.
+        return if_false.where(_to_image(condition), if_true)
+
+    def binary(self, min_precedence):
+        left = self.unary()
+        while True:
+            kind, operator = self.peek()
+            if kind != 'op' or operator not in self.BINARY or self.BINARY[operator][0] < min_precedence:
+                return left
+            precedence, method = self.BINARY[operator]
+            self.take()
+            # ** is right associative, the others are left associative.
+            right = self.binary(precedence if operator == '**' else precedence + 1)
+            left = getattr(_to_image(left), method)(right)
+
+    def unary(self):
+        kind, operator = self.peek()
+        if (kind, operator) == ('op', '-'):
+            self.take()
+            operand = self.unary()
+            return -operand if isinstance(operand, float) else _to_image(operand)._map_bands('neg')
+        if (kind, operator) == ('op', '+'):
+            self.take()
+            return self.unary()
+        if (kind, operator) == ('op', '!'):
+            self.take()
+            return _to_image(self.unary()).Not()
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == 'number':
+            return value
+        if (kind, value) == ('op', '('):
+            result = self.ternary()
+            self.take(')')
+            return result
+        if kind != 'name':
+            self.position -= 1
+            self.fail()
+
+        if self.peek() == ('op', '('):
+            arguments = self.arguments()
+            if value == 'b':
+                return self.image.select(arguments[0] if isinstance(arguments[0], str) else int(arguments[0]))
+            if value not in self.FUNCTIONS:
+                raise SyntaxError('Unknown function {} in expression: {}'.format(value, self.expression))
+            return getattr(_to_image(arguments[0]), self.FUNCTIONS[value])(*arguments[1:])
+
+        if value in self.variables:
+            result = self.variables[value]
+        elif value in self.image.bandNames():
+            result = self.image.select(value)
+        else:
+            raise SyntaxError('Unknown variable {} in expression: {}'.format(value, self.expression))
+        if self.peek() == ('op', '.'):
+            self.take('.')
+            result = _to_image(result).select(self.take()[1])
+        return result if isinstance(result, (Image, float, int)) else _to_image(result)
+
+    def arguments(self):
+        self.take('(')
+        arguments = []
+        while self.peek() != ('op', ')'):
+            if self.peek()[0] == 'string':
+                arguments.append(self.take()[1])
+            else:
+                arguments.append(self.ternary())
+            if self.peek() == ('op', ','):
+                self.take(',')
+        self.take(')')
+        return arguments
@@ -0,0 +1,145 @@
+''' Benchmarks of local_image.py: the fused evaluation of band math, and terrain products computed tile by tile.
+
+To compare the fused evaluation with plain NumPy: python local_image_benchmark.py --benchmark --size 4096
+To time the terrain products of a synthetic DEM within a memory limit:
+    python local_image_benchmark.py --tile-benchmark --size 8192 --memory-limit 256
+
+'''
+
+# License: MIT
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from local_image import Image, Kernel, Terrain, Grid, BLOCK_SIZE, MB, timing_report
+
+
+def benchmark(size=4096, repeat=3, block_size=BLOCK_SIZE):
+    """Time NDVI, NDWI and EVI computations on random bands, with the fused blocked pass and with plain NumPy.
+
+    Args:
+        size (int, optional): The width and height of the image. Defaults to 4096.
+        repeat (int, optional): Number of timed runs; the best one is reported. Defaults to 3.
+        block_size (int, optional): The block size of the fused pass. Defaults to BLOCK_SIZE.
+
+    Returns:
+        dict: The best times in seconds, keyed by 'fused' and 'numpy'.
+    """
+    random = np.random.default_rng(0)
+    arrays = {name: random.integers(0, 10000, (size, size), dtype=np.uint16) for name in ['B2', 'B3', 'B4', 'B8']}
+    image = Image(arrays)
+    ndvi = image.normalizedDifference(['B8', 'B4'])
+    ndwi = image.normalizedDifference(['B3', 'B8'])
+    evi = image.expression('2.5 * (NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1)',
+                           {'NIR': image.select('B8'), 'RED': image.select('B4'), 'BLUE': image.select('B2')})
+    result = ndvi.updateMask(ndvi.gte(0.4)).addBands(ndwi.gte(0.2).rename('water')).addBands(evi.rename('evi'))
+
+    def numpy_version():
+        b2, b3, b4, b8 = [arrays[name].astype(np.float64) for name in ['B2', 'B3', 'B4', 'B8']]
+        with np.errstate(all='ignore'):
+            nd = np.where(b8 + b4 == 0, 0.0, (b8 - b4) / (b8 + b4))
+            water = (np.where(b3 + b8 == 0, 0.0, (b3 - b8) / (b3 + b8)) >= 0.2).astype(np.float64)
+            denominator = b8 + 6 * b4 - 7.5 * b2 + 1
+            evi_array = 2.5 * (b8 - b4) / denominator
+        return [np.ma.MaskedArray(nd, mask=nd < 0.4), water, np.ma.MaskedArray(evi_array, mask=denominator == 0)]
+
+    times = {}
+    for name, function in [('fused', lambda: result.compute(block_size)),
+                           ('unfused', lambda: result.compute(None)),
+                           ('numpy', numpy_version)]:
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            function()
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times[name] = best
+
+    fused = result.compute(block_size)
+    for (band, array), expected in zip(fused.items(), numpy_version()):
+        if not np.ma.allclose(array, expected):
+            raise AssertionError('The {} band differs from the NumPy result'.format(band))
+
+    print('{0}x{0} pixels: fused {1:.3f}s, unfused {2:.3f}s, plain NumPy {3:.3f}s'.format(
+        size, times['fused'], times['unfused'], times['numpy']))
+    return times
+
+
+def benchmark_tiles(size=8192, memory_limit=256 * MB, workers=4, tile_size=None, work_dir=None):
+    """Compute the terrain products of a synthetic DEM larger than a memory limit, tile by tile from disk to disk.
+
+    Args:
+        size (int, optional): The width and height of the DEM, of one arc-second pixels. Defaults to 8192.
+        memory_limit (int, optional): The memory limit, in bytes. Defaults to 256 MB.
+        workers (int, optional): Number of threads computing tiles. Defaults to 4.
+        tile_size (int, optional): The tile size. Defaults to None, which uses the largest one within the limit.
+        work_dir (str, optional): The folder of the DEM and of the results. Defaults to None, which uses a temporary
+            folder that is deleted at the end.
+
+    Returns:
+        dict: The timing report of the terrain products, with their wall time and the peak of the memory allocated.
+    """
+    temporary = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='local_image_')
+    try:
+        grid = Grid((size, size), (1 / 3600.0, 0.0, -122.0, 0.0, -1 / 3600.0, 47.0), 'EPSG:4326')
+        coords = Image.pixelLonLat()
+        lon, lat = coords.select('longitude'), coords.select('latitude')
+        dem = lon.multiply(40).sin().multiply(lat.multiply(30).cos()).multiply(800) \
+            .add(lon.multiply(7).add(lat.multiply(5)).cos().multiply(300)).add(1200).rename('elevation')
+        dem = Image(dem.save(os.path.join(work_dir, 'dem'), grid=grid, workers=workers, memory_limit=memory_limit))
+        print('Saved a DEM of {0}x{0} pixels ({1:.0f} MB)'.format(size, size * size * 4 / MB))
+
+        shade = Terrain.hillshade(dem, 315, 45)
+        relief = dem.focal_max(2, 'square').subtract(dem.focal_min(2, 'square')).rename('relief')
+        smooth = dem.convolve(Kernel.gaussian(3, 1.5)).rename('smooth')
+        products = shade.addBands([Terrain.slope(dem), relief, smooth])
+
+        timings = []
+        tracemalloc.start()
+        start = time.time()
+        products.save(os.path.join(work_dir, 'terrain'), workers=workers, tile_size=tile_size,
+                      memory_limit=memory_limit, timings=timings)
+        wall_time = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = timing_report(timings, wall_time)
+    report.update({'wall_time': wall_time, 'peak_memory': peak})
+    print('{0}x{0} pixels, 4 bands ({1:.0f} MB) in {2:.2f}s, with at most {3:.0f} MB allocated (limit {4:.0f} MB)'
+          .format(size, size * size * 16 / MB, wall_time, peak / MB, memory_limit / MB))
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the local NumPy backend for the ee.Image band math.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Compare the fused evaluation with plain NumPy")
+    parser.add_argument('--size', type=int, default=4096,
+                        help="Width and height of the benchmark image")
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE,
+                        help="Number of pixels computed at a time")
+    parser.add_argument('--tile-benchmark', action='store_true',
+                        help="Compute the terrain products of a synthetic DEM tile by tile, within --memory-limit")
+    parser.add_argument('--memory-limit', type=float, default=256,
+                        help="Memory limit of the tile benchmark, in MB")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Number of threads computing tiles")
+    parser.add_argument('--tile-size', type=int,
+                        help="Tile size, the largest one within the memory limit by default")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.size, block_size=args.block_size)
+    if args.tile_benchmark:
+        benchmark_tiles(args.size, args.memory_limit * MB, args.workers, args.tile_size)
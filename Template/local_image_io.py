@@ -0,0 +1,114 @@
+''' Local copies of Earth Engine images for local_image.py: the .npz files that Image() reads, and their download.
+
+To save a local copy of a region of an asset (this needs the real ee package and an Earth Engine session):
+    python local_image_io.py --download LANDSAT/LC08/C01/T1_TOA/LC08_044034_20140318 --region -122.3 37.6 -122.1 37.8
+
+The file is saved in the folder of the local assets, local_image.DATA_DIR, where Image('LANDSAT/...') finds it.
+
+'''
+
+# License: MIT
+
+import os
+import json
+import argparse
+
+import numpy as np
+
+from local_image import DATA_DIR
+
+
+def save_npz(out_file, arrays, crs_transform=None, crs=None, properties=None):
+    """Save bands to a .npz file that Image() can read.
+
+    Args:
+        out_file (str): The output file path.
+        arrays (dict): The 2D arrays, keyed by band name. The mask of a masked array is saved in the <band>.mask
+            array, and its masked pixels are saved as NaN (0 for integer arrays).
+        crs_transform (list, optional): The affine transform of the grid, [scaleX, shearX, translateX, shearY,
+            scaleY, translateY]. Defaults to None.
+        crs (str, optional): The CRS of the grid, e.g., EPSG:4326. Defaults to None.
+        properties (dict, optional): The JSON serializable image properties. Defaults to None.
+    """
+    out_dir = os.path.dirname(os.path.abspath(out_file))
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    data = {}
+    for name, array in arrays.items():
+        if np.ma.isMaskedArray(array):
+            data[name + '.mask'] = ~np.ma.getmaskarray(array)
+            array = array.filled(np.nan if np.issubdtype(array.dtype, np.floating) else 0)
+        data[name] = np.asarray(array)
+    if crs_transform is not None:
+        data['__crs_transform__'] = np.asarray(crs_transform, dtype=np.float64)
+    if crs is not None:
+        data['__crs__'] = np.asarray(crs)
+    if properties:
+        data['__properties__'] = np.asarray(json.dumps(properties))
+    np.savez_compressed(out_file, **data)
+
+
+def download_asset(asset_id, region, scale, crs='EPSG:4326', data_dir=None, bands=None):
+    """Save a local copy of a region of an Earth Engine image, with the real ee package.
+
+    Args:
+        asset_id (str): The asset id of the image.
+        region (list): The [xMin, yMin, xMax, yMax] bounds of the region, in crs.
+        scale (float): The pixel size, in the units of crs.
+        crs (str, optional): The CRS of the grid. Defaults to 'EPSG:4326'.
+        data_dir (str, optional): The folder of the local assets. Defaults to None, which uses DATA_DIR.
+        bands (list, optional): The band names. Defaults to None, which saves all bands.
+
+    Returns:
+        str: The path of the .npz file, with the masks of the bands, see save_npz().
+    """
+    import ee
+
+    x0, y0, x1, y1 = region
+    width, height = int(round((x1 - x0) / scale)), int(round((y1 - y0) / scale))
+    image = ee.Image(asset_id)
+    if bands:
+        image = image.select(bands)
+    names, properties = ee.List([image.bandNames(), image.toDictionary()]).getInfo()
+    # The NumPy arrays of computePixels() have no mask, so the masks are downloaded as bands too.
+    masks = image.mask().gt(0).toByte().rename([name + '_mask' for name in names])
+    crs_transform = [scale, 0, x0, 0, -scale, y1]
+    pixels = ee.data.computePixels({
+        'expression': image.addBands(masks),
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': {
+            'dimensions': {'width': width, 'height': height},
+            'affineTransform': dict(zip(['scaleX', 'shearX', 'translateX', 'shearY', 'scaleY', 'translateY'],
+                                        crs_transform)),
+            'crsCode': crs,
+        },
+    })
+
+    out_file = os.path.join(data_dir or DATA_DIR, *asset_id.split('/')) + '.npz'
+    arrays = {name: np.ma.MaskedArray(pixels[name], mask=pixels[name + '_mask'] == 0) for name in names}
+    save_npz(out_file, arrays, crs_transform, crs, properties)
+    print('Saved {} bands of {}x{} pixels to {}'.format(len(names), width, height, out_file))
+    return out_file
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Save a local copy of an Earth Engine image for local_image.py.')
+    parser.add_argument('--download', type=str, required=True,
+                        help="Asset id of an image to save locally")
+    parser.add_argument('--region', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'), required=True,
+                        help="Bounds of the region to save, in the CRS")
+    parser.add_argument('--scale', type=float, default=0.00025,
+                        help="Pixel size of the saved image, in the units of the CRS")
+    parser.add_argument('--crs', type=str, default='EPSG:4326',
+                        help="CRS of the saved image")
+    parser.add_argument('--bands', type=str, nargs='+',
+                        help="Bands to save, all bands by default")
+    parser.add_argument('--data-dir', type=str, default=DATA_DIR,
+                        help="Folder of the local assets")
+    args = parser.parse_args()
+
+    import ee
+    ee.Initialize()
+    download_asset(args.download, args.region, args.scale, args.crs, args.data_dir, args.bands)
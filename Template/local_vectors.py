@@ -0,0 +1,439 @@
+''' Connected components and polygons of local rasters with NumPy, for the local backend of local_image.py.
+
+To count the pixels of the 8-connected patches of equal values, capped at 500:
+    counts = connected_pixel_count(values, valid, 500, eight_connected=True)
+To get the polygons of the patches as GeoJSON features: polygonize(values, valid, crs_transform)
+To time the water extraction of cal_ndwi() in naip_ndwi_pipeline.py on a synthetic NAIP tile:
+    python local_vectors.py --benchmark --size 10000
+
+The patches are labelled with a union-find over the runs of equal values of the rows instead of over the pixels:
+the runs of a row are linked to the touching runs of the previous row with a binary search, and the runs are merged by
+hooking roots onto smaller roots and compressing the paths, all with vectorized NumPy operations. The polygons are
+traced from the pixel sides between different patches: every side is linked to the next side of its patch, the rings
+are found and ordered by pointer doubling, and only their corners are kept.
+
+'''
+
+# License: MIT
+
+import time
+import argparse
+
+import numpy as np
+
+
+def runs(values, valid):
+    """Find the runs of equal valid values of the rows of an array.
+
+    Args:
+        values (numpy.ndarray): The 2D values.
+        valid (numpy.ndarray): The 2D mask of the valid pixels.
+
+    Returns:
+        tuple: The row, first column and last column + 1 of the runs, in row-major order.
+    """
+    height, width = values.shape
+    change = np.ones((height, width), dtype=np.bool_)
+    change[:, 1:] = (values[:, 1:] != values[:, :-1]) | (valid[:, 1:] != valid[:, :-1])
+    starts = np.flatnonzero(change)
+    # Every row starts a run, so a run never goes past the end of its row.
+    ends = np.append(starts[1:], height * width)
+    keep = valid.reshape(-1)[starts]
+    starts, ends = starts[keep], ends[keep]
+    rows = starts // width
+    return rows, starts - rows * width, ends - rows * width
+
+
+def touching_runs(rows, first, last, width, eight_connected=True):
+    """Find the pairs of runs of consecutive rows that touch each other.
+
+    Args:
+        rows (numpy.ndarray): The rows of the runs, see runs().
+        first (numpy.ndarray): The first columns of the runs.
+        last (numpy.ndarray): The last columns + 1 of the runs.
+        width (int): The width of the array.
+        eight_connected (bool, optional): Whether runs touching by a corner touch. Defaults to True.
+
+    Returns:
+        tuple: The indices of the runs of the previous row and of the runs of the next row of every pair.
+    """
+    corner = 1 if eight_connected else 0
+    # Keys that sort the runs by row then column, with a gap between the rows.
+    stride = width + 2
+    start_keys = rows * stride + first
+    end_keys = rows * stride + last
+    low = np.searchsorted(end_keys, (rows - 1) * stride + first - corner, side='right')
+    high = np.searchsorted(start_keys, (rows - 1) * stride + last + corner, side='left')
+    counts = np.maximum(high - low, 0)
+    below = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(low, counts) + offsets, below
+
+
+def union_find(count, first, second):
+    """Merge the elements of pairs into sets.
+
+    Args:
+        count (int): Number of elements.
+        first (numpy.ndarray): The first elements of the pairs.
+        second (numpy.ndarray): The second elements of the pairs.
+
+    Returns:
+        numpy.ndarray: The smallest element of the set of every element.
+    """
+    parent = np.arange(count)
+    while len(first):
+        first_root, second_root = parent[first], parent[second]
+        different = first_root != second_root
+        if not different.any():
+            break
+        first, second = first[different], second[different]
+        first_root, second_root = first_root[different], second_root[different]
+        # Hook the larger root onto the smaller one, then point every element to its root.
+        np.minimum.at(parent, np.maximum(first_root, second_root), np.minimum(first_root, second_root))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def label(values, valid, eight_connected=True):
+    """Label the connected patches of equal valid values.
+
+    Args:
+        values (numpy.ndarray): The 2D values.
+        valid (numpy.ndarray): The 2D mask of the valid pixels.
+        eight_connected (bool, optional): Whether pixels touching by a corner are connected. Defaults to True.
+
+    Returns:
+        tuple: The runs (see runs()), the patch of every run, numbered from 0, and the number of pixels of every patch.
+    """
+    rows, first, last = runs(values, valid)
+    run_values = values[rows, first]
+    previous, following = touching_runs(rows, first, last, values.shape[1], eight_connected)
+    same = run_values[previous] == run_values[following]
+    roots = union_find(len(rows), previous[same], following[same])
+    _, patches = np.unique(roots, return_inverse=True)
+    patches = patches.reshape(-1)
+    sizes = np.bincount(patches, weights=last - first).astype(np.int64)
+    return (rows, first, last), patches, sizes
+
+
+def connected_pixel_count(values, valid, max_size=100, eight_connected=True):
+    """Count the pixels of the connected patch of equal values of every pixel, like ee.Image.connectedPixelCount().
+
+    Args:
+        values (numpy.ndarray): The 2D values.
+        valid (numpy.ndarray): The 2D mask of the valid pixels.
+        max_size (int, optional): The largest count; larger patches get this count. Defaults to 100.
+        eight_connected (bool, optional): Whether pixels touching by a corner are connected. Defaults to True.
+
+    Returns:
+        numpy.ndarray: The counts, 0 for the pixels that are not valid.
+    """
+    (rows, first, last), patches, sizes = label(values, valid, eight_connected)
+    counts = np.zeros(values.shape, dtype=np.int64)
+    counts.reshape(-1)[np.flatnonzero(valid)] = np.repeat(np.minimum(sizes, max_size)[patches], last - first)
+    return counts
+
+
+def label_image(values, valid, eight_connected=True):
+    """Label the connected patches of equal valid values, pixel by pixel.
+
+    Args:
+        values (numpy.ndarray): The 2D values.
+        valid (numpy.ndarray): The 2D mask of the valid pixels.
+        eight_connected (bool, optional): Whether pixels touching by a corner are connected. Defaults to True.
+
+    Returns:
+        tuple: The 2D labels (-1 for the pixels that are not valid), the value of every patch and its number of pixels.
+    """
+    (rows, first, last), patches, sizes = label(values, valid, eight_connected)
+    labels = np.full(values.shape, -1, dtype=np.int32 if len(sizes) < 2 ** 31 else np.int64)
+    labels.reshape(-1)[np.flatnonzero(valid)] = np.repeat(patches, last - first)
+    patch_values = np.zeros(len(sizes), dtype=values.dtype)
+    patch_values[patches] = values[rows, first]
+    return labels, patch_values, sizes
+
+
+def _pointer_doubling_rings(successor):
+    # Find the cycles of a permutation and the position of every element in its cycle, from the smallest element.
+    ring = np.arange(len(successor))
+    jump = successor.copy()
+    while True:
+        smaller = np.minimum(ring, ring[jump])
+        jump = jump[jump]
+        if np.array_equal(smaller, ring):
+            break
+        ring = smaller
+    # Cut every cycle before its smallest element and rank the elements by their distance to the cut.
+    last = successor == ring
+    distance = np.where(last, 0, 1)
+    jump = np.where(last, np.arange(len(successor)), successor)
+    while True:
+        distance_next = distance + distance[jump]
+        jump_next = jump[jump]
+        if np.array_equal(jump_next, jump):
+            break
+        distance, jump = distance_next, jump_next
+    return ring, distance
+
+
+def trace_rings(labels, eight_connected=True):
+    """Trace the boundaries of the labelled patches.
+
+    The pixel sides between different labels are oriented so that their patch is on their right in row and column
+    coordinates (the outer rings go clockwise on the screen and the holes counterclockwise).
+
+    Args:
+        labels (numpy.ndarray): The 2D labels, -1 for no patch.
+        eight_connected (bool, optional): Whether the boundary goes through the corners where two pixels of a patch
+            touch, which keeps 8-connected patches in one ring. Defaults to True.
+
+    Returns:
+        tuple: The label of every ring and the list of the (column, row) corner vertices of every ring.
+    """
+    height, width = labels.shape
+    padded = np.full((height + 2, width + 2), -1, dtype=labels.dtype)
+    padded[1:-1, 1:-1] = labels
+    inner = padded[1:-1, 1:-1]
+
+    # The sides of the pixels whose neighbor has another label: (neighbor row, column offset, start and end vertex
+    # offsets from the top left corner of the pixel)
+    sides = [((0, 1), (0, 0), (0, 1)), ((1, 2), (0, 1), (1, 1)), ((2, 1), (1, 1), (1, 0)), ((1, 0), (1, 0), (0, 0))]
+    starts, ends, edge_labels = [], [], []
+    for (row_offset, col_offset), (start_row, start_col), (end_row, end_col) in sides:
+        neighbor = padded[row_offset:row_offset + height, col_offset:col_offset + width]
+        rows, cols = np.nonzero((inner >= 0) & (inner != neighbor))
+        starts.append((rows + start_row) * (width + 1) + cols + start_col)
+        ends.append((rows + end_row) * (width + 1) + cols + end_col)
+        edge_labels.append(inner[rows, cols])
+    starts, ends = np.concatenate(starts), np.concatenate(ends)
+    edge_labels = np.concatenate(edge_labels).astype(np.int64)
+    if not len(starts):
+        return np.zeros(0, dtype=labels.dtype), []
+
+    # The next side of every side: the side of the same patch starting where it ends. Where two pixels of a patch
+    # touch by a corner, two sides start there: take the one turning left (towards the other pixel) to go through
+    # the corner, or the one turning right to go around it.
+    vertices = (height + 1) * (width + 1)
+    keys = edge_labels * vertices + starts
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    next_keys = edge_labels * vertices + ends
+    first = np.searchsorted(sorted_keys, next_keys, side='left')
+    count = np.searchsorted(sorted_keys, next_keys, side='right') - first
+    successor = order[first]
+    ambiguous = np.flatnonzero(count == 2)
+    if len(ambiguous):
+        direction_in = _direction(starts[ambiguous], ends[ambiguous], width)
+        candidate = order[first[ambiguous]]
+        direction_out = _direction(starts[candidate], ends[candidate], width)
+        cross = direction_in[0] * direction_out[1] - direction_in[1] * direction_out[0]
+        take_other = (cross > 0) if eight_connected else (cross < 0)
+        successor[ambiguous] = np.where(take_other, order[first[ambiguous] + 1], candidate)
+
+    ring, distance = _pointer_doubling_rings(successor)
+    position = np.lexsort((-distance, ring))
+    ring_sorted = ring[position]
+    boundaries = np.flatnonzero(np.diff(ring_sorted)) + 1
+
+    # Keep the vertices where the direction changes.
+    direction = _direction(starts, ends, width)
+    direction = direction[0][position] * 3 + direction[1][position]
+    ring_starts = np.concatenate([[0], boundaries])
+    previous = np.roll(direction, 1)
+    previous[ring_starts] = direction[np.append(boundaries - 1, len(direction) - 1)]
+    corners = direction != previous
+
+    ring_vertices = []
+    vertex_starts = starts[position]
+    for indices, is_corner in zip(np.split(np.arange(len(position)), boundaries), np.split(corners, boundaries)):
+        kept = vertex_starts[indices[is_corner]]
+        rows, cols = np.divmod(kept, width + 1)
+        ring_vertices.append(np.stack([cols, rows], axis=1))
+    return edge_labels[position[ring_starts]], ring_vertices
+
+
+def _direction(starts, ends, width):
+    start_rows, start_cols = np.divmod(starts, width + 1)
+    end_rows, end_cols = np.divmod(ends, width + 1)
+    return end_cols - start_cols, end_rows - start_rows
+
+
+def _signed_area(vertices):
+    x, y = vertices[:, 0].astype(np.float64), vertices[:, 1].astype(np.float64)
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _ring_contains(vertices, point):
+    x, y = point
+    inside = False
+    for (x0, y0), (x1, y1) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / float(y1 - y0):
+            inside = not inside
+    return inside
+
+
+def polygonize(values, valid, crs_transform=(1, 0, 0, 0, 1, 0), eight_connected=True, geometry_type='polygon',
+               label_property='label'):
+    """Get the connected patches of equal valid values as GeoJSON features, like ee.Image.reduceToVectors().
+
+    Args:
+        values (numpy.ndarray): The 2D values.
+        valid (numpy.ndarray): The 2D mask of the valid pixels.
+        crs_transform (list, optional): The affine transform of the grid, [scaleX, shearX, translateX, shearY,
+            scaleY, translateY]. Defaults to the pixel coordinates.
+        eight_connected (bool, optional): Whether pixels touching by a corner are connected. Defaults to True.
+        geometry_type (str, optional): 'polygon' for the outlines of the patches, 'bb' for their bounding boxes or
+            'centroid' for the centroid of their pixel centers. Defaults to 'polygon'.
+        label_property (str, optional): The property holding the value of the patch. Defaults to 'label'.
+
+    Returns:
+        list: The features, with the label_property and count (number of pixels) properties.
+    """
+    sx, shx, tx, shy, sy, ty = [float(value) for value in crs_transform]
+
+    def transform(vertices):
+        cols, rows = vertices[:, 0], vertices[:, 1]
+        return np.stack([sx * cols + shx * rows + tx, shy * cols + sy * rows + ty], axis=1)
+
+    labels, patch_values, sizes = label_image(values, valid, eight_connected)
+    features = [{'type': 'Feature', 'geometry': None,
+                 'properties': {label_property: patch_values[index].item(), 'count': int(sizes[index])}}
+                for index in range(len(sizes))]
+
+    if geometry_type == 'centroid':
+        rows, cols = np.nonzero(labels >= 0)
+        patches = labels[rows, cols]
+        centers = np.stack([np.bincount(patches, cols + 0.5, len(sizes)) / sizes,
+                            np.bincount(patches, rows + 0.5, len(sizes)) / sizes], axis=1)
+        for feature, point in zip(features, transform(centers)):
+            feature['geometry'] = {'type': 'Point', 'coordinates': point.tolist()}
+        return features
+
+    ring_labels, rings = trace_rings(labels, eight_connected)
+    # The rings of the boundaries go clockwise in row and column coordinates (counterclockwise for the holes), which
+    # is counterclockwise on a north-up map; reverse them when the transform flips the orientation.
+    flip = sx * sy - shx * shy < 0
+    outer = {}
+    holes = {}
+    for patch, ring in zip(ring_labels, rings):
+        if _signed_area(ring) > 0:
+            outer.setdefault(patch, []).append(ring)
+        else:
+            holes.setdefault(patch, []).append(ring)
+
+    for patch, shells in outer.items():
+        if geometry_type == 'bb':
+            corners = np.concatenate(shells)
+            (col0, row0), (col1, row1) = corners.min(axis=0), corners.max(axis=0)
+            shells, patch_holes = [np.array([[col0, row0], [col1, row0], [col1, row1], [col0, row1]])], {}
+        else:
+            patch_holes = {}
+            for hole in holes.get(patch, []):
+                shell = 0 if len(shells) == 1 else next(
+                    (index for index, shell in enumerate(shells) if _ring_contains(shell, hole[0] + 0.5)), 0)
+                patch_holes.setdefault(shell, []).append(hole)
+
+        polygons = []
+        for index, shell in enumerate(shells):
+            polygon = []
+            for ring in [shell] + patch_holes.get(index, []):
+                ring = transform(ring)
+                if flip:
+                    ring = ring[::-1]
+                polygon.append(np.vstack([ring, ring[:1]]).tolist())
+            polygons.append(polygon)
+        features[patch]['geometry'] = {'type': 'Polygon', 'coordinates': polygons[0]} if len(polygons) == 1 \
+            else {'type': 'MultiPolygon', 'coordinates': polygons}
+    return features
+
+
+def synthetic_naip(size, seed=0):
+    """Create G and N bands of a NAIP-like tile with water bodies, small ponds and noise.
+
+    Args:
+        size (int): The width and height of the tile.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        dict: The uint8 G and N bands.
+    """
+    random = np.random.default_rng(seed)
+    coords = np.linspace(0, 1, size, dtype=np.float32)
+    field = np.zeros((size, size), dtype=np.float32)
+    for _ in range(6):
+        fx, fy = random.uniform(2, 12, 2)
+        px, py = random.uniform(0, 2 * np.pi, 2)
+        field += np.outer(np.sin(fy * 2 * np.pi * coords + py), np.cos(fx * 2 * np.pi * coords + px))
+    water = field > 1.5
+    # Small ponds of a few pixels, which the minimum patch size removes.
+    water.reshape(-1)[random.integers(0, size * size, size * size // 2000)] = True
+    noise = random.integers(0, 40, (size, size), dtype=np.uint8)
+    green = np.where(water, 110, 70).astype(np.uint8) + noise
+    nir = np.where(water, 40, 130).astype(np.uint8) + noise
+    return {'G': green, 'N': nir}
+
+
+def benchmark(size=10000, threshold=0.2, min_patch_size=500, block_size=None):
+    """Time the water extraction of cal_ndwi() in naip_ndwi_pipeline.py and its polygons on a synthetic NAIP tile.
+
+    Args:
+        size (int, optional): The width and height of the tile. Defaults to 10000.
+        threshold (float, optional): The minimum NDWI of water. Defaults to 0.2.
+        min_patch_size (int, optional): The number of connected pixels of the smallest patch kept. Defaults to 500.
+        block_size (int, optional): See local_image.Image.compute(). Defaults to None, which uses its default.
+
+    Returns:
+        dict: The seconds of every step.
+    """
+    from local_image import Image, BLOCK_SIZE
+
+    times = {}
+    start = time.time()
+    image = Image(synthetic_naip(size))
+    times['synthetic data'] = time.time() - start
+
+    # The chain of cal_ndwi()
+    ndwi = image.normalizedDifference(['G', 'N'])
+    ndwi_masked = ndwi.updateMask(ndwi.gte(threshold))
+    ndwi_bin = ndwi_masked.gt(0)
+    patch_size = ndwi_bin.connectedPixelCount(min_patch_size, True)
+    large_patches = patch_size.eq(min_patch_size)
+    large_patches = large_patches.updateMask(large_patches)
+    water = large_patches.focal_min(1).focal_max(1)
+
+    timings = []
+    start = time.time()
+    result = water.compute(block_size or BLOCK_SIZE, np.float32, timings=timings)['nd']
+    times['water mask'] = time.time() - start
+    times['connected pixel count and opening'] = timings[0]['neighborhood']
+
+    start = time.time()
+    features = polygonize(result.filled(0), ~np.ma.getmaskarray(result), eight_connected=True)
+    times['polygons'] = time.time() - start
+
+    print('{0}x{0} pixels: {1} water pixels in {2} polygons'.format(size, int(result.count()), len(features)))
+    for step, seconds in times.items():
+        print('{}: {:.2f}s'.format(step, seconds))
+    return times
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Connected components and polygons of local rasters.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Time the water extraction of cal_ndwi() on a synthetic NAIP tile")
+    parser.add_argument('--size', type=int, default=10000,
+                        help="Width and height of the synthetic tile")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Minimum NDWI of water")
+    parser.add_argument('--min-patch-size', type=int, default=500,
+                        help="Number of connected pixels of the smallest water patch kept")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.size, args.threshold, args.min_patch_size)
@@ -0,0 +1,274 @@
+''' Export the NDWI water polygons of NAIP imagery for many watersheds and years, resumably.
+
+To export the water polygons of every watershed for several years to Google Drive:
+
+    watersheds = ee.FeatureCollection('users/name/watersheds')
+    results = export_ndwi_vectors(watersheds, [2009, 2012, 2015], 'ndwi_checkpoint.json', threshold=0.3)
+
+From the command line: python naip_ndwi_pipeline.py --watersheds users/name/watersheds --years 2009 2012 2015
+
+Each (year, watershed) unit is one KML export task named like Y2015_12_Little_Pipestem_Creek, holding the vectors of
+the NDWI water mask of the NAIP mosaic over that watershed. The tasks are started through an ExportScheduler, which
+limits the tasks in flight. The state of every unit is saved to a JSON checkpoint as the tasks progress, so that
+a run that was interrupted can be started again with the same checkpoint: completed units are skipped, running tasks
+are tracked until they finish, and failed or unstarted units are exported again.
+
+'''
+
+# License: MIT
+
+import os
+import json
+import argparse
+
+import ee
+from export_scheduler import ExportScheduler, FINAL_STATES
+
+
+NAIP_COLLECTION = 'USDA/NAIP/DOQQ'
+MAX_PIXELS = 59568116121
+CHECKPOINT_VERSION = '1'
+
+
+def cal_ndwi(image, threshold=0.2, min_patch_size=500):
+    """Compute the water mask of a NAIP image: NDWI above threshold, without small patches, opened by one pixel.
+
+    Args:
+        image (ee.Image): The NAIP image, with the G and N bands.
+        threshold (float, optional): The minimum NDWI of water. Defaults to 0.2.
+        min_patch_size (int, optional): The number of connected pixels of the smallest patch kept. Defaults to 500.
+
+    Returns:
+        ee.Image: The water mask, with 1 for water and masked elsewhere.
+    """
+    ndwi = image.normalizedDifference(['G', 'N'])
+    ndwi_masked = ndwi.updateMask(ndwi.gte(threshold))
+    ndwi_bin = ndwi_masked.gt(0)
+    patch_size = ndwi_bin.connectedPixelCount(min_patch_size, True)
+    large_patches = patch_size.eq(min_patch_size)
+    large_patches = large_patches.updateMask(large_patches)
+    return large_patches.focal_min(1).focal_max(1)
+
+
+def ndwi_vectors(watershed, year, threshold=0.2, collection=NAIP_COLLECTION, scale=1):
+    """Build the water polygons of NAIP imagery for a watershed.
+
+    Args:
+        watershed (ee.Feature): The watershed.
+        year (int): The year of the NAIP imagery.
+        threshold (float, optional): See cal_ndwi(). Defaults to 0.2.
+        collection (str, optional): The asset id of the NAIP collection. Defaults to NAIP_COLLECTION.
+        scale (float, optional): The scale of the vectors, in meters. Defaults to 1.
+
+    Returns:
+        ee.FeatureCollection: The water polygons, with the year and watershed (its system:index) properties.
+    """
+    geometry = watershed.geometry()
+    image = ee.ImageCollection(collection).filterDate(str(year) + '-01-01', str(year) + '-12-31') \
+        .filterBounds(geometry).mosaic().clip(geometry)
+    ndwi = cal_ndwi(image, threshold)
+    vectors = ndwi.reduceToVectors(geometry=geometry, eightConnected=True, maxPixels=MAX_PIXELS,
+                                   crs=ndwi.projection(), scale=scale)
+    properties = {'year': year, 'watershed': watershed.get('system:index')}
+    return vectors.map(lambda feature: feature.set(properties))
+
+
+def watershed_names(watersheds, name_property='name'):
+    """Get the system:index and the name of all watersheds in one request.
+
+    Args:
+        watersheds (ee.FeatureCollection): The watersheds.
+        name_property (str, optional): The property holding the watershed name. Defaults to 'name'.
+
+    Returns:
+        list: The [system:index, name] pairs.
+    """
+    return watersheds.reduceColumns(ee.Reducer.toList(2), ['system:index', name_property]).getInfo()['list']
+
+
+def unit_name(year, watershed_id, name):
+    """Get the task name of a (year, watershed) unit, e.g., Y2015_12_Little_Pipestem_Creek.
+
+    Args:
+        year (int): The year.
+        watershed_id (str): The system:index of the watershed.
+        name (str): The name of the watershed.
+
+    Returns:
+        str: The task name, which is also the file name of the export.
+    """
+    return "Y" + str(year) + "_" + str(watershed_id) + "_" + str(name).replace(" ", "_")
+
+
+class ExportCheckpoint(object):
+    """The states of the export units of a pipeline run, kept in a JSON file.
+
+    The entries are discarded when the options of the run (threshold, collection, ...) differ from the ones they
+    were exported with.
+
+    Args:
+        checkpoint_file (str): File path of the JSON checkpoint. It is created on save() if it does not exist.
+        options (dict): The JSON serializable options of the run.
+    """
+
+    def __init__(self, checkpoint_file, options):
+        self.checkpoint_file = checkpoint_file
+        self.options = options
+        self.entries = {}
+
+        if os.path.isfile(checkpoint_file):
+            try:
+                with open(checkpoint_file) as f:
+                    checkpoint = json.load(f)
+                if checkpoint.get('version') == CHECKPOINT_VERSION and checkpoint.get('options') == options:
+                    self.entries = checkpoint.get('entries', {})
+                else:
+                    print('Starting over, {} was written with other options'.format(checkpoint_file))
+            except (ValueError, OSError):
+                print('Ignoring the corrupted checkpoint {}'.format(checkpoint_file))
+
+    def update(self, results):
+        """Record the states of tasks.
+
+        Args:
+            results (list): The task results of an ExportScheduler, whose descriptions are the unit names.
+        """
+        for result in results:
+            if result['state'] == 'PENDING':
+                continue
+            entry = self.entries.setdefault(result['description'], {})
+            entry.update({'id': result['id'], 'state': result['state'], 'error': result['error']})
+
+    def save(self):
+        """Write the checkpoint file."""
+        checkpoint_dir = os.path.dirname(os.path.abspath(self.checkpoint_file))
+        if not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'version': CHECKPOINT_VERSION, 'options': self.options, 'entries': self.entries}, f,
+                      indent=1, sort_keys=True)
+        os.replace(tmp_file, self.checkpoint_file)
+
+
+def refresh_states(checkpoint):
+    """Update the checkpoint entries of the tasks that had not finished, with one task list request.
+
+    Args:
+        checkpoint (ExportCheckpoint): The checkpoint.
+    """
+    unfinished = {entry['id']: entry for entry in checkpoint.entries.values()
+                  if entry.get('id') and entry.get('state') not in FINAL_STATES}
+    if not unfinished:
+        return
+    states = {task.get('id'): task for task in ee.data.getTaskList()}
+    for task_id, entry in unfinished.items():
+        status = states.get(task_id)
+        if status is None:
+            # The task list only goes back so far: the task has to be exported again.
+            entry.update({'id': None, 'state': 'UNKNOWN'})
+            continue
+        entry['state'] = status.get('state', entry['state'])
+        if entry['state'] in FINAL_STATES:
+            entry['error'] = status.get('error_message')
+
+
+def export_ndwi_vectors(watersheds, years, checkpoint_file, threshold=0.2, collection=NAIP_COLLECTION,
+                        name_property='name', config=None, max_in_flight=10, workers=4, wait_until='started',
+                        save_interval=30, **kwargs):
+    """Export the water polygons of every (year, watershed) unit to Google Drive, resuming from a checkpoint.
+
+    Args:
+        watersheds (ee.FeatureCollection): The watersheds.
+        years (list): The years of the NAIP imagery.
+        checkpoint_file (str): File path of the JSON checkpoint, see ExportCheckpoint.
+        threshold (float, optional): See cal_ndwi(). Defaults to 0.2.
+        collection (str, optional): The asset id of the NAIP collection. Defaults to NAIP_COLLECTION.
+        name_property (str, optional): The property holding the watershed name. Defaults to 'name'.
+        config (dict, optional): The export configuration of ee.batch.Export.table(). Defaults to None, which
+            exports KML files to the image folder of Google Drive.
+        max_in_flight (int, optional): See ExportScheduler. Defaults to 10.
+        workers (int, optional): See ExportScheduler. Defaults to 4.
+        wait_until (str, optional): See ExportScheduler.wait(). Defaults to 'started'.
+        save_interval (float, optional): Seconds between two saves of the checkpoint while waiting. Defaults to 30.
+        **kwargs: Other arguments of ExportScheduler.
+
+    Returns:
+        dict: The checkpoint entries of the units of this run, keyed by unit name, with the keys year, watershed,
+            id, state and error.
+    """
+    if config is None:
+        config = {'driveFolder': 'image', 'fileFormat': 'KML'}
+    checkpoint = ExportCheckpoint(checkpoint_file, {'threshold': threshold, 'collection': collection,
+                                                    'config': config})
+    refresh_states(checkpoint)
+
+    names = watershed_names(watersheds, name_property)
+    units = {}
+    for year in years:
+        for watershed_id, name in names:
+            units[unit_name(year, watershed_id, name)] = (year, str(watershed_id))
+
+    def make_task(year, watershed_id, description):
+        watershed = ee.Feature(watersheds.filter(ee.Filter.eq('system:index', watershed_id)).first())
+        vectors = ndwi_vectors(watershed, year, threshold, collection)
+        return ee.batch.Export.table(vectors, description, config)
+
+    skipped = 0
+    scheduler = ExportScheduler(max_in_flight, workers, **kwargs)
+    try:
+        for description, (year, watershed_id) in units.items():
+            entry = checkpoint.entries.setdefault(description, {'id': None, 'state': None, 'error': None})
+            entry.update({'year': year, 'watershed': watershed_id})
+            if entry['state'] == 'COMPLETED':
+                skipped += 1
+            elif entry['id'] and entry['state'] not in FINAL_STATES:
+                scheduler.track(entry['id'], description)
+            else:
+                scheduler.submit(lambda year=year, watershed_id=watershed_id, description=description:
+                                 make_task(year, watershed_id, description), description)
+        print('{} units: {} completed earlier, {} to export or track'.format(len(units), skipped,
+                                                                            len(units) - skipped))
+
+        while not scheduler.wait(save_interval, until=wait_until):
+            checkpoint.update(scheduler.results())
+            checkpoint.save()
+    finally:
+        scheduler.close()
+        checkpoint.update(scheduler.results())
+        checkpoint.save()
+
+    states = {}
+    for description in units:
+        state = checkpoint.entries[description]['state']
+        states[state] = states.get(state, 0) + 1
+    print(', '.join('{} {}'.format(count, state) for state, count in sorted(states.items(), key=str)))
+    return {description: dict(checkpoint.entries[description]) for description in units}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Export the NDWI water polygons of NAIP imagery per watershed.')
+    parser.add_argument('--watersheds', type=str, required=True,
+                        help="Asset id of the watershed feature collection")
+    parser.add_argument('--years', type=int, nargs='+', required=True,
+                        help="Years of the NAIP imagery")
+    parser.add_argument('--checkpoint', type=str, default='ndwi_checkpoint.json',
+                        help="Path to the JSON checkpoint of the run")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Minimum NDWI of water")
+    parser.add_argument('--name-property', type=str, default='name',
+                        help="Property holding the watershed name")
+    parser.add_argument('--max-in-flight', type=int, default=10,
+                        help="Maximum number of started tasks that have not finished yet")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Number of threads starting tasks")
+    parser.add_argument('--wait', choices=['started', 'finished'], default='started',
+                        help="Return once all tasks have started, or once they have all finished")
+    args = parser.parse_args()
+
+    ee.Initialize()
+    export_ndwi_vectors(ee.FeatureCollection(args.watersheds), args.years, args.checkpoint, args.threshold,
+                        name_property=args.name_property, max_in_flight=args.max_in_flight, workers=args.workers,
+                        wait_until=args.wait)
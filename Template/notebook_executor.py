@@ -0,0 +1,575 @@
+''' Execute Jupyter notebooks in parallel, with a timeout per notebook and a JSON report of the results.
+
+To execute all notebooks in a folder recursively with 4 kernels: execute_notebooks(get_notebooks(in_dir), workers=4)
+From the command line: python notebook_executor.py --input in_dir --workers 4 --timeout 600 --report report.json
+To run the examples offline, put stand-in ee (and geemap) modules in a folder and add: --python-path stub_dir
+The local_ee folder has stand-ins that compute the band math examples with NumPy: --python-path local_ee
+To reuse warm kernels with ee, geemap, ipyleaflet and folium already imported: --warm --recycle-after 20
+
+The notebooks run in Jupyter kernels (ipykernel) started with jupyter_client and driven by nbclient, the way
+'jupyter nbconvert --execute --inplace' runs them, so magics, display() and widget outputs work as in Jupyter, and
+the executed notebooks are saved with nbformat.
+
+Notebooks whose code cells have not changed since their last successful run in the same kernel environment keep
+their outputs and are skipped, using the cache manifest .notebook_execution_cache.json in the input folder.
+To execute them all anyway: --no-cache
+
+To save the wall time, peak memory and getInfo()/request counts of every cell and print the 20 slowest cells:
+--profile profile.csv
+To reuse the getInfo() results of earlier runs from a SQLite cache shared by the kernels: --getinfo-cache getinfo.sqlite
+
+'''
+
+# License: MIT
+
+import os
+import ast
+import sys
+import json
+import time
+import queue
+import asyncio
+import argparse
+import datetime
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import nbformat
+from nbclient import NotebookClient
+from nbclient.exceptions import CellExecutionError, CellTimeoutError, DeadKernelError
+from jupyter_client.manager import AsyncKernelManager
+
+from notebook_kernel import PRELOAD_MODULES
+from execution_cache import ExecutionCache, kernel_fingerprint
+from notebook_profile import write_profile, print_slowest_cells
+
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def run_coroutine(coroutine):
+    """Run a coroutine on the event loop thread that talks to all kernels.
+
+    Args:
+        coroutine (coroutine): The coroutine.
+
+    Returns:
+        concurrent.futures.Future: The future of its result.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='kernel-loop', daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _loop)
+
+
+class KernelProcess(object):
+    """A Jupyter kernel started by jupyter_client.AsyncKernelManager, executing notebooks with nbclient.
+
+    The kernel gets the Template folder and python_path on its PYTHONPATH, runs notebook_kernel.setup() to import the
+    preload modules and profile its cells, and notebook_kernel.begin() before each notebook. The methods block the
+    calling thread; the kernel messages are handled on a shared event loop thread, see run_coroutine().
+
+    Args:
+        python_path (list, optional): Folders prepended to sys.path of the kernel. Defaults to None.
+        preload (tuple, optional): Modules the kernel imports before it is ready. Defaults to ().
+        getinfo_cache (str, optional): File path of the SQLite getInfo() cache of the kernel. Defaults to None.
+        kernel_name (str, optional): The kernel spec. Defaults to 'python3'.
+        map_thumbnails (bool, optional): Whether to save a PNG of the map of each notebook in its metadata, see
+            notebook_kernel.map_thumbnail(). Defaults to False.
+    """
+
+    def __init__(self, python_path=None, preload=(), getinfo_cache=None, kernel_name='python3', map_thumbnails=False):
+        self.kernel_name = kernel_name
+        self.map_thumbnails = map_thumbnails
+        self.km = None
+        self.kc = None
+        self.pid = None
+        self.start_time = time.perf_counter()
+        self.startup_time = None
+        self.preloaded = {}
+        self.notebooks = 0
+        self._killed = False
+        self._ready = run_coroutine(self._start(python_path or [], tuple(preload), getinfo_cache))
+
+    async def _start(self, python_path, preload, getinfo_cache):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(python_path + [TEMPLATE_DIR] + [path for path in
+                                            env.get('PYTHONPATH', '').split(os.pathsep) if path])
+        self.km = AsyncKernelManager(kernel_name=self.kernel_name)
+        await self.km.start_kernel(env=env)
+        self.pid = getattr(self.km.provisioner, 'pid', None)
+        self.kc = self.km.client()
+        self.kc.start_channels()
+        await self.kc.wait_for_ready(timeout=60)
+        preloaded = await self._call('setup({!r}, {!r})'.format(preload, getinfo_cache))
+        return json.loads(preloaded)
+
+    async def _call(self, call):
+        # Run a function of notebook_kernel in the kernel, silently, and get the string it returns.
+        expression = "__import__('notebook_kernel').{}".format(call)
+        reply = await self.kc.execute_interactive('', silent=True, store_history=False, timeout=60,
+                                                  user_expressions={'result': expression},
+                                                  output_hook=lambda msg: None)
+        result = reply['content']['user_expressions']['result']
+        if result['status'] != 'ok':
+            raise RuntimeError('{}: {}'.format(result['ename'], result['evalue']))
+        return ast.literal_eval(result['data']['text/plain'])
+
+    def wait_ready(self, timeout=60):
+        """Wait until the kernel has started.
+
+        Args:
+            timeout (float, optional): Seconds to wait. Defaults to 60.
+
+        Returns:
+            bool: Returns True if the kernel is ready.
+        """
+        if self.startup_time is not None:
+            return True
+        try:
+            self.preloaded = self._ready.result(timeout)
+        except Exception:
+            return False
+        self.startup_time = time.perf_counter() - self.start_time
+        return True
+
+    async def _execute(self, notebook, notebook_dir, allow_errors, timeout):
+        # The cells get the time left until the deadline of the notebook. Cancelling nbclient is not an option, as
+        # it takes any cancellation for a dead kernel.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        start_time = time.perf_counter()
+        await self._call('begin({!r}, {!r})'.format(notebook_dir, self.notebooks > 1))
+        reset_time = time.perf_counter() - start_time
+        client = NotebookClient(notebook, km=self.km, timeout=None, allow_errors=allow_errors,
+                                timeout_func=lambda cell: deadline and max(1e-3, deadline - time.monotonic()),
+                                resources={'metadata': {'path': notebook_dir}})
+        client.kc = self.kc
+        executed = []
+        async with client.async_setup_kernel():
+            reply = await client.async_wait_for_reply(client.kc.kernel_info())
+            if reply is not None and 'language_info' in reply['content']:
+                notebook.metadata['language_info'] = reply['content']['language_info']
+            try:
+                for index, cell in enumerate(notebook.cells):
+                    if cell.cell_type == 'code' and cell.source.strip():
+                        executed.append(index)
+                    await client.async_execute_cell(cell, index, execution_count=client.code_cells_executed + 1)
+            except CellTimeoutError:
+                return None
+            except CellExecutionError:
+                pass
+            client.set_widgets_metadata()
+        results = json.loads(await self._call('collect()'))
+        if self.map_thumbnails:
+            thumbnail = await self._call('map_thumbnail()')
+            if thumbnail:
+                notebook.metadata['thumbnail'] = {'image/png': thumbnail}
+            else:
+                notebook.metadata.pop('thumbnail', None)
+        for index, profile in zip(executed, results['profile']):
+            profile['index'] = index
+        results['reset_time'] = reset_time
+        return executed, results
+
+    def execute(self, in_file, allow_errors=False, timeout=None):
+        """Execute a notebook in the kernel and save the output cells with nbformat.
+
+        Args:
+            in_file (str): File path of the notebook.
+            allow_errors (bool, optional): Whether to keep running the cells after a failed cell. Defaults to False,
+                which stops at the first error and does not save the notebook, like 'jupyter nbconvert --execute'.
+            timeout (float, optional): Seconds after which the kernel is killed. Defaults to None, i.e., no limit.
+
+        Returns:
+            dict: The execution result, with the keys path, status ('ok', 'error', 'timeout' or 'crashed'), duration
+                (in seconds), cells (the number of code cells), failed_cells (dicts with the keys index, ename and
+                evalue), profile (the profile of each executed cell, with the keys index, duration, peak_rss and
+                rss_increase in bytes, getinfo_calls and network_calls), and getinfo_cache (the counters of the
+                getInfo() cache for this notebook) if the cache is used.
+        """
+        start_time = time.perf_counter()
+        self.notebooks += 1
+        result = {'path': in_file, 'cells': None, 'failed_cells': []}
+        try:
+            notebook = nbformat.read(in_file, as_version=4)
+        except Exception as e:
+            result.update(status='error', duration=time.perf_counter() - start_time,
+                          error='{}: {}'.format(type(e).__name__, e))
+            return result
+
+        notebook_dir = os.path.dirname(os.path.abspath(in_file))
+        try:
+            outcome = run_coroutine(self._execute(notebook, notebook_dir, allow_errors, timeout)).result()
+        except (DeadKernelError, RuntimeError, OSError) as e:
+            self.kill()
+            result.update(status='crashed', duration=time.perf_counter() - start_time,
+                          error='{}: {}'.format(type(e).__name__, e))
+            return result
+        if outcome is None:
+            self.kill()
+            result.update(status='timeout', duration=time.perf_counter() - start_time)
+            return result
+        executed, results = outcome
+
+        failures = []
+        for index in executed:
+            for output in notebook.cells[index].get('outputs', []):
+                if output.get('output_type') == 'error':
+                    failures.append({'index': index, 'ename': output['ename'], 'evalue': output['evalue']})
+        if allow_errors or not failures:
+            nbformat.write(notebook, in_file)
+        result.update(results)
+        result.update(status='error' if failures else 'ok', duration=time.perf_counter() - start_time,
+                      cells=sum(1 for cell in notebook.cells if cell.cell_type == 'code'), failed_cells=failures)
+        return result
+
+    def is_alive(self):
+        if self._killed:
+            return False
+        if not self._ready.done():
+            return True
+        return self._ready.exception() is None and run_coroutine(self.km.is_alive()).result()
+
+    async def _shutdown(self, now):
+        if self.kc is not None:
+            self.kc.stop_channels()
+        if self.km is not None and self.km.has_kernel:
+            await self.km.shutdown_kernel(now=now)
+
+    def kill(self):
+        """Kill the kernel process."""
+        self.close(now=True)
+
+    def close(self, timeout=5, now=False):
+        """Shut the kernel down, killing it if it does not exit in time."""
+        if self._killed:
+            return
+        self._killed = True
+        try:
+            self._ready.result(60)
+        except Exception:
+            pass
+        try:
+            run_coroutine(self._shutdown(now)).result(timeout)
+        except Exception:
+            run_coroutine(self._shutdown(True)).result()
+
+
+class KernelPool(object):
+    """A pool of warm kernel processes, which are reused for many notebooks.
+
+    The kernels start in the background, import the preload modules once, and reset their namespace before each
+    notebook. A kernel is replaced after recycle_after notebooks, to bound the state leaking between notebooks
+    through the imported modules, and right away when it is killed by a timeout or crashes. The replacement starts
+    as soon as the old kernel is released, so it is usually warm by the time it is needed.
+
+    Args:
+        size (int): Number of kernels.
+        python_path (list, optional): Folders prepended to sys.path of the kernels. Defaults to None.
+        preload (tuple, optional): Modules imported by each kernel when it starts. Defaults to PRELOAD_MODULES.
+        recycle_after (int, optional): Number of notebooks a kernel executes before it is replaced. Defaults to 20.
+        getinfo_cache (str, optional): File path of the SQLite getInfo() cache of the kernels. Defaults to None.
+        map_thumbnails (bool, optional): See KernelProcess. Defaults to False.
+    """
+
+    def __init__(self, size, python_path=None, preload=PRELOAD_MODULES, recycle_after=20, getinfo_cache=None,
+                 map_thumbnails=False):
+        self.python_path = python_path
+        self.getinfo_cache = getinfo_cache
+        self.map_thumbnails = map_thumbnails
+        self.preload = tuple(preload)
+        self.recycle_after = max(1, recycle_after)
+        self.started = 0
+        self.recycled = 0
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        for _ in range(max(1, size)):
+            self._idle.put(self._start_kernel())
+
+    def _start_kernel(self):
+        with self._lock:
+            self.started += 1
+        return KernelProcess(self.python_path, self.preload, self.getinfo_cache, map_thumbnails=self.map_thumbnails)
+
+    def acquire(self, timeout=60):
+        """Take an idle kernel from the pool, waiting until it is ready.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a starting kernel. Defaults to 60.
+
+        Returns:
+            KernelProcess: The kernel, or None if it failed to start. In that case it has been replaced.
+        """
+        kernel = self._idle.get()
+        if kernel.wait_ready(timeout):
+            return kernel
+        kernel.kill()
+        self._idle.put(self._start_kernel())
+        return None
+
+    def release(self, kernel):
+        """Return a kernel to the pool, replacing it if it died or has executed recycle_after notebooks."""
+        if kernel.is_alive() and kernel.notebooks < self.recycle_after:
+            self._idle.put(kernel)
+            return
+        if kernel.is_alive():
+            with self._lock:
+                self.recycled += 1
+            # Shut the old kernel down in the background, so that the caller does not wait for it.
+            threading.Thread(target=kernel.close, daemon=True).start()
+        else:
+            kernel.kill()
+        self._idle.put(self._start_kernel())
+
+    def close(self):
+        """Shut all idle kernels down."""
+        while True:
+            try:
+                kernel = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            kernel.close()
+
+
+def get_notebooks(in_dir):
+    """Get all Jupyter notebooks in a folder recursively, skipping the .ipynb_checkpoints folders.
+
+    Args:
+        in_dir (str): The input folder.
+
+    Returns:
+        list: Sorted list of notebook file paths.
+    """
+    return sorted(str(file) for file in Path(in_dir).rglob('*.ipynb') if '.ipynb_checkpoints' not in file.parts)
+
+
+def _kernel_failed(in_file, startup_time):
+    return {'path': in_file, 'status': 'crashed', 'duration': 0.0, 'cells': None, 'failed_cells': [],
+            'error': 'The kernel failed to start', 'startup_time': startup_time}
+
+
+def _execute_in_new_kernel(in_file, allow_errors, timeout, python_path, getinfo_cache=None, map_thumbnails=False):
+    start_time = time.perf_counter()
+    kernel = KernelProcess(python_path, getinfo_cache=getinfo_cache, map_thumbnails=map_thumbnails)
+    try:
+        if not kernel.wait_ready():
+            return _kernel_failed(in_file, time.perf_counter() - start_time)
+        result = kernel.execute(in_file, allow_errors, timeout)
+        result['startup_time'] = kernel.startup_time + result.get('reset_time', 0.0)
+        return result
+    finally:
+        kernel.close()
+
+
+def _execute_in_pool(pool, in_file, allow_errors, timeout):
+    start_time = time.perf_counter()
+    kernel = pool.acquire()
+    if kernel is None:
+        return _kernel_failed(in_file, time.perf_counter() - start_time)
+    waited = time.perf_counter() - start_time
+    try:
+        result = kernel.execute(in_file, allow_errors, timeout)
+    finally:
+        pool.release(kernel)
+    result['startup_time'] = waited + result.get('reset_time', 0.0)
+    return result
+
+
+def execute_notebooks(files, workers=4, timeout=600, allow_errors=False, python_path=None, report_file=None,
+                      warm=False, preload=PRELOAD_MODULES, recycle_after=20, cache=None, profile_file=None,
+                      getinfo_cache=None, map_thumbnails=False):
+    """Execute Jupyter notebooks in parallel and save their output cells.
+
+    At most workers notebooks run at the same time. By default each notebook runs in a fresh kernel process. With
+    warm=True the notebooks run in a KernelPool of workers kernels that have imported the preload modules already.
+    A notebook running longer than timeout seconds is killed and reported with the 'timeout' status.
+
+    The startup overhead of each notebook is reported as startup_time: the time from taking the notebook until its
+    first cell could run, i.e., starting a kernel (or waiting for a warm one) plus resetting the namespace.
+
+    With a cache, the notebooks that hold the outputs of their current code cells are not executed, and are
+    reported with the 'cached' status. The hits and misses of the cache are reported too.
+
+    files can be a generator: each notebook is submitted as soon as it is produced, so that producing the next
+    notebooks (e.g., converting them from Python scripts) overlaps with executing the previous ones.
+
+    Args:
+        files (iterable): Notebook file paths.
+        workers (int, optional): Number of notebooks executed concurrently. Defaults to 4.
+        timeout (float, optional): Seconds allowed per notebook. Defaults to 600. None means no limit.
+        allow_errors (bool, optional): Whether to keep running the cells after a failed cell and save the notebook
+            anyway. Defaults to False.
+        python_path (list, optional): Folders prepended to sys.path of the kernels, e.g., a folder holding a
+            stand-in ee module. Defaults to None.
+        report_file (str, optional): File path of the JSON report. Defaults to None, which writes no report.
+        warm (bool, optional): Whether to run the notebooks in a pool of warm kernels. Defaults to False.
+        preload (tuple, optional): Modules the warm kernels import when they start. Defaults to PRELOAD_MODULES.
+        recycle_after (int, optional): Number of notebooks a warm kernel executes before it is replaced.
+            Defaults to 20.
+        cache (ExecutionCache, optional): The execution cache, which is saved before returning. Defaults to None.
+        profile_file (str, optional): File path of the cell profiles (.csv or .json), see notebook_profile.py. The
+            slowest cells are printed too. Defaults to None, which writes no profile.
+        getinfo_cache (str, optional): File path of the SQLite getInfo() cache shared by the kernels, see
+            getinfo_cache.py. Defaults to None, which does not cache getInfo() results.
+        map_thumbnails (bool, optional): Whether to save a PNG of the map of each notebook in its metadata, for the
+            thumbnails of static_snapshot.py. Defaults to False.
+
+    Returns:
+        dict: The report, with the keys started, duration, workers, timeout, warm, summary (the number of notebooks
+            by status), startup (the total and mean startup overhead in seconds, and the number of kernels started),
+            cache (the hits and misses of the execution cache, if it is used), getinfo_cache (the total counters of
+            the getInfo() cache, if it is used) and notebooks (the result of each notebook, in the order of files,
+            with the profile of each cell).
+    """
+    total = len(files) if hasattr(files, '__len__') else None
+    started = datetime.datetime.now().isoformat(timespec='seconds')
+    start_time = time.perf_counter()
+    paths = []
+    results = []
+    keys = {}
+    workers = max(1, workers)
+    pool = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for in_file in files:
+                in_file = str(in_file)
+                index = len(paths)
+                paths.append(in_file)
+                results.append(None)
+                if cache is not None:
+                    try:
+                        keys[in_file] = cache.make_key(in_file)
+                    except (OSError, ValueError):
+                        keys[in_file] = None
+                    if keys[in_file] is not None and cache.is_fresh(in_file, keys[in_file]):
+                        results[index] = {'path': in_file, 'status': 'cached', 'duration': 0.0, 'cells': None,
+                                          'failed_cells': [], 'startup_time': 0.0}
+                        continue
+                if warm and pool is None:
+                    pool = KernelPool(workers if total is None else min(workers, total - index), python_path,
+                                      preload, recycle_after, getinfo_cache, map_thumbnails)
+                if pool is not None:
+                    futures[executor.submit(_execute_in_pool, pool, in_file, allow_errors, timeout)] = index
+                else:
+                    futures[executor.submit(_execute_in_new_kernel, in_file, allow_errors, timeout,
+                                            python_path, getinfo_cache, map_thumbnails)] = index
+
+            for count, future in enumerate(as_completed(futures)):
+                index = futures[future]
+                results[index] = future.result()
+                print('Processing {}/{}: {} ({}, {:.1f} s)'.format(count + 1, len(futures), paths[index],
+                                                                 results[index]['status'], results[index]['duration']))
+                if cache is not None:
+                    if results[index]['status'] == 'ok' and keys[paths[index]] is not None:
+                        cache.store(paths[index], keys[paths[index]])
+                    else:
+                        cache.discard(paths[index])
+    finally:
+        if pool is not None:
+            pool.close()
+        if cache is not None:
+            cache.save()
+
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+
+    startup_total = sum(result.get('startup_time') or 0.0 for result in results)
+    report = {
+        'started': started,
+        'duration': time.perf_counter() - start_time,
+        'workers': workers,
+        'timeout': timeout,
+        'warm': pool is not None,
+        'summary': summary,
+        'startup': {
+            'total': startup_total,
+            'mean': startup_total / len(results) if results else 0.0,
+            'kernels_started': pool.started if pool is not None else len(futures),
+        },
+        'notebooks': results,
+    }
+    if cache is not None:
+        report['cache'] = {'hits': cache.hits, 'misses': cache.misses}
+    if getinfo_cache is not None:
+        totals = {}
+        for result in results:
+            for name, value in (result.get('getinfo_cache') or {}).items():
+                totals[name] = totals.get(name, 0) + value
+        hits = totals.get('memory_hits', 0) + totals.get('disk_hits', 0)
+        totals['hit_rate'] = hits / (hits + totals.get('misses', 0)) if hits + totals.get('misses', 0) else 0.0
+        report['getinfo_cache'] = totals
+
+    if report_file is not None:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if profile_file is not None:
+        write_profile(report, profile_file)
+        print_slowest_cells(report)
+
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Execute Jupyter notebooks in parallel and save the output cells.')
+    parser.add_argument('--input', type=str, required=True,
+                        help="Path to the notebook or the folder containing notebooks")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Number of notebooks executed concurrently")
+    parser.add_argument('--timeout', type=float, default=600,
+                        help="Seconds allowed per notebook (0 for no limit)")
+    parser.add_argument('--allow-errors', action='store_true',
+                        help="Keep running the cells after a failed cell and save the notebook anyway")
+    parser.add_argument('--python-path', action='append', default=[],
+                        help="Folder prepended to sys.path of the kernels, e.g., holding a stand-in ee module")
+    parser.add_argument('--report', type=str,
+                        help="Path to the JSON report")
+    parser.add_argument('--warm', action='store_true',
+                        help="Reuse a pool of warm kernels with the preload modules already imported")
+    parser.add_argument('--preload', action='append',
+                        help="Module imported by the warm kernels when they start (default: {})".format(
+                            ', '.join(PRELOAD_MODULES)))
+    parser.add_argument('--recycle-after', type=int, default=20,
+                        help="Number of notebooks a warm kernel executes before it is replaced")
+    parser.add_argument('--profile', type=str,
+                        help="Path to the profile of every cell (.csv or .json); the slowest cells are printed")
+    parser.add_argument('--getinfo-cache', type=str,
+                        help="Path to the SQLite file caching the getInfo() results of the kernels")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Execute all notebooks, including the ones whose code has not changed since the last run")
+    args = parser.parse_args()
+
+    python_path = [os.path.abspath(path) for path in args.python_path]
+    if os.path.isdir(args.input):
+        files = get_notebooks(args.input)
+        cache_dir = args.input
+    else:
+        files = [args.input]
+        cache_dir = os.path.dirname(args.input)
+    cache = None
+    if not args.no_cache:
+        cache_file = os.path.join(cache_dir, '.notebook_execution_cache.json')
+        cache = ExecutionCache(cache_file, kernel_fingerprint(python_path))
+    report = execute_notebooks(files, args.workers, args.timeout or None, args.allow_errors, python_path, args.report,
+                               warm=args.warm, preload=args.preload or PRELOAD_MODULES,
+                               recycle_after=args.recycle_after, cache=cache, profile_file=args.profile,
+                               getinfo_cache=args.getinfo_cache and os.path.abspath(args.getinfo_cache))
+    print('Executed {} notebooks in {:.1f} s: {}'.format(
+        len(files), report['duration'], ', '.join('{} {}'.format(count, status)
+                                                  for status, count in sorted(report['summary'].items()))))
+    print('Startup overhead: {:.2f} s in total, {:.3f} s per notebook, {} kernels started'.format(
+        report['startup']['total'], report['startup']['mean'], report['startup']['kernels_started']))
+    if 'getinfo_cache' in report:
+        print('getInfo() cache: {memory_hits} memory hits, {disk_hits} disk hits, {misses} misses, '
+              '{evictions} evictions, {expirations} expirations'.format(**report['getinfo_cache']))
+    sys.exit(0 if report['summary'].get('ok', 0) + report['summary'].get('cached', 0) == len(files) else 1)
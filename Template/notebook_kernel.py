@@ -0,0 +1,315 @@
+''' Instrument the IPython kernels that notebook_executor.py starts to execute notebooks with nbclient.
+
+The executor runs these functions in the kernel with silent executions, which are neither profiled nor stored:
+    __import__('notebook_kernel').setup(preload, getinfo_cache)   # once, when the kernel has started
+    __import__('notebook_kernel').begin(notebook_dir, reset)      # before each notebook
+    __import__('notebook_kernel').collect()                       # after each notebook, returns the profiles as JSON
+    __import__('notebook_kernel').map_thumbnail()                 # after each notebook, for static_snapshot.py
+A kernel can import the slow modules (ee, geemap, ...) once before its first notebook: setup(PRELOAD_MODULES)
+
+Every cell is profiled through the pre_run_cell and post_run_cell events of IPython: its wall time, the peak resident
+memory of the kernel while it ran, and the number of getInfo() calls and Earth Engine API requests it made.
+To reuse the getInfo() results of earlier runs: setup(getinfo_cache='getinfo.sqlite'), see getinfo_cache.py.
+
+'''
+
+# License: MIT
+
+import io
+import os
+import sys
+import json
+import time
+import base64
+import importlib
+import functools
+import contextlib
+import getinfo_cache
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# The modules imported by every example notebook, which take seconds to import in a fresh kernel.
+PRELOAD_MODULES = ('ee', 'geemap', 'ipyleaflet', 'folium')
+
+# The visualization parameters of Map.addLayer() that ee.Image.visualize() takes.
+VIS_PARAMS = ('bands', 'gain', 'bias', 'min', 'max', 'gamma', 'palette', 'opacity', 'forceRgbOutput')
+THUMBNAIL_SIZE = 440
+
+# The Earth Engine API functions that are counted: (module, class or None, function, counter).
+# Every request to the Earth Engine servers goes through ee.data._execute_cloud_call (ee.data.send_ in older
+# versions of the API). ee.Image.getInfo() and friends all end up in ComputedObject.getInfo().
+COUNTED_FUNCTIONS = (
+    ('ee.computedobject', 'ComputedObject', 'getInfo', 'getinfo_calls'),
+    ('ee.data', None, '_execute_cloud_call', 'network_calls'),
+    ('ee.data', None, 'send_', 'network_calls'),
+)
+
+
+class CallCounter(object):
+    """Count the getInfo() calls and Earth Engine requests by wrapping the functions in COUNTED_FUNCTIONS.
+
+    The functions are wrapped once the ee package has been imported, i.e., install() is called before every cell
+    and does nothing until then. Nested calls are counted once, so that getInfo() overrides calling the base
+    getInfo() are not counted twice.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.installed = set()
+        self._depth = {}
+
+    def reset(self):
+        """Set all counts to zero."""
+        self.counts = {counter: 0 for _, _, _, counter in COUNTED_FUNCTIONS}
+
+    def install(self):
+        """Wrap the functions of the ee modules that have been imported, if they are not wrapped yet."""
+        for module_name, class_name, function_name, counter in COUNTED_FUNCTIONS:
+            key = (module_name, class_name, function_name)
+            module = sys.modules.get(module_name)
+            if key in self.installed or module is None:
+                continue
+            owner = module if class_name is None else getattr(module, class_name, None)
+            function = getattr(owner, function_name, None) if isinstance(owner, type) or class_name is None else None
+            if callable(function):
+                setattr(owner, function_name, self._wrap(function, counter))
+            self.installed.add(key)
+
+    def _wrap(self, function, counter):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            depth = self._depth.get(counter, 0)
+            if depth == 0:
+                self.counts[counter] = self.counts.get(counter, 0) + 1
+            self._depth[counter] = depth + 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._depth[counter] = depth
+        return wrapper
+
+
+class CellProfiler(object):
+    """Profile the cells run by an IPython shell, see setup().
+
+    Args:
+        getinfo_cache (str, optional): File path of the SQLite getInfo() cache, which is installed once ee has been
+            imported. Defaults to None, which does not cache getInfo() results.
+    """
+
+    def __init__(self, getinfo_cache=None):
+        self.profile = []
+        self.counter = CallCounter()
+        self.getinfo_cache_file = getinfo_cache
+        self.getinfo_cache = None
+        self.cache_stats = {}
+        self._start = None
+
+    def instrument(self):
+        """Install the getInfo() cache and the call counter once the ee package has been imported."""
+        # The cache goes first, so that the counter sees all getInfo() calls but only the requests of the misses.
+        if self.getinfo_cache_file is not None and self.getinfo_cache is None and \
+                isinstance(getattr(sys.modules.get('ee.computedobject'), 'ComputedObject', None), type):
+            self.getinfo_cache = getinfo_cache.install(getinfo_cache.GetInfoCache(self.getinfo_cache_file))
+        self.counter.install()
+
+    def start(self):
+        """Forget the profiles of the previous notebook."""
+        self.profile = []
+        self.cache_stats = self.getinfo_cache.stats() if self.getinfo_cache is not None else {}
+
+    def pre_run_cell(self, info=None):
+        self.instrument()
+        self.counter.reset()
+        reset_peak_rss()
+        self._start = (time.perf_counter(), current_rss())
+
+    def post_run_cell(self, result=None):
+        if self._start is None:
+            return
+        start_time, rss = self._start
+        self._start = None
+        # The ee package may have been imported by this cell, in which case the calls are counted from the next one.
+        self.instrument()
+        profile = {
+            'duration': time.perf_counter() - start_time,
+            'peak_rss': peak_rss(),
+            'rss_increase': current_rss() - rss,
+        }
+        profile.update(self.counter.counts)
+        self.profile.append(profile)
+
+    def results(self):
+        """Get the profiles of the cells run since start(), and the getInfo() cache counters if the cache is used."""
+        results = {'profile': self.profile}
+        if self.getinfo_cache is not None:
+            results['getinfo_cache'] = {name: value - self.cache_stats.get(name, 0)
+                                        for name, value in self.getinfo_cache.stats().items() if name != 'hit_rate'}
+        return results
+
+
+_profiler = None
+
+
+def setup(preload=(), getinfo_cache=None):
+    """Import the preload modules and start profiling the cells of the kernel this runs in.
+
+    Args:
+        preload (tuple, optional): Modules to import, e.g., PRELOAD_MODULES. Defaults to ().
+        getinfo_cache (str, optional): File path of the SQLite getInfo() cache. Defaults to None.
+
+    Returns:
+        str: JSON mapping of the preload modules to their import time in seconds, or to the import error.
+    """
+    global _profiler
+    from IPython import get_ipython
+
+    preloaded = preload_modules(preload)
+    _profiler = CellProfiler(getinfo_cache)
+    _profiler.instrument()
+    shell = get_ipython()
+    shell.events.register('pre_run_cell', _profiler.pre_run_cell)
+    shell.events.register('post_run_cell', _profiler.post_run_cell)
+    return json.dumps(preloaded)
+
+
+def begin(notebook_dir, reset=False):
+    """Get the kernel ready for a notebook.
+
+    Args:
+        notebook_dir (str): The folder of the notebook, which becomes the working directory.
+        reset (bool, optional): Whether to clear the namespace and the execution count left by the previous notebook,
+            as in a fresh kernel. The modules imported stay in sys.modules. Defaults to False.
+    """
+    from IPython import get_ipython
+
+    if reset:
+        get_ipython().reset(new_session=True)
+    os.chdir(notebook_dir)
+    _profiler.start()
+
+
+def collect():
+    """Get the profiles of the cells of the notebook, see CellProfiler.results().
+
+    Returns:
+        str: The JSON of the profiles.
+    """
+    return json.dumps(_profiler.results())
+
+
+def map_thumbnail(name='Map', size=THUMBNAIL_SIZE):
+    """Render the top Earth Engine layer of the geemap map of the notebook to a PNG.
+
+    The map widget has no static rendering and the URLs of its tiles expire, so the layer is rendered again with
+    getThumbURL() over the view of the map, from its center and zoom. The layers are read from Map.ee_layers (or
+    Map.ee_layer_dict in older versions of geemap), which map the layer names to their ee_object and vis_params.
+
+    Args:
+        name (str, optional): The name of the map in the namespace of the notebook. Defaults to 'Map'.
+        size (int, optional): The width and height of the PNG, in pixels. Defaults to THUMBNAIL_SIZE.
+
+    Returns:
+        str: The base64 PNG, or None if the notebook has no map with an Earth Engine layer or the rendering failed.
+    """
+    import urllib.request
+    from IPython import get_ipython
+
+    try:
+        import ee
+
+        map_widget = get_ipython().user_ns.get(name)
+        layers = getattr(map_widget, 'ee_layers', None)
+        if not isinstance(layers, dict):
+            layers = getattr(map_widget, 'ee_layer_dict', None)
+        if not isinstance(layers, dict) or not layers:
+            return None
+        layer = list(layers.values())[-1]
+        ee_object, vis_params = layer.get('ee_object'), layer.get('vis_params') or {}
+
+        if isinstance(ee_object, ee.Geometry):
+            ee_object = ee.Feature(ee_object)
+        if isinstance(ee_object, ee.Feature):
+            ee_object = ee.FeatureCollection([ee_object])
+        if isinstance(ee_object, ee.FeatureCollection):
+            image = ee_object.style(color=vis_params.get('color', '000000'), fillColor='00000000')
+        elif isinstance(ee_object, (ee.Image, ee.ImageCollection)):
+            image = ee.Image(ee_object.mosaic() if isinstance(ee_object, ee.ImageCollection) else ee_object)
+            image = image.visualize(**{key: value for key, value in vis_params.items() if key in VIS_PARAMS})
+        else:
+            return None
+
+        # The map shows 256 pixels of 360 / 2 ** zoom degrees of longitude.
+        lat, lon = map_widget.center
+        half_size = 360.0 / 2 ** map_widget.zoom * size / 256 / 2
+        region = ee.Geometry.Rectangle([lon - half_size, max(-85.0, lat - half_size), lon + half_size,
+                                        min(85.0, lat + half_size)], None, False)
+        url = image.getThumbURL({'region': region, 'dimensions': size, 'format': 'png'})
+        with urllib.request.urlopen(url, timeout=60) as response:
+            return base64.b64encode(response.read()).decode('ascii')
+    except Exception:
+        return None
+
+
+def current_rss():
+    """Get the resident memory of this process in bytes, or 0 if it is unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def reset_peak_rss():
+    """Reset the peak resident memory of this process to its current value, on Linux."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Get the peak resident memory of this process in bytes, since the last reset_peak_rss() where supported.
+
+    Returns:
+        int: The peak resident memory, or 0 if it is unknown.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS, and it is never reset.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def preload_modules(modules):
+    """Import modules so that the notebooks importing them later get them from sys.modules.
+
+    Args:
+        modules (list): Names of the modules. The ones that are not installed are skipped.
+
+    Returns:
+        dict: Mapping of the module names to their import time in seconds, or to the error message if the import
+            failed.
+    """
+    imported = {}
+    for module in modules:
+        start_time = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                importlib.import_module(module)
+            imported[module] = time.perf_counter() - start_time
+        except Exception as e:
+            imported[module] = '{}: {}'.format(type(e).__name__, e)
+    return imported
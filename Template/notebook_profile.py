@@ -0,0 +1,125 @@
+''' Collect the per-cell profiles of notebook execution reports and find the slowest cells.
+
+To save the cell profiles of a report as CSV (or JSON with a .json extension): write_profile(report, 'profile.csv')
+To print the 20 slowest cells: print_slowest_cells(report)
+From the command line, with the reports of notebook_executor.py: python notebook_profile.py --report report.json --output profile.csv
+
+'''
+
+# License: MIT
+
+import os
+import csv
+import json
+import argparse
+
+
+PROFILE_FIELDS = ('path', 'index', 'duration', 'peak_rss', 'rss_increase', 'getinfo_calls', 'network_calls')
+
+
+def profile_rows(report):
+    """Flatten the cell profiles of an execution report.
+
+    Args:
+        report (dict): The report returned by notebook_executor.execute_notebooks().
+
+    Returns:
+        list: One dict per executed cell, with the keys in PROFILE_FIELDS. The cell index is the position of the cell
+            in the notebook, counting the markdown cells.
+    """
+    rows = []
+    for result in report.get('notebooks', []):
+        for cell in result.get('profile') or []:
+            row = {field: cell.get(field, 0) for field in PROFILE_FIELDS}
+            row['path'] = result['path']
+            rows.append(row)
+    return rows
+
+
+def write_profile(report, profile_file):
+    """Save the cell profiles of an execution report, as CSV if profile_file ends with .csv and as JSON otherwise.
+
+    Args:
+        report (dict): The report returned by notebook_executor.execute_notebooks().
+        profile_file (str): File path of the profile.
+
+    Returns:
+        list: The rows written, see profile_rows().
+    """
+    rows = profile_rows(report)
+    out_dir = os.path.dirname(os.path.abspath(profile_file))
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    if profile_file.lower().endswith('.csv'):
+        with open(profile_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=PROFILE_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(profile_file, 'w') as f:
+            json.dump(rows, f, indent=1)
+    return rows
+
+
+def slowest_cells(report, count=20):
+    """Find the slowest cells of an execution report.
+
+    Args:
+        report (dict): The report returned by notebook_executor.execute_notebooks().
+        count (int, optional): Number of cells. Defaults to 20.
+
+    Returns:
+        list: The rows of the slowest cells, see profile_rows(), slowest first.
+    """
+    return sorted(profile_rows(report), key=lambda row: row['duration'], reverse=True)[:count]
+
+
+def print_slowest_cells(report, count=20):
+    """Print the slowest cells of an execution report as a table.
+
+    Args:
+        report (dict): The report returned by notebook_executor.execute_notebooks().
+        count (int, optional): Number of cells. Defaults to 20.
+    """
+    rows = slowest_cells(report, count)
+    print('Slowest {} cells:'.format(len(rows)))
+    print('{:>9} {:>9} {:>8} {:>8}  {}'.format('time (s)', 'peak MB', 'getInfo', 'requests', 'cell'))
+    for row in rows:
+        print('{:9.2f} {:9.1f} {:8d} {:8d}  {} [{}]'.format(row['duration'], row['peak_rss'] / 2 ** 20,
+                                                           row['getinfo_calls'], row['network_calls'],
+                                                           row['path'], row['index']))
+
+
+def merge_reports(report_files):
+    """Merge the notebook results of several execution reports, e.g., of the folders of the repo.
+
+    Args:
+        report_files (list): File paths of the JSON reports.
+
+    Returns:
+        dict: A report holding the notebooks of all reports.
+    """
+    notebooks = []
+    for report_file in report_files:
+        with open(report_file) as f:
+            notebooks.extend(json.load(f).get('notebooks', []))
+    return {'notebooks': notebooks}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Summarize the cell profiles of notebook execution reports.')
+    parser.add_argument('--report', type=str, action='append', required=True,
+                        help="Path to a JSON report of notebook_executor.py (can be given several times)")
+    parser.add_argument('--output', type=str,
+                        help="Path to the profile of all cells (.csv or .json)")
+    parser.add_argument('--top', type=int, default=20,
+                        help="Number of slowest cells to print")
+    args = parser.parse_args()
+
+    report = merge_reports(args.report)
+    if args.output is not None:
+        rows = write_profile(report, args.output)
+        print('Saved the profiles of {} cells to {}'.format(len(rows), args.output))
+    print_slowest_cells(report, args.top)
@@ -0,0 +1,119 @@
+''' Parse the notebook template once and splice Earth Engine Python scripts into it.
+
+To load the template (memoized by path and modification time): template = load_template(template_file)
+To splice a script into the template: lines = template.splice(content, 'giswqs', 'earthengine-py-notebooks', 'Image/ndvi')
+
+'''
+
+# License: MIT
+
+import os
+
+
+HEADER_MARKER = '## Add Earth Engine Python script'
+FOOTER_MARKER = '## Display Earth Engine data layers'
+
+# The template links to itself (GitHub, nbviewer and Colab); these links are pointed at each generated notebook.
+TEMPLATE_PATH = 'Template/template'
+TEMPLATE_USERNAME = 'giswqs'
+TEMPLATE_REPO = 'earthengine-py-notebooks'
+
+
+class NotebookTemplate(object):
+    """A notebook template split into the header before and the footer after the Earth Engine Python script.
+
+    Args:
+        template_file (str): File path of the notebook template (e.g., Template/template.py).
+    """
+
+    def __init__(self, template_file):
+        self.template_file = template_file
+
+        with open(template_file) as f:
+            template_lines = f.readlines()
+
+        header_end_index = 0
+        footer_start_index = 0
+        for index, line in enumerate(template_lines):
+            if HEADER_MARKER in line:
+                header_end_index = index + 5
+            if FOOTER_MARKER in line:
+                footer_start_index = index - 3
+
+        self.header = template_lines[:header_end_index]
+        self.footer = ['\n'] + template_lines[footer_start_index:]
+        self._header_segments = {}
+
+    def header_segments(self, github_username=None, github_repo=None):
+        """Get the header with the GitHub user and repo substituted, split around the links to the template.
+
+        The segments are built once per user and repo, so rendering the header of a notebook is a single join.
+
+        Args:
+            github_username (str, optional): GitHub username. Defaults to None, which keeps the template links.
+            github_repo (str, optional): GitHub repo name. Defaults to None, which keeps the template links.
+
+        Returns:
+            list: The header text split on 'Template/template'.
+        """
+        key = (github_username, github_repo)
+        if key not in self._header_segments:
+            text = ''.join(self.header)
+            if github_username is not None and github_repo is not None:
+                text = text.replace(TEMPLATE_USERNAME, github_username).replace(TEMPLATE_REPO, github_repo)
+            self._header_segments[key] = text.split(TEMPLATE_PATH)
+        return self._header_segments[key]
+
+    def render_header(self, github_username=None, github_repo=None, notebook_path=None):
+        """Render the header of a notebook.
+
+        Args:
+            github_username (str, optional): GitHub username. Defaults to None.
+            github_repo (str, optional): GitHub repo name. Defaults to None.
+            notebook_path (str, optional): Path of the notebook relative to the repo, without extension, that the
+                links to the template are replaced with. Defaults to None, which keeps the links.
+
+        Returns:
+            list: List of lines.
+        """
+        segments = self.header_segments(github_username, github_repo)
+        link = TEMPLATE_PATH if notebook_path is None else notebook_path
+        return link.join(segments).splitlines(True)
+
+    def splice(self, content, github_username=None, github_repo=None, notebook_path=None):
+        """Splice an Earth Engine Python script between the header and the footer of the template.
+
+        Args:
+            content (list): List of lines of the Python script, or None for an empty script.
+            github_username (str, optional): GitHub username. Defaults to None.
+            github_repo (str, optional): GitHub repo name. Defaults to None.
+            notebook_path (str, optional): See render_header(). Defaults to None.
+
+        Returns:
+            list: List of lines of the percent-format notebook script.
+        """
+        header = self.render_header(github_username, github_repo, notebook_path)
+        if content is None:
+            return header + self.footer
+        return header + content + self.footer
+
+
+_templates = {}
+
+
+def load_template(template_file):
+    """Load a notebook template, reusing the parsed template until the file changes.
+
+    Args:
+        template_file (str): File path of the notebook template.
+
+    Returns:
+        NotebookTemplate: The parsed template.
+    """
+    template_file = os.path.abspath(template_file)
+    mtime = os.stat(template_file).st_mtime_ns
+    cached = _templates.get(template_file)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, NotebookTemplate(template_file))
+        _templates[template_file] = cached
+    return cached[1]
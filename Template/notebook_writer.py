@@ -0,0 +1,126 @@
+''' Write Jupyter notebooks from Python scripts in the percent format, without leaving the Python process.
+
+To convert the lines of a percent-format script to a notebook: write_notebook(lines, out_file)
+To convert a percent-format script file to a notebook: py_file_to_notebook(in_file, out_file)
+
+A percent-format script separates cells with '# %%' lines. Cells holding only a triple-quoted string become
+markdown cells. The notebooks are identical to the ones written by the ipynb-py-convert command line tool.
+
+'''
+
+# License: MIT
+
+import os
+import copy
+import json
+
+
+CELL_MARKER = '# %%\n'
+
+NOTEBOOK_METADATA = {
+    'anaconda-cloud': {},
+    'kernelspec': {
+        'display_name': 'Python 3',
+        'language': 'python',
+        'name': 'python3'},
+    'language_info': {
+        'codemirror_mode': {'name': 'ipython', 'version': 3},
+        'file_extension': '.py',
+        'mimetype': 'text/x-python',
+        'name': 'python',
+        'nbconvert_exporter': 'python',
+        'pygments_lexer': 'ipython3',
+        'version': '3.6.1'}}
+
+
+def percent_to_cells(text):
+    """Split a percent-format Python script into notebook cells.
+
+    Args:
+        text (str): The Python script.
+
+    Returns:
+        list: List of nbformat 4 cell dicts.
+    """
+    if text.startswith(CELL_MARKER):
+        text = text[len(CELL_MARKER):]
+
+    cells = []
+    for chunk in text.split('\n\n' + CELL_MARKER):
+        cell_type = 'code'
+        if chunk.startswith("'''"):
+            chunk = chunk.strip("'\n")
+            cell_type = 'markdown'
+        elif chunk.startswith('"""'):
+            chunk = chunk.strip('"\n')
+            cell_type = 'markdown'
+
+        cell = {
+            'cell_type': cell_type,
+            'metadata': {},
+            'source': chunk.splitlines(True),
+        }
+        if cell_type == 'code':
+            cell.update({'outputs': [], 'execution_count': None})
+        cells.append(cell)
+
+    return cells
+
+
+def make_notebook(cells):
+    """Wrap a list of cells into an nbformat 4 notebook.
+
+    Args:
+        cells (list): List of cell dicts.
+
+    Returns:
+        dict: The notebook.
+    """
+    return {
+        'cells': cells,
+        'metadata': copy.deepcopy(NOTEBOOK_METADATA),
+        'nbformat': 4,
+        'nbformat_minor': 4
+    }
+
+
+def write_notebook(lines, out_file):
+    """Write the lines of a percent-format Python script to a Jupyter notebook.
+
+    Args:
+        lines (list): List of lines, e.g., the header, content and footer of a notebook template joined together.
+        out_file (str): File path of the output notebook.
+
+    Returns:
+        dict: The notebook.
+    """
+    notebook = make_notebook(percent_to_cells(''.join(lines)))
+
+    out_dir = os.path.dirname(out_file)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    with open(out_file, 'w', encoding='utf-8') as f:
+        json.dump(notebook, f, indent=2)
+
+    return notebook
+
+
+def py_file_to_notebook(in_file, out_file=None):
+    """Convert a percent-format Python script file to a Jupyter notebook.
+
+    Args:
+        in_file (str): File path of the input Python script.
+        out_file (str, optional): File path of the output notebook. Defaults to None, which replaces the .py extension
+            of in_file with .ipynb.
+
+    Returns:
+        dict: The notebook.
+    """
+    if out_file is None:
+        out_file = os.path.splitext(in_file)[0] + '.ipynb'
+
+    with open(in_file, encoding='utf-8') as f:
+        text = f.read()
+
+    return write_notebook([text], out_file)
@@ -0,0 +1,408 @@
+''' Serve the static notebook snapshots, and start Voila only when a visitor asks to run a notebook live.
+
+To serve the snapshots built by static_snapshot.py on port 8866: python snapshot_server.py --port 8866
+To build the snapshots on startup as well: python snapshot_server.py --port 8866 --build-snapshots
+
+The Procfile runs: python Template/snapshot_server.py --port=$PORT --prespawn-memory=256
+It serves the snapshots that the Snapshots workflow (.github/workflows/snapshots.yml) commits to _snapshots: the
+workflow executes the notebooks with Earth Engine credentials before rendering them, see static_snapshot.py. A build
+on a dyno would only render the saved outputs, and as the files of a dyno do not persist, it would render all the
+notebooks again on every boot. With --build-snapshots, the snapshots are rendered by static_snapshot.py in a child
+process, so that the server listens on its port right away.
+
+The snapshots are served as static files from _snapshots, with index.html as the home page, so that browsing the
+examples costs no kernel. The requests under /live/ are proxied to a Voila server started on a local port on the first
+of them, with the same options the Procfile used to run Voila with. Voila then starts a kernel per live page as usual,
+and culls the idle ones. The Voila server itself is stopped when no live request has been seen for --live-idle-timeout
+seconds and no kernel connection is open. When the snapshot folder has no index.html, e.g., until the first build has
+finished, / redirects to the live tree.
+
+To keep kernels ready for the most visited notebooks within 2 GB of memory: --prespawn-memory 2048
+The visits of the live notebooks are counted in .voila_request_stats.json, and Voila is started right away with the
+kernel pools that kernel_prespawn.PrespawnPolicy chooses. Voila refills its pools as their kernels are used, so the
+pools only take memory while Voila runs: it is still stopped after --live-idle-timeout seconds without live requests,
+and the pools are chosen again and filled when the next live request starts it. /_live_stats reports the visits, the
+pool size per notebook and the render latency of the notebooks with and without a pool. Voila does not report whether a
+render got a kernel from the pool, so the share of renders of notebooks with a pool is an upper bound of the hit rate.
+
+To serve the map tiles of the live notebooks through a 512 MB cache as well, see tile_cache.py: --tile-cache-mb 512
+
+'''
+
+# License: MIT
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from urllib.parse import unquote
+
+from tornado import httpclient, ioloop, web, websocket
+from kernel_prespawn import RequestStats, PrespawnPolicy, voila_prespawn_args, MB
+from tile_cache import TileCache, TileProxy, tile_routes, TILE_CACHE_DIR
+
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TEMPLATE_DIR)
+SNAPSHOT_DIR = os.path.join(ROOT_DIR, '_snapshots')
+STATS_FILE = os.path.join(ROOT_DIR, '.voila_request_stats.json')
+LIVE_PREFIX = '/live/'
+VOILA_ARGS = ['--no-browser', '--strip_sources=False', '--enable_nbextensions=True',
+              '--MappingKernelManager.cull_interval=60', '--MappingKernelManager.cull_idle_timeout=120']
+# Response headers set by the proxy itself.
+HOP_HEADERS = ('Connection', 'Keep-Alive', 'Transfer-Encoding', 'Content-Length', 'Content-Encoding', 'Upgrade')
+
+
+def free_port():
+    """Get a free local TCP port.
+
+    Returns:
+        int: The port.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LiveServer(object):
+    """A Voila server running in a child process, started on demand and stopped when idle.
+
+    Args:
+        root_dir (str, optional): The folder served by Voila. Defaults to ROOT_DIR.
+        voila_args (list, optional): Options of Voila. Defaults to VOILA_ARGS.
+        idle_timeout (float, optional): Seconds without live requests or kernel connections after which Voila is
+            stopped. Defaults to 1800. None means never.
+        command (list, optional): The command starting the server, before the port, base URL and root_dir arguments.
+            Defaults to None, which runs Voila with the current Python.
+        stats (RequestStats, optional): The visit counts of the notebooks. Defaults to None, which counts them in
+            memory.
+        policy (PrespawnPolicy, optional): The policy choosing the kernels Voila keeps ready when it starts. Defaults
+            to None, which keeps none.
+    """
+
+    def __init__(self, root_dir=ROOT_DIR, voila_args=None, idle_timeout=1800, command=None, stats=None, policy=None):
+        self.root_dir = root_dir
+        self.voila_args = VOILA_ARGS if voila_args is None else voila_args
+        self.idle_timeout = idle_timeout
+        self.command = command or [sys.executable, '-m', 'voila']
+        self.stats = stats if stats is not None else RequestStats()
+        self.policy = policy
+        self.pool_sizes = {}
+        self.renders = []
+        self.process = None
+        self.port = None
+        self.connections = 0
+        self.last_request = time.monotonic()
+        self.starts = 0
+        self.start_time = None
+        self._starting = None
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    async def ensure_started(self, timeout=60):
+        """Start Voila if it is not running, and wait until it accepts connections.
+
+        Args:
+            timeout (float, optional): Seconds to wait. Defaults to 60.
+
+        Returns:
+            str: The base URL of Voila, e.g., http://127.0.0.1:40123
+        """
+        self.last_request = time.monotonic()
+        if self._starting is None and not self.is_running():
+            # Concurrent requests wait for the same start.
+            self._starting = asyncio.ensure_future(self._start(timeout))
+        if self._starting is not None:
+            try:
+                await asyncio.shield(self._starting)
+            finally:
+                if self._starting is not None and self._starting.done():
+                    self._starting = None
+        return self.url
+
+    async def _start(self, timeout):
+        self.port = free_port()
+        start = time.perf_counter()
+        self.pool_sizes = self.policy.pool_sizes() if self.policy is not None else {}
+        prespawn_args = voila_prespawn_args(self.pool_sizes) if self.pool_sizes else []
+        self.process = subprocess.Popen(self.command + ['--port={}'.format(self.port), '--Voila.ip=127.0.0.1',
+                                                        '--Voila.base_url={}'.format(LIVE_PREFIX)] +
+                                        self.voila_args + prespawn_args + [self.root_dir])
+        self.starts += 1
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('Voila exited with code {}'.format(self.process.returncode))
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', self.port)
+                writer.close()
+                self.start_time = time.perf_counter() - start
+                print('Started Voila on port {} in {:.1f} s'.format(self.port, self.start_time))
+                return
+            except OSError:
+                await asyncio.sleep(0.2)
+        self.stop()
+        raise RuntimeError('Voila did not start within {} s'.format(timeout))
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.port)
+
+    def record_render(self, path, duration):
+        """Count the visit of a notebook and the time Voila took to render it.
+
+        Args:
+            path (str): The notebook path, relative to root_dir.
+            duration (float): Seconds until the rendered page was received.
+        """
+        self.stats.record(path)
+        self.renders.append((path in self.pool_sizes, duration))
+        del self.renders[:-1000]
+
+    def report(self):
+        """Get the visit counts and render latencies.
+
+        Returns:
+            dict: The Voila starts and the seconds of the last one, the pool size per notebook, the 20 most visited
+                notebooks, and the number and mean render latency of the last 1000 visits, of the notebooks with a pool
+                (with_pool) and without (without_pool). with_pool_share is the share of the renders of notebooks with a
+                pool, whether or not a kernel of the pool was free.
+        """
+        report = {'starts': self.starts, 'start_time': self.start_time, 'pool_sizes': self.pool_sizes,
+                  'top': self.stats.ranking()[:20]}
+        for name, pooled in (('with_pool', True), ('without_pool', False)):
+            durations = [duration for has_pool, duration in self.renders if has_pool == pooled]
+            report[name] = {'renders': len(durations),
+                            'latency_mean': sum(durations) / len(durations) if durations else 0.0}
+        report['with_pool_share'] = report['with_pool']['renders'] / len(self.renders) if self.renders else 0.0
+        return report
+
+    def stop_if_idle(self):
+        """Stop Voila if it has been idle for longer than idle_timeout."""
+        if self.idle_timeout is None or not self.is_running() or self.connections or self._starting is not None:
+            return
+        if time.monotonic() - self.last_request > self.idle_timeout:
+            print('Stopping Voila after {} s without live requests'.format(self.idle_timeout))
+            self.stop()
+
+    def stop(self):
+        """Stop Voila."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+
+class LiveProxyHandler(web.RequestHandler):
+    """Proxy an HTTP request under LIVE_PREFIX to Voila."""
+
+    SUPPORTED_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+    def initialize(self, live):
+        self.live = live
+
+    async def proxy(self, *args):
+        try:
+            url = await self.live.ensure_started()
+        except RuntimeError as e:
+            raise web.HTTPError(503, str(e))
+
+        headers = {name: value for name, value in self.request.headers.get_all() if name.lower() != 'host'}
+        request = httpclient.HTTPRequest(url + self.request.uri, method=self.request.method, headers=headers,
+                                         body=self.request.body if self.request.method in ('POST', 'PUT', 'PATCH')
+                                         else None, follow_redirects=False, request_timeout=600,
+                                         allow_nonstandard_methods=True)
+        response = await httpclient.AsyncHTTPClient().fetch(request, raise_error=False)
+        if response.code == 599:
+            raise web.HTTPError(502, str(response.error))
+        self.live.last_request = time.monotonic()
+        render_prefix = LIVE_PREFIX + 'voila/render/'
+        if self.request.method == 'GET' and self.request.path.startswith(render_prefix) and response.code == 200:
+            self.live.record_render(unquote(self.request.path[len(render_prefix):]), response.request_time)
+
+        self.set_status(response.code, response.reason)
+        for name in list(self._headers):
+            self.clear_header(name)
+        for name, value in response.headers.get_all():
+            if name not in HOP_HEADERS:
+                self.add_header(name, value)
+        if response.body and self.request.method != 'HEAD':
+            self.write(response.body)
+
+    get = head = post = put = patch = delete = options = proxy
+
+
+class LiveWebSocketHandler(websocket.WebSocketHandler):
+    """Proxy a kernel websocket under LIVE_PREFIX to Voila."""
+
+    def initialize(self, live):
+        self.live = live
+        self.upstream = None
+        self.counted = False
+        self.closed = False
+
+    async def open(self, *args):
+        url = await self.live.ensure_started()
+        if self.closed:
+            # The page was closed while Voila was starting.
+            return
+        self.live.connections += 1
+        self.counted = True
+        headers = {name: value for name, value in self.request.headers.get_all()
+                   if name.lower() in ('cookie', 'authorization')}
+        request = httpclient.HTTPRequest(url.replace('http', 'ws', 1) + self.request.uri, headers=headers)
+        try:
+            self.upstream = await websocket.websocket_connect(request)
+        except Exception:
+            self.close(1011)
+            return
+        if self.closed:
+            self.upstream.close()
+            return
+        ioloop.IOLoop.current().spawn_callback(self._pump)
+
+    async def _pump(self):
+        while True:
+            message = await self.upstream.read_message()
+            if message is None:
+                self.close()
+                return
+            try:
+                await self.write_message(message, binary=isinstance(message, bytes))
+            except websocket.WebSocketClosedError:
+                return
+
+    async def on_message(self, message):
+        self.live.last_request = time.monotonic()
+        if self.upstream is not None:
+            await self.upstream.write_message(message, binary=isinstance(message, bytes))
+
+    def on_close(self):
+        # The connection is only counted once Voila has started, and may be closed before.
+        self.closed = True
+        if self.counted:
+            self.live.connections -= 1
+            self.counted = False
+        self.live.last_request = time.monotonic()
+        if self.upstream is not None:
+            self.upstream.close()
+
+
+class LiveStatsHandler(web.RequestHandler):
+    """Report the visit counts and render latencies of the live notebooks, see LiveServer.report()."""
+
+    def initialize(self, live):
+        self.live = live
+
+    def get(self):
+        self.write(self.live.report())
+
+
+class SnapshotHandler(web.StaticFileHandler):
+    """Serve the snapshots, or redirect to the live tree if there are none."""
+
+    async def get(self, path, include_body=True):
+        if not path and not os.path.isfile(os.path.join(self.root, 'index.html')):
+            self.redirect(LIVE_PREFIX)
+            return
+        await super().get(path, include_body)
+
+
+def start_snapshot_build(root_dir=ROOT_DIR, snapshot_dir=SNAPSHOT_DIR):
+    """Start building the snapshots of the notebooks with static_snapshot.py in a child process.
+
+    Args:
+        root_dir (str, optional): The folder of the notebooks. Defaults to ROOT_DIR.
+        snapshot_dir (str, optional): The folder of the snapshots. Defaults to SNAPSHOT_DIR.
+
+    Returns:
+        subprocess.Popen: The process building the snapshots.
+    """
+    print('Building the snapshots of {} in {}'.format(root_dir, snapshot_dir))
+    return subprocess.Popen([sys.executable, os.path.join(TEMPLATE_DIR, 'static_snapshot.py'), '--input', root_dir,
+                             '--output', snapshot_dir])
+
+
+def make_app(snapshot_dir=SNAPSHOT_DIR, live=None, tile_proxy=None):
+    """Create the web application.
+
+    Args:
+        snapshot_dir (str, optional): The folder of the snapshots. Defaults to SNAPSHOT_DIR.
+        live (LiveServer, optional): The live Voila server. Defaults to None, which creates one for ROOT_DIR.
+        tile_proxy (tile_cache.TileProxy, optional): The map tile proxy served under /tiles. Defaults to None.
+
+    Returns:
+        tornado.web.Application: The application.
+    """
+    if live is None:
+        live = LiveServer()
+    prefix = LIVE_PREFIX.rstrip('/')
+    routes = [
+        (prefix + r'(/api/kernels/[^/]+/channels)', LiveWebSocketHandler, {'live': live}),
+        (prefix + r'(/.*)?', LiveProxyHandler, {'live': live}),
+        (r'/_live_stats', LiveStatsHandler, {'live': live}),
+    ]
+    if tile_proxy is not None:
+        routes += tile_routes(tile_proxy)
+    routes.append((r'/(.*)', SnapshotHandler, {'path': snapshot_dir, 'default_filename': 'index.html'}))
+    return web.Application(routes)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Serve the static notebook snapshots and run Voila on demand.')
+    parser.add_argument('--port', type=int, default=8866,
+                        help="Port to listen on")
+    parser.add_argument('--snapshots', type=str, default=SNAPSHOT_DIR,
+                        help="Path to the folder of the snapshots")
+    parser.add_argument('--root', type=str, default=ROOT_DIR,
+                        help="Path to the folder of the notebooks served live")
+    parser.add_argument('--build-snapshots', action='store_true',
+                        help="Build the snapshots of the notebooks in the background on startup")
+    parser.add_argument('--live-idle-timeout', type=float, default=1800,
+                        help="Seconds without live requests after which Voila is stopped (0 to keep it running)")
+    parser.add_argument('--prespawn-memory', type=int, default=0,
+                        help="Megabytes of memory for kernels kept ready for the most visited notebooks (0 for none)")
+    parser.add_argument('--kernel-memory', type=int, default=250,
+                        help="Estimated megabytes of memory of a kernel")
+    parser.add_argument('--stats', type=str, default=STATS_FILE,
+                        help="Path to the JSON visit counts of the notebooks")
+    parser.add_argument('--tile-cache-mb', type=int, default=0,
+                        help="Megabytes of the map tile cache served under /tiles (0 for no tile proxy)")
+    parser.add_argument('--tile-cache-dir', type=str, default=TILE_CACHE_DIR,
+                        help="Path to the folder of the cached map tiles")
+    args = parser.parse_args()
+
+    stats = RequestStats(args.stats)
+    policy = None
+    if args.prespawn_memory:
+        policy = PrespawnPolicy(stats, args.prespawn_memory * MB, args.kernel_memory * MB)
+    live = LiveServer(os.path.abspath(args.root), idle_timeout=args.live_idle_timeout or None, stats=stats,
+                      policy=policy)
+    tile_proxy = None
+    if args.tile_cache_mb:
+        tile_proxy = TileProxy(TileCache(args.tile_cache_dir, args.tile_cache_mb * MB))
+    app = make_app(os.path.abspath(args.snapshots), live, tile_proxy)
+    app.listen(args.port)
+    build = start_snapshot_build(os.path.abspath(args.root), os.path.abspath(args.snapshots)) \
+        if args.build_snapshots else None
+    ioloop.PeriodicCallback(live.stop_if_idle, 60 * 1000).start()
+    ioloop.PeriodicCallback(stats.save, 60 * 1000).start()
+    if policy is not None:
+        # The pools are ready for the first visitors, and are stopped with Voila once it is idle.
+        ioloop.IOLoop.current().spawn_callback(live.ensure_started)
+    print('Serving {} on port {}'.format(args.snapshots, args.port))
+    try:
+        ioloop.IOLoop.current().start()
+    finally:
+        if build is not None and build.poll() is None:
+            build.terminate()
+        live.stop()
+        stats.save()
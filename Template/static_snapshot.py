@@ -0,0 +1,280 @@
+''' Pre-render the example notebooks to static HTML snapshots, to be served without a kernel.
+
+To render the notebooks with their saved outputs: build_snapshots()
+From the command line: python static_snapshot.py --input .. --output ../_snapshots
+To execute the notebooks whose code changed before rendering them: --execute --workers 4
+
+Each notebook is rendered with its output cells to the same relative path in the output folder (NAIP/metadata.ipynb →
+_snapshots/NAIP/metadata.html), with a link to run it live in Voila. The first PNG output of a notebook is saved next
+to it as its thumbnail (NAIP/metadata.png), and index.html lists all snapshots. Interactive maps are widgets whose
+tiles are served by Earth Engine with URLs that expire, so they cannot be published as static assets and are only
+shown live. When the notebooks are executed, the top Earth Engine layer of the map of each notebook is rendered with
+getThumbURL() instead (see notebook_kernel.map_thumbnail()), which is its thumbnail if it has no PNG output.
+Snapshots whose notebook has not changed are not rendered again, using the manifest .snapshot_cache.json in the output
+folder. snapshot_server.py serves the snapshots and starts Voila on the first live request.
+
+Executing the notebooks needs Earth Engine credentials, so the published snapshots are built by the Snapshots workflow
+(.github/workflows/snapshots.yml) with --execute, and committed to _snapshots. Without --execute only the saved
+outputs are rendered: most notebooks of this repository are saved without outputs, so their snapshots are code
+listings without a thumbnail.
+
+'''
+
+# License: MIT
+
+import os
+import json
+import html
+import base64
+import argparse
+import datetime
+from pathlib import Path
+from urllib.parse import quote
+from conversion_cache import ConversionCache
+from notebook_executor import get_notebooks, execute_notebooks
+from execution_cache import ExecutionCache, kernel_fingerprint
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_DIR = os.path.join(ROOT_DIR, '_snapshots')
+# The URL prefix of the live Voila server, see snapshot_server.py.
+LIVE_PREFIX = '/live/'
+SNAPSHOT_VERSION = '1'
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="{root}style.css">
+</head>
+<body>
+<div class="snapshot-bar">
+<a href="{root}index.html">All examples</a>
+<span>Static snapshot of {title}, rendered {date}.</span>
+<a class="live" href="{live_url}">Run live</a>
+</div>
+<div class="snapshot-body">
+{body}
+</div>
+</body>
+</html>
+'''
+
+STYLE = '''body { font-family: sans-serif; margin: 0; }
+.snapshot-bar { position: sticky; top: 0; background: #f5f5f5; border-bottom: 1px solid #ddd; padding: 8px 16px; }
+.snapshot-bar span { margin: 0 16px; color: #555; }
+.snapshot-bar .live { background: #1976d2; color: white; padding: 4px 12px; border-radius: 4px; text-decoration: none; }
+.snapshot-body { max-width: 1100px; margin: 0 auto; padding: 16px; }
+.jp-InputArea-editor, .input_area pre { background: #f7f7f7; padding: 8px; overflow-x: auto; }
+.jp-OutputArea-output pre, .output_area pre { overflow-x: auto; }
+.jp-OutputArea-output img, .output_area img { max-width: 100%; }
+.gallery { display: flex; flex-wrap: wrap; }
+.gallery div { width: 220px; margin: 8px; }
+.gallery img { width: 220px; height: 150px; object-fit: cover; background: #eee; }
+'''
+
+
+def snapshot_files(in_file, in_dir, out_dir):
+    """Get the file paths of the snapshot and the thumbnail of a notebook.
+
+    Args:
+        in_file (str): File path of the notebook.
+        in_dir (str): The folder of the notebooks, which in_file is relative to.
+        out_dir (str): The folder of the snapshots.
+
+    Returns:
+        tuple: File paths of the HTML snapshot and the PNG thumbnail.
+    """
+    out_stem = os.path.join(out_dir, os.path.splitext(os.path.relpath(in_file, in_dir))[0])
+    return out_stem + '.html', out_stem + '.png'
+
+
+def live_url(in_file, in_dir, live_prefix=LIVE_PREFIX):
+    """Get the URL of the live Voila rendering of a notebook.
+
+    Args:
+        in_file (str): File path of the notebook.
+        in_dir (str): The folder served by Voila, which in_file is relative to.
+        live_prefix (str, optional): The base URL of Voila. Defaults to LIVE_PREFIX.
+
+    Returns:
+        str: The URL.
+    """
+    return live_prefix + 'voila/render/' + quote(Path(os.path.relpath(in_file, in_dir)).as_posix())
+
+
+def notebook_thumbnail(notebook):
+    """Get the first PNG output of a notebook, or else the PNG of its map saved when it was executed.
+
+    Args:
+        notebook (dict): The notebook.
+
+    Returns:
+        bytes: The PNG image, or None if the notebook has no PNG output and no map thumbnail.
+    """
+    outputs = [output.get('data', {}) for cell in notebook['cells'] for output in cell.get('outputs', [])]
+    for data in outputs + [notebook.get('metadata', {}).get('thumbnail', {})]:
+        data = data.get('image/png')
+        if data:
+            return base64.b64decode(''.join(data) if isinstance(data, list) else data)
+    return None
+
+
+def render_snapshot(in_file, in_dir, live_prefix=LIVE_PREFIX, root='', date=None):
+    """Render a notebook and its output cells to an HTML page.
+
+    Args:
+        in_file (str): File path of the notebook.
+        in_dir (str): The folder of the notebooks, which in_file is relative to.
+        live_prefix (str, optional): The base URL of Voila. Defaults to LIVE_PREFIX.
+        root (str, optional): The relative URL of the snapshot folder, e.g., '../'. Defaults to ''.
+        date (str, optional): The date shown on the page. Defaults to None, which uses today.
+
+    Returns:
+        str: The HTML page.
+    """
+    import nbformat
+    from nbconvert import HTMLExporter
+
+    notebook = nbformat.read(in_file, as_version=4)
+    body, _ = HTMLExporter(template_name='basic').from_notebook_node(notebook)
+    title = Path(os.path.relpath(in_file, in_dir)).with_suffix('').as_posix()
+    return PAGE_TEMPLATE.format(title=html.escape(title), root=root, date=date or datetime.date.today().isoformat(),
+                                live_url=live_url(in_file, in_dir, live_prefix), body=body)
+
+
+def write_index(entries, out_dir, live_prefix=LIVE_PREFIX):
+    """Write index.html, the gallery of all snapshots, and the shared style.css.
+
+    Args:
+        entries (list): The (notebook path relative to the notebook folder, has thumbnail) of the snapshots.
+        out_dir (str): The folder of the snapshots.
+        live_prefix (str, optional): The base URL of Voila. Defaults to LIVE_PREFIX.
+    """
+    sections = {}
+    for rel_path, has_thumbnail in sorted(entries):
+        folder = os.path.dirname(rel_path) or '.'
+        sections.setdefault(folder, []).append((rel_path, has_thumbnail))
+
+    body = ['<h1>Earth Engine Python notebooks</h1>',
+            '<p>Static snapshots of the examples. Use <a href="{}">Run live</a> to execute one in Voila.</p>'.format(
+                live_prefix)]
+    for folder, items in sections.items():
+        body.append('<h2>{}</h2>'.format(html.escape(folder)))
+        body.append('<div class="gallery">')
+        for rel_path, has_thumbnail in items:
+            stem = quote(os.path.splitext(rel_path)[0])
+            name = html.escape(os.path.splitext(os.path.basename(rel_path))[0])
+            image = '<img src="{}.png" alt="{}">'.format(stem, name) if has_thumbnail else '<img alt="">'
+            body.append('<div><a href="{0}.html">{1}</a><br><a href="{0}.html">{2}</a> &middot; '
+                        '<a href="{3}voila/render/{4}">Run live</a></div>'.format(
+                            stem, image, name, live_prefix, quote(rel_path)))
+        body.append('</div>')
+
+    page = PAGE_TEMPLATE.format(title='Earth Engine Python notebooks', root='', live_url=live_prefix,
+                                date=datetime.date.today().isoformat(), body='\n'.join(body))
+    with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(page)
+    with open(os.path.join(out_dir, 'style.css'), 'w') as f:
+        f.write(STYLE)
+
+
+def build_snapshots(in_dir=ROOT_DIR, out_dir=SNAPSHOT_DIR, execute=False, workers=4, timeout=600, python_path=None,
+                    use_cache=True, live_prefix=LIVE_PREFIX):
+    """Render the notebooks of a folder to static HTML snapshots, with thumbnails and an index page.
+
+    Args:
+        in_dir (str, optional): The folder of the notebooks. Defaults to ROOT_DIR.
+        out_dir (str, optional): The folder of the snapshots. Defaults to SNAPSHOT_DIR.
+        execute (bool, optional): Whether to execute the notebooks whose code cells changed since their last
+            successful execution before rendering them, saving the thumbnails of their maps. This needs Earth Engine
+            credentials. Defaults to False.
+        workers (int, optional): Number of notebooks executed concurrently. Defaults to 4.
+        timeout (float, optional): Seconds allowed per notebook. Defaults to 600.
+        python_path (list, optional): Folders prepended to sys.path of the kernels. Defaults to None.
+        use_cache (bool, optional): Whether to skip the notebooks whose snapshot is up to date. Defaults to True.
+        live_prefix (str, optional): The base URL of Voila. Defaults to LIVE_PREFIX.
+
+    Returns:
+        dict: The number of notebooks rendered, skipped (up to date) and failed.
+    """
+    out_dir = os.path.abspath(out_dir)
+    files = [file for file in get_notebooks(in_dir) if not os.path.abspath(file).startswith(out_dir + os.sep)]
+
+    if execute:
+        cache_file = os.path.join(in_dir, '.notebook_execution_cache.json')
+        execute_notebooks(files, workers, timeout, python_path=python_path,
+                          cache=ExecutionCache(cache_file, kernel_fingerprint(python_path)), map_thumbnails=True)
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    cache = ConversionCache(os.path.join(out_dir, '.snapshot_cache.json'), SNAPSHOT_VERSION) if use_cache else None
+    counts = {'rendered': 0, 'skipped': 0, 'failed': 0}
+    entries = []
+    for i, in_file in enumerate(files):
+        rel_path = Path(os.path.relpath(in_file, in_dir)).as_posix()
+        html_file, png_file = snapshot_files(in_file, in_dir, out_dir)
+        key = cache.make_key(in_file, {'live_prefix': live_prefix}) if cache is not None else None
+        if cache is not None and cache.is_fresh(in_file, key, html_file):
+            counts['skipped'] += 1
+            entries.append((rel_path, os.path.isfile(png_file)))
+            continue
+
+        print('{}/{}: {}'.format(i + 1, len(files), rel_path))
+        root = '../' * rel_path.count('/')
+        try:
+            page = render_snapshot(in_file, in_dir, live_prefix, root)
+            with open(in_file, encoding='utf-8') as f:
+                thumbnail = notebook_thumbnail(json.load(f))
+        except Exception as e:
+            print('Failed to render {}: {}: {}'.format(rel_path, type(e).__name__, e))
+            counts['failed'] += 1
+            if cache is not None:
+                cache.discard(in_file)
+            continue
+
+        if not os.path.exists(os.path.dirname(html_file)):
+            os.makedirs(os.path.dirname(html_file))
+        with open(html_file, 'w', encoding='utf-8') as f:
+            f.write(page)
+        if thumbnail is not None:
+            with open(png_file, 'wb') as f:
+                f.write(thumbnail)
+        elif os.path.isfile(png_file):
+            os.remove(png_file)
+        if cache is not None:
+            cache.store(in_file, key, html_file)
+        counts['rendered'] += 1
+        entries.append((rel_path, thumbnail is not None))
+
+    write_index(entries, out_dir, live_prefix)
+    if cache is not None:
+        cache.save()
+    print('Rendered {rendered} snapshots, {skipped} up to date, {failed} failed'.format(**counts))
+    return counts
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Pre-render the notebooks to static HTML snapshots.')
+    parser.add_argument('--input', type=str, default=ROOT_DIR,
+                        help="Path to the folder of the notebooks")
+    parser.add_argument('--output', type=str, default=SNAPSHOT_DIR,
+                        help="Path to the folder of the snapshots")
+    parser.add_argument('--execute', action='store_true',
+                        help="Execute the notebooks whose code changed before rendering them")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Number of notebooks executed concurrently")
+    parser.add_argument('--timeout', type=float, default=600,
+                        help="Seconds allowed per notebook (0 for no limit)")
+    parser.add_argument('--python-path', action='append', default=[],
+                        help="Folder prepended to sys.path of the kernels")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Render all notebooks, including the ones whose snapshot is up to date")
+    parser.add_argument('--live-prefix', type=str, default=LIVE_PREFIX,
+                        help="Base URL of the live Voila server")
+    args = parser.parse_args()
+
+    build_snapshots(os.path.abspath(args.input), args.output, args.execute, args.workers, args.timeout or None,
+                    [os.path.abspath(path) for path in args.python_path], not args.no_cache, args.live_prefix)
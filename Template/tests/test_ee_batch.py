@@ -0,0 +1,162 @@
+import os
+import sys
+import types
+import importlib
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The examples ported to one ee.List([...]).getInfo(): (script, requests, objects fetched).
+# The objects fetched is the number of getInfo() calls the example made before it was ported.
+PORTED_EXAMPLES = [
+    ('ImageCollection/creating_monthly_imagery.py', 1, 5),
+    ('ImageCollection/metadata.py', 1, 7),
+    ('image2/image_metadata.py', 1, 7),
+    ('Image1/band_stats.py', 1, 5),
+    ('NAIP/metadata.py', 2, 8),
+]
+
+
+class Requests(object):
+    """The requests made to the fake Earth Engine servers."""
+
+    def __init__(self):
+        self.count = 0
+        self.fetched = 0
+
+
+class AnyObject(object):
+    """A stand-in that accepts any attribute and call, e.g., geemap.Map()."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: AnyObject()
+
+
+def make_fake_ee(requests):
+    """Make an ee module whose objects accept any method and count the getInfo() requests."""
+
+    class ComputedObjectType(type):
+        def __getattr__(cls, name):
+            # Static methods, e.g., ee.Reducer.minMax() and ee.List.sequence().
+            return lambda *args, **kwargs: ComputedObject(name, *args)
+
+    class ComputedObject(metaclass=ComputedObjectType):
+        def __init__(self, *args, **kwargs):
+            self.args = args
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: ComputedObject(name, *args)
+
+        def value(self):
+            return 'value'
+
+        def getInfo(self):
+            requests.count += 1
+            requests.fetched += 1
+            return self.value()
+
+    class List(ComputedObject):
+        def value(self):
+            if self.args and isinstance(self.args[0], list):
+                return [fetched(item) for item in self.args[0]]
+            return []
+
+        def getInfo(self):
+            requests.count += 1
+            requests.fetched += sum(isinstance(item, ComputedObject) for item in self.items())
+            return self.value()
+
+        def items(self):
+            return self.args[0] if self.args and isinstance(self.args[0], list) else [self]
+
+    class Dictionary(ComputedObject):
+        def value(self):
+            return {name: fetched(item) for name, item in self.args[0].items()}
+
+        def getInfo(self):
+            requests.count += 1
+            requests.fetched += sum(isinstance(item, ComputedObject) for item in self.args[0].values())
+            return self.value()
+
+    def fetched(obj):
+        return obj.value() if isinstance(obj, ComputedObject) else obj
+
+    classes = {}
+
+    def module_getattr(name):
+        # ee.Image, ee.Date, ee.Geometry, ... are all computed objects.
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name not in classes:
+            classes[name] = type(name, (ComputedObject,), {})
+        return classes[name]
+
+    ee = types.ModuleType('ee')
+    ee.ComputedObject = ComputedObject
+    ee.List = List
+    ee.Dictionary = Dictionary
+    ee.Initialize = lambda *args, **kwargs: None
+    ee.__getattr__ = module_getattr
+    return ee
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    requests = Requests()
+    geemap = types.ModuleType('geemap')
+    geemap.Map = lambda *args, **kwargs: AnyObject()
+    monkeypatch.setitem(sys.modules, 'ee', make_fake_ee(requests))
+    monkeypatch.setitem(sys.modules, 'geemap', geemap)
+    monkeypatch.delitem(sys.modules, 'ee_batch', raising=False)
+    return requests
+
+
+def test_batch_get_info(requests):
+    import ee
+    ee_batch = importlib.import_module('ee_batch')
+    objs = [ee.Number(1), ee.Image('USGS/NED').bandNames(), 'plain', ee.Date('2020-01-01')]
+
+    values = [obj.getInfo() if isinstance(obj, ee.ComputedObject) else obj for obj in objs]
+    assert (requests.count, requests.fetched) == (3, 3)
+
+    requests.count = requests.fetched = 0
+    assert ee_batch.batch_get_info(*objs) == values
+    assert (requests.count, requests.fetched) == (1, 3)
+
+    requests.count = requests.fetched = 0
+    assert ee_batch.batch_get_info('plain', 2) == ['plain', 2]
+    assert requests.count == 0
+
+
+def test_batch_get_info_dict(requests):
+    import ee
+    ee_batch = importlib.import_module('ee_batch')
+    info = ee_batch.batch_get_info_dict({'count': ee.Number(1), 'names': ee.List(['B1']), 'scale': 30})
+    assert info == {'count': 'value', 'names': ['B1'], 'scale': 30}
+    assert (requests.count, requests.fetched) == (1, 2)
+
+
+def test_get_info_batch(requests):
+    import ee
+    ee_batch = importlib.import_module('ee_batch')
+    with ee_batch.GetInfoBatch() as batch:
+        count = batch.add(ee.Number(1))
+        names = batch.add(ee.Image('USGS/NED').bandNames())
+        with pytest.raises(RuntimeError):
+            count.value
+        assert requests.count == 0
+    assert (count.value, names.value) == ('value', 'value')
+    assert (requests.count, requests.fetched) == (1, 2)
+
+    batch.fetch()
+    assert requests.count == 1
+
+
+@pytest.mark.parametrize('script, expected_requests, expected_fetched', PORTED_EXAMPLES)
+def test_ported_examples(requests, script, expected_requests, expected_fetched, capsys):
+    with open(os.path.join(REPO_DIR, script)) as f:
+        code = compile(f.read(), script, 'exec')
+    exec(code, {'__name__': '__main__'})
+    assert requests.count == expected_requests
+    assert requests.fetched == expected_fetched
@@ -0,0 +1,179 @@
+import os
+import sys
+import types
+import threading
+import importlib
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class BatchServer(object):
+    """A stand-in for the Earth Engine batch API: ee.batch.Export.image() and ee.data.getTaskList().
+
+    Each getTaskList() request completes the oldest running tasks, complete_per_poll at a time.
+
+    Args:
+        failing_starts (dict, optional): Mapping of task names to the number of times their start() fails.
+        unlisted (set, optional): Names of the tasks that never show up in the task list.
+        complete_per_poll (int, optional): Number of tasks completed by each getTaskList() request.
+    """
+
+    def __init__(self, failing_starts=None, unlisted=(), complete_per_poll=3):
+        self.failing_starts = dict(failing_starts or {})
+        self.unlisted = set(unlisted)
+        self.complete_per_poll = complete_per_poll
+        self.tasks = []
+        self.requests = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def make_task(self, image, description, config):
+        server = self
+
+        class Task(object):
+            def __init__(self):
+                self.id = None
+                self.name = description
+
+            def start(self):
+                with server.lock:
+                    if server.failing_starts.get(self.name, 0) > 0:
+                        server.failing_starts[self.name] -= 1
+                        raise RuntimeError('Too many tasks already in the queue.')
+                    self.id = 'TASK{}'.format(len(server.tasks))
+                    server.tasks.append({'id': self.id, 'name': self.name, 'state': 'RUNNING'})
+                    server.max_running = max(server.max_running, server.running())
+
+        return Task()
+
+    def running(self):
+        return sum(task['state'] == 'RUNNING' for task in self.tasks)
+
+    def get_task_list(self):
+        with self.lock:
+            self.requests += 1
+            for task in [task for task in self.tasks if task['state'] == 'RUNNING'][:self.complete_per_poll]:
+                task['state'] = 'COMPLETED'
+            return [{'id': task['id'], 'state': task['state']} for task in self.tasks
+                    if task['name'] not in self.unlisted]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = BatchServer()
+    ee = types.ModuleType('ee')
+    ee.batch = types.SimpleNamespace(Export=types.SimpleNamespace(image=server.make_task))
+    ee.data = types.SimpleNamespace(getTaskList=server.get_task_list)
+    monkeypatch.setitem(sys.modules, 'ee', ee)
+    monkeypatch.delitem(sys.modules, 'export_scheduler', raising=False)
+    return server
+
+
+def export(scheduler, server, names):
+    import ee
+    for name in names:
+        scheduler.submit(lambda name=name: ee.batch.Export.image(None, name, {}), name)
+    assert scheduler.wait(timeout=10, until='finished')
+    return {result['description']: result for result in scheduler.results()}
+
+
+def test_in_flight_limit_and_retries(server):
+    export_scheduler = importlib.import_module('export_scheduler')
+    server.failing_starts = {'image3': 2, 'image7': 1}
+    names = ['image{}'.format(index) for index in range(25)]
+    with export_scheduler.ExportScheduler(max_in_flight=5, workers=4, backoff=0.001, poll_interval=0.005) as scheduler:
+        results = export(scheduler, server, names)
+
+    assert all(result['state'] == 'COMPLETED' for result in results.values())
+    assert (results['image3']['attempts'], results['image7']['attempts'], results['image0']['attempts']) == (3, 2, 1)
+    assert 0 < server.max_running <= 5
+    # One request per poll rather than one per task and poll.
+    assert server.requests == scheduler.polls
+
+
+def test_failed_starts(server):
+    export_scheduler = importlib.import_module('export_scheduler')
+    server.failing_starts = {'image1': 10}
+    with export_scheduler.ExportScheduler(max_in_flight=2, retries=2, backoff=0.001, poll_interval=0.005) as scheduler:
+        results = export(scheduler, server, ['image0', 'image1', 'image2', 'image3'])
+
+    assert results['image1']['state'] == 'FAILED'
+    assert results['image1']['attempts'] == 3
+    assert 'Too many tasks' in results['image1']['error']
+    # The failed start gave its slot back.
+    assert [results[name]['state'] for name in ('image0', 'image2', 'image3')] == ['COMPLETED'] * 3
+
+
+def test_tasks_missing_from_the_task_list(server):
+    export_scheduler = importlib.import_module('export_scheduler')
+    server.unlisted = {'image0'}
+    with export_scheduler.ExportScheduler(max_in_flight=1, poll_interval=0.005, missing_timeout=0.05) as scheduler:
+        results = export(scheduler, server, ['image0', 'image1'])
+
+    assert results['image0']['state'] == 'FAILED'
+    assert 'missing from the task list' in results['image0']['error']
+    # The missing task freed its slot for the next one.
+    assert results['image1']['state'] == 'COMPLETED'
+
+
+class AnyObject(object):
+    """A stand-in that accepts any attribute and call, e.g., ee.Geometry.Polygon() or geemap.Map()."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return AnyObject()
+
+    def __getattr__(self, name):
+        return AnyObject()
+
+
+NAIP_NAMES = ['m_4609915_sw_14_1_201507{:02d}'.format(index) for index in range(12)]
+WATERSHEDS = [[str(index), 'Watershed {}'.format(index)] for index in range(12)]
+
+# The export examples: (script, the result of their ee.List([...]).getInfo() request, the names of their tasks).
+EXPORT_EXAMPLES = [
+    ('AssetManagement/export_raster.py', [[-99.25, 46.75], NAIP_NAMES], NAIP_NAMES),
+    ('AssetManagement/export_ImageCollection.py', [[-99.25, 46.75], NAIP_NAMES], NAIP_NAMES),
+    ('NAIP/loop_FeatureCollection.py', [[-99.25, 46.75], WATERSHEDS],
+     ['Y2015_{}_Watershed_{}'.format(index, index) for index in range(12)]),
+    ('NAIP/ndwi_timeseries.py', [[-99.25, 46.75], WATERSHEDS],
+     ['Y2014_{}_Watershed_{}'.format(index, index) for index in range(12)]),
+]
+
+
+@pytest.mark.parametrize('scheduled', [True, False])
+@pytest.mark.parametrize('script, info, task_names', EXPORT_EXAMPLES)
+def test_export_examples(server, monkeypatch, script, info, task_names, scheduled):
+    import ee
+
+    class List(AnyObject):
+        def getInfo(self):
+            return info
+
+    ee.ImageCollection = ee.Geometry = ee.FeatureCollection = ee.Image = AnyObject()
+    ee.Date = ee.Filter = ee.Reducer = AnyObject()
+    ee.List = List
+    ee.batch.Export.table = server.make_task
+    geemap = types.ModuleType('geemap')
+    geemap.Map = AnyObject()
+    monkeypatch.setitem(sys.modules, 'geemap', geemap)
+    monkeypatch.chdir(os.path.join(REPO_DIR, os.path.dirname(script)))
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    if scheduled:
+        # The examples keep the default poll interval of 10 seconds.
+        monkeypatch.setattr(importlib.import_module('export_scheduler').ExportScheduler.__init__, '__defaults__',
+                            (10, 4, 5, 0.001, 60.0, 0.005, 300.0))
+    else:
+        # As on Colab, where the examples run without the Template folder.
+        monkeypatch.setitem(sys.modules, 'export_scheduler', None)
+
+    with open(os.path.join(REPO_DIR, script)) as f:
+        exec(compile(f.read(), script, 'exec'), {'__name__': '__main__'})
+
+    assert sorted(task['name'] for task in server.tasks) == sorted(task_names)
+    if scheduled:
+        assert 0 < server.max_running <= 10
@@ -0,0 +1,100 @@
+import io
+import os
+
+import pytest
+
+from convert_js_to_python import write_js_to_python, js_to_python
+from js_parser import parse
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Scripts whose syntax tree conversion must match the line-based one, apart from indentation and blank lines.
+SAME_AS_LINES = [
+    'JavaScripts/Arrays/DecorrelationStretch.js',
+    'JavaScripts/Arrays/SpectralUnmixing.js',
+    'JavaScripts/CloudMasking/MODISSurfaceReflectanceQABand.js',
+    'JavaScripts/Demos/Sentinel1Composite.js',
+    'javascript2/Image/ConnectedPixelCount.js',
+    'javascript2/Image/NormalizedDifference.js',
+]
+
+
+def convert(in_file, frontend):
+    stream = io.StringIO()
+    write_js_to_python(in_file, stream, frontend=frontend)
+    return stream.getvalue()
+
+
+def code_lines(code):
+    return [line.strip() for line in code.splitlines() if line.strip()]
+
+
+@pytest.mark.parametrize('script', SAME_AS_LINES)
+def test_ast_matches_lines(script):
+    in_file = os.path.join(REPO_DIR, script)
+    assert code_lines(convert(in_file, 'ast')) == code_lines(convert(in_file, 'lines'))
+
+
+def test_length_property_and_method(tmp_path):
+    in_file = tmp_path / 'length.js'
+    in_file.write_text('var names = ["B1", "B2"];\n'
+                       'var count = names.length;\n'
+                       'var size = ee.List(names).length();\n')
+    code = convert(str(in_file), 'ast')
+    assert 'count = len(names)' in code
+    assert 'size = ee.List(names).length()' in code
+
+
+def test_output_folder_created_by_another_worker(tmp_path, monkeypatch):
+    in_file = tmp_path / 'js' / 'Arrays' / 'image.js'
+    in_file.parent.mkdir(parents=True)
+    in_file.write_text('var image = ee.Image(1);\n')
+    (tmp_path / 'py' / 'Arrays').mkdir(parents=True)
+    # As when another worker of js_to_python_dir() creates the folder between a check and its creation.
+    exists = os.path.exists
+    monkeypatch.setattr(os.path, 'exists', lambda path: False if os.path.isdir(path) else exists(path))
+    js_to_python(str(in_file), str(tmp_path / 'py' / 'Arrays' / 'image.py'), use_qgis=False)
+    assert (tmp_path / 'py' / 'Arrays' / 'image.py').is_file()
+
+
+def grouping(node):
+    """Write the binary expressions of a syntax tree with explicit parentheses."""
+    if node['type'] == 'Identifier':
+        return node['name']
+    return '({} {} {})'.format(grouping(node['left']), node['operator'], grouping(node['right']))
+
+
+# JavaScript expressions, and their grouping by precedence and associativity.
+PRECEDENCE = [
+    ('b + c * d', '(b + (c * d))'),
+    ('b * c + d', '((b * c) + d)'),
+    ('b - c * d - e', '((b - (c * d)) - e)'),
+    ('b - c - e', '((b - c) - e)'),
+    ('b / c / d', '((b / c) / d)'),
+    ('b ** c ** d', '(b ** (c ** d))'),
+    ('b * c ** d', '(b * (c ** d))'),
+    ('d || e && f', '(d || (e && f))'),
+    ('d && e || f', '((d && e) || f)'),
+    ('b < c == d < e', '((b < c) == (d < e))'),
+    ('b + c < d * e', '((b + c) < (d * e))'),
+    ('b | c ^ d & e', '(b | (c ^ (d & e)))'),
+]
+
+
+@pytest.mark.parametrize('expression, expected', PRECEDENCE)
+def test_binary_precedence(expression, expected):
+    statement = parse('x = {};'.format(expression))['body'][0]
+    assert grouping(statement['expression']['right']) == expected
+
+
+def test_binary_expressions_keep_their_grouping(tmp_path):
+    in_file = tmp_path / 'precedence.js'
+    in_file.write_text('var a = b + c * d;\n'
+                       'var g = b - c * d - e;\n'
+                       'var h = d || e && f;\n'
+                       'var i = b - (c - e);\n'
+                       'var j = b ** c ** d;\n'
+                       'var k = (b ** c) ** d;\n')
+    assert code_lines(convert(str(in_file), 'ast'))[-6:] == [
+        'a = b + c * d', 'g = b - c * d - e', 'h = d or e and f', 'i = b - (c - e)', 'j = b ** c ** d',
+        'k = (b ** c) ** d']
@@ -0,0 +1,198 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from local_image import Image, Kernel, MB
+from local_vectors import polygonize
+from local_image_io import save_npz, download_asset
+
+CRS_TRANSFORM = [30, 0, 500000, 0, -30, 4100000]
+
+
+def masked_bands():
+    mask = np.zeros((4, 5), bool)
+    mask[0, :2] = mask[3, 4] = True
+    elevation = np.ma.MaskedArray(np.arange(20, dtype=np.float32).reshape(4, 5), mask=mask)
+    landcover = np.ma.MaskedArray(np.arange(20, dtype=np.uint16).reshape(4, 5), mask=mask.T.reshape(4, 5))
+    return {'elevation': elevation, 'landcover': landcover}
+
+
+def test_masks_of_npz_files(tmp_path):
+    arrays = masked_bands()
+    out_file = str(tmp_path / 'dem.npz')
+    save_npz(out_file, dict(arrays, slope=np.ones((4, 5))), CRS_TRANSFORM, 'EPSG:32610', {'year': 2020})
+
+    with np.load(out_file) as npz:
+        assert sorted(npz.files) == ['__crs__', '__crs_transform__', '__properties__', 'elevation', 'elevation.mask',
+                                     'landcover', 'landcover.mask', 'slope']
+        assert npz['landcover'].dtype == np.uint16
+
+    image = Image(out_file)
+    assert image.bandNames().getInfo() == ['elevation', 'landcover', 'slope']
+    bands = image.compute()
+    for name, array in arrays.items():
+        assert (bands[name].mask == array.mask).all()
+        assert (bands[name].compressed() == array.compressed()).all()
+    assert not bands['slope'].mask.any()
+    assert bands['elevation'].mean() == arrays['elevation'].mean()
+
+
+def test_download_asset(tmp_path, monkeypatch):
+    arrays = masked_bands()
+    pixels = np.zeros((4, 5), [('elevation', np.float32), ('landcover', np.uint16), ('elevation_mask', np.uint8),
+                               ('landcover_mask', np.uint8)])
+    for name, array in arrays.items():
+        # Earth Engine fills the masked pixels of the arrays it returns.
+        pixels[name] = array.filled(0)
+        pixels[name + '_mask'] = ~array.mask
+
+    class EEImage(object):
+        def __init__(self, *args):
+            self.added = []
+
+        def __getattr__(self, name):
+            return lambda *args: self
+
+        def addBands(self, image):
+            self.added.append(image)
+            return self
+
+    ee = types.ModuleType('ee')
+    ee.Image = EEImage
+    ee.List = lambda items: types.SimpleNamespace(getInfo=lambda: [list(arrays), {'year': 2020}])
+    ee.data = types.SimpleNamespace(computePixels=lambda request: pixels)
+    monkeypatch.setitem(sys.modules, 'ee', ee)
+
+    out_file = download_asset('users/test/dem', (500000, 4099880, 500150, 4100000), 30, 'EPSG:32610',
+                              data_dir=str(tmp_path))
+    bands = Image(out_file).compute()
+    for name, array in arrays.items():
+        assert (bands[name].mask == array.mask).all()
+        assert (bands[name].compressed() == array.compressed()).all()
+
+
+def random_image(shape=(96, 80), seed=0):
+    """A band of small integers, so that the patches of equal values have a few pixels, with 10% masked pixels."""
+    random = np.random.default_rng(seed)
+    values = random.integers(0, 3, shape).astype(np.float64)
+    return np.ma.MaskedArray(values, mask=random.random(shape) < 0.1)
+
+
+def brute_force_focal(array, kernel, reducer):
+    """The reducer of the unmasked pixels of the kernel footprint of every pixel, pixel by pixel."""
+    values, valid = np.ma.getdata(array), ~np.ma.getmaskarray(array)
+    height, width = values.shape
+    offsets = [(row - kernel.y, col - kernel.x) for row, col in zip(*np.nonzero(kernel.weights))]
+    out = np.ma.masked_all(values.shape)
+    for row in range(height):
+        for col in range(width):
+            found = [values[row + dy, col + dx] for dy, dx in offsets
+                     if 0 <= row + dy < height and 0 <= col + dx < width and valid[row + dy, col + dx]]
+            if found:
+                out[row, col] = reducer(found)
+    return out
+
+
+def brute_force_patches(array, eight_connected):
+    """The patches of connected pixels of equal values, as lists of pixels, with a flood fill."""
+    values, valid = np.ma.getdata(array), ~np.ma.getmaskarray(array)
+    steps = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    if eight_connected:
+        steps += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+    seen = ~valid
+    patches = []
+    for start in zip(*np.nonzero(valid)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        patch = [start]
+        for row, col in patch:
+            for dy, dx in steps:
+                pixel = (row + dy, col + dx)
+                if 0 <= pixel[0] < values.shape[0] and 0 <= pixel[1] < values.shape[1] and not seen[pixel] \
+                        and values[pixel] == values[start]:
+                    seen[pixel] = True
+                    patch.append(pixel)
+        patches.append(patch)
+    return patches
+
+
+def assert_same(actual, expected):
+    assert (np.ma.getmaskarray(actual) == np.ma.getmaskarray(expected)).all()
+    assert np.allclose(actual.compressed(), expected.compressed())
+
+
+@pytest.mark.parametrize('kernel_type, radius', [('square', 1), ('square', 2), ('circle', 2), ('plus', 3)])
+def test_focal_min_max(kernel_type, radius):
+    array = random_image()
+    image = Image({'b': array}).multiply(Image.pixelLonLat().select('longitude'))
+    values = image.compute()['b']
+    kernel = getattr(Kernel, kernel_type)(radius, normalize=False)
+    assert_same(image.focal_min(radius, kernel_type).compute()['b'], brute_force_focal(values, kernel, min))
+    assert_same(image.focal_max(radius, kernel_type).compute()['b'], brute_force_focal(values, kernel, max))
+
+
+@pytest.mark.parametrize('eight_connected', [False, True])
+def test_connected_pixel_count(eight_connected):
+    array = random_image()
+    patches = brute_force_patches(array, eight_connected)
+    counts = Image({'b': array}).connectedPixelCount(8, eight_connected).compute()['b']
+    expected = np.ma.MaskedArray(np.zeros(array.shape), mask=np.ma.getmaskarray(array))
+    for patch in patches:
+        rows, cols = zip(*patch)
+        expected[rows, cols] = min(len(patch), 8)
+    assert_same(counts, expected)
+    assert counts.max() == 8
+
+
+@pytest.mark.parametrize('eight_connected', [False, True])
+def test_polygonize(eight_connected):
+    array = random_image((40, 30))
+    patches = brute_force_patches(array, eight_connected)
+    features = polygonize(np.ma.getdata(array), ~np.ma.getmaskarray(array), eight_connected=eight_connected)
+    assert sorted(feature['properties']['count'] for feature in features) == sorted(len(patch) for patch in patches)
+
+    def area(ring):
+        x, y = np.array(ring).T
+        return abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+    # The outlines cover the pixels of their patch: the area of a polygon, less its holes, is its count.
+    for feature in features:
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        assert sum(area(rings[0]) - sum(area(hole) for hole in rings[1:]) for rings in polygons) == \
+            feature['properties']['count']
+
+
+def terrain_products(array):
+    image = Image({'b': array})
+    relief = image.focal_max(2, 'square').subtract(image.focal_min(1)).rename('relief')
+    smooth = image.convolve(Kernel.gaussian(3, 1.5)).focal_mean(1).rename('smooth')
+    return relief.addBands([smooth, image.connectedPixelCount(20, True).rename('count')])
+
+
+@pytest.mark.parametrize('tile_size, workers', [(16, 1), (32, 2), (50, 4), (64, 2)])
+def test_tiles_join_without_seams(tile_size, workers):
+    products = terrain_products(random_image())
+    whole = products.compute()
+    timings = []
+    tiled = products.compute(tile_size=tile_size, workers=workers, timings=timings)
+    assert len(timings) == -(-96 // tile_size) * -(-80 // tile_size)
+    for name in whole:
+        assert_same(tiled[name], whole[name])
+
+
+def test_memory_limit():
+    products = terrain_products(random_image((256, 256)))
+    whole = products.compute()
+    timings = []
+    tiled = products.compute(memory_limit=8 * MB, timings=timings)
+    # The largest tiles whose halos and intermediate arrays fit in the limit.
+    assert {timing['window'][1] - timing['window'][0] for timing in timings} == {64}
+    for name in whole:
+        assert_same(tiled[name], whole[name])
+
+    with pytest.raises(MemoryError):
+        products.compute(memory_limit=4 * MB)
@@ -0,0 +1,162 @@
+import json
+import base64
+
+import pytest
+import nbformat
+from nbformat.v4 import new_notebook, new_code_cell
+
+from notebook_executor import execute_notebooks
+from static_snapshot import notebook_thumbnail
+from convert_py_to_ipynb import convert_py_to_ipynb_dir
+
+pytest.importorskip('ipykernel')
+
+
+def write_notebook(path, cells):
+    nbformat.write(new_notebook(cells=[new_code_cell(cell) for cell in cells]), str(path))
+    return str(path)
+
+
+def test_real_kernel_outputs(tmp_path):
+    in_file = write_notebook(tmp_path / 'display.ipynb', [
+        'from IPython.display import display, HTML',
+        '%time x = 1',
+        "display(HTML('<b>map</b>'))",
+        'x + 1',
+    ])
+    report = execute_notebooks([in_file], workers=1, timeout=60)
+    result = report['notebooks'][0]
+    assert result['status'] == 'ok'
+    assert [profile['index'] for profile in result['profile']] == [0, 1, 2, 3]
+
+    notebook = nbformat.read(in_file, as_version=4)
+    nbformat.validate(notebook)
+    assert notebook.metadata.language_info.name == 'python'
+    assert notebook.cells[1].outputs[0].text.startswith('CPU times')
+    assert notebook.cells[2].outputs[0].output_type == 'display_data'
+    assert notebook.cells[2].outputs[0].data['text/html'] == '<b>map</b>'
+    assert notebook.cells[3].outputs[0].data['text/plain'] == '2'
+    assert notebook.cells[3].execution_count == 4
+
+
+def test_errors_and_timeouts(tmp_path):
+    failing = write_notebook(tmp_path / 'failing.ipynb', ['a = 1', '1 / 0', 'b = 2'])
+    slow = write_notebook(tmp_path / 'slow.ipynb', ['import time', 'time.sleep(60)'])
+    before = (tmp_path / 'failing.ipynb').read_text()
+    report = execute_notebooks([failing, slow], workers=2, timeout=5)
+
+    failed, timed_out = report['notebooks']
+    assert failed['status'] == 'error'
+    assert failed['failed_cells'] == [{'index': 1, 'ename': 'ZeroDivisionError', 'evalue': 'division by zero'}]
+    # Like 'jupyter nbconvert --execute --inplace', a notebook that stopped on an error is not saved.
+    assert (tmp_path / 'failing.ipynb').read_text() == before
+    assert timed_out['status'] == 'timeout'
+
+
+def test_warm_kernels_start_clean(tmp_path):
+    first = write_notebook(tmp_path / 'first.ipynb', ['a = 1'])
+    second = write_notebook(tmp_path / 'second.ipynb', ["'a' in dir()"])
+    report = execute_notebooks([first, second], workers=1, timeout=60, warm=True, preload=('json',))
+    assert report['summary'] == {'ok': 2}
+    assert report['startup']['kernels_started'] == 1
+
+    cell = nbformat.read(second, as_version=4).cells[0]
+    assert cell.execution_count == 1
+    assert cell.outputs[0].data['text/plain'] == 'False'
+
+
+# A stand-in ee module whose thumbnails are a local PNG file, and records the visualization and region asked for.
+STUB_EE = '''
+import json
+
+
+class ComputedObject(object):
+    def __init__(self, *args, **kwargs):
+        self.args = args
+
+
+class Geometry(ComputedObject):
+    @staticmethod
+    def Rectangle(coords, proj=None, geodesic=True):
+        return Geometry(coords)
+
+
+class Feature(ComputedObject):
+    pass
+
+
+class FeatureCollection(ComputedObject):
+    pass
+
+
+class ImageCollection(ComputedObject):
+    pass
+
+
+class Image(ComputedObject):
+    def visualize(self, **params):
+        self.params = params
+        return self
+
+    def getThumbURL(self, params):
+        with open({requests!r}, 'w') as f:
+            json.dump({{'vis': self.params, 'region': params['region'].args[0], 'size': params['dimensions']}}, f)
+        return {url!r}
+'''
+
+
+def test_map_thumbnails(tmp_path):
+    png = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+    (tmp_path / 'thumb.png').write_bytes(png)
+    (tmp_path / 'stubs').mkdir()
+    (tmp_path / 'stubs' / 'ee.py').write_text(STUB_EE.format(requests=str(tmp_path / 'requests.json'),
+                                                             url=(tmp_path / 'thumb.png').as_uri()))
+    with_map = write_notebook(tmp_path / 'map.ipynb', [
+        'import ee, types',
+        "Map = types.SimpleNamespace(center=(40, -100), zoom=4, ee_layers={'dem': {'ee_object': ee.Image('USGS/NED'), "
+        "'vis_params': {'min': 0, 'max': 4000, 'palette': ['white', 'black'], 'color': 'red'}}})",
+    ])
+    without_map = write_notebook(tmp_path / 'no_map.ipynb', ['import ee'])
+    report = execute_notebooks([with_map, without_map], workers=1, timeout=60, python_path=[str(tmp_path / 'stubs')],
+                               map_thumbnails=True)
+    assert report['summary'] == {'ok': 2}
+
+    notebook = nbformat.read(with_map, as_version=4)
+    assert base64.b64decode(notebook.metadata.thumbnail['image/png']) == png
+    assert notebook_thumbnail(notebook) == png
+    assert notebook_thumbnail(nbformat.read(without_map, as_version=4)) is None
+
+    requested = (tmp_path / 'requests.json').read_text()
+    # The view of the map: 440 pixels of 360 / 2 ** 4 degrees per 256 pixels, around its center.
+    assert json.loads(requested) == {'vis': {'min': 0, 'max': 4000, 'palette': ['white', 'black']},
+                                     'region': [-119.3359375, 20.6640625, -80.6640625, 59.3359375], 'size': 440}
+
+
+STUB_GEEMAP = '''
+class Map(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+'''
+
+
+def test_converted_notebooks_are_checked_once(tmp_path):
+    (tmp_path / 'stubs').mkdir()
+    (tmp_path / 'stubs' / 'ee.py').write_text('')
+    (tmp_path / 'stubs' / 'geemap.py').write_text(STUB_GEEMAP)
+    script = tmp_path / 'qgis' / 'Image' / 'hello.py'
+    script.parent.mkdir(parents=True)
+
+    def convert(code):
+        script.write_text('import ee\nfrom ee_plugin import Map\n\n' + code)
+        report = convert_py_to_ipynb_dir(str(tmp_path / 'qgis'), str(tmp_path / 'out'), workers=1, timeout=60,
+                                         python_path=[str(tmp_path / 'stubs')])
+        return report['summary'], report['cache']
+
+    assert convert("print('hello')\n") == ({'ok': 1}, {'hits': 0, 'misses': 1})
+    # The notebook is neither rewritten nor executed, and keeps its outputs.
+    assert convert("print('hello')\n") == ({'cached': 1}, {'hits': 1, 'misses': 0})
+    assert 'hello' in (tmp_path / 'out' / 'Image' / 'hello.ipynb').read_text()
+    assert convert("print('world')\n") == ({'ok': 1}, {'hits': 0, 'misses': 1})
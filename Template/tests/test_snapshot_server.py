@@ -0,0 +1,144 @@
+import sys
+import time
+import asyncio
+import subprocess
+
+import nbformat
+import pytest
+from tornado import httpclient, httpserver, web, websocket
+
+from kernel_prespawn import RequestStats, PrespawnPolicy, MB
+from snapshot_server import LiveServer, make_app, start_snapshot_build, free_port
+
+
+class FailingLiveServer(LiveServer):
+    """A live server whose Voila never starts."""
+
+    async def ensure_started(self, timeout=60):
+        raise RuntimeError('Voila exited with code 1')
+
+
+class SlowLiveServer(LiveServer):
+    """A live server whose Voila takes a while to start, with a stub kernel websocket."""
+
+    def __init__(self, root_dir, upstream_port):
+        super().__init__(root_dir)
+        self.port = upstream_port
+
+    async def ensure_started(self, timeout=60):
+        await asyncio.sleep(0.5)
+        return self.url
+
+
+class KernelHandler(websocket.WebSocketHandler):
+    open_connections = 0
+
+    def open(self, *args):
+        KernelHandler.open_connections += 1
+
+    def on_close(self):
+        KernelHandler.open_connections -= 1
+
+
+async def serve(app, run):
+    port = free_port()
+    server = httpserver.HTTPServer(app)
+    server.listen(port, '127.0.0.1')
+    try:
+        return await run(port)
+    finally:
+        server.stop()
+
+
+def websocket_request(port, origin):
+    return httpclient.HTTPRequest('ws://127.0.0.1:{}/live/api/kernels/abc/channels'.format(port),
+                                  headers={'Origin': origin})
+
+
+def test_kernel_websockets(tmp_path):
+    live = FailingLiveServer(str(tmp_path))
+
+    async def run(port):
+        # Pages of other sites cannot open kernel connections.
+        with pytest.raises(httpclient.HTTPClientError) as error:
+            await websocket.websocket_connect(websocket_request(port, 'http://example.com'))
+        assert error.value.code == 403
+
+        # The connection is closed when Voila fails to start, and it is not counted.
+        connection = await websocket.websocket_connect(websocket_request(port, 'http://127.0.0.1:{}'.format(port)))
+        assert await connection.read_message() is None
+        await asyncio.sleep(0.1)
+        return live.connections
+
+    assert asyncio.run(serve(make_app(str(tmp_path / '_snapshots'), live), run)) == 0
+
+
+def test_kernel_websocket_closed_while_voila_starts(tmp_path):
+    upstream_port = free_port()
+    live = SlowLiveServer(str(tmp_path), upstream_port)
+
+    async def run(port):
+        upstream = httpserver.HTTPServer(web.Application([(r'/live/api/kernels/[^/]+/channels', KernelHandler)]))
+        upstream.listen(upstream_port, '127.0.0.1')
+        try:
+            connection = await websocket.websocket_connect(websocket_request(port, 'http://127.0.0.1:{}'.format(port)))
+            # As when the tab is closed: the TCP connection is dropped without a close handshake.
+            connection.protocol.stream.close()
+            await asyncio.sleep(0.2)
+            connections_while_starting = live.connections
+            await asyncio.sleep(0.6)
+            return connections_while_starting, live.connections, KernelHandler.open_connections
+        finally:
+            upstream.stop()
+
+    # No connection is counted, and none is left open to the kernel.
+    assert asyncio.run(serve(make_app(str(tmp_path / '_snapshots'), live), run)) == (0, 0, 0)
+
+
+def test_snapshot_build(tmp_path):
+    notebook_dir = tmp_path / 'notebooks'
+    snapshot_dir = tmp_path / 'notebooks' / '_snapshots'
+    (notebook_dir / 'Image').mkdir(parents=True)
+    notebook = nbformat.v4.new_notebook(cells=[nbformat.v4.new_code_cell("print('NDVI')")])
+    nbformat.write(notebook, str(notebook_dir / 'Image' / 'ndvi.ipynb'))
+
+    async def get_home(port):
+        response = await httpclient.AsyncHTTPClient().fetch('http://127.0.0.1:{}/'.format(port), raise_error=False,
+                                                            follow_redirects=False)
+        return response.code, response.headers.get('Location'), response.body
+
+    app = make_app(str(snapshot_dir), LiveServer(str(notebook_dir)))
+    assert asyncio.run(serve(app, get_home))[:2] == (302, '/live/')
+
+    assert start_snapshot_build(str(notebook_dir), str(snapshot_dir)).wait(300) == 0
+    assert (snapshot_dir / 'Image' / 'ndvi.html').is_file()
+    code, _, body = asyncio.run(serve(app, get_home))
+    assert code == 200
+    assert b'Image/ndvi.html' in body
+
+
+def test_idle_voila_stops_with_its_pools(tmp_path):
+    live = LiveServer(str(tmp_path), idle_timeout=60, policy=PrespawnPolicy(RequestStats(), 512 * MB))
+    live.process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    try:
+        live.stop_if_idle()
+        assert live.is_running()
+        live.last_request = time.monotonic() - 61
+        live.stop_if_idle()
+        assert not live.is_running()
+    finally:
+        live.stop()
+
+
+def test_live_report(tmp_path):
+    live = LiveServer(str(tmp_path))
+    live.pool_sizes = {'GetStarted/01_hello_world.ipynb': 2}
+    live.record_render('GetStarted/01_hello_world.ipynb', 1.0)
+    live.record_render('GetStarted/01_hello_world.ipynb', 2.0)
+    live.record_render('NAIP/metadata.ipynb', 6.0)
+
+    report = live.report()
+    assert report['with_pool'] == {'renders': 2, 'latency_mean': 1.5}
+    assert report['without_pool'] == {'renders': 1, 'latency_mean': 6.0}
+    assert report['with_pool_share'] == 2 / 3
+    assert report['top'][0][0] == 'GetStarted/01_hello_world.ipynb'
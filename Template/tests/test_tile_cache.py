@@ -0,0 +1,111 @@
+import json
+import asyncio
+
+import pytest
+from tornado import httpclient, httpserver, web
+
+from snapshot_server import free_port
+from tile_cache import TileCache, TileProxy, make_app
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 92
+MAPS_PATH = '/v1/projects/earthengine-legacy/maps/'
+
+
+class OriginTileHandler(web.RequestHandler):
+    """The tiles of a stub Earth Engine tile server, which takes a while to render each of them."""
+
+    requests = 0
+
+    async def get(self, map_id, z, x, y):
+        OriginTileHandler.requests += 1
+        await asyncio.sleep(0.2)
+        self.set_header('Content-Type', 'image/png')
+        self.write(PNG)
+
+
+async def serve_proxy(tmp_path, run, max_bytes=1024 ** 2):
+    origin_port, proxy_port = free_port(), free_port()
+    origin = httpserver.HTTPServer(web.Application([(MAPS_PATH + r'([\w-]+)/tiles/(\d+)/(\d+)/(\d+)',
+                                                     OriginTileHandler)]))
+    origin.listen(origin_port, '127.0.0.1')
+    proxy = TileProxy(TileCache(str(tmp_path / 'tiles'), max_bytes), allowed_hosts=('127.0.0.1',))
+    server = httpserver.HTTPServer(make_app(proxy))
+    server.listen(proxy_port, '127.0.0.1')
+    try:
+        return await run(proxy, 'http://127.0.0.1:{}'.format(origin_port), 'http://127.0.0.1:{}'.format(proxy_port))
+    finally:
+        server.stop()
+        origin.stop()
+
+
+async def register(proxy_url, key, url):
+    response = await httpclient.AsyncHTTPClient().fetch(proxy_url + '/_register', method='POST', raise_error=False,
+                                                        body=json.dumps({'key': key, 'url': url}))
+    return response.code, json.loads(response.body) if response.code == 200 else None
+
+
+def test_concurrent_requests_share_one_upstream_fetch(tmp_path):
+    OriginTileHandler.requests = 0
+
+    async def run(proxy, origin_url, proxy_url):
+        code, layer = await register(proxy_url, 'dem', origin_url + MAPS_PATH + 'map1/tiles/{z}/{x}/{y}')
+        assert (code, layer['tiles']) == (200, '/tiles/dem/{z}/{x}/{y}')
+        client = httpclient.AsyncHTTPClient()
+        responses = await asyncio.gather(*[client.fetch(proxy_url + '/tiles/dem/8/41/97') for _ in range(10)])
+        assert [response.body for response in responses] == [PNG] * 10
+        assert OriginTileHandler.requests == 1
+
+        # The next request is a cache hit.
+        response = await client.fetch(proxy_url + '/tiles/dem/8/41/97')
+        assert (response.body, response.headers['Content-Type']) == (PNG, 'image/png')
+        assert OriginTileHandler.requests == 1
+        return proxy.stats()
+
+    stats = asyncio.run(serve_proxy(tmp_path, run))
+    assert (stats['upstream_requests'], stats['coalesced'], stats['hits'], stats['tiles']) == (1, 9, 1, 1)
+
+
+def test_registering_a_layer_again(tmp_path):
+
+    async def run(proxy, origin_url, proxy_url):
+        tiles = MAPS_PATH + '{}/tiles/{{z}}/{{x}}/{{y}}'
+        codes = []
+        codes.append((await register(proxy_url, 'dem', origin_url + tiles.format('map1')))[0])
+        # A new map id of the same layer, e.g., once the previous one has expired.
+        codes.append((await register(proxy_url, 'dem', origin_url + tiles.format('map2')))[0])
+        # Another host, or another project of the same host.
+        codes.append((await register(proxy_url, 'dem', 'http://localhost:1' + tiles.format('map3')))[0])
+        other_project = origin_url + '/v1/projects/other/maps/map3/tiles/{z}/{x}/{y}'
+        codes.append((await register(proxy_url, 'dem', other_project))[0])
+        # A host that is not allowed.
+        codes.append((await register(proxy_url, 'srtm', 'https://example.com' + tiles.format('map4')))[0])
+        return codes, proxy.layers['dem']
+
+    codes, url = asyncio.run(serve_proxy(tmp_path, run))
+    assert codes == [200, 200, 400, 400, 400]
+    assert '/maps/map2/' in url
+
+
+def test_least_recently_used_tiles_are_evicted(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=250)
+    cache.put('dem/1/0/0', PNG)
+    cache.put('dem/1/0/1', PNG)
+    assert cache.get('dem/1/0/0') == PNG
+    cache.put('dem/1/1/0', PNG)
+
+    assert cache.get('dem/1/0/1') is None
+    assert cache.get('dem/1/0/0') == PNG
+    assert cache.get('dem/1/1/0') == PNG
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 200
+
+    # The remaining tiles are found again when the cache is opened.
+    reopened = TileCache(str(tmp_path), max_bytes=250)
+    assert reopened.stats()['tiles'] == 2
+    assert reopened.get('dem/1/0/0') == PNG
+
+
+def test_invalid_layer_keys(tmp_path):
+    proxy = TileProxy(TileCache(str(tmp_path)))
+    with pytest.raises(ValueError):
+        proxy.register('../dem', 'https://earthengine.googleapis.com' + MAPS_PATH + 'map1/tiles/{z}/{x}/{y}')
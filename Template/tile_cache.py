@@ -0,0 +1,449 @@
+''' A caching proxy for the map tiles of Earth Engine layers, shared by all notebooks and users of a server.
+
+To run the proxy on port 8867 with a 1 GB cache: python tile_cache.py --port 8867 --max-mb 1024
+To add a layer whose tiles go through the proxy, in a notebook:
+
+    Map.add_layer(cached_tile_layer(image, vis_params, 'DEM', proxy_url='http://localhost:8867'))
+
+Each layer is registered with the proxy under a key (the map id), and its tiles are requested from the proxy as
+/tiles/<key>/<z>/<x>/<y>. A tile is served from the cache when it is there, and fetched from the Earth Engine tile
+URL of the layer otherwise. Concurrent requests of the same missing tile share one upstream request. The map ids
+that getMapId() returns change with every call, so the key of a layer is computed from its serialized expression and
+visualization parameters, and the users who add the same layer share its tiles. A layer registered again gets the
+new tile URL of its map id, but only if the URL has the same host and path prefix (the Earth Engine project), so that
+a client cannot point the cached tiles of another layer to other tiles. The tiles are kept in files, and the least
+recently used ones are removed when they take more than the byte budget. /_tile_stats reports the hit rate.
+
+'''
+
+# License: MIT
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from tornado import httpclient, ioloop, web
+
+
+TILE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.tile_cache')
+# Only tiles of these hosts are proxied, so that the proxy cannot be used to fetch arbitrary URLs.
+ALLOWED_HOSTS = ('earthengine.googleapis.com',)
+
+
+class TileCache(object):
+    """Tiles kept in files, removed in least recently used order beyond a byte budget.
+
+    The order is kept in memory and rebuilt from the modification times of the files when the cache is opened.
+    A hit sets the modification time of its file, so that the order survives restarts.
+
+    Args:
+        cache_dir (str): The folder of the tile files.
+        max_bytes (int, optional): Bytes the tiles may take. Defaults to 1 GiB.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        files = []
+        for folder, _, names in os.walk(cache_dir):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                stat = os.stat(os.path.join(folder, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.size += size
+        self._evict()
+
+    def _file(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    @staticmethod
+    def digest(key):
+        """Get the file name of a tile key.
+
+        Args:
+            key (str): The tile key, e.g., <map id>/<z>/<x>/<y>.
+
+        Returns:
+            str: The hexadecimal SHA-256 digest of the key.
+        """
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Read a tile, and count the hit or miss.
+
+        Args:
+            key (str): The tile key.
+
+        Returns:
+            bytes: The tile, or None if it is not cached.
+        """
+        digest = self.digest(key)
+        with self._lock:
+            if digest not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+        try:
+            with open(self._file(digest), 'rb') as f:
+                data = f.read()
+            os.utime(self._file(digest))
+        except OSError:
+            with self._lock:
+                self.size -= self._entries.pop(digest, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store a tile, removing the least recently used tiles beyond the byte budget.
+
+        Args:
+            key (str): The tile key.
+            data (bytes): The tile.
+        """
+        digest = self.digest(key)
+        file_path = self._file(digest)
+        if not os.path.exists(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_file = '{}.{}.tmp'.format(file_path, threading.get_ident())
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, file_path)
+        with self._lock:
+            self.size += len(data) - self._entries.pop(digest, 0)
+            self._entries[digest] = len(data)
+        self._evict()
+
+    def _evict(self):
+        removed = []
+        with self._lock:
+            while self.size > self.max_bytes and self._entries:
+                digest, size = self._entries.popitem(last=False)
+                self.size -= size
+                self.evictions += 1
+                removed.append(digest)
+        for digest in removed:
+            try:
+                os.remove(self._file(digest))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Get the counters of the cache.
+
+        Returns:
+            dict: The hits, misses, hit_rate, evictions, and the number of tiles and bytes cached.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'tiles': len(self._entries), 'bytes': self.size}
+
+
+class TileProxy(object):
+    """Serve the tiles of registered layers from a TileCache, fetching the missing ones upstream.
+
+    Args:
+        cache (TileCache): The cache.
+        allowed_hosts (tuple, optional): Hosts of the upstream tile URLs that can be registered. Defaults to
+            ALLOWED_HOSTS.
+        timeout (float, optional): Seconds allowed per upstream request. Defaults to 30.
+        max_concurrent (int, optional): Maximum number of upstream requests at a time. Defaults to 32.
+    """
+
+    def __init__(self, cache, allowed_hosts=ALLOWED_HOSTS, timeout=30, max_concurrent=32):
+        self.cache = cache
+        self.allowed_hosts = allowed_hosts
+        self.timeout = timeout
+        self.layers = {}
+        self.coalesced = 0
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.max_concurrent = max_concurrent
+        self._pending = {}
+        self._client = None
+
+    def register(self, key, url_format):
+        """Register the upstream tile URL of a layer, replacing the one it had if it has the same prefix.
+
+        Args:
+            key (str): The key of the layer, see layer_key().
+            url_format (str): The tile URL, with {z}, {x} and {y} placeholders.
+
+        Raises:
+            ValueError: If the key is not made of letters, digits, - and _, if the host is not allowed, or if the key
+                was registered with a URL of another host or path prefix, see url_prefix().
+        """
+        if not key or not all(c.isalnum() or c in '-_' for c in key):
+            raise ValueError('Invalid layer key: {}'.format(key))
+        host = urlparse(url_format).hostname
+        if host not in self.allowed_hosts:
+            raise ValueError('Tiles of {} are not proxied'.format(host))
+        if key in self.layers and url_prefix(self.layers[key]) != url_prefix(url_format):
+            raise ValueError('Layer {} is registered with tiles of {}'.format(key, url_prefix(self.layers[key])))
+        self.layers[key] = url_format
+
+    async def get_tile(self, key, z, x, y):
+        """Get a tile from the cache, or from upstream on a miss.
+
+        Args:
+            key (str): The key of the layer.
+            z (int): The zoom level.
+            x (int): The tile column.
+            y (int): The tile row.
+
+        Returns:
+            tuple: The HTTP status code, the content type and the tile. Only tiles received with status 200 are cached.
+        """
+        tile_key = '{}/{}/{}/{}'.format(key, z, x, y)
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self.cache.get, tile_key)
+        if data is not None:
+            return 200, _content_type(data), data
+
+        pending = self._pending.get(tile_key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        if key not in self.layers:
+            return 404, 'text/plain', b'Unknown layer'
+
+        future = loop.create_future()
+        self._pending[tile_key] = future
+        try:
+            result = await self._fetch(tile_key, self.layers[key].format(z=z, x=x, y=y))
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved, for when no other request waited for the tile.
+            future.exception()
+            raise
+        finally:
+            del self._pending[tile_key]
+        return result
+
+    async def _fetch(self, tile_key, url):
+        if self._client is None:
+            # A client of its own, whose max_clients limits the upstream requests, rather than the shared one.
+            self._client = httpclient.AsyncHTTPClient(force_instance=True, max_clients=self.max_concurrent)
+        self.upstream_requests += 1
+        response = await self._client.fetch(url, raise_error=False, request_timeout=self.timeout)
+        if response.code != 200:
+            self.upstream_errors += 1
+            return (response.code if response.code != 599 else 502), 'text/plain', \
+                (response.body or str(response.error).encode('utf-8'))
+        data = response.body
+        await asyncio.get_running_loop().run_in_executor(None, self.cache.put, tile_key, data)
+        return 200, response.headers.get('Content-Type', _content_type(data)), data
+
+    def stats(self):
+        """Get the counters of the cache and the proxy.
+
+        Returns:
+            dict: The cache counters (see TileCache.stats()), with the hit_rate of the cache as cache_hit_rate, the
+                requests that waited for the upstream request of another one (coalesced), the upstream requests and
+                errors, the number of layers, and the hit_rate: the share of the tile requests served without an
+                upstream request of their own.
+        """
+        stats = self.cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        stats.update({'cache_hit_rate': stats['hit_rate'], 'coalesced': self.coalesced,
+                      'upstream_requests': self.upstream_requests, 'upstream_errors': self.upstream_errors,
+                      'layers': len(self.layers),
+                      'hit_rate': (stats['hits'] + self.coalesced) / lookups if lookups else 0.0})
+        return stats
+
+
+def url_prefix(url_format):
+    """Get the part of a tile URL that stays the same when the map id of a layer changes.
+
+    Args:
+        url_format (str): The tile URL, e.g., https://earthengine.googleapis.com/v1/projects/earthengine-legacy/maps/
+            <map id>/tiles/{z}/{x}/{y}
+
+    Returns:
+        str: The scheme, host and path without its last 5 segments (<map id>/tiles/{z}/{x}/{y}), e.g.,
+            https://earthengine.googleapis.com/v1/projects/earthengine-legacy/maps
+    """
+    url = urlparse(url_format)
+    segments = url.path.split('/')
+    return '{}://{}{}'.format(url.scheme, url.netloc, '/'.join(segments[:-5]) if len(segments) > 5 else url.path)
+
+
+def _content_type(data):
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    return 'application/octet-stream'
+
+
+class TileHandler(web.RequestHandler):
+    """Serve /tiles/<key>/<z>/<x>/<y>."""
+
+    def initialize(self, proxy):
+        self.proxy = proxy
+
+    async def get(self, key, z, x, y):
+        status, content_type, data = await self.proxy.get_tile(key, int(z), int(x), int(y))
+        self.set_status(status)
+        self.set_header('Content-Type', content_type)
+        self.set_header('Access-Control-Allow-Origin', '*')
+        if status == 200:
+            self.set_header('Cache-Control', 'public, max-age=86400')
+        self.write(data)
+
+
+class RegisterHandler(web.RequestHandler):
+    """Register a layer with a POST of {"key": ..., "url": ...} to /_register."""
+
+    def initialize(self, proxy):
+        self.proxy = proxy
+
+    def post(self):
+        try:
+            layer = json.loads(self.request.body)
+            self.proxy.register(layer['key'], layer['url'])
+        except (ValueError, KeyError, TypeError) as e:
+            raise web.HTTPError(400, str(e))
+        self.write({'key': layer['key'], 'tiles': '/tiles/{}/{{z}}/{{x}}/{{y}}'.format(layer['key'])})
+
+
+class StatsHandler(web.RequestHandler):
+    """Report the counters of the proxy, see TileProxy.stats()."""
+
+    def initialize(self, proxy):
+        self.proxy = proxy
+
+    def get(self):
+        self.write(self.proxy.stats())
+
+
+def tile_routes(proxy):
+    """Get the URL routes of a proxy, to serve it from another tornado application, e.g., snapshot_server.py.
+
+    Args:
+        proxy (TileProxy): The proxy.
+
+    Returns:
+        list: The (pattern, handler, arguments) routes.
+    """
+    return [
+        (r'/tiles/([\w-]+)/(\d+)/(\d+)/(\d+)(?:\.png)?', TileHandler, {'proxy': proxy}),
+        (r'/_register', RegisterHandler, {'proxy': proxy}),
+        (r'/_tile_stats', StatsHandler, {'proxy': proxy}),
+    ]
+
+
+def make_app(proxy):
+    """Create the web application of a proxy.
+
+    Args:
+        proxy (TileProxy): The proxy.
+
+    Returns:
+        tornado.web.Application: The application.
+    """
+    return web.Application(tile_routes(proxy))
+
+
+def layer_key(ee_object, vis_params=None):
+    """Compute the key of a layer from its expression and visualization parameters.
+
+    Args:
+        ee_object (ee.ComputedObject): The image, image collection or feature collection of the layer.
+        vis_params (dict, optional): The visualization parameters. Defaults to None.
+
+    Returns:
+        str: The first 32 hexadecimal digits of the SHA-256 digest.
+    """
+    digest = hashlib.sha256(ee_object.serialize().encode('utf-8'))
+    digest.update(json.dumps(vis_params or {}, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def cached_tile_layer(ee_object, vis_params=None, name='Layer untitled', proxy_url='http://localhost:8867',
+                      opacity=1.0, shown=True, register_url=None):
+    """Create an ipyleaflet tile layer of an Earth Engine object whose tiles are served by the proxy.
+
+    Args:
+        ee_object (ee.ComputedObject): The ee.Image, ee.ImageCollection (mosaicked) or ee.FeatureCollection.
+        vis_params (dict, optional): The visualization parameters, as for Map.addLayer(). Defaults to None.
+        name (str, optional): The name of the layer. Defaults to 'Layer untitled'.
+        proxy_url (str, optional): The URL of the proxy, as seen from the browser. Defaults to
+            'http://localhost:8867'.
+        opacity (float, optional): The opacity of the layer. Defaults to 1.
+        shown (bool, optional): Whether the layer is visible. Defaults to True.
+        register_url (str, optional): The URL of the proxy, as seen from the kernel, e.g., http://127.0.0.1:8866
+            when the proxy runs in the snapshot server of a Voila deployment. Defaults to None, which uses proxy_url.
+
+    Returns:
+        ipyleaflet.TileLayer: The layer, to be added with Map.add_layer().
+    """
+    import ee
+    import ipyleaflet
+    from urllib.request import Request, urlopen
+
+    vis_params = vis_params or {}
+    image = ee_object
+    if isinstance(ee_object, ee.ImageCollection):
+        image = ee_object.mosaic()
+    elif isinstance(ee_object, (ee.FeatureCollection, ee.Feature, ee.Geometry)):
+        image = ee.FeatureCollection(ee_object).style(**{'color': vis_params.get('color', '000000')})
+        vis_params = {}
+
+    key = layer_key(image, vis_params)
+    url_format = image.getMapId(vis_params)['tile_fetcher'].url_format
+    body = json.dumps({'key': key, 'url': url_format}).encode('utf-8')
+    request = Request((register_url or proxy_url).rstrip('/') + '/_register', body,
+                      {'Content-Type': 'application/json'})
+    with urlopen(request, timeout=10) as response:
+        tiles = json.load(response)['tiles']
+    return ipyleaflet.TileLayer(url=proxy_url.rstrip('/') + tiles, attribution='Google Earth Engine', name=name,
+                                opacity=opacity, visible=shown)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Serve the map tiles of Earth Engine layers through a local cache.')
+    parser.add_argument('--port', type=int, default=8867,
+                        help="Port to listen on")
+    parser.add_argument('--cache-dir', type=str, default=TILE_CACHE_DIR,
+                        help="Path to the folder of the cached tiles")
+    parser.add_argument('--max-mb', type=int, default=1024,
+                        help="Megabytes the cached tiles may take")
+    parser.add_argument('--allow-host', action='append',
+                        help="Host of upstream tile URLs (can be given several times; default: {})".format(
+                            ', '.join(ALLOWED_HOSTS)))
+    args = parser.parse_args()
+
+    async def main():
+        proxy = TileProxy(TileCache(args.cache_dir, args.max_mb * 1024 * 1024), tuple(args.allow_host or ALLOWED_HOSTS))
+        make_app(proxy).listen(args.port)
+        print('Serving tiles from {} on port {}'.format(args.cache_dir, args.port))
+        start_time = time.time()
+        while True:
+            await asyncio.sleep(300)
+            print('{:.0f} s: {}'.format(time.time() - start_time, json.dumps(proxy.stats())))
+
+    ioloop.IOLoop.current().run_sync(main)
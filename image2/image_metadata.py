@@ -47,26 +47,23 @@ Map
 # Add Earth Engine dataset
 image = ee.Image('LANDSAT/LC8_L1T/LC80440342014077LGN00')
 
-bandNames = image.bandNames()
-print('Band names: ', bandNames.getInfo()) # ee.List
-
-b1proj = image.select('B1').projection()
-print('Band 1 projection: ', b1proj.getInfo()) # ee.Projection
-
-b1scale = image.select('B1').projection().nominalScale()
-print('Band 1 scale: ', b1scale.getInfo()) # ee.Number
-
-b8scale = image.select('B8').projection().nominalScale()
-print('Band 8 scale: ', b8scale.getInfo()) # ee.Number
-
-properties = image.propertyNames()
-print('Metadata properties: ', properties.getInfo()) # ee.List
-
-cloudiness = image.get('CLOUD_COVER')
-print('CLOUD_COVER: ', cloudiness.getInfo()) # ee.Number
-
-date = ee.Date(image.get('system:time_start'))
-print('Timestamp: ', date.getInfo()) # ee.Date
+bandNames = image.bandNames() # ee.List
+b1proj = image.select('B1').projection() # ee.Projection
+b1scale = image.select('B1').projection().nominalScale() # ee.Number
+b8scale = image.select('B8').projection().nominalScale() # ee.Number
+properties = image.propertyNames() # ee.List
+cloudiness = image.get('CLOUD_COVER') # ee.Number
+date = ee.Date(image.get('system:time_start')) # ee.Date
+
+# Fetch all metadata in one request instead of one getInfo() call each.
+metadata = ee.List([bandNames, b1proj, b1scale, b8scale, properties, cloudiness, date]).getInfo()
+print('Band names: ', metadata[0])
+print('Band 1 projection: ', metadata[1])
+print('Band 1 scale: ', metadata[2])
+print('Band 8 scale: ', metadata[3])
+print('Metadata properties: ', metadata[4])
+print('CLOUD_COVER: ', metadata[5])
+print('Timestamp: ', metadata[6])
 
 
 # %%